@@ -0,0 +1,182 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+# Tunables (override via environment)
+LOG_FILE = os.environ.get("LOG_FILE", "debug.log")
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", 5))
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+# Per-logger overrides, e.g. "classify=DEBUG,werkzeug=WARNING"
+LOG_LEVELS = os.environ.get("LOG_LEVELS", "")
+LOG_STDERR = os.environ.get("LOG_STDERR", "0") not in ("0", "false", "False")
+
+# Ids attached to every record logged while they are bound
+CONTEXT_FIELDS = ('request_id', 'job_id', 'item_id', 'page_id')
+_context = {name: contextvars.ContextVar(name, default=None) for name in CONTEXT_FIELDS}
+
+_listener = None
+_configure_lock = threading.Lock()
+
+
+@contextmanager
+def log_context(**ids):
+    """Bind request/job/page ids for records logged inside the block (this thread/context only)."""
+    tokens = [(_context[name], _context[name].set(value)) for name, value in ids.items() if name in _context]
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def bind(**ids):
+    """Bind ids until unbind(tokens); for before/after-request hooks that cannot use a with block."""
+    return [(_context[name], _context[name].set(value)) for name, value in ids.items() if name in _context]
+
+
+def unbind(tokens):
+    for var, token in reversed(tokens or []):
+        var.reset(token)
+
+
+def current_context():
+    return {name: var.get() for name, var in _context.items() if var.get() is not None}
+
+
+class ContextFilter(logging.Filter):
+    """Copies the bound ids onto the record. Runs in the calling thread, before the queue hop."""
+
+    def filter(self, record):
+        for name, var in _context.items():
+            if not hasattr(record, name):
+                setattr(record, name, var.get())
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, any bound ids, exc if present."""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for name in CONTEXT_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _EnqueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the listener thread. Message args and tracebacks are rendered here,
+    in the caller, so the listener never touches objects owned by other threads.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _parse_levels(spec):
+    levels = {}
+    for part in spec.split(','):
+        if '=' in part:
+            name, level = part.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(log_file=None, level=None, levels=None):
+    """
+    Route all logging through an in-memory queue to a background thread that writes JSON lines
+    to a size-rotated file, so callers never wait on disk. Idempotent.
+
+    Note: each process rotates its own handle; with several gunicorn workers give each worker
+    its own LOG_FILE or rely on stderr (LOG_STDERR=1) if rotation races matter.
+    """
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return _listener
+
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file or LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8', delay=True
+        )
+        file_handler.setFormatter(JsonFormatter())
+        handlers = [file_handler]
+        if LOG_STDERR:
+            stderr_handler = logging.StreamHandler()
+            stderr_handler.setFormatter(JsonFormatter())
+            handlers.append(stderr_handler)
+
+        records = queue.SimpleQueue()
+        enqueue = _EnqueueHandler(records)
+        enqueue.addFilter(ContextFilter())
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(enqueue)
+        root.setLevel(level or LOG_LEVEL)
+        for name, module_level in _parse_levels(LOG_LEVELS if levels is None else levels).items():
+            logging.getLogger(name).setLevel(module_level)
+
+        _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        return _listener
+
+
+def _format_line(line):
+    """Render a JSON log line the way the old debug.log looked; other lines pass through."""
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return line + '\n'
+    if not isinstance(entry, dict) or 'msg' not in entry:
+        return line + '\n'
+    ids = ' '.join(f"{name}={entry[name]}" for name in CONTEXT_FIELDS if entry.get(name))
+    text = f"[{entry.get('ts', '')[:19].replace('T', ' ')}] {entry.get('level', '')} {entry.get('logger', '')}: {entry['msg']}"
+    if ids:
+        text += f" ({ids})"
+    if entry.get('exc'):
+        text += '\n' + entry['exc']
+    return text + '\n'
+
+
+def tail_log(path=None, lines=50, raw=False, block_size=8192):
+    """Last `lines` lines of the log, read backwards from the end in blocks (never the whole file)."""
+    path = path or LOG_FILE
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b''
+        while position > 0 and data.count(b'\n') <= lines:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    tail = [line + '\n' for line in data.decode('utf-8', errors='replace').splitlines()[-lines:]]
+    return tail if raw else [_format_line(line.rstrip('\n')) for line in tail]
@@ -0,0 +1,174 @@
+import contextvars
+import queue
+import re
+import threading
+from collections import deque
+
+# "**Meta Description**: ..." - the line the article prompts ask the model to put at the top
+META_LINE = re.compile(r'\*\*Meta Description\*\*:\s*(.*)')
+
+
+def chunk_text(chunk):
+    """Text of one streamed SDK chunk (old and new Gemini SDKs); '' for chunks without text."""
+    try:
+        return getattr(chunk, 'text', None) or ''
+    except ValueError:  # legacy SDK: a chunk with no text parts (e.g. the final finish_reason chunk)
+        return ''
+
+
+def strip_code_fence(text):
+    """Drop the ```markdown fence models sometimes wrap the whole article in."""
+    if text.startswith('```markdown'): text = text[11:]
+    if text.startswith('```'): text = text[3:]
+    if text.endswith('```'): text = text[:-3]
+    return text
+
+
+class MetaDescriptionParser:
+    """
+    Finds the Meta Description while the article streams in: only the unfinished last line is
+    buffered, and each completed line is checked once. The value is known as soon as its line
+    ends (a description on the line after the label is picked up too).
+    """
+
+    def __init__(self):
+        self.value = None
+        self._line = ''
+        self._label_seen = False
+
+    def _check(self, line):
+        if self._label_seen:
+            if line.strip():
+                self.value = line.strip()
+            return
+        match = META_LINE.search(line)
+        if match:
+            if match.group(1).strip():
+                self.value = match.group(1).strip()
+            else:
+                self._label_seen = True
+
+    def feed(self, text):
+        """Returns the description the first time it becomes known, else None."""
+        if self.value is not None or not text:
+            return None
+        self._line += text
+        if '\n' not in self._line:
+            return None
+        *lines, self._line = self._line.split('\n')
+        for line in lines:
+            self._check(line)
+            if self.value is not None:
+                self._line = ''
+                return self.value
+        return None
+
+    def finish(self):
+        """Check the last (unterminated) line; returns the description if that is where it was."""
+        if self.value is None and self._line:
+            self._check(self._line)
+            self._line = ''
+            return self.value
+        return None
+
+
+class ArticleStream:
+    """Accumulates streamed markdown and reports 'chunk' and 'meta' events to `on_event`."""
+
+    def __init__(self, on_event=None):
+        self.on_event = on_event or (lambda event: None)
+        self.meta = MetaDescriptionParser()
+        self._parts = []
+
+    def feed(self, text):
+        if not text:
+            return
+        self._parts.append(text)
+        self.on_event({'event': 'chunk', 'text': text})
+        if self.meta.feed(text):
+            self.on_event({'event': 'meta', 'meta_description': self.meta.value})
+
+    def finish(self):
+        if self.meta.finish():
+            self.on_event({'event': 'meta', 'meta_description': self.meta.value})
+        return self.text
+
+    @property
+    def text(self):
+        return ''.join(self._parts)
+
+    @property
+    def content(self):
+        return strip_code_fence(self.text).strip()
+
+
+def article_events(chunks, finish=None):
+    """
+    Generator of events for a stream of SDK chunks: 'chunk' and 'meta' as they arrive, then
+    'complete' with the full markdown (plus whatever `finish(article)` returns), or 'error'.
+    """
+    pending = deque()
+    article = ArticleStream(pending.append)
+    try:
+        for chunk in chunks:
+            article.feed(chunk_text(chunk))
+            while pending:
+                yield pending.popleft()
+        article.finish()
+        while pending:
+            yield pending.popleft()
+        complete = {'event': 'complete', 'content': article.content, 'meta_description': article.meta.value}
+        if finish:
+            complete.update(finish(article) or {})
+        yield complete
+    except Exception as e:
+        print(f"DEBUG: Article stream failed: {e}")
+        yield {'event': 'error', 'error': str(e)}
+
+
+async def aarticle_events(chunks, finish=None):
+    """article_events for an async iterator of chunks (the ASGI routes); `finish` may be async."""
+    pending = deque()
+    article = ArticleStream(pending.append)
+    try:
+        async for chunk in chunks:
+            article.feed(chunk_text(chunk))
+            while pending:
+                yield pending.popleft()
+        article.finish()
+        while pending:
+            yield pending.popleft()
+        complete = {'event': 'complete', 'content': article.content, 'meta_description': article.meta.value}
+        if finish:
+            extra = finish(article)
+            if hasattr(extra, '__await__'):
+                extra = await extra
+            complete.update(extra or {})
+        yield complete
+    except Exception as e:
+        print(f"DEBUG: Article stream failed: {e}")
+        yield {'event': 'error', 'error': str(e)}
+
+
+def run_with_events(target, name='event-runner'):
+    """
+    Run target(on_event) on a background thread (in a copy of the caller's context, so log ids
+    follow) and yield its events as they happen. The work finishes even if the reader stops.
+    """
+    events = queue.Queue()
+    context = contextvars.copy_context()
+
+    def runner():
+        try:
+            context.run(target, events.put)
+        except Exception as e:
+            events.put({'event': 'error', 'error': str(e)})
+        finally:
+            events.put(None)
+
+    threading.Thread(target=runner, name=name, daemon=True).start()
+    while True:
+        event = events.get()
+        if event is None:
+            return
+        yield event
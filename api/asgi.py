@@ -0,0 +1,344 @@
+"""
+ASGI entry point: the I/O-bound endpoints as async routes, everything else served by the Flask app.
+
+Run (instead of gunicorn) with:
+    uvicorn api.asgi:app --host 0.0.0.0 --port 3000 --workers 2
+
+analyze-speed, generate-funnel, write-article-v2, start-audit and generate-image-prompt await
+PageSpeed, Gemini, the page fetch and Supabase on the event loop, so one worker can keep
+hundreds of them in flight. They share the request/response shapes of their Flask twins
+(and its prompt/parse helpers); other routes run unchanged on a thread pool.
+"""
+
+import json
+import os
+import sys
+import uuid
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from supabase import acreate_client
+
+import index
+from app_logging import log_context
+from article_stream import aarticle_events
+from http_fetcher import AsyncHttpFetcher
+from llm_cache import acached_generate
+from outbound_scheduler import ascheduled_call, ascheduled_stream
+from setup_dag import sse_format
+
+# Tunables (override via environment)
+ASGI_WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", 16))   # threads for the Flask routes
+GEMINI_TIMEOUT = float(os.environ.get("GEMINI_TIMEOUT", 300))
+
+GEMINI_REST_URL = "https://generativelanguage.googleapis.com/v1beta/models/{model}:{method}"
+
+# Clients bound to the running loop, created in lifespan()
+state = SimpleNamespace(db=None, http=None, fetcher=None)
+
+
+class GeminiResponse:
+    """generateContent REST reply with the SDK attributes callers use (.text, .usage_metadata)."""
+
+    def __init__(self, data):
+        candidates = data.get('candidates') or [{}]
+        parts = (candidates[0].get('content') or {}).get('parts') or []
+        self.text = ''.join(p.get('text', '') for p in parts)
+        usage = data.get('usageMetadata') or {}
+        self.usage_metadata = SimpleNamespace(prompt_token_count=usage.get('promptTokenCount'),
+                                              candidates_token_count=usage.get('candidatesTokenCount'))
+
+
+def _gemini_body(prompt, generation_config=None):
+    body = {"contents": [{"parts": [{"text": prompt}]}]}
+    if generation_config:
+        # REST field names are camelCase ("response_mime_type" -> "responseMimeType")
+        body["generationConfig"] = {k.split('_')[0] + ''.join(w.title() for w in k.split('_')[1:]): v
+                                    for k, v in generation_config.items()}
+    return body
+
+
+async def _gemini_post(model, prompt, generation_config=None):
+    resp = await state.http.post(GEMINI_REST_URL.format(model=model, method='generateContent'),
+                                 params={'key': index.GEMINI_API_KEY},
+                                 json=_gemini_body(prompt, generation_config), timeout=GEMINI_TIMEOUT)
+    if resp.status_code == 200:
+        return resp
+    # Surface errors the way the SDK does, so throttle_delay sees 429s and their retry hints
+    error = RuntimeError(f"Gemini API {resp.status_code}: {resp.text[:500]}")
+    error.code = resp.status_code
+    raise error
+
+
+async def gemini_generate(model, prompt, generation_config=None):
+    """One generateContent call through the provider scheduler."""
+    resp = await ascheduled_call('gemini', _gemini_post, model, prompt, generation_config)
+    return GeminiResponse(resp.json())
+
+
+async def _gemini_sse(model, prompt):
+    url = GEMINI_REST_URL.format(model=model, method='streamGenerateContent')
+    async with state.http.stream('POST', url, params={'key': index.GEMINI_API_KEY, 'alt': 'sse'},
+                                 json=_gemini_body(prompt), timeout=GEMINI_TIMEOUT) as resp:
+        if resp.status_code != 200:
+            error = RuntimeError(f"Gemini API {resp.status_code}: {(await resp.aread())[:500].decode('utf-8', 'replace')}")
+            error.code = resp.status_code
+            raise error
+        async for line in resp.aiter_lines():
+            if line.startswith('data:'):
+                yield GeminiResponse(json.loads(line[5:]))
+
+
+def gemini_stream(model, prompt):
+    """Async iterator of streamed chunks (with .text), admitted by the provider scheduler."""
+    return ascheduled_stream('gemini', _gemini_sse, model, prompt)
+
+
+def error_response(message, status):
+    return JSONResponse({"error": message}, status_code=status)
+
+
+async def request_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+def wants_stream(request, data):
+    """Same rule as index.wants_stream, for a Starlette request."""
+    return bool((data or {}).get('stream')) or 'text/event-stream' in request.headers.get('accept', '')
+
+
+def sse_response(events):
+    async def frames():
+        async for event in events:
+            yield sse_format(event)
+    return StreamingResponse(frames(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def route(path, endpoint):
+    """POST route that binds the request id for logging and echoes it like the Flask hooks do."""
+    async def handler(request):
+        request_id = request.headers.get('x-request-id') or uuid.uuid4().hex[:12]
+        with log_context(request_id=request_id):
+            response = await endpoint(request)
+        response.headers['X-Request-ID'] = request_id
+        return response
+    return Route(path, handler, methods=['POST'], name=endpoint.__name__)
+
+
+async def start_audit(request):
+    if not state.db:
+        return error_response("Supabase not configured", 500)
+
+    data = await request_json(request)
+    page_id = (data or {}).get('page_id')
+    try:
+        if not page_id:
+            return error_response("page_id is required", 400)
+
+        page_res = await state.db.table('pages').select('*').eq('id', page_id).execute()
+        if not page_res.data:
+            return error_response("Page not found", 404)
+        page = page_res.data[0]
+
+        print(f"DEBUG: Starting Tech Audit for {page['url']}")
+        await state.db.table('pages').update({"audit_status": "Processing"}).eq('id', page_id).execute()
+
+        try:
+            result = await state.fetcher.fetch_with_fallback(page['url'])
+            # HTML parsing is CPU work: keep it off the event loop
+            audit_data = await run_in_threadpool(index.audit_fetched_page, page, result)
+        except Exception as e:
+            print(f"Audit Error: {e}")
+            audit_data = {"status_code": 0, "error": str(e), "onpage_score": 0}
+
+        await state.db.table('pages').update(index.audit_update_payload(page, audit_data)).eq('id', page_id).execute()
+        return JSONResponse({"message": "Tech audit completed", "data": audit_data})
+
+    except Exception as e:
+        print(f"ERROR in start_audit: {str(e)}")
+        if page_id:
+            await state.db.table('pages').update({"audit_status": "Failed"}).eq('id', page_id).execute()
+        return error_response(str(e), 500)
+
+
+async def analyze_speed(request):
+    if not state.db:
+        return error_response("Supabase not configured", 500)
+
+    try:
+        data = await request_json(request)
+        page_id = data.get('page_id')
+        strategy = data.get('strategy', 'mobile')
+        if not page_id:
+            return error_response("page_id required", 400)
+
+        page_res = await state.db.table('pages').select('url, tech_audit_data').eq('id', page_id).single().execute()
+        if not page_res.data:
+            return error_response("Page not found", 404)
+        page = page_res.data
+
+        print(f"Running PageSpeed ({strategy}) for {page['url']}...")
+        psi_res = await state.http.get(index.pagespeed_url(page['url'], strategy), timeout=index.PAGESPEED_TIMEOUT)
+        if psi_res.status_code != 200:
+            return error_response(f"PSI API Failed: {psi_res.text}", 400)
+
+        current_data = page.get('tech_audit_data') or {}
+        speed_data = current_data.get('speed', {})
+        speed_data[strategy] = index.speed_summary(psi_res.json())
+        current_data['speed'] = speed_data
+        await state.db.table('pages').update({"tech_audit_data": current_data}).eq('id', page_id).execute()
+
+        return JSONResponse({"message": "Speed analysis complete", "data": speed_data[strategy]})
+    except Exception as e:
+        print(f"Speed Audit Error: {e}")
+        return error_response(str(e), 500)
+
+
+async def generate_funnel(request):
+    if not state.db:
+        return error_response("Supabase not configured", 500)
+
+    try:
+        data = await request_json(request)
+        page_id = data.get('page_id')
+        project_id = data.get('project_id')
+        current_stage = data.get('current_stage', 'BoFu')
+        if not page_id or not project_id:
+            return error_response("page_id and project_id are required", 400)
+
+        profile_res = await state.db.table('business_profiles').select('*').eq('project_id', project_id).execute()
+        profile = profile_res.data[0] if profile_res.data else {}
+        page_res = await state.db.table('pages').select('*').eq('id', page_id).execute()
+        page = page_res.data[0] if page_res.data else {}
+
+        target_stage = "MoFu" if current_stage == 'BoFu' else "ToFu"
+        print(f"Generating {target_stage} strategy for {page.get('url')}...")
+
+        prompt = index.funnel_prompt(profile, page, current_stage, target_stage)
+        generation_config = {"response_mime_type": "application/json"}
+        response_text = await acached_generate(
+            'gemini-2.0-flash-exp', prompt,
+            lambda: gemini_generate('gemini-2.0-flash-exp', prompt, generation_config),
+            config=generation_config
+        )
+        ideas = json.loads(response_text)
+
+        try:
+            keywords = [idea.get('primary_keyword') for idea in ideas if idea.get('primary_keyword')]
+            # The keyword cache merges concurrent misses across threads; it stays synchronous
+            keyword_data = await run_in_threadpool(index.fetch_keyword_data, keywords)
+        except Exception as e:
+            print(f"DataForSEO Error: {e}")
+            keyword_data = {}
+
+        briefs_to_insert, pages_to_insert = index.funnel_rows(ideas, keyword_data, project_id, page_id, target_stage)
+        if briefs_to_insert:
+            await state.db.table('content_briefs').insert(briefs_to_insert).execute()
+            if pages_to_insert:
+                print(f"Syncing {len(pages_to_insert)} topics to pages table...")
+                await state.db.table('pages').insert(pages_to_insert).execute()
+
+        return JSONResponse({
+            "message": f"Generated {len(briefs_to_insert)} {target_stage} ideas",
+            "ideas": briefs_to_insert
+        })
+    except Exception as e:
+        print(f"Error in generate_funnel: {e}")
+        return error_response(str(e), 500)
+
+
+async def write_article_v2(request):
+    """Article with a link to the parent page; streams like /api/write-article when asked to."""
+    if not state.db:
+        return error_response("Supabase not configured", 500)
+
+    try:
+        data = await request_json(request)
+        project_id = data.get('project_id')
+        topic = data.get('topic')
+        keyword = data.get('keyword')
+        parent_page_id = data.get('parent_page_id')
+        if not project_id or not topic:
+            return error_response("project_id and topic are required", 400)
+
+        profile_res = await state.db.table('business_profiles').select('*').eq('project_id', project_id).execute()
+        profile = profile_res.data[0] if profile_res.data else {}
+        parent_page = {}
+        if parent_page_id:
+            page_res = await state.db.table('pages').select('*').eq('id', parent_page_id).execute()
+            parent_page = page_res.data[0] if page_res.data else {}
+
+        print(f"Writing article '{topic}' for project {project_id}...")
+        prompt = index.article_v2_prompt(profile, parent_page, topic, keyword)
+
+        if wants_stream(request, data):
+            chunks = gemini_stream('gemini-2.0-flash-exp', prompt)
+            return sse_response(aarticle_events(chunks, finish=lambda article: {"meta": {"linked_to": parent_page.get('url')}}))
+
+        response = await gemini_generate('gemini-2.0-flash-exp', prompt)
+        return JSONResponse({"content": response.text, "meta": {"linked_to": parent_page.get('url')}})
+    except Exception as e:
+        print(f"Error in write_article_v2: {e}")
+        return error_response(str(e), 500)
+
+
+async def generate_image_prompt(request):
+    if not state.db:
+        return error_response("Supabase not configured", 500)
+
+    try:
+        data = await request_json(request)
+        topic = data.get('topic')
+        project_id = data.get('project_id')
+
+        project_loc = 'US'
+        if project_id:
+            project_res = await state.db.table('projects').select('location').eq('id', project_id).single().execute()
+            if project_res.data:
+                project_loc = project_res.data.get('location', 'US')
+
+        response = await gemini_generate('gemini-2.0-flash-exp', index.image_prompt_request(topic, project_loc))
+        return JSONResponse({"prompt": response.text.strip()})
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if index.SUPABASE_URL and index.SUPABASE_KEY:
+        state.db = await acreate_client(index.SUPABASE_URL, index.SUPABASE_KEY)
+    state.http = httpx.AsyncClient(timeout=index.PAGESPEED_TIMEOUT)
+    state.fetcher = AsyncHttpFetcher()
+    try:
+        yield
+    finally:
+        await state.fetcher.aclose()
+        await state.http.aclose()
+
+
+app = Starlette(
+    routes=[
+        route('/api/start-audit', start_audit),
+        route('/api/analyze-speed', analyze_speed),
+        route('/api/generate-funnel', generate_funnel),
+        route('/api/write-article-v2', write_article_v2),
+        route('/api/generate-image-prompt', generate_image_prompt),
+        Mount('/', app=WSGIMiddleware(index.app, workers=ASGI_WSGI_THREADS)),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan,
+)
@@ -0,0 +1,177 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlparse
+
+from rate_limit import HostRateLimiter
+from page_analyzer import analyze_page
+from tech_audit import fetch_meta_from_result
+
+# Tunables (override via environment)
+AUDIT_FETCH_WORKERS = int(os.environ.get("AUDIT_FETCH_WORKERS", 8))
+_CPUS = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+# 0 = parse on a single helper thread (a process pool cannot beat that on one core)
+AUDIT_PARSE_WORKERS = int(os.environ.get("AUDIT_PARSE_WORKERS", min(4, _CPUS) if _CPUS > 1 else 0))
+AUDIT_HOST_RATE = float(os.environ.get("AUDIT_HOST_RATE", 2))       # requests/sec per host
+AUDIT_HOST_BURST = int(os.environ.get("AUDIT_HOST_BURST", 2))
+AUDIT_HOST_CONCURRENCY = int(os.environ.get("AUDIT_HOST_CONCURRENCY", 4))  # in-flight requests per host
+AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", 50))
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+def get_parse_pool(workers):
+    """
+    Process pool shared by all audits in this process. Uses 'spawn' so workers never inherit
+    the parent's threads/sockets (gunicorn worker, Supabase client).
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(max_workers=workers,
+                                              mp_context=multiprocessing.get_context('spawn'))
+        return _parse_pool
+
+
+def reset_parse_pool():
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is not None:
+            _parse_pool.shutdown(wait=False, cancel_futures=True)
+        _parse_pool = None
+
+
+def _timed_parse(url, content, fetch_meta):
+    start = time.perf_counter()
+    data = analyze_page(url, content, fetch_meta)
+    return data, time.perf_counter() - start
+
+
+class AuditPipeline:
+    """
+    Three-stage technical audit:
+
+    1. fetch   - thread pool; each host gets a token bucket and a cap on in-flight requests
+    2. parse   - process pool (HTML parsing is CPU-bound and holds the GIL); a helper thread when AUDIT_PARSE_WORKERS=0
+    3. persist - rows are handed to `persist(rows)` in batches of `batch_size`
+
+    Stages overlap: pages are parsed as soon as they are fetched and flushed as soon as a
+    batch fills up. `fetch(url)` must return a FetchResult; `build_row(page, tech_data)`
+    turns an audited page into the row passed to `persist`.
+    """
+
+    def __init__(self, fetch, persist, build_row, fetch_workers=None, parse_workers=None,
+                 host_rate=None, host_burst=None, host_concurrency=None, batch_size=None):
+        self.fetch = fetch
+        self.persist = persist
+        self.build_row = build_row
+        self.fetch_workers = fetch_workers or AUDIT_FETCH_WORKERS
+        self.parse_workers = AUDIT_PARSE_WORKERS if parse_workers is None else parse_workers
+        self.limiter = HostRateLimiter(
+            rate=host_rate if host_rate is not None else AUDIT_HOST_RATE,
+            burst=host_burst if host_burst is not None else AUDIT_HOST_BURST
+        )
+        self.host_concurrency = host_concurrency or AUDIT_HOST_CONCURRENCY
+        self.batch_size = batch_size or AUDIT_BATCH_SIZE
+        self._host_slots = {}
+        self._host_lock = threading.Lock()
+        self.stats = {}
+
+    def _slot_for(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._host_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.host_concurrency)
+                self._host_slots[host] = slot
+            return slot
+
+    def _fetch(self, url):
+        self.limiter.acquire(url)
+        with self._slot_for(url):
+            start = time.perf_counter()
+            result = self.fetch(url)
+            return result.content, fetch_meta_from_result(result), time.perf_counter() - start
+
+    def _submit_parse(self, url, content, fetch_meta):
+        if self.parse_workers > 0:
+            try:
+                return get_parse_pool(self.parse_workers).submit(_timed_parse, url, content, fetch_meta)
+            except (BrokenProcessPool, RuntimeError) as e:
+                print(f"DEBUG: Parse pool unavailable ({e}), parsing inline")
+                reset_parse_pool()
+        return self._inline.submit(_timed_parse, url, content, fetch_meta)
+
+    def run(self, pages):
+        """Audit `pages` (dicts with at least 'url'). Returns the stats dict."""
+        start = time.perf_counter()
+        stats = {
+            'pages': len(pages), 'audited': 0, 'failed': 0, 'persisted': 0, 'batches': 0,
+            'fetch_sec': 0.0, 'parse_sec': 0.0, 'persist_sec': 0.0
+        }
+        batch = []
+
+        def flush():
+            if not batch:
+                return
+            t0 = time.perf_counter()
+            try:
+                stats['persisted'] += self.persist(list(batch))
+                stats['batches'] += 1
+            except Exception as e:
+                print(f"ERROR: Failed to persist audit batch of {len(batch)}: {e}")
+            stats['persist_sec'] += time.perf_counter() - t0
+            batch.clear()
+
+        fetch_pool = ThreadPoolExecutor(max_workers=self.fetch_workers)
+        # Used when no process pool is configured (or it broke) - keeps the loop below uniform
+        self._inline = ThreadPoolExecutor(max_workers=1)
+        pending = {}
+        try:
+            for page in pages:
+                pending[fetch_pool.submit(self._fetch, page['url'])] = ('fetch', page)
+
+            while pending:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, page = pending.pop(future)
+                    url = page['url']
+                    try:
+                        if stage == 'fetch':
+                            content, fetch_meta, elapsed = future.result()
+                            stats['fetch_sec'] += elapsed
+                            print(f"DEBUG: Fetched {url} (HTTP {fetch_meta['status_code']})")
+                            pending[self._submit_parse(url, content, fetch_meta)] = ('parse', page)
+                            continue
+
+                        try:
+                            tech_data, elapsed = future.result()
+                        except BrokenProcessPool:
+                            reset_parse_pool()
+                            raise
+                        stats['parse_sec'] += elapsed
+                        stats['audited'] += 1
+                        batch.append(self.build_row(page, tech_data))
+                        if len(batch) >= self.batch_size:
+                            flush()
+                    except Exception as e:
+                        stats['failed'] += 1
+                        print(f"ERROR: Failed to audit {url} during {stage}: {e}")
+            flush()
+        finally:
+            fetch_pool.shutdown(wait=False, cancel_futures=True)
+            self._inline.shutdown(wait=False)
+
+        wall = time.perf_counter() - start
+        # Stage timings are busy time summed over workers; wall_sec is end-to-end
+        for key in ('fetch_sec', 'parse_sec', 'persist_sec'):
+            stats[key] = round(stats[key], 3)
+        stats['wall_sec'] = round(wall, 3)
+        stats['pages_per_sec'] = round(stats['audited'] / wall, 2) if wall > 0 else 0.0
+        self.stats = stats
+        print(f"DEBUG: Tech audit pipeline finished: {stats}")
+        return stats
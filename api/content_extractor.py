@@ -0,0 +1,451 @@
+import hashlib
+import json
+import os
+import re
+
+from lxml import etree, html as lxml_html
+
+# Below this confidence scrape_page_content falls back to the Gemini extraction prompt
+EXTRACTOR_MIN_CONFIDENCE = float(os.environ.get("EXTRACTOR_MIN_CONFIDENCE", 0.6))
+
+# Never part of the readable content. form/template/canvas are kept: WebForms and some shop
+# themes wrap the whole page body in one <form>; only the controls themselves are dropped.
+DROP_TAGS = {'script', 'style', 'svg', 'noscript', 'iframe', 'object', 'embed', 'applet',
+             'link', 'meta', 'button', 'select', 'input'}
+BOILERPLATE_TAGS = {'nav', 'footer', 'aside', 'header'}
+BLOCK_TAGS = {'div', 'section', 'article', 'main', 'td', 'li', 'body'}
+
+NEGATIVE_HINTS = re.compile(
+    r'nav|menu|footer|sidebar|related|recommend|upsell|cross-?sell|cookie|consent|newsletter|social|share|'
+    r'breadcrumb|cart|minicart|modal|popup|drawer|banner|promo|announcement|header|search|review-form|comment',
+    re.I)
+POSITIVE_HINTS = re.compile(
+    r'content|description|product|article|main|entry|post|text|detail|collection|category|rte|body|story',
+    re.I)
+# Headings that introduce recommendation rails rather than page content (same list as the old cleaner)
+NOISE_HEADINGS = ('related', 'you may also like', 'stories', 'intentional living', 'blog', 'latest news', 'articles')
+
+
+def _text(el):
+    return ' '.join(el.text_content().split())
+
+
+def _class_id(el):
+    return f"{el.get('class', '')} {el.get('id', '')}"
+
+
+def parse_html(content):
+    if isinstance(content, str):
+        # lxml refuses str input that still carries an XML encoding declaration
+        content = re.sub(r'^\s*<\?xml[^>]*\?>', '', content)
+    if not content or not content.strip():
+        return None
+    try:
+        return lxml_html.document_fromstring(content)
+    except (etree.ParserError, ValueError):
+        return None
+
+
+# --- Structured data ---
+
+def _types(node):
+    t = node.get('@type')
+    if isinstance(t, list):
+        return {str(x) for x in t}
+    return {str(t)} if t else set()
+
+
+def _walk_json_ld(data):
+    """Yield every dict in a JSON-LD document (handles @graph, lists and nesting)."""
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+        elif isinstance(node, dict):
+            yield node
+            for value in node.values():
+                if isinstance(value, (list, dict)):
+                    stack.append(value)
+
+
+def _offer_price(offers):
+    if isinstance(offers, list):
+        offers = offers[0] if offers else {}
+    if not isinstance(offers, dict):
+        return None, None
+    price = offers.get('price') or offers.get('lowPrice')
+    return price, offers.get('priceCurrency')
+
+
+def extract_structured(tree):
+    """Products, item lists and the page's declared type from JSON-LD and schema.org microdata."""
+    products, list_items, declared = [], [], set()
+
+    for script in tree.iter('script'):
+        if (script.get('type') or '').strip().lower() != 'application/ld+json' or not script.text:
+            continue
+        try:
+            data = json.loads(script.text)
+        except ValueError:
+            continue
+        for node in _walk_json_ld(data):
+            types = _types(node)
+            declared |= types
+            if 'Product' in types:
+                price, currency = _offer_price(node.get('offers'))
+                products.append({
+                    'name': node.get('name'),
+                    'description': node.get('description'),
+                    'price': price,
+                    'currency': currency,
+                    'brand': (node.get('brand') or {}).get('name') if isinstance(node.get('brand'), dict) else node.get('brand'),
+                    'sku': node.get('sku'),
+                    'source': 'json-ld'
+                })
+            elif 'ItemList' in types:
+                for item in node.get('itemListElement') or []:
+                    if isinstance(item, dict):
+                        inner = item.get('item') if isinstance(item.get('item'), dict) else item
+                        name = inner.get('name')
+                        if name:
+                            list_items.append({'name': name, 'url': inner.get('url') or item.get('url')})
+
+    for scope in tree.xpath('//*[@itemscope and contains(@itemtype, "schema.org/Product")]'):
+        def prop(name):
+            for el in scope.xpath(f'.//*[@itemprop="{name}"]'):
+                return el.get('content') or _text(el)
+            return None
+        declared.add('Product')
+        products.append({
+            'name': prop('name'),
+            'description': prop('description'),
+            'price': prop('price'),
+            'currency': prop('priceCurrency'),
+            'brand': prop('brand'),
+            'sku': prop('sku'),
+            'source': 'microdata'
+        })
+
+    # The same product is often declared in both JSON-LD and microdata
+    seen, unique = set(), []
+    for p in products:
+        key = (p.get('name') or '').strip().lower()
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(p)
+    return {'products': unique, 'list_items': list_items, 'declared_types': declared}
+
+
+def json_ld_summary(structured):
+    """The JSON-LD block scrape_page_content has always passed to the extraction prompt."""
+    return ''.join(
+        f"\nJSON-LD Product Data:\nName: {p.get('name')}\nDescription: {p.get('description')}\n"
+        for p in structured['products'] if p['source'] == 'json-ld'
+    )
+
+
+# --- Page metadata ---
+
+def page_metadata(tree):
+    title = None
+    for t in tree.iter('title'):
+        if not any(a.tag in ('svg', 'symbol', 'defs', 'g') for a in t.iterancestors()):
+            title = _text(t)
+            break
+    meta = {}
+    for m in tree.iter('meta'):
+        key = (m.get('name') or m.get('property') or '').lower()
+        if key and key not in meta:
+            meta[key] = (m.get('content') or '').strip()
+    h1 = next((_text(h) for h in tree.iter('h1') if _text(h)), '')
+    short = tree.xpath('//*[contains(concat(" ", normalize-space(@class), " "), " short-description ")]')
+    return {
+        'title': title or meta.get('og:title') or h1 or None,
+        'h1': h1,
+        'meta_description': meta.get('description') or meta.get('og:description') or '',
+        'short_description': _text(short[0]) if short else ''
+    }
+
+
+# --- Readable block scoring ---
+
+def _drop_noise_rails(body):
+    """Drop the rail a noise heading introduces (nearest section/div/aside within 3 levels)."""
+    for el in list(body.iter('h1', 'h2', 'h3', 'h4', 'h5', 'h6')):
+        if el.getparent() is None or not any(x in _text(el).lower() for x in NOISE_HEADINGS):
+            continue
+        parent = el.getparent()
+        for _ in range(3):
+            if parent is None:
+                break
+            if parent.tag in ('section', 'div', 'aside') and parent.getparent() is not None:
+                parent.drop_tree()
+                break
+            parent = parent.getparent()
+
+
+def _strip_boilerplate(body):
+    for el in list(body.iter(*DROP_TAGS)):
+        el.drop_tree()
+    for el in list(body.iter(*BOILERPLATE_TAGS)):
+        el.drop_tree()
+    _drop_noise_rails(body)
+    for el in list(body.iter()):
+        if el is body or not isinstance(el.tag, str) or el.getparent() is None:
+            continue
+        hints = _class_id(el)
+        if hints.strip() and NEGATIVE_HINTS.search(hints) and not POSITIVE_HINTS.search(hints):
+            el.drop_tree()
+
+
+def _link_density(el, text_len):
+    if not text_len:
+        return 1.0
+    link_len = sum(len(_text(a)) for a in el.iter('a'))
+    return min(1.0, link_len / text_len)
+
+
+def score_blocks(body):
+    """Readability-style scores: paragraph text feeds its parent and (halved) grandparent."""
+    scores = {}
+    for p in body.iter('p', 'li', 'td', 'pre', 'dd', 'h2', 'h3', 'h4'):
+        text = _text(p)
+        if len(text) < 25:
+            continue
+        points = 1 + text.count(',') + min(len(text) // 100, 3)
+        parent = p.getparent()
+        grand = parent.getparent() if parent is not None else None
+        if parent is not None:
+            scores[parent] = scores.get(parent, 0) + points
+        if grand is not None:
+            scores[grand] = scores.get(grand, 0) + points / 2
+    for el in list(scores):
+        hints = _class_id(el)
+        if POSITIVE_HINTS.search(hints):
+            scores[el] += 25
+        if el.tag in ('article', 'main'):
+            scores[el] += 10
+        scores[el] *= 1 - _link_density(el, len(_text(el)))
+    return scores
+
+
+def _main_node(body, scores):
+    if not scores:
+        return body, 0.0
+    best = max(scores, key=scores.get)
+    # Climb while the parent holds most of the text (content split across sibling blocks)
+    node = best
+    while node.getparent() is not None and node.getparent().tag in BLOCK_TAGS:
+        parent = node.getparent()
+        if scores.get(parent, 0) >= scores[best] * 0.75:
+            node = parent
+        else:
+            break
+    return node, scores[best]
+
+
+# --- Markdown ---
+
+def _inline(el):
+    parts = [el.text or '']
+    for child in el:
+        if not isinstance(child.tag, str):
+            parts.append(child.tail or '')
+            continue
+        inner = _inline(child)
+        if child.tag in ('strong', 'b') and inner.strip():
+            inner = f"**{inner.strip()}**"
+        elif child.tag in ('em', 'i') and inner.strip():
+            inner = f"*{inner.strip()}*"
+        elif child.tag == 'br':
+            inner = '\n'
+        parts.append(inner)
+        parts.append(child.tail or '')
+    return re.sub(r'[ \t\r\f\v]+', ' ', ''.join(parts))
+
+
+def to_markdown(node):
+    out = []
+
+    def emit(block):
+        block = block.strip()
+        if block and (not out or out[-1] != block):
+            out.append(block)
+
+    def walk(el):
+        tag = el.tag if isinstance(el.tag, str) else ''
+        if tag in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+            emit('#' * int(tag[1]) + ' ' + ' '.join(_inline(el).split()))
+        elif tag in ('p', 'blockquote', 'pre', 'dd', 'dt', 'figcaption'):
+            emit(_inline(el))
+        elif tag in ('ul', 'ol'):
+            items = [' '.join(_inline(li).split()) for li in el if isinstance(li.tag, str) and li.tag == 'li']
+            lines = [f"{'1.' if tag == 'ol' else '-'} {text}" for text in items if text]
+            emit('\n'.join(lines))
+        elif tag == 'table':
+            rows = []
+            for tr in el.iter('tr'):
+                cells = [' '.join(_text(c).split()) for c in tr if isinstance(c.tag, str) and c.tag in ('td', 'th')]
+                if any(cells):
+                    rows.append('| ' + ' | '.join(cells) + ' |')
+            if rows:
+                header_sep = '|' + '---|' * rows[0].count(' | ') + '---|'
+                emit('\n'.join([rows[0], header_sep] + rows[1:]))
+        else:
+            # Text sitting directly in a container (common in Shopify/WooCommerce descriptions)
+            if el.text and el.text.strip() and tag not in ('', 'li'):
+                emit(el.text)
+            for child in el:
+                walk(child)
+                if child.tail and child.tail.strip():
+                    emit(child.tail)
+
+    walk(node)
+    return '\n\n'.join(out)
+
+
+def _product_markdown(structured, main_md):
+    lines = []
+    for p in structured['products'][:1]:
+        price = f"{p['price']} {p.get('currency') or ''}".strip() if p.get('price') else None
+        if p.get('name') and f"# {p['name']}" not in main_md:
+            lines.append(f"# {p['name']}")
+        if price:
+            lines.append(f"**Price:** {price}")
+        if p.get('brand'):
+            lines.append(f"**Brand:** {p['brand']}")
+    return '\n\n'.join(lines)
+
+
+def _category_markdown(structured):
+    items = structured['list_items'] or [{'name': p['name']} for p in structured['products']]
+    rows = []
+    for item in items[:100]:
+        price = next((p.get('price') for p in structured['products'] if p.get('name') == item['name'] and p.get('price')), None)
+        rows.append(f"- {item['name']}" + (f" — {price}" if price else ''))
+    return "## Products\n\n" + '\n'.join(rows) if rows else ''
+
+
+def detect_page_type(structured, url):
+    declared = structured['declared_types']
+    if len(structured['products']) > 2 or structured['list_items'] or declared & {'CollectionPage', 'OfferCatalog'}:
+        return 'Category'
+    if 'Product' in declared:
+        return 'Product'
+    if declared & {'Article', 'BlogPosting', 'NewsArticle'}:
+        return 'Blog'
+    path = (url or '').lower()
+    if any(x in path for x in ('/product', '/products/', '/p/', '/item/')):
+        return 'Product'
+    if any(x in path for x in ('/collections/', '/category/', '/categories/', '/shop/', '/c/')):
+        return 'Category'
+    if any(x in path for x in ('/blog', '/news/', '/article')):
+        return 'Blog'
+    return 'Unknown'
+
+
+def content_fingerprint(tree, extra=()):
+    """Hash of the visible text stream plus `extra`; stable across nonces, tracking attributes and scripts."""
+    digest = hashlib.sha256()
+    body = tree.find('body')
+    if body is not None:
+        for el in body.iter():
+            if not isinstance(el.tag, str) or el.tag in DROP_TAGS:
+                continue
+            digest.update(el.tag.encode())
+            for piece in (el.text, el.tail):
+                if piece and piece.strip():
+                    digest.update(' '.join(piece.split()).encode('utf-8'))
+    for value in extra:
+        digest.update(b'\x00' + (value or '').encode('utf-8'))
+    return digest.hexdigest()
+
+
+def extract_content(content, url=None):
+    """
+    Local extraction of a page into the fields scrape_page_content returns, plus a markdown
+    body and a confidence in [0, 1]. Returns None if the HTML cannot be parsed.
+    """
+    tree = parse_html(content)
+    if tree is None:
+        return None
+
+    meta = page_metadata(tree)
+    structured = extract_structured(tree)
+    page_type = detect_page_type(structured, url)
+    json_ld_text = json_ld_summary(structured)
+    fingerprint = content_fingerprint(tree, (json_ld_text, meta['meta_description'], meta['short_description']))
+
+    body = tree.find('body')
+    if body is None:
+        body = tree
+    _strip_boilerplate(body)
+    scores = score_blocks(body)
+    main, best_score = _main_node(body, scores)
+    main_md = to_markdown(main)
+    main_words = len(main_md.split())
+    link_density = _link_density(main, len(_text(main)))
+
+    sections = []
+    if page_type == 'Product' and structured['products']:
+        sections.append(_product_markdown(structured, main_md))
+        desc = structured['products'][0].get('description')
+        if desc and desc[:60] not in main_md:
+            sections.append(desc)
+        if meta['short_description'] and meta['short_description'][:60] not in main_md:
+            sections.append(meta['short_description'])
+    elif meta['h1'] and meta['h1'] not in main_md:
+        sections.append(f"# {meta['h1']}")
+    sections.append(main_md)
+    if page_type == 'Category':
+        sections.append(_category_markdown(structured))
+    markdown = '\n\n'.join(s for s in sections if s and s.strip())
+
+    # Confidence: enough readable copy in a clearly winning block, backed by structured data
+    confidence = min(main_words / 250, 1.0) * 0.5
+    confidence += min(best_score / 40, 1.0) * 0.2
+    if structured['products'] and any(p.get('description') for p in structured['products']):
+        confidence += 0.2
+    if page_type == 'Category' and len(structured['list_items'] or structured['products']) > 2:
+        # The product list comes from structured data, so short intro copy is expected
+        confidence += 0.3
+    if meta['h1']:
+        confidence += 0.1
+    if link_density > 0.5:
+        confidence -= 0.3
+    confidence = round(max(0.0, min(confidence, 1.0)), 2)
+
+    return {
+        'title': meta['title'],
+        'meta_description': meta['meta_description'],
+        'short_description': meta['short_description'],
+        'json_ld': json_ld_text,
+        'page_type': page_type,
+        'products': structured['products'],
+        'markdown': markdown,
+        'word_count': len(markdown.split()),
+        'confidence': confidence,
+        'fingerprint': fingerprint
+    }
+
+
+def clean_html_for_llm(content, limit=150000):
+    """
+    The attribute-free body markup the Gemini extraction prompt receives, built with lxml in
+    one pass instead of the BeautifulSoup decompose/find_all(True) loops.
+    """
+    tree = parse_html(content)
+    if tree is None:
+        return ''
+    body = tree.find('body')
+    if body is None:
+        return ''
+    for el in list(body.iter(*DROP_TAGS)):
+        el.drop_tree()
+    for el in list(body.iter('nav', 'footer', 'aside')):
+        el.drop_tree()
+    _drop_noise_rails(body)
+    etree.strip_tags(body, etree.Comment)
+    etree.strip_attributes(body, *{a for el in body.iter() if isinstance(el.tag, str) for a in el.attrib})
+    return lxml_html.tostring(body, encoding='unicode')[:limit]
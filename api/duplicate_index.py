@@ -0,0 +1,232 @@
+import hashlib
+import operator
+import os
+import re
+import threading
+import time
+import unicodedata
+
+# Tunables (override via environment)
+DUPLICATE_INDEX_TTL = float(os.environ.get("DUPLICATE_INDEX_TTL", 300))  # seconds before a cached index is rebuilt
+MINHASH_PERMUTATIONS = int(os.environ.get("MINHASH_PERMUTATIONS", 64))
+# LSH bands; rows per band = permutations / bands. 8x8 puts the candidate cut-off near 0.77 similarity
+MINHASH_BANDS = int(os.environ.get("MINHASH_BANDS", 8))
+
+# pages column -> flag written into tech_audit_data
+FIELDS = {
+    'title': 'duplicate_title',
+    'meta_description': 'duplicate_desc'
+}
+
+def normalize_text(text):
+    """Case-, Unicode-width- and whitespace-insensitive form used for duplicate matching."""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKC', text).casefold()
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text.strip(' |-–—:')
+
+
+def text_hash(text):
+    normalized = normalize_text(text)
+    if not normalized:
+        return None
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]
+
+
+def shingles(text, size=3):
+    """Word shingles; short texts fall back to character shingles so titles still compare well."""
+    normalized = normalize_text(text)
+    words = re.findall(r'\w+', normalized)
+    if len(words) >= size * 2:
+        return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    compact = ' '.join(words)
+    if len(compact) <= 4:
+        return {compact} if compact else set()
+    return {compact[i:i + 4] for i in range(len(compact) - 3)}
+
+
+def minhash_signature(text):
+    """
+    MinHash signature: one SHAKE-128 digest per shingle supplies MINHASH_PERMUTATIONS independent
+    32-bit hashes, and the signature is the per-position minimum (all of it runs in C).
+    """
+    grams = shingles(text)
+    if not grams:
+        return None
+    width = MINHASH_PERMUTATIONS * 4
+    rows = [memoryview(hashlib.shake_128(g.encode('utf-8')).digest(width)).cast('I') for g in grams]
+    return tuple(map(min, zip(*rows)))
+
+
+def estimate_similarity(sig_a, sig_b):
+    return sum(map(operator.eq, sig_a, sig_b)) / len(sig_a)
+
+
+class DuplicateIndex:
+    """
+    Per-project index of normalized title/description hashes -> page ids.
+
+    Exact duplicates are answered from the hash buckets without touching the database.
+    Near duplicates use MinHash signatures bucketed with LSH bands, so only pages that
+    share a band are compared.
+    """
+
+    def __init__(self, project_id):
+        self.project_id = project_id
+        self.built_at = time.time()
+        self._buckets = {field: {} for field in FIELDS}   # field -> hash -> set(page_id)
+        self._page_hashes = {}                            # page_id -> {field: hash}
+        self._texts = {}                                  # page_id -> {field: raw text}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._page_hashes)
+
+    def update(self, page_id, title=None, meta_description=None):
+        """Insert or refresh one page (call whenever an audit writes new values)."""
+        values = {'title': title, 'meta_description': meta_description}
+        with self._lock:
+            self._remove_locked(page_id)
+            hashes = {}
+            for field, value in values.items():
+                h = text_hash(value)
+                hashes[field] = h
+                if h:
+                    self._buckets[field].setdefault(h, set()).add(page_id)
+            self._page_hashes[page_id] = hashes
+            self._texts[page_id] = values
+
+    def remove(self, page_id):
+        with self._lock:
+            self._remove_locked(page_id)
+
+    def _remove_locked(self, page_id):
+        old = self._page_hashes.pop(page_id, None)
+        self._texts.pop(page_id, None)
+        if not old:
+            return
+        for field, h in old.items():
+            bucket = self._buckets[field].get(h) if h else None
+            if bucket is not None:
+                bucket.discard(page_id)
+                if not bucket:
+                    del self._buckets[field][h]
+
+    def flags_for(self, page_id):
+        """{'duplicate_title': bool, 'duplicate_desc': bool} for a single page."""
+        with self._lock:
+            hashes = self._page_hashes.get(page_id) or {}
+            return {flag: len(self._buckets[field].get(hashes.get(field), ())) > 1
+                    for field, flag in FIELDS.items()}
+
+    def duplicate_groups(self, field):
+        """Lists of page ids sharing the same normalized value (only groups of 2+)."""
+        with self._lock:
+            return [sorted(ids, key=str) for ids in self._buckets[field].values() if len(ids) > 1]
+
+    def near_duplicate_groups(self, field, threshold=0.8):
+        """
+        Groups of pages whose `field` is at least `threshold` similar (estimated Jaccard
+        over shingles). Exact duplicates are included.
+        """
+        with self._lock:
+            # Exact duplicates share a bucket already; only one signature per distinct value is needed
+            members = {h: sorted(ids, key=str) for h, ids in self._buckets[field].items()}
+            texts = {h: self._texts[ids[0]][field] for h, ids in members.items()}
+
+        signatures = {}
+        for h, text in texts.items():
+            sig = minhash_signature(text)
+            if sig:
+                signatures[h] = sig
+
+        rows = max(1, MINHASH_PERMUTATIONS // MINHASH_BANDS)
+        parent = {h: h for h in signatures}
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        compared = set()
+        for band in range(MINHASH_BANDS):
+            lsh = {}
+            for h, sig in signatures.items():
+                lsh.setdefault(sig[band * rows:(band + 1) * rows], []).append(h)
+            for candidates in lsh.values():
+                if len(candidates) < 2:
+                    continue
+                for i, first in enumerate(candidates):
+                    for other in candidates[i + 1:]:
+                        pair = (first, other)
+                        if pair in compared or find(first) == find(other):
+                            continue
+                        compared.add(pair)
+                        if estimate_similarity(signatures[first], signatures[other]) >= threshold:
+                            parent[find(other)] = find(first)
+
+        groups = {}
+        for h in signatures:
+            groups.setdefault(find(h), []).extend(members[h])
+        return [sorted(ids, key=str) for ids in groups.values() if len(ids) > 1]
+
+    def find_groups(self, near=False, threshold=0.8):
+        """{field: [[page_id, ...], ...]} for every indexed field."""
+        return {field: self.near_duplicate_groups(field, threshold) if near else self.duplicate_groups(field)
+                for field in FIELDS}
+
+    def flag_all(self, near=False, threshold=0.8, groups=None):
+        """Duplicate flags for every page in the project in one pass: {page_id: {flag: bool}}."""
+        groups = groups or self.find_groups(near, threshold)
+        with self._lock:
+            page_ids = list(self._page_hashes)
+        flags = {pid: {flag: False for flag in FIELDS.values()} for pid in page_ids}
+        for field, flag in FIELDS.items():
+            for group in groups.get(field, []):
+                for pid in group:
+                    flags[pid][flag] = True
+        return flags
+
+
+def build_project_index(supabase, project_id, page_size=1000):
+    """Load every page of a project (paged past PostgREST's row cap) into a fresh index."""
+    index = DuplicateIndex(project_id)
+    offset = 0
+    while True:
+        res = supabase.table('pages').select('id, title, meta_description') \
+            .eq('project_id', project_id).order('id').range(offset, offset + page_size - 1).execute()
+        rows = res.data or []
+        for row in rows:
+            index.update(row['id'], row.get('title'), row.get('meta_description'))
+        if len(rows) < page_size:
+            break
+        offset += page_size
+    return index
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_project_index(supabase, project_id, refresh=False):
+    """
+    Cached per-project index. Rebuilt after DUPLICATE_INDEX_TTL seconds so writes made by
+    other workers are eventually picked up.
+    """
+    with _indexes_lock:
+        index = _indexes.get(project_id)
+    if index is None or refresh or time.time() - index.built_at > DUPLICATE_INDEX_TTL:
+        index = build_project_index(supabase, project_id)
+        with _indexes_lock:
+            _indexes[project_id] = index
+    return index
+
+
+def record_page(project_id, page_id, title, meta_description):
+    """Keep an already-cached index in sync after an audit writes a page (no-op if not cached)."""
+    with _indexes_lock:
+        index = _indexes.get(project_id)
+    if index is not None:
+        index.update(page_id, title, meta_description)
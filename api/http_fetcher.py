@@ -0,0 +1,301 @@
+import os
+import re
+import subprocess
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Browser-like header profiles. 'curl' mimics the bare curl request that some CDNs (e.g. Akamai) let through
+# when they block spoofed browser UAs.
+HEADER_PROFILES = {
+    'chrome': {
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.9',
+        'Accept-Encoding': 'gzip, deflate',
+        'Referer': 'https://www.google.com/',
+        'Upgrade-Insecure-Requests': '1',
+        'Connection': 'keep-alive'
+    },
+    'googlebot': {
+        'User-Agent': 'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive'
+    },
+    'curl': {
+        'User-Agent': 'curl/8.4.0',
+        'Accept': '*/*'
+    }
+}
+
+BLOCKED_STATUSES = (401, 403, 406, 429)
+
+FETCH_STRATEGY = os.environ.get("FETCH_STRATEGY", "pool")  # 'pool' (in-process, keep-alive) or 'curl'
+FETCH_POOL_SIZE = int(os.environ.get("FETCH_POOL_SIZE", 10))
+FETCH_TIMEOUT = float(os.environ.get("FETCH_TIMEOUT", 30))
+
+
+_CHARSET = re.compile(rb'charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+
+
+def decode_body(raw, content_type=None):
+    """
+    Text of a response body. The Content-Type charset wins, then a <meta charset> in the
+    first 4KB, then UTF-8 (as curl output was read) with windows-1252 for bodies that are not UTF-8.
+    requests/httpx default text/* without a charset to ISO-8859-1, which garbles UTF-8 pages.
+    """
+    for source in ((content_type or '').encode('latin-1', 'replace'), raw[:4096]):
+        match = _CHARSET.search(source)
+        if match:
+            try:
+                return raw.decode(match.group(1).decode('ascii'), errors='replace')
+            except LookupError:
+                pass
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return raw.decode('windows-1252', errors='replace')
+
+
+class FetchResult:
+    """Outcome of a single fetch. `latency` is the total time in seconds (the old curl time_total)."""
+
+    def __init__(self, url, content=None, status_code=0, final_url=None, history=None,
+                 ttfb=0.0, total=0.0, headers=None, profile=None, strategy=None, error=None):
+        self.url = url
+        self.content = content
+        self.status_code = status_code
+        self.final_url = final_url or url
+        self.history = history or []  # [(status_code, url), ...] for every redirect hop
+        self.ttfb = ttfb
+        self.total = total
+        self.headers = headers or {}
+        self.profile = profile
+        self.strategy = strategy
+        self.error = error
+
+    @property
+    def latency(self):
+        return self.total
+
+    @property
+    def ok(self):
+        return bool(self.content) and 200 <= self.status_code < 400
+
+    def looks_blocked(self):
+        if self.status_code == 304:  # answer to a conditional request, empty by design
+            return False
+        if self.status_code in BLOCKED_STATUSES:
+            return True
+        return not self.content or "Access Denied" in self.content[:5000]
+
+    def to_dict(self):
+        return {
+            'status_code': self.status_code,
+            'final_url': self.final_url,
+            'redirects': [{'status_code': s, 'url': u} for s, u in self.history],
+            'ttfb_ms': int(self.ttfb * 1000),
+            'total_ms': int(self.total * 1000),
+            'profile': self.profile,
+            'strategy': self.strategy
+        }
+
+
+class HttpFetcher:
+    """
+    In-process fetcher with one keep-alive connection pool per host.
+
+    `fetch_with_fallback` reproduces the old fetch_with_curl behaviour: try the browser
+    profile first and retry with the bare curl profile when the response looks blocked.
+    """
+
+    def __init__(self, pool_size=None, timeout=None, profile='chrome', fallback_profile='curl'):
+        self.pool_size = pool_size or FETCH_POOL_SIZE
+        self.timeout = timeout or FETCH_TIMEOUT
+        self.profile = profile
+        self.fallback_profile = fallback_profile
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session_for(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[host] = session
+            return session
+
+    def _headers(self, profile, extra=None):
+        headers = dict(HEADER_PROFILES.get(profile) or HEADER_PROFILES['chrome'])
+        if extra:
+            headers.update(extra)
+        return headers
+
+    def open_stream(self, url, profile=None, headers=None):
+        """Start a streamed GET on the pooled session. Caller must close the returned response."""
+        profile = profile or self.profile
+        return self.session_for(url).get(url, headers=self._headers(profile, headers),
+                                         timeout=self.timeout, stream=True, allow_redirects=True)
+
+    def fetch(self, url, profile=None, headers=None):
+        profile = profile or self.profile
+        start = time.perf_counter()
+        try:
+            resp = self.open_stream(url, profile=profile, headers=headers)
+            # With stream=True the call returns once the final response headers arrive
+            ttfb = time.perf_counter() - start
+            try:
+                raw = resp.content
+            finally:
+                resp.close()
+            total = time.perf_counter() - start
+            content = decode_body(raw, resp.headers.get('Content-Type'))
+            return FetchResult(
+                url, content=content, status_code=resp.status_code, final_url=resp.url,
+                history=[(r.status_code, r.url) for r in resp.history],
+                ttfb=ttfb, total=total, headers=dict(resp.headers), profile=profile, strategy='pool'
+            )
+        except Exception as e:
+            return FetchResult(url, total=time.perf_counter() - start, profile=profile,
+                               strategy='pool', error=str(e))
+
+    def fetch_with_fallback(self, url, headers=None):
+        result = self.fetch(url, headers=headers)
+        if result.looks_blocked() and self.fallback_profile:
+            print(f"DEBUG: {self.profile} profile failed for {url} (HTTP {result.status_code}), retrying with {self.fallback_profile} profile...")
+            retry = self.fetch(url, profile=self.fallback_profile, headers=headers)
+            if retry.content or not result.content:
+                return retry
+        return result
+
+
+class CurlFetcher:
+    """Explicit fallback strategy: one curl subprocess per URL (no connection reuse)."""
+
+    DELIMITER = "|||CURL_META|||"
+
+    def __init__(self, timeout=None, profile='chrome', fallback_profile='curl'):
+        self.timeout = timeout or FETCH_TIMEOUT
+        self.profile = profile
+        self.fallback_profile = fallback_profile
+
+    def fetch(self, url, profile=None, headers=None):
+        profile = profile or self.profile
+        cmd = ['curl', '-L', '-s', '--compressed', '--max-time', str(int(self.timeout)),
+               '-w', f'{self.DELIMITER}%{{http_code}} %{{time_starttransfer}} %{{time_total}} %{{num_redirects}} %{{url_effective}}']
+        if profile != 'curl':
+            for name, value in self._profile_headers(profile, headers).items():
+                if name == 'User-Agent':
+                    cmd.extend(['-A', value])
+                elif name not in ('Accept-Encoding', 'Connection'):
+                    cmd.extend(['-H', f'{name}: {value}'])
+        cmd.append(url)
+
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout + 5)
+        except Exception as e:
+            return FetchResult(url, profile=profile, strategy='curl', error=str(e))
+
+        parts = result.stdout.rsplit(self.DELIMITER, 1)
+        if result.returncode != 0 or len(parts) != 2:
+            return FetchResult(url, profile=profile, strategy='curl',
+                               error=f"curl exited with {result.returncode}: {result.stderr}")
+        try:
+            status, ttfb, total, redirects, final_url = parts[1].split(' ', 4)
+            status, ttfb, total, redirects = int(status), float(ttfb), float(total), int(redirects)
+        except ValueError:
+            status, ttfb, total, redirects, final_url = 0, 0.0, 0.0, 0, url
+        # curl only reports the number of hops, not each intermediate status/URL
+        history = [(None, None)] * redirects
+        return FetchResult(url, content=parts[0], status_code=status, final_url=final_url, history=history,
+                           ttfb=ttfb, total=total, profile=profile, strategy='curl')
+
+    def _profile_headers(self, profile, extra=None):
+        headers = dict(HEADER_PROFILES.get(profile) or HEADER_PROFILES['chrome'])
+        if extra:
+            headers.update(extra)
+        return headers
+
+    def fetch_with_fallback(self, url, headers=None):
+        result = self.fetch(url, headers=headers)
+        if result.looks_blocked() and self.fallback_profile:
+            print(f"DEBUG: Chrome UA failed for {url}, retrying with default curl UA...")
+            retry = self.fetch(url, profile=self.fallback_profile, headers=headers)
+            if retry.content or not result.content:
+                return retry
+        return result
+
+
+class AsyncHttpFetcher:
+    """
+    HttpFetcher for the ASGI app: one httpx.AsyncClient (keep-alive pools per host) shared by
+    every request on the event loop. Same header profiles, fallback and FetchResult.
+    Create it inside the running loop and aclose() it on shutdown.
+    """
+
+    def __init__(self, pool_size=None, timeout=None, profile='chrome', fallback_profile='curl'):
+        import httpx
+        self.timeout = timeout or FETCH_TIMEOUT
+        self.profile = profile
+        self.fallback_profile = fallback_profile
+        self.client = httpx.AsyncClient(
+            timeout=self.timeout, follow_redirects=True,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=pool_size or FETCH_POOL_SIZE * 10)
+        )
+
+    def _headers(self, profile, extra=None):
+        headers = dict(HEADER_PROFILES.get(profile) or HEADER_PROFILES['chrome'])
+        if extra:
+            headers.update(extra)
+        return headers
+
+    async def fetch(self, url, profile=None, headers=None):
+        profile = profile or self.profile
+        start = time.perf_counter()
+        try:
+            async with self.client.stream('GET', url, headers=self._headers(profile, headers)) as resp:
+                ttfb = time.perf_counter() - start
+                raw = await resp.aread()
+            total = time.perf_counter() - start
+            content = decode_body(raw, resp.headers.get('Content-Type'))
+            return FetchResult(
+                url, content=content, status_code=resp.status_code, final_url=str(resp.url),
+                history=[(r.status_code, str(r.url)) for r in resp.history],
+                ttfb=ttfb, total=total, headers=dict(resp.headers), profile=profile, strategy='async'
+            )
+        except Exception as e:
+            return FetchResult(url, total=time.perf_counter() - start, profile=profile,
+                               strategy='async', error=str(e))
+
+    async def fetch_with_fallback(self, url, headers=None):
+        result = await self.fetch(url, headers=headers)
+        if result.looks_blocked() and self.fallback_profile:
+            print(f"DEBUG: {self.profile} profile failed for {url} (HTTP {result.status_code}), retrying with {self.fallback_profile} profile...")
+            retry = await self.fetch(url, profile=self.fallback_profile, headers=headers)
+            if retry.content or not result.content:
+                return retry
+        return result
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_default_fetcher = None
+_default_lock = threading.Lock()
+
+
+def get_fetcher():
+    """Process-wide fetcher for the configured FETCH_STRATEGY."""
+    global _default_fetcher
+    with _default_lock:
+        if _default_fetcher is None:
+            _default_fetcher = CurlFetcher() if FETCH_STRATEGY == 'curl' else HttpFetcher()
+        return _default_fetcher
@@ -4,7 +4,7 @@ import time
 import traceback
 import json
 import requests
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 import google.generativeai as genai  # Legacy SDK for content generation
 # from google import genai as genai_new  # Removed to avoid build issues
@@ -14,6 +14,33 @@ from supabase import create_client, Client
 from dotenv import load_dotenv
 import io
 import mimetypes
+import gzip
+import hashlib
+import logging
+import uuid
+import contextvars
+import threading
+
+# Sibling modules in api/ are imported by plain name (gunicorn, Vercel and the helper scripts all load index.py differently)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from sitemap_crawler import SitemapCrawler, parse_sitemap_soup
+from sitemap_parser import parse_sitemap_stream
+from tech_audit import fetch_meta_from_result, get_title_from_url
+from page_analyzer import analyze_page
+from duplicate_index import get_project_index, record_page
+from audit_pipeline import AuditPipeline
+from jobs import ensure_inline_worker, get_queue, job_checkpoint, job_reached, job_stage, register_job_type
+from outbound_scheduler import BACKGROUND, current_priority, outbound_priority, scheduled_call, scheduled_stream, scheduler_stats
+from keyword_cache import get_keyword_cache, normalize_keyword
+from llm_cache import cached_generate, get_llm_cache
+from content_extractor import EXTRACTOR_MIN_CONFIDENCE, clean_html_for_llm, extract_content
+from setup_dag import SetupDAG, sse_format
+from app_logging import LOG_FILE, bind, configure_logging, log_context, tail_log, unbind
+from page_classifier import get_classifier
+from keyword_intent import classify_intent, classify_intents
+from keyword_clusters import cluster_keywords, expand_topic_keywords, format_clusters_for_prompt, keyword_index, prompt_size
+from page_loader import PageLoader, current_loader, job_loader, use_loader
+from article_stream import ArticleStream, article_events, chunk_text, run_with_events
 
 load_dotenv('.env.local')
 load_dotenv()
@@ -22,35 +49,41 @@ app = Flask(__name__, static_folder='../public', static_url_path='')
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0 # Disable cache for development
 CORS(app)
 
-# File-based logging for debugging
+# Structured logging: records go through a queue to a background writer (see app_logging.py)
+configure_logging()
+logger = logging.getLogger('app')
+
 def log_debug(message):
-    try:
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-        with open("debug.log", "a") as f:
-            f.write(f"[{timestamp}] {message}\n")
-    except Exception as e:
-        print(f"Logging failed: {e}", file=sys.stderr)
+    logger.info(message)
 
 # Initialize log
 log_debug("Server started/reloaded")
 
+@app.before_request
+def _bind_request_id():
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:12]
+    g.log_tokens = bind(request_id=g.request_id)
+
+@app.after_request
+def _return_request_id(response):
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+@app.teardown_request
+def _unbind_request_id(exc=None):
+    unbind(g.pop('log_tokens', None))
+
 @app.route('/api/get-debug-log', methods=['GET'])
 def get_debug_log():
     try:
-        if os.path.exists("debug.log"):
-            with open("debug.log", "r") as f:
-                # Read last 50 lines
-                lines = f.readlines()
-                return jsonify({"logs": lines[-50:]}), 200
+        lines = min(int(request.args.get('lines', 50)), 2000)
+        if os.path.exists(LOG_FILE):
+            return jsonify({"logs": tail_log(LOG_FILE, lines, raw=request.args.get('raw') == '1')}), 200
         return jsonify({"logs": ["Log file not found."]}), 200
     except Exception as e:
         return jsonify({"logs": [f"Error reading log: {str(e)}"]}), 200
 
-import logging
-logging.basicConfig(filename='backend.log', level=logging.INFO, 
-                    format='%(asctime)s %(levelname)s: %(message)s')
-logger = logging.getLogger()
-
 # Configure Gemini
 # Configure Gemini
 # Configure Gemini
@@ -92,11 +125,46 @@ def test_ai():
 
         # Using the requested model which is confirmed to be available for this key
         model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content(f"Write a short 1-sentence SEO strategy for '{topic}'.")
+        response = scheduled_call('gemini', model.generate_content, f"Write a short 1-sentence SEO strategy for '{topic}'.")
         return jsonify({"strategy": response.text.strip()})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def audit_fetched_page(page, result):
+    """Tech audit of a fetched page (FetchResult), with the project-wide duplicate title/description flags."""
+    page_id = page['id']
+    audit_data = analyze_page(page['url'], result.content, fetch_meta_from_result(result))
+    
+    if not audit_data.get("error"):
+        title = audit_data.get("title")
+        desc = audit_data.get("meta_description")
+        # Duplicate Checks (project-scoped hash index, no per-page count queries)
+        try:
+            dup_index = get_project_index(supabase, page['project_id'])
+            dup_index.update(page_id, title or page.get('title'), desc or page.get('meta_description'))
+            audit_data.update(dup_index.flags_for(page_id))
+        except Exception as e:
+            print(f"Duplicate Check Error: {e}")
+            audit_data["duplicate_title"] = False
+            audit_data["duplicate_desc"] = False
+    else:
+        print(f"Audit Failed: {audit_data['error']}")
+    return audit_data
+
+def audit_update_payload(page, audit_data):
+    """pages update for an audit result: merged into tech_audit_data, core fields refreshed when found."""
+    current_tech_data = page.get('tech_audit_data') or {}
+    current_tech_data.update(audit_data)
+    
+    return {
+        "audit_status": "Analyzed",
+        "tech_audit_data": current_tech_data,
+        # Also update core fields if found
+        "title": audit_data.get("title") or page.get("title"),
+        "meta_description": audit_data.get("meta_description") or page.get("meta_description"),
+        "h1": audit_data.get("h1") or page.get("h1")
+    }
+
 @app.route('/api/start-audit', methods=['POST'])
 def start_audit():
     print("DEBUG: AUDIT FIX APPLIED - STARTING REQUEST")
@@ -123,208 +191,15 @@ def start_audit():
         # 2. Update status to PROCESSING
         supabase.table('pages').update({"audit_status": "Processing"}).eq('id', page_id).execute()
         
-        # 3. Perform Tech Audit
-        audit_data = {
-            "status_code": None,
-            "load_time_ms": 0,
-            "title": None,
-            "meta_description": None,
-            "h1": None,
-            "word_count": 0,
-            "internal_links_count": 0,
-            "broken_links": []
-        }
-        
+        # 3. Perform Tech Audit (same analyzer as the bulk tech audit)
         try:
-            start_time = time.time()
-            # Use a real browser User-Agent to avoid 403 Forbidden on sites like Apple
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            }
-            response = requests.get(target_url, headers=headers, timeout=15)
-            audit_data["load_time_ms"] = int((time.time() - start_time) * 1000)
-            audit_data["status_code"] = response.status_code
-            
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                # Title
-                audit_data["title"] = soup.title.string.strip() if soup.title else None
-                
-                # Meta Description
-                meta_desc = soup.find('meta', attrs={'name': 'description'})
-                if meta_desc:
-                    audit_data["meta_description"] = meta_desc.get('content', '').strip()
-                
-                # H1
-                h1 = soup.find('h1')
-                audit_data["h1"] = h1.get_text().strip() if h1 else None
-
-                # Open Graph Tags
-                og_title = soup.find('meta', attrs={'property': 'og:title'})
-                audit_data["og_title"] = og_title.get('content', '').strip() if og_title else None
-                
-                og_desc = soup.find('meta', attrs={'property': 'og:description'})
-                audit_data["og_description"] = og_desc.get('content', '').strip() if og_desc else None
-                
-                # Word Count (rough estimate)
-                text = soup.get_text(separator=' ')
-                words = [w for w in text.split() if len(w) > 2]
-                audit_data["word_count"] = len(words)
-                
-                # Internal Links
-                links = soup.find_all('a', href=True)
-                audit_data["internal_links_count"] = len(links)
-
-                # Canonical
-                canonical = soup.find('link', attrs={'rel': 'canonical'})
-                if canonical:
-                    audit_data["canonical"] = canonical.get('href', '').strip()
-                
-                # Click Depth (Estimated based on URL path segments)
-                import urllib.parse
-                path = urllib.parse.urlparse(target_url).path
-                # Root / is depth 0 or 1. Let's say root is 0.
-                segments = [x for x in path.split('/') if x]
-                audit_data["click_depth"] = len(segments)
-
-                # --- On-Page Analysis ---
-                score = 100
-                checks = []
-                
-                # Title Analysis
-                title = audit_data.get("title")
-                if not title:
-                    score -= 20
-                    checks.append("Missing Title")
-                    audit_data["title_length"] = 0
-                else:
-                    t_len = len(title)
-                    audit_data["title_length"] = t_len
-                    if t_len < 10: 
-                        score -= 10
-                        checks.append("Title too short")
-                    elif t_len > 60:
-                        score -= 10
-                        checks.append("Title too long")
-
-                # Meta Description Analysis
-                desc = audit_data.get("meta_description")
-                if not desc:
-                    score -= 20
-                    checks.append("Missing Meta Desc")
-                    audit_data["description_length"] = 0
-                else:
-                    d_len = len(desc)
-                    audit_data["description_length"] = d_len
-                    if d_len < 50:
-                        score -= 5
-                        checks.append("Desc too short")
-                    elif d_len > 160:
-                        score -= 5
-                        checks.append("Desc too long")
-
-                # H1 Analysis
-                h1 = audit_data.get("h1")
-                if not h1:
-                    score -= 20
-                    checks.append("Missing H1")
-                    audit_data["missing_h1"] = True
-                else:
-                    audit_data["missing_h1"] = False
-
-                # OG Checks
-                if not audit_data.get("og_title"):
-                    checks.append("Missing OG Title")
-                if not audit_data.get("og_description"):
-                    checks.append("Missing OG Desc")
-                
-                # Image Alt Analysis
-                images = soup.find_all('img')
-                missing_alt = [img for img in images if not img.get('alt')]
-                audit_data["missing_alt_count"] = len(missing_alt)
-                
-                if missing_alt:
-                    score -= 10
-                    checks.append(f"{len(missing_alt)} Images missing Alt")
-                
-                # --- Technical Issues Checks ---
-                # Check for redirects using history
-                if response.history:
-                    audit_data["is_redirect"] = True
-                    # You might want to store the initial status, but for now let's keep the final status for on-page checks
-                    # or maybe store initial_status separately if needed.
-                    # audit_data["status_code"] = response.history[0].status_code # Optional: if you want the 301
-                else:
-                    audit_data["is_redirect"] = 300 <= response.status_code < 400
-
-                status = audit_data["status_code"]
-                audit_data["is_4xx_code"] = 400 <= status < 500
-                audit_data["is_5xx_code"] = 500 <= status < 600
-                audit_data["high_loading_time"] = audit_data["load_time_ms"] > 2000
-                
-                # Advanced Checks
-                audit_data["redirect_chain"] = len(response.history) > 1
-                
-                canonical = audit_data.get("canonical")
-                if canonical and canonical != target_url:
-                    audit_data["canonical_mismatch"] = True
-                else:
-                    audit_data["canonical_mismatch"] = False
-                    
-                audit_data["is_orphan_page"] = False # Placeholder: Requires full link graph
-                
-                # Final Checks
-                audit_data["is_broken"] = status >= 400 or status == 0
-                
-                # Schema / Microdata Check
-                has_json_ld = soup.find('script', type='application/ld+json') is not None
-                has_microdata = soup.find(attrs={'itemscope': True}) is not None
-                audit_data["has_schema"] = has_json_ld or has_microdata
-                
-                # Duplicate Checks (Query DB)
-                try:
-                    if title:
-                        dup_title = supabase.table('pages').select('id', count='exact').eq('title', title).neq('id', page_id).execute()
-                        audit_data["duplicate_title"] = dup_title.count > 0
-                    else:
-                        audit_data["duplicate_title"] = False
-                        
-                    if desc:
-                        dup_desc = supabase.table('pages').select('id', count='exact').eq('meta_description', desc).neq('id', page_id).execute()
-                        audit_data["duplicate_desc"] = dup_desc.count > 0
-                    else:
-                        audit_data["duplicate_desc"] = False
-                except Exception as e:
-                    print(f"Duplicate Check Error: {e}")
-                    audit_data["duplicate_title"] = False
-                    audit_data["duplicate_desc"] = False
-
-                audit_data["onpage_score"] = max(0, score)
-                audit_data["checks"] = checks
-
-            else:
-                print(f"Audit Failed: Status {response.status_code}")
-                audit_data["error"] = f"HTTP {response.status_code}"
-                audit_data["onpage_score"] = 0
-                
+            audit_data = audit_fetched_page(page, fetch_page(target_url))
         except Exception as e:
             print(f"Audit Error: {e}")
-            audit_data["error"] = str(e)
-            audit_data["status_code"] = 0 # Indicate failure
+            audit_data = {"status_code": 0, "error": str(e), "onpage_score": 0} # Indicate failure
     
     # 4. Save Results (Merge with existing)
-        current_tech_data = page.get('tech_audit_data') or {}
-        current_tech_data.update(audit_data)
-        
-        update_payload = {
-            "audit_status": "Analyzed",
-            "tech_audit_data": current_tech_data,
-            # Also update core fields if found
-            "title": audit_data.get("title") or page.get("title"),
-            "meta_description": audit_data.get("meta_description") or page.get("meta_description"),
-            "h1": audit_data.get("h1") or page.get("h1")
-        }
+        update_payload = audit_update_payload(page, audit_data)
         
         print(f"DEBUG: Updating DB for page {page_id}")
         print(f"DEBUG: Payload: {json.dumps(update_payload, default=str)[:500]}...") # Print first 500 chars
@@ -346,6 +221,86 @@ def start_audit():
 
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/find-duplicates', methods=['POST'])
+def find_duplicates():
+    """Flag duplicate (or near-duplicate) titles and meta descriptions across a whole project in one pass."""
+    if not supabase: return jsonify({"error": "Supabase not configured"}), 500
+    
+    try:
+        data = request.get_json() or {}
+        project_id = data.get('project_id')
+        mode = data.get('mode', 'exact') # 'exact' or 'near' (MinHash)
+        threshold = float(data.get('threshold', 0.8))
+        apply_flags = data.get('apply', False) # Write flags into tech_audit_data
+        
+        if not project_id: return jsonify({"error": "project_id required"}), 400
+        
+        start = time.time()
+        dup_index = get_project_index(supabase, project_id, refresh=True)
+        groups = dup_index.find_groups(near=(mode == 'near'), threshold=threshold)
+        flags = dup_index.flag_all(groups=groups)
+        
+        updated = 0
+        if apply_flags:
+            # Only rewrite pages whose flags actually changed
+            offset = 0
+            batch = []
+            while True:
+                res = supabase.table('pages').select('id, project_id, url, tech_audit_data') \
+                    .eq('project_id', project_id).order('id').range(offset, offset + 999).execute()
+                for row in res.data:
+                    tech = row.get('tech_audit_data') or {}
+                    new_flags = flags.get(row['id'])
+                    if not new_flags or all(tech.get(k) == v for k, v in new_flags.items()):
+                        continue
+                    tech.update(new_flags)
+                    batch.append({'id': row['id'], 'project_id': row['project_id'], 'url': row['url'], 'tech_audit_data': tech})
+                if len(res.data) < 1000:
+                    break
+                offset += 1000
+            for i in range(0, len(batch), 500):
+                supabase.table('pages').upsert(batch[i:i + 500], on_conflict='id').execute()
+            updated = len(batch)
+        
+        return jsonify({
+            "mode": mode,
+            "pages": len(dup_index),
+            "duplicate_title_pages": sum(1 for f in flags.values() if f['duplicate_title']),
+            "duplicate_desc_pages": sum(1 for f in flags.values() if f['duplicate_desc']),
+            "groups": groups,
+            "updated": updated,
+            "elapsed_ms": int((time.time() - start) * 1000)
+        })
+    except Exception as e:
+        print(f"ERROR in find_duplicates: {e}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+PAGESPEED_TIMEOUT = 60
+
+def pagespeed_url(url, strategy):
+    """Google PageSpeed Insights request URL (with PAGESPEED_API_KEY when set)."""
+    psi_key = os.environ.get("PAGESPEED_API_KEY")
+    psi_url = f"https://www.googleapis.com/pagespeedonline/v5/runPagespeed?url={url}&strategy={strategy}"
+    if psi_key:
+        psi_url += f"&key={psi_key}"
+    return psi_url
+
+def speed_summary(psi_data):
+    """Score and core metrics from a PageSpeed Insights response, as stored in tech_audit_data.speed."""
+    lighthouse = psi_data.get('lighthouseResult', {})
+    audits = lighthouse.get('audits', {})
+    categories = lighthouse.get('categories', {})
+    
+    return {
+        "score": categories.get('performance', {}).get('score', 0) * 100,
+        "fcp": audits.get('first-contentful-paint', {}).get('displayValue'),
+        "lcp": audits.get('largest-contentful-paint', {}).get('displayValue'),
+        "cls": audits.get('cumulative-layout-shift', {}).get('displayValue'),
+        "tti": audits.get('interactive', {}).get('displayValue'),
+        "last_run": int(time.time())
+    }
+
 @app.route('/api/analyze-speed', methods=['POST'])
 def analyze_speed():
     if not supabase: return jsonify({"error": "Supabase not configured"}), 500
@@ -366,40 +321,15 @@ def analyze_speed():
         print(f"Running PageSpeed ({strategy}) for {url}...")
         
         # Call Google PageSpeed Insights API
-        psi_key = os.environ.get("PAGESPEED_API_KEY")
-        psi_url = f"https://www.googleapis.com/pagespeedonline/v5/runPagespeed?url={url}&strategy={strategy}"
-        if psi_key:
-            psi_url += f"&key={psi_key}"
-            
-        psi_res = requests.get(psi_url, timeout=60)
+        psi_res = requests.get(pagespeed_url(url, strategy), timeout=PAGESPEED_TIMEOUT)
         
         if psi_res.status_code != 200:
             return jsonify({"error": f"PSI API Failed: {psi_res.text}"}), 400
             
-        psi_data = psi_res.json()
-        
-        # Extract Metrics
-        lighthouse = psi_data.get('lighthouseResult', {})
-        audits = lighthouse.get('audits', {})
-        categories = lighthouse.get('categories', {})
-        
-        score = categories.get('performance', {}).get('score', 0) * 100
-        fcp = audits.get('first-contentful-paint', {}).get('displayValue')
-        lcp = audits.get('largest-contentful-paint', {}).get('displayValue')
-        cls = audits.get('cumulative-layout-shift', {}).get('displayValue')
-        tti = audits.get('interactive', {}).get('displayValue')
-        
         # Update DB
         current_data = page.get('tech_audit_data') or {}
         speed_data = current_data.get('speed', {})
-        speed_data[strategy] = {
-            "score": score,
-            "fcp": fcp,
-            "lcp": lcp,
-            "cls": cls,
-            "tti": tti,
-            "last_run": int(time.time())
-        }
+        speed_data[strategy] = speed_summary(psi_res.json())
         current_data['speed'] = speed_data
         
         supabase.table('pages').update({"tech_audit_data": current_data}).eq('id', page_id).execute()
@@ -511,7 +441,7 @@ def get_ranking_keywords(target_url):
             'content-type': 'application/json'
         }
 
-        response = requests.post(url, json=payload, auth=(DATAFORSEO_LOGIN, DATAFORSEO_PASSWORD), headers=headers)
+        response = scheduled_call('dataforseo', requests.post, url, json=payload, auth=(DATAFORSEO_LOGIN, DATAFORSEO_PASSWORD), headers=headers)
         response.raise_for_status()
         data = response.json()
 
@@ -586,7 +516,7 @@ def process_job():
         
         prompt = f"Analyze SEO for {target_url}. It currently ranks for these top keywords: {keywords_str}. Based on this, suggest 3 new content topics."
         
-        ai_response = model.generate_content(prompt)
+        ai_response = scheduled_call('gemini', model.generate_content, prompt)
         audit_result = ai_response.text.strip()
         
         # Step D: Save (Update result and status to COMPLETED)
@@ -604,8 +534,24 @@ def process_job():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def wants_stream(data):
+    """SSE mode: "stream": true in the body or an Accept: text/event-stream request."""
+    return bool((data or {}).get('stream')) or 'text/event-stream' in request.headers.get('Accept', '')
+
+
+def sse_response(events):
+    """Server-Sent Events response for a generator of event dicts."""
+    return Response(stream_with_context(sse_format(e) for e in events),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/api/write-article', methods=['POST'])
 def write_article():
+    """
+    Blog post for a topic. With "stream": true (or Accept: text/event-stream) the markdown
+    arrives as 'chunk' events, then 'meta' and a final 'complete' with the whole article.
+    """
     if not GEMINI_API_KEY:
         return jsonify({"error": "GEMINI_API_KEY not found"}), 500
 
@@ -624,7 +570,10 @@ def write_article():
         keywords_str = ', '.join(keywords) if keywords else 'relevant SEO keywords'
         full_prompt = f"{system_instruction}\n\nTopic: {topic}\nTarget Keywords: {keywords_str}"
         
-        response = model.generate_content(full_prompt)
+        if wants_stream(data):
+            return sse_response(article_events(scheduled_stream('gemini', model.generate_content, full_prompt, stream=True)))
+
+        response = scheduled_call('gemini', model.generate_content, full_prompt)
         return jsonify({"content": response.text.strip()})
 
     except Exception as e:
@@ -638,52 +587,26 @@ from bs4 import BeautifulSoup
 
 
 
-import subprocess
+from http_fetcher import get_fetcher
+
+def fetch_page(url, use_chrome_ua=True):
+    """
+    Fetch URL through the pooled in-process fetcher (or curl when FETCH_STRATEGY=curl).
+    Returns a FetchResult with content, real status code, redirect history and TTFB/total timings.
+    """
+    fetcher = get_fetcher()
+    if use_chrome_ua:
+        # Falls back to a bare curl-like request when the Chrome UA is blocked (some sites like Akamai allow curl)
+        return fetcher.fetch_with_fallback(url)
+    return fetcher.fetch(url, profile='curl')
 
 def fetch_with_curl(url, use_chrome_ua=True):
-    """Fetch URL using system curl to bypass TLS fingerprinting blocks. Returns (content, latency)."""
-    try:
-        # Use a delimiter to separate content from the time metric
-        delimiter = "|||CURL_TIME|||"
-        # Increased timeout to 30s for slow sites
-        cmd = ['curl', '-L', '-s', '-w', f'{delimiter}%{{time_total}}', '--max-time', '30']
-        
-        if use_chrome_ua:
-            cmd.extend([
-                '-A', 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                '-H', 'Accept: text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-                '-H', 'Accept-Language: en-US,en;q=0.9',
-                '-H', 'Referer: https://www.google.com/',
-                '-H', 'Upgrade-Insecure-Requests: 1'
-            ])
-            
-        cmd.append(url)
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=20)
-        
-        # If failed with Chrome UA, retry without it (some sites like Akamai block fake UAs but allow curl)
-        if use_chrome_ua and (result.returncode != 0 or not result.stdout or "Access Denied" in result.stdout):
-            print(f"DEBUG: Chrome UA failed for {url}, retrying with default curl UA...")
-            return fetch_with_curl(url, use_chrome_ua=False)
-            
-        if result.returncode == 0 and result.stdout:
-            # Split content and time
-            parts = result.stdout.rsplit(delimiter, 1)
-            if len(parts) == 2:
-                content = parts[0]
-                try:
-                    latency = float(parts[1])
-                except:
-                    latency = 0
-                return content, latency
-            else:
-                return result.stdout, 0
-        else:
-            print(f"DEBUG: curl failed with code {result.returncode}: {result.stderr}")
-            return None, 0
-    except Exception as e:
-        print(f"DEBUG: curl exception: {e}")
-        return None, 0
+    """Fetch URL with browser-like headers to get past bot protection. Returns (content, latency)."""
+    result = fetch_page(url, use_chrome_ua=use_chrome_ua)
+    if result.content:
+        return result.content, result.latency
+    print(f"DEBUG: fetch failed for {url} (HTTP {result.status_code}): {result.error}")
+    return None, 0
 
 def crawl_sitemap(domain, project_id, max_pages=200):
     """Recursively crawl sitemaps with anti-bot headers"""
@@ -725,15 +648,9 @@ def crawl_sitemap(domain, project_id, max_pages=200):
             f"{base_domain}/sitemap.php"
         ]
 
-    pages = []
-    
-    # 3. Process each sitemap
-    for sitemap_url in sitemap_urls:
-        if len(pages) >= max_pages:
-            break
-        pages.extend(fetch_sitemap_urls(sitemap_url, project_id, headers, max_pages - len(pages)))
-    
-    return pages
+    # 3. Process all sitemaps concurrently (child sitemaps are fetched in parallel, rate limited per host)
+    crawler = make_sitemap_crawler()
+    return crawler.crawl(sitemap_urls, project_id, max_pages=max_pages)
 
 def clean_title(title):
     """Clean up product titles by removing common e-commerce patterns."""
@@ -758,92 +675,78 @@ def clean_title(title):
                 
     return title.strip()
 
-def fetch_sitemap_urls(sitemap_url, project_id, headers, max_urls):
-    """Fetch URLs from a sitemap, recursively handling sitemap indexes"""
-    print(f"DEBUG: Fetching sitemap: {sitemap_url}")
-    pages = []
+def fetch_sitemap_document(sitemap_url):
+    """Fetch a raw sitemap document (curl first, requests as fallback). Returns the text or None."""
+    # Use fetch_with_curl for robustness against bot protection
+    content, latency = fetch_with_curl(sitemap_url)
     
-    try:
-        # Use fetch_with_curl for robustness against bot protection
-        content, latency = fetch_with_curl(sitemap_url)
-        
-        # Fallback to requests if curl fails
-        if not content:
-            print(f"DEBUG: curl failed for {sitemap_url}, falling back to requests...")
-            try:
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                }
-                resp = requests.get(sitemap_url, headers=headers, timeout=30)
-                if resp.status_code == 200:
-                    content = resp.text
-                    latency = resp.elapsed.total_seconds()
-                    print(f"DEBUG: requests fallback successful for {sitemap_url}")
-            except Exception as req_err:
-                print(f"DEBUG: requests fallback failed: {req_err}")
-        
-        if not content:
-            print(f"DEBUG: Failed to fetch {sitemap_url} (curl and requests failed)")
-            return pages
-
-        # Try parsing with XML, fallback to HTML parser if needed
+    # Fallback to requests if curl fails
+    if not content:
+        print(f"DEBUG: curl failed for {sitemap_url}, falling back to requests...")
         try:
-            soup = BeautifulSoup(content, 'xml')
-        except:
-            soup = BeautifulSoup(content, 'html.parser')
-        
-        # Check if this is a sitemap index (contains <sitemap> tags)
-        sitemap_tags = soup.find_all('sitemap')
-        
-        if sitemap_tags:
-            # Recursively fetch ALL child sitemaps (removed limit of 5)
-            for i, sitemap_tag in enumerate(sitemap_tags):
-                if len(pages) >= max_urls:
-                    break
-                    
-                loc = sitemap_tag.find('loc')
-                if loc:
-                    child_url = loc.text.strip()
-                    print(f"DEBUG: Recursively fetching child sitemap {i+1}: {child_url}")
-                    
-                    # Rate Limit: Sleep 2 seconds between sitemaps to avoid 429/Blocking
-                    import time
-                    time.sleep(2)
-                    
-                    child_pages = fetch_sitemap_urls(child_url, project_id, headers, max_urls - len(pages))
-                    
-                    if not child_pages:
-                        print(f"DEBUG: Warning - Child sitemap {child_url} returned 0 pages. Possible block?")
-                        
-                    pages.extend(child_pages)
-        else:
-            # Regular sitemap with <url> tags
-            url_tags = soup.find_all('url')
-            print(f"DEBUG: Found {len(url_tags)} URLs in sitemap")
-            
-            for tag in url_tags:
-                if len(pages) >= max_urls:
-                    break
-                    
-                loc = tag.find('loc')
-                if loc and loc.text.strip():
-                    url = loc.text.strip()
-                    
-                    # Skip title scraping for speed. 
-                    # User can run "Perform Audit" to get details.
-                    title = "Pending Scan"
-
-                    pages.append({
-                        'project_id': project_id,
-                        'url': url,
-                        'status': 'DISCOVERED',
-                        'tech_audit_data': {'title': title} 
-                    })
+            headers = {
+                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+            }
+            resp = requests.get(sitemap_url, headers=headers, timeout=30)
+            if resp.status_code == 200:
+                content = resp.text
+                print(f"DEBUG: requests fallback successful for {sitemap_url}")
+        except Exception as req_err:
+            print(f"DEBUG: requests fallback failed: {req_err}")
+    
+    return content
+
+def fetch_sitemap_stream(sitemap_url):
+    """
+    Open a sitemap as a byte stream so it can be parsed incrementally (.xml.gz is handled by the parser).
+    Falls back to the buffered curl/requests fetch when the streaming request is refused.
+    """
+    fetcher = get_fetcher()
+    if not hasattr(fetcher, 'open_stream'):
+        # curl strategy cannot stream; parse the buffered document instead
+        content = fetch_sitemap_document(sitemap_url)
+        return content.encode('utf-8') if content else None
+
+    try:
+        resp = fetcher.open_stream(sitemap_url, headers={'Accept': 'application/xml,text/xml;q=0.9,*/*;q=0.8'})
+        if resp.status_code == 200:
+            resp.raw.decode_content = True
+            return _StreamedResponse(resp)
+        print(f"DEBUG: Streaming fetch got HTTP {resp.status_code} for {sitemap_url}, falling back to buffered fetch...")
+        resp.close()
+    except Exception as e:
+        print(f"DEBUG: Streaming fetch failed for {sitemap_url}: {e}")
     
+    content = fetch_sitemap_document(sitemap_url)
+    return content.encode('utf-8') if content else None
+
+class _StreamedResponse:
+    """File-like view of a streamed requests response; close() releases the connection."""
+    def __init__(self, resp):
+        self._resp = resp
+
+    def read(self, size=-1):
+        return self._resp.raw.read(size)
+
+    def close(self):
+        self._resp.close()
+
+# 'stream' parses sitemaps incrementally with lxml iterparse, 'soup' loads the whole document into BeautifulSoup
+SITEMAP_PARSER_MODE = os.environ.get("SITEMAP_PARSER_MODE", "stream")
+
+def make_sitemap_crawler():
+    if SITEMAP_PARSER_MODE == 'soup':
+        return SitemapCrawler(fetch=fetch_sitemap_document, parse=parse_sitemap_soup)
+    return SitemapCrawler(fetch=fetch_sitemap_stream, parse=parse_sitemap_stream)
+
+def fetch_sitemap_urls(sitemap_url, project_id, headers, max_urls):
+    """Fetch URLs from a sitemap, handling sitemap indexes (children are crawled concurrently)"""
+    try:
+        crawler = make_sitemap_crawler()
+        return crawler.crawl([sitemap_url], project_id, max_pages=max_urls)
     except Exception as e:
         print(f"DEBUG: Error fetching sitemap {sitemap_url}: {e}")
-    
-    return pages
+        return []
 
 
 # Helper function to upload to Supabase Storage
@@ -917,31 +820,113 @@ def health_check():
         
     return jsonify({"status": "ok", "message": "Backend is running", "database": db_status})
 
+PROJECT_SUMMARY_FIELDS = [
+    'id', 'project_name', 'domain', 'language', 'location', 'focus', 'created_at',
+    'business_summary', 'strategy_plan', 'ideal_customer_profile', 'brand_voice',
+    'primary_products', 'competitors', 'unique_selling_points', 'page_count', 'classified_count'
+]
+PROFILE_FIELDS = ['business_summary', 'ideal_customer_profile', 'brand_voice', 'primary_products',
+                  'competitors', 'unique_selling_points']
+COUNT_FIELDS = ['page_count', 'classified_count']
+
+_project_counts_rpc = {'available': True}
+
+def rpc_missing(error):
+    """True if PostgREST says the called SQL function is not installed (not a timeout or 5xx)."""
+    code = str(getattr(error, 'code', '') or '')
+    return code in ('PGRST202', '42883', '404') or 'PGRST202' in str(error)
+
+def fetch_project_page_counts(project_ids):
+    """
+    {project_id: {'page_count': n, 'classified_count': n}} for the given projects.
+    One grouped query via the get_project_page_counts RPC (see migrate_db_v8.py); if the
+    function is not installed, falls back to head-only counts issued concurrently.
+    """
+    counts = {pid: {'page_count': 0, 'classified_count': 0} for pid in project_ids}
+    if not project_ids:
+        return counts
+    
+    if _project_counts_rpc['available']:
+        try:
+            res = supabase.rpc('get_project_page_counts', {'project_ids': project_ids}).execute()
+            for row in res.data or []:
+                counts[row['project_id']] = {
+                    'page_count': row.get('page_count') or 0,
+                    'classified_count': row.get('classified_count') or 0
+                }
+            return counts
+        except Exception as e:
+            if rpc_missing(e):
+                print(f"DEBUG: get_project_page_counts RPC not installed ({e}), using per-project counts")
+                _project_counts_rpc['available'] = False
+            else:
+                print(f"DEBUG: get_project_page_counts RPC failed ({e}), using per-project counts for this call")
+    
+    def count_one(pid):
+        try:
+            total = supabase.table('pages').select('id', count='exact', head=True).eq('project_id', pid).execute().count
+            # neq() also excludes NULL page_type, matching the RPC
+            classified = supabase.table('pages').select('id', count='exact', head=True).eq('project_id', pid).neq('page_type', 'Unclassified').execute().count
+            return pid, {'page_count': total or 0, 'classified_count': classified or 0}
+        except Exception as e:
+            print(f"Error counting pages for project {pid}: {e}")
+            return pid, counts[pid]
+    
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(8, len(project_ids))) as pool:
+        for pid, c in pool.map(count_one, project_ids):
+            counts[pid] = c
+    return counts
+
 @app.route('/api/get-projects', methods=['GET'])
 def get_projects():
+    """
+    Project summaries for the dashboard.
+    Query params: limit / offset (pagination) and fields=id,domain,page_count,... (projection).
+    """
     if not supabase:
         return jsonify({"error": "Supabase not configured"}), 500
     
     try:
-        # Fetch projects
-        projects_res = supabase.table('projects').select('*').order('created_at', desc=True).execute()
+        limit = request.args.get('limit', type=int)
+        offset = request.args.get('offset', default=0, type=int)
+        fields_arg = request.args.get('fields')
+        fields = [f.strip() for f in fields_arg.split(',') if f.strip() in PROJECT_SUMMARY_FIELDS] if fields_arg else PROJECT_SUMMARY_FIELDS
+        if 'id' not in fields:
+            fields = ['id'] + fields
+        
+        # Fetch projects (one page of them when limit is given)
+        query = supabase.table('projects').select('*', count='exact').order('created_at', desc=True)
+        if limit:
+            query = query.range(offset, offset + limit - 1)
+        projects_res = query.execute()
         projects = projects_res.data if projects_res.data else []
+        total = projects_res.count if projects_res.count is not None else len(projects)
         
         if not projects:
-            return jsonify({"projects": []})
+            return jsonify({"projects": [], "total": total, "has_more": False})
         
-        # Fetch profiles for these projects
-        try:
-            profiles_res = supabase.table('business_profiles').select('*').execute()
-            profiles_data = profiles_res.data if profiles_res.data else []
-            profiles_map = {p['project_id']: p for p in profiles_data}
-        except Exception as e:
-            print(f"Error fetching profiles: {e}")
-            profiles_map = {}
+        project_ids = [p['id'] for p in projects]
+        need_profiles = any(f in fields for f in PROFILE_FIELDS + ['strategy_plan'])
+        need_counts = any(f in fields for f in COUNT_FIELDS)
+        
+        # Profiles and grouped counts only for the projects on this page, fetched in parallel
+        def load_profiles():
+            if not need_profiles:
+                return {}
+            try:
+                profiles_res = supabase.table('business_profiles').select('*').in_('project_id', project_ids).execute()
+                return {p['project_id']: p for p in (profiles_res.data or [])}
+            except Exception as e:
+                print(f"Error fetching profiles: {e}")
+                return {}
         
-        # Fetch all pages for counts (optimization)
-        # OLD: Fetched all pages (slow for 100k+ pages)
-        # NEW: Fetch counts per project (O(N) where N is projects, not pages)
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            profiles_future = pool.submit(load_profiles)
+            counts_future = pool.submit(fetch_project_page_counts, project_ids if need_counts else [])
+            profiles_map = profiles_future.result()
+            counts_map = counts_future.result()
         
         # Merge and parse strategy plan
         final_projects = []
@@ -961,40 +946,17 @@ def get_projects():
                     except:
                         pass
                 
-                # Efficient Counting via Supabase
-                # 1. Total Count
-                try:
-                    count_res = supabase.table('pages').select('id', count='exact', head=True).eq('project_id', p['id']).execute()
-                    page_count = count_res.count
-                except:
-                    page_count = 0
-                    
-                # 2. Classified Count (Not Unclassified)
-                # Note: Supabase 'neq' with NULLs can be tricky. We assume 'Unclassified' is the string.
-                # If page_type is NULL, it's also unclassified.
-                # So we want count where page_type IS NOT NULL AND page_type != 'Unclassified'
-                try:
-                    # We can't easily do complex OR logic in one query without RPC.
-                    # Simplified: Count where page_type is NOT 'Unclassified' (ignoring NULLs for now or assuming default is Unclassified)
-                    # Actually, let's just count where page_type is in ['Product', 'Category', 'Service', 'Article', 'Blog']
-                    # Or just subtract unclassified from total?
-                    # Let's try to get count of "Product" + "Category" + "Service" etc.
-                    # Simpler: Just use the total count for now to be fast, or do a specific query.
-                    # Let's do: count where page_type != 'Unclassified'
-                    class_res = supabase.table('pages').select('id', count='exact', head=True).eq('project_id', p['id']).neq('page_type', 'Unclassified').execute()
-                    classified_count = class_res.count
-                except:
-                    classified_count = 0
+                counts = counts_map.get(p['id'], {})
                 
                 # Construct the project object to return
                 project_obj = {
                     "id": p['id'],
-                    "project_name": p['project_name'],
-                    "domain": p['domain'],
-                    "language": p['language'],
-                    "location": p['location'],
-                    "focus": p['focus'],
-                    "created_at": p['created_at'],
+                    "project_name": p.get('project_name'),
+                    "domain": p.get('domain'),
+                    "language": p.get('language'),
+                    "location": p.get('location'),
+                    "focus": p.get('focus'),
+                    "created_at": p.get('created_at'),
                     "business_summary": summary, # Cleaned summary
                     "strategy_plan": strategy_plan, # Extracted strategy
                     "ideal_customer_profile": profile.get('ideal_customer_profile'),
@@ -1002,21 +964,70 @@ def get_projects():
                     "primary_products": profile.get('primary_products'),
                     "competitors": profile.get('competitors'),
                     "unique_selling_points": profile.get('unique_selling_points'),
-                    "page_count": page_count,
-                    "classified_count": classified_count
+                    "page_count": counts.get('page_count', 0),
+                    "classified_count": counts.get('classified_count', 0)
                 }
-                final_projects.append(project_obj)
+                final_projects.append({k: project_obj[k] for k in fields})
             except Exception as e:
                 print(f"Error processing project {p.get('id')}: {e}")
                 continue
             
-        return jsonify({"projects": final_projects})
+        return jsonify({
+            "projects": final_projects,
+            "total": total,
+            "has_more": bool(limit) and offset + len(projects) < total
+        })
     except Exception as e:
         print(f"Critical error in get_projects: {e}")
         return jsonify({"error": str(e)}), 500
 
+def conditional_json(payload, status=200):
+    """
+    JSON response with an ETag (304 when the client already has it) and gzip when accepted.
+    Cache-Control: no-cache makes browsers revalidate instead of silently reusing stale data.
+    """
+    body = json.dumps(payload, default=str, separators=(',', ':')).encode('utf-8')
+    etag = hashlib.sha1(body).hexdigest()
+    
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(body, status=status, mimetype='application/json')
+        if len(body) > 1024 and 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response.set_data(gzip.compress(body, compresslevel=6))
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# Columns a client may ask for via get-pages ?fields=
+PAGE_LIST_COLUMNS = [
+    'id', 'project_id', 'url', 'page_type', 'created_at', 'tech_audit_data', 'funnel_stage', 'source_page_id',
+    'content_description', 'keywords', 'product_action', 'research_data', 'title', 'meta_description', 'h1',
+    'content', 'status', 'audit_status', 'classification_status', 'strategy_status'
+]
+# Default list view: no research_data / content, and tech_audit_data.body_content is cut to a preview
+PAGE_LIST_DEFAULT_FIELDS = [
+    'id', 'project_id', 'url', 'page_type', 'created_at', 'tech_audit_data', 'funnel_stage', 'source_page_id',
+    'content_description', 'keywords', 'product_action'
+]
+# PostgREST returns at most max_rows (1000 on Supabase) rows per request; a page plus the one
+# look-ahead row that detects the next page must fit in that
+SUPABASE_MAX_ROWS = int(os.environ.get("SUPABASE_MAX_ROWS", 1000))
+PAGE_LIST_MAX_LIMIT = SUPABASE_MAX_ROWS - 1
+BODY_PREVIEW_CHARS = 200
+
 @app.route('/api/get-pages', methods=['GET'])
 def get_pages():
+    """
+    Keyset-paginated page list for a project.
+    Query params:
+        project_id (required)
+        limit (default and max PAGE_LIST_MAX_LIMIT = 999), after_id (cursor from the previous response's next_cursor)
+        fields=id,url,... (default excludes research_data/content and trims body_content)
+        page_type / funnel_stage / product_action (comma-separated values allowed)
+    """
     if not supabase:
         return jsonify({"error": "Supabase not configured"}), 500
     
@@ -1025,21 +1036,56 @@ def get_pages():
         if not project_id:
             return jsonify({"error": "project_id is required"}), 400
         
-        # Optimize: Select only necessary columns for the list view
-        # We need tech_audit_data for the status/title, but we don't need the full body_content if it's huge.
-        # However, Supabase select doesn't support "exclude".
-        # Let's select explicit columns.
-        response = supabase.table('pages').select('id, project_id, url, page_type, created_at, tech_audit_data, funnel_stage, source_page_id, content_description, keywords, product_action, research_data').eq('project_id', project_id).order('id').execute()
+        limit = min(max(request.args.get('limit', default=PAGE_LIST_MAX_LIMIT, type=int), 1), PAGE_LIST_MAX_LIMIT)
+        after_id = request.args.get('after_id')
         
-        import sys
-        print(f"DEBUG: get_pages for {project_id} found {len(response.data) if response.data else 0} pages.", file=sys.stderr)
-        
-        # DEBUG: Check data structure
-        if response.data:
-            print(f"DEBUG: get_pages first row keys: {response.data[0].keys()}", file=sys.stderr)
-            print(f"DEBUG: get_pages first row tech_audit_data: {response.data[0].get('tech_audit_data')}", file=sys.stderr)
+        fields_arg = request.args.get('fields')
+        light = not fields_arg
+        if fields_arg:
+            fields = [f.strip() for f in fields_arg.split(',') if f.strip() in PAGE_LIST_COLUMNS]
+        else:
+            fields = list(PAGE_LIST_DEFAULT_FIELDS)
+        if 'id' not in fields:
+            fields = ['id'] + fields # Needed for the cursor
+        
+        def apply_filters(query):
+            query = query.eq('project_id', project_id)
+            for column in ('page_type', 'funnel_stage', 'product_action'):
+                value = request.args.get(column)
+                if value:
+                    values = [v.strip() for v in value.split(',') if v.strip()]
+                    query = query.in_(column, values) if len(values) > 1 else query.eq(column, values[0])
+            return query
+        
+        # Fetch one extra row to know whether another page follows
+        query = apply_filters(supabase.table('pages').select(', '.join(fields)))
+        if after_id:
+            query = query.gt('id', after_id)
+        response = query.order('id').limit(limit + 1).execute()
+        pages = response.data or []
+        has_more = len(pages) > limit
+        pages = pages[:limit]
+        
+        if light and pages:
+            # Which of these pages have a research brief (ids only - the blobs stay in the DB)
+            research_query = apply_filters(supabase.table('pages').select('id')).not_.is_('research_data', 'null') \
+                .gte('id', pages[0]['id']).lte('id', pages[-1]['id'])
+            with_research = {r['id'] for r in (research_query.execute().data or [])}
             
-        return jsonify({"pages": response.data})
+            for page in pages:
+                page['has_research_data'] = page['id'] in with_research
+                tech = page.get('tech_audit_data')
+                if tech and tech.get('body_content'):
+                    body = tech.pop('body_content')
+                    tech['body_content_preview'] = body[:BODY_PREVIEW_CHARS]
+                    tech['body_content_length'] = len(body)
+        
+        print(f"DEBUG: get_pages for {project_id} returned {len(pages)} pages (after_id={after_id}, more={has_more}).", file=sys.stderr)
+        
+        return conditional_json({
+            "pages": pages,
+            "next_cursor": pages[-1]['id'] if has_more and pages else None
+        })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -1148,11 +1194,28 @@ def classify_page():
         log_debug(f"DEBUG: classify_page error: {e}")
         return jsonify({"error": str(e)}), 500
 
+classify_log = logging.getLogger('classify')
+
+def load_pages_for_classification(project_id):
+    """id, url, page_type and og:type of every page in the project (og_type pulled out server-side)."""
+    pages, offset = [], 0
+    while True:
+        res = supabase.table('pages').select('id, url, page_type, og_type:tech_audit_data->>og_type') \
+            .eq('project_id', project_id).order('id').range(offset, offset + 999).execute()
+        pages.extend(res.data)
+        if len(res.data) < 1000:
+            break
+        offset += 1000
+    return pages
+
 @app.route('/api/auto-classify', methods=['POST'])
 def auto_classify():
-    # Log to a separate file to ensure we see it
-    with open('debug_classify.log', 'a') as f:
-        f.write(f"DEBUG: ENTERING auto_classify\n")
+    """
+    Classify every unclassified page of a project with the compiled rule set (page_classifier.py),
+    then write one update per page type. Project rules come from projects.classifier_rules,
+    or from "rules" in the request body.
+    """
+    classify_log.info("Entering auto_classify")
     
     if not supabase: return jsonify({"error": "Supabase not configured"}), 500
     
@@ -1161,341 +1224,347 @@ def auto_classify():
         project_id = data.get('project_id')
         if not project_id: return jsonify({"error": "project_id required"}), 400
         
-        # Fetch all pages for project, ordered by ID to ensure "list order"
-        res = supabase.table('pages').select('id, url, page_type, tech_audit_data').eq('project_id', project_id).order('id').execute()
-        all_pages = res.data
-        
-        # Prioritize Unclassified pages
-        unclassified_pages = [p for p in all_pages if p.get('page_type') in [None, 'Unclassified', 'Other', '']]
+        rules = data.get('rules')
+        if rules is None:
+            proj_res = supabase.table('projects').select('*').eq('id', project_id).execute()
+            rules = proj_res.data[0].get('classifier_rules') if proj_res.data else None
+        classifier = get_classifier(rules)
         
-        # LIMIT: Only take the first 50 unclassified pages
-        pages = unclassified_pages[:50]
-        
-        with open('debug_classify.log', 'a') as f:
-            f.write(f"DEBUG: Total pages: {len(all_pages)}. Unclassified: {len(unclassified_pages)}. Processing batch of: {len(pages)}\n")
+        start = time.time()
+        all_pages = load_pages_for_classification(project_id)
+        groups = classifier.classify_pages(all_pages)
+        classify_log.info(f"Total pages: {len(all_pages)}. Matched: {sum(len(ids) for ids in groups.values())} "
+                          f"in {time.time() - start:.2f}s")
         
         updated_count = 0
-        
-        for p in pages:
-            current_type = p.get('page_type')
-            
-            # Log every URL
-            with open('debug_classify.log', 'a') as f:
-                f.write(f"DEBUG: Processing {p['url']} | Type: {current_type}\n")
-
-            # Allow overwriting if it's Unclassified, None, empty, OR 'Other'
-            # We ONLY skip if it's already 'Product' or 'Category'
-            if current_type in ['Product', 'Category']:
-                with open('debug_classify.log', 'a') as f:
-                    f.write(f"DEBUG: SKIPPING {p['url']} (Already {current_type})\n")
-                continue
+        for page_type, ids in groups.items():
+            classify_log.debug(f"{page_type}: {len(ids)} pages")
+            # Chunked so the id list stays within PostgREST's URL limits
+            for i in range(0, len(ids), 500):
+                supabase.table('pages').update({'page_type': page_type}).in_('id', ids[i:i + 500]).execute()
+            updated_count += len(ids)
                 
-            url = p['url'].lower()
-            new_type = None
-            
-            # 1. Check Technical Data (Most Accurate)
-            tech_data = p.get('tech_audit_data') or {}
-            og_type = tech_data.get('og_type', '').lower()
-            
-            if 'product' in og_type:
-                new_type = 'Product'
-            elif 'service' in og_type:
-                new_type = 'Service'
-            elif 'article' in og_type or 'blog' in og_type:
-                new_type = 'Category'
-            
-            # 2. URL Heuristics (Fallback)
-            if not new_type:
-                # Strict Product
-                if any(x in url for x in ['/product/', '/products/', '/item/', '/p/', '/shop/']):
-                    new_type = 'Product'
-                
-                # Strict Service
-                elif any(x in url for x in ['/service/', '/services/', '/solution/', '/solutions/', '/consulting/', '/offering/']):
-                    new_type = 'Service'
-
-                # Categories / Content
-                elif any(x in url for x in ['/category/', '/categories/', '/c/', '/collection/', '/collections/', '/blog/', '/blogs/', '/article/', '/news/']):
-                    new_type = 'Category'
-                
-                # Expanded Content (Generic E-commerce/Blog terms)
-                # 'culture', 'trend', 'backstage', 'editorial', 'guide' are common content markers
-                elif 'culture' in url or 'trend' in url or 'artistry' in url or 'how-to' in url or 'backstage' in url or 'collections' in url or 'editorial' in url or 'guide' in url:
-                    new_type = 'Category'
-                
-                # Common Beauty/Fashion Categories (Generic)
-                # lips, face, eyes, skincare, brushes are standard industry categories
-                elif any(f"/{x}" in url for x in ['lips', 'face', 'eyes', 'brushes', 'skincare', 'bestsellers', 'new', 'sets', 'gifts']):
-                    new_type = 'Category'
-                
-                # Keywords that imply a collection/list (Generic)
-                elif 'shades' in url or 'colours' in url or 'looks' in url or 'inspiration' in url:
-                    new_type = 'Category'
-                
-                # Generic "products" list pattern
-                elif 'trending-products' in url or url.endswith('-products'):
-                    new_type = 'Category'
-            
-            if new_type:
-                with open('debug_classify.log', 'a') as f:
-                    f.write(f"DEBUG: MATCH! {url} -> {new_type}\n")
-            else:
-                with open('debug_classify.log', 'a') as f:
-                    f.write(f"DEBUG: NO MATCH for {url}\n")
-            
-            if new_type:
-                supabase.table('pages').update({'page_type': new_type}).eq('id', p['id']).execute()
-                updated_count += 1
-                
-        return jsonify({"message": f"Auto-classified {updated_count} pages", "count": updated_count})
+        return jsonify({
+            "message": f"Auto-classified {updated_count} pages",
+            "count": updated_count,
+            "by_type": {page_type: len(ids) for page_type, ids in groups.items()}
+        })
 
     except Exception as e:
         print(f"Auto-classify error: {e}")
         return jsonify({"error": str(e)}), 500
 
-def get_title_from_url(url):
-    try:
-        from urllib.parse import urlparse
-        path = urlparse(url).path
-        # Get last non-empty segment
-        segments = [s for s in path.split('/') if s]
-        if not segments: return "Home"
-        slug = segments[-1]
-        # Convert slug to title (e.g., "my-page-title" -> "My Page Title")
-        return slug.replace('-', ' ').replace('_', ' ').title()
-    except:
-        return "Untitled Page"
-
 def scrape_page_details(url):
     """Scrape detailed technical data for a single page."""
-    import requests
-    from bs4 import BeautifulSoup
-    import time
+    # Pooled fetch with browser headers (falls back to a curl-like UA when blocked)
+    result = fetch_page(url)
+    return analyze_page(url, result.content, fetch_meta_from_result(result))
+
+def _needs_tech_audit(page):
+    tech = page.get('tech_audit_data') or {}
+    status = tech.get('status_code')
     
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)'
-    }
+    # Retry if:
+    # 1. No data
+    # 2. Title is still "Pending Scan" (a page without a <title> is audited and flagged "Missing Title")
+    # 3. Status is Forbidden (403) or Rate Limited (429) or 0/None
+    return not tech or \
+        tech.get('title') == 'Pending Scan' or \
+        status in [403, 429, 406, 0, None]
+
+def _tech_audit_row(page, tech_data):
+    """Row for the batched upsert. Every row carries the same keys so PostgREST accepts the bulk payload."""
+    # Merge with existing data
+    existing_data = page.get('tech_audit_data') or {}
+    existing_data.update(tech_data)
     
-    data = {
-        'status_code': 0,
-        'title': '',
-        'meta_description': '',
-        'h1': '',
-        'canonical': '',
-        'word_count': 0,
-        'og_title': '',
-        'og_description': '',
-        'has_schema': False,
-        'missing_alt_count': 0,
-        'missing_h1': False,
-        'onpage_score': 0,
-        'load_time_ms': 0,
-        'checks': [],
-        'error': None
-    }
+    title = page.get('title')
+    if tech_data.get('title') and tech_data.get('title') != 'Pending Scan':
+        title = tech_data['title']
+    elif not title or title == 'Pending Scan':
+        title = get_title_from_url(page['url'])
     
+    return {
+        'id': page['id'],
+        'project_id': page['project_id'],
+        'url': page['url'],
+        'tech_audit_data': existing_data,
+        'title': title,
+        'meta_description': tech_data.get('meta_description') or page.get('meta_description')
+    }
+
+def _persist_tech_audit_rows(rows):
+    """Write one batch of audited pages. Falls back to per-row updates if the bulk upsert is rejected."""
     try:
-        # Rate Limit: Sleep 1 second before scraping to be polite
-        time.sleep(1)
-        
-        start_time = time.time()
-        
-        # Use curl to bypass TLS fingerprinting
-        content, latency = fetch_with_curl(url)
-        data['load_time_ms'] = int(latency * 1000)
-        
-        if content:
-            data['status_code'] = 200 # Assume 200 if curl returns content
-            soup = BeautifulSoup(content, 'html.parser')
-            
-            # Title
-            # Robust extraction: Find first title not in SVG/Symbol
-            page_title = None
-            
-            # 1. Try head > title first
-            head_title = soup.select_one('head > title')
-            if head_title and head_title.string:
-                page_title = head_title
-            
-            # 2. Fallback: Search all titles and filter
-            if not page_title:
-                all_titles = soup.find_all('title')
-                for t in all_titles:
-                    # Check if parent or grandparent is SVG-related
-                    parents = [p.name for p in t.parents]
-                    if not any(x in ['svg', 'symbol', 'defs', 'g'] for x in parents):
-                        page_title = t
-                        break
-            
-            if page_title:
-                data['title'] = page_title.get_text(strip=True)
-            else:
-                data['title'] = get_title_from_url(url)
-                
-            data['title_length'] = len(data['title'])
+        supabase.table('pages').upsert(rows, on_conflict='id').execute()
+        for row in rows:
+            record_page(row['project_id'], row['id'], row['title'], row['meta_description'])
+        return len(rows)
+    except Exception as e:
+        print(f"DEBUG: Bulk upsert of {len(rows)} audited pages failed ({e}), updating one by one")
+    
+    written = 0
+    for row in rows:
+        try:
+            payload = {k: v for k, v in row.items() if k not in ('id', 'project_id', 'url')}
+            supabase.table('pages').update(payload).eq('id', row['id']).execute()
+            record_page(row['project_id'], row['id'], row['title'], row['meta_description'])
+            written += 1
+        except Exception as e:
+            print(f"ERROR: Failed to update audit for {row.get('url')}: {e}")
+    return written
+
+def perform_tech_audit(project_id, limit=20):
+    """Audit existing pages that are missing technical data. Returns the pipeline stats."""
+    print(f"Starting technical audit for project {project_id} (Limit: {limit})...")
+    
+    # 1. Get pages that need auditing (prioritize those without tech data)
+    # Fetch all pages (or a large batch) and filter in python
+    res = supabase.table('pages').select('id, project_id, url, title, meta_description, tech_audit_data').eq('project_id', project_id).order('id').execute()
+    
+    # Filter for pages that have NO tech_audit_data, or "Pending Scan", or failed status (403/429)
+    unaudited_pages = [p for p in res.data if _needs_tech_audit(p)]
             
-            # Meta Description
-            meta_desc = soup.find('meta', attrs={'name': 'description'})
-            if meta_desc:
-                data['meta_description'] = meta_desc.get('content', '').strip()
-                data['description_length'] = len(data['meta_description'])
-                
-            # H1
-            h1 = soup.find('h1')
-            if h1:
-                data['h1'] = h1.get_text(strip=True)
-            else:
-                data['missing_h1'] = True
-                data['checks'].append("Missing H1")
-                
-            # Canonical
-            canonical = soup.find('link', attrs={'rel': 'canonical'})
-            if canonical:
-                data['canonical'] = canonical.get('href', '').strip()
-            else:
-                # Fallback regex for malformed HTML
-                import re
-                match = re.search(r'<link[^>]*rel=["\']canonical["\'][^>]*href=["\']([^"\']+)["\']', content)
-                if match:
-                    data['canonical'] = match.group(1).strip()
-                
-            # Word Count (rough estimate)
-            text = soup.get_text(separator=' ')
-            data['word_count'] = len(text.split())
-            
-            # Click Depth (Proxy: URL Depth)
-            # Count slashes after the domain. 
-            # e.g. https://domain.com/ = 0
-            # https://domain.com/page = 1
-            # https://domain.com/blog/post = 2
-            from urllib.parse import urlparse
-            parsed = urlparse(url)
-            path = parsed.path.strip('/')
-            data['click_depth'] = 0 if not path else len(path.split('/'))
-            
-            # OG Tags
-            og_title = soup.find('meta', property='og:title')
-            if og_title: data['og_title'] = og_title.get('content', '').strip()
-            
-            og_desc = soup.find('meta', property='og:description')
-            if og_desc: data['og_description'] = og_desc.get('content', '').strip()
-            
-            # Schema
-            schema = soup.find('script', type='application/ld+json')
-            if schema: data['has_schema'] = True
-            
-            # Missing Alt Tags
-            images = soup.find_all('img')
-            for img in images:
-                if not img.get('alt'):
-                    data['missing_alt_count'] += 1
-            
-            # Calculate OnPage Score (Simple Heuristic)
-            score = 100
-            if data['missing_h1']: score -= 20
-            if not data['title']: score -= 20
-            if not data['meta_description']: score -= 20
-            if data['missing_alt_count'] > 0: score -= min(10, data['missing_alt_count'] * 2)
-            if data['word_count'] < 300: score -= 10
-            if not data['og_title']: score -= 5
-            if not data['og_description']: score -= 5
-            
-            data['onpage_score'] = max(0, score)
-            
-            # Technical Checks
-            data['is_redirect'] = False # Cannot detect redirects easily with simple curl
-            data['is_4xx_code'] = 400 <= data['status_code'] < 500
-            data['is_5xx_code'] = 500 <= data['status_code'] < 600
-            data['is_broken'] = data['status_code'] >= 400
-            data['high_loading_time'] = data['load_time_ms'] > 2000
-            
-            # Canonical Mismatch
-            if data['canonical']:
-                # Normalize URLs for comparison (remove trailing slash, etc)
-                norm_url = url.rstrip('/')
-                norm_canon = data['canonical'].rstrip('/')
-                data['canonical_mismatch'] = norm_url != norm_canon
-            else:
-                data['canonical_mismatch'] = False # Or True if strict? Let's say False if missing.
+    # Take the first 'limit' pages
+    pages = unaudited_pages[:limit]
+    print(f"DEBUG: Found {len(unaudited_pages)} unaudited pages. Processing first {len(pages)}.")
+    
+    # 2. Fetch (concurrent, polite per host) -> parse (process pool) -> batched upsert
+    pipeline = AuditPipeline(fetch=fetch_page, persist=_persist_tech_audit_rows, build_row=_tech_audit_row)
+    stats = pipeline.run(pages)
+    
+    print(f"Audit complete. Updated {stats['persisted']} pages.")
+    return stats
 
-    except Exception as e:
-        data['error'] = str(e)
-        data['is_broken'] = True
-        print(f"Error scraping {url}: {e}")
-        
-    return data
+def _setup_model():
+    try:
+        tools = [{'google_search': {}}]
+        return genai.GenerativeModel('gemini-2.0-flash-exp', tools=tools)
+    except:
+        print("Warning: Google Search tool failed. Using standard model.")
+        return genai.GenerativeModel('gemini-2.0-flash-exp')
 
-def perform_tech_audit(project_id, limit=20):
-    """Audit existing pages that are missing technical data."""
-    print(f"Starting technical audit for project {project_id} (Limit: {limit})...")
+def research_business_profile(project, domain):
+    """Gemini research step of project setup: returns the parsed Business Profile dict."""
+    print("Starting Gemini research...")
+    model = _setup_model()
     
-    # 1. Get pages that need auditing (prioritize those without tech data)
-    # Fetch all pages (or a large batch) and filter in python
-    res = supabase.table('pages').select('id, url, tech_audit_data').eq('project_id', project_id).order('id').execute()
-    all_pages = res.data
+    prompt = f"""
+    You are an expert business analyst. Research the website {domain} and create a comprehensive Business Profile.
     
-    # Filter for pages that have NO tech_audit_data, or "Pending Scan", or failed status (403/429)
-    unaudited_pages = []
-    for p in all_pages:
-        tech = p.get('tech_audit_data') or {}
-        status = tech.get('status_code')
-        
-        # Retry if:
-        # 1. No data
-        # 2. Title is missing or "Pending Scan"
-        # 3. Status is Forbidden (403) or Rate Limited (429) or 0/None
-        if not tech or \
-           not tech.get('title') or \
-           tech.get('title') == 'Pending Scan' or \
-           status in [403, 429, 406, 0, None]:
-            unaudited_pages.append(p)
-            
-    # Take the first 'limit' pages
-    pages = unaudited_pages[:limit]
-    print(f"DEBUG: Found {len(unaudited_pages)} unaudited pages. Processing first {len(pages)}.")
+    Context:
+    - Language: {project.get('language')}
+    - Location: {project.get('location')}
+    - Focus: {project.get('focus')}
+    
+    I need you to find:
+    1. Business Summary: What do they do? (1 paragraph)
+    2. Ideal Customer Profile (ICP): Who are they selling to? Be specific.
+    3. Brand Voice: How do they sound?
+    4. Primary Products: List their main products/services.
+    5. Competitors: List 3-5 potential competitors.
+    6. Unique Selling Points (USPs): What makes them different?
+    
+    Return JSON:
+    {{
+        "business_summary": "...",
+        "ideal_customer_profile": "...",
+        "brand_voice": "...",
+        "primary_products": ["..."],
+        "competitors": ["..."],
+        "unique_selling_points": ["..."]
+    }}
+    """
+    
+    response = scheduled_call('gemini', model.generate_content, prompt)
+    
+    # Parse JSON
+    text = response.text.strip()
+    if text.startswith('```json'): text = text[7:]
+    if text.startswith('```'): text = text[3:]
+    if text.endswith('```'): text = text[:-3]
+    
+    return json.loads(text.strip())
+
+def generate_strategy_plan(project, profile_data):
+    """Bottom-up content strategy (markdown) for a researched Business Profile."""
+    print("Generating Strategy Plan...")
+    model = _setup_model()
+    strategy_prompt = f"""
+    Based on this business profile:
+    {json.dumps(profile_data)}
+    
+    **CONTEXT**:
+    - Target Audience Location: {project.get('location')}
+    - Target Language: {project.get('language')}
+    
+    Create a high-level Content Strategy Plan following the "Bottom-Up" approach:
+    1. Bottom Funnel (BoFu): What product/service pages need optimization?
+    2. Middle Funnel (MoFu): What comparison/best-of topics link to BoFu?
+    3. Top Funnel (ToFu): What informational topics link to MoFu?
+    
+    Return a short markdown summary of the strategy.
+    """
+    strategy_res = scheduled_call('gemini', model.generate_content, strategy_prompt)
+    return strategy_res.text
+
+def save_business_profile(project_id, profile_data, strategy_plan):
+    """Upsert the project's business_profiles row; returns the saved fields."""
+    # WORKAROUND: Append Strategy Plan to Business Summary for persistence
+    combined_summary = profile_data.get("business_summary", "")
+    if strategy_plan:
+        combined_summary += "\n\n===STRATEGY_PLAN===\n\n" + strategy_plan
+
+    profile_insert = {
+        "project_id": project_id,
+        "business_summary": combined_summary,
+        "ideal_customer_profile": profile_data.get("ideal_customer_profile"),
+        "brand_voice": profile_data.get("brand_voice"),
+        "primary_products": profile_data.get("primary_products"),
+        "competitors": profile_data.get("competitors"),
+        "unique_selling_points": profile_data.get("unique_selling_points")
+    }
     
-    audited_count = 0
+    # Check if exists, update or insert
+    existing = supabase.table('business_profiles').select('id').eq('project_id', project_id).execute()
+    if existing.data:
+        supabase.table('business_profiles').update(profile_insert).eq('id', existing.data[0]['id']).execute()
+    else:
+        supabase.table('business_profiles').insert(profile_insert).execute()
+    return profile_insert
+
+# Crawler placeholders that must not overwrite a title we already have
+PLACEHOLDER_TITLES = ('Pending Scan', 'Untitled Product')
+PAGE_MERGE_BATCH = int(os.environ.get("PAGE_MERGE_BATCH", 1000))  # pages per merge_discovered_pages call
+PAGE_MERGE_CHUNK = int(os.environ.get("PAGE_MERGE_CHUNK", 150))   # URLs per in_() lookup in the fallback
+_page_merge_rpc = {'available': True}
+
+def merge_tech_audit_data(existing, incoming):
+    """Client-side twin of the merge_tech_audit_data SQL function (migrate_db_v9.py)."""
+    if existing is None:
+        return dict(incoming or {})
+    incoming = incoming or {}
+    if (existing.get('title') or '') not in ('',) + PLACEHOLDER_TITLES and incoming.get('title') in PLACEHOLDER_TITLES:
+        return {**incoming, **existing}
+    return {**existing, **incoming}
+
+def _merge_pages_rpc(project_id, pages):
+    inserted = updated = 0
+    for i in range(0, len(pages), PAGE_MERGE_BATCH):
+        batch = [{'url': p['url'], 'status': p.get('status'), 'tech_audit_data': p.get('tech_audit_data')}
+                 for p in pages[i:i + PAGE_MERGE_BATCH]]
+        res = supabase.rpc('merge_discovered_pages', {'p_project_id': project_id, 'p_pages': batch}).execute()
+        row = (res.data or [{}])[0]
+        inserted += row.get('inserted') or 0
+        updated += row.get('updated') or 0
+    return inserted, updated
+
+def _merge_pages_chunked(project_id, pages):
+    """Fallback without the RPC: per chunk one lookup, one bulk upsert of changed rows and one insert."""
+    inserted = updated = 0
+    for i in range(0, len(pages), PAGE_MERGE_CHUNK):
+        chunk = pages[i:i + PAGE_MERGE_CHUNK]
+        existing_res = supabase.table('pages').select('id, url, tech_audit_data') \
+            .eq('project_id', project_id).in_('url', [p['url'] for p in chunk]).execute()
+        existing_map = {row['url']: row for row in existing_res.data or []}
+        
+        changed, new_pages = [], []
+        for p in chunk:
+            row = existing_map.get(p['url'])
+            if row is None:
+                new_pages.append(p)
+                continue
+            merged = merge_tech_audit_data(row.get('tech_audit_data'), p.get('tech_audit_data'))
+            if merged != (row.get('tech_audit_data') or {}):
+                changed.append({'id': row['id'], 'project_id': project_id, 'url': p['url'], 'tech_audit_data': merged})
+        
+        if changed:
+            supabase.table('pages').upsert(changed, on_conflict='id').execute()
+            updated += len(changed)
+        if new_pages:
+            supabase.table('pages').insert(new_pages).execute()
+            inserted += len(new_pages)
+    return inserted, updated
+
+def sync_discovered_pages(project_id, pages_to_insert):
+    """
+    Merge crawled pages into the pages table and refresh the project's page_count.
+    Uses the merge_discovered_pages RPC (upsert on (project_id, url), JSONB merged in SQL);
+    without it, merges client-side in chunks.
+    """
+    if not pages_to_insert:
+        return 0
+    # The crawler dedupes, but the SQL upsert cannot touch the same row twice in one statement
+    pages = list({p['url']: p for p in pages_to_insert}.values())
+    print(f"Found {len(pages)} pages. syncing with DB...")
     
-    for p in pages:
+    merged = None
+    if _page_merge_rpc['available']:
         try:
-            url = p['url']
-            print(f"DEBUG: Auditing {url}...")
-            
-            tech_data = scrape_page_details(url)
-            print(f"DEBUG: Scraped {url}. Status: {tech_data.get('status_code')}")
-            
-            # Merge with existing data
-            existing_data = p.get('tech_audit_data') or {}
-            existing_data.update(tech_data)
-            
-            # Update DB
-            print(f"DEBUG: Updating DB for {url}...")
-            update_payload = {
-                'tech_audit_data': existing_data
-            }
-            
-            # Also update top-level columns if found
-            if tech_data.get('title') and tech_data.get('title') != 'Pending Scan':
-                update_payload['title'] = tech_data['title']
-                
-            if tech_data.get('meta_description'):
-                update_payload['meta_description'] = tech_data['meta_description']
-                
-            supabase.table('pages').update(update_payload).eq('id', p['id']).execute()
-            
-            audited_count += 1
-            print(f"DEBUG: Successfully audited {url}")
-            
+            merged = _merge_pages_rpc(project_id, pages)
         except Exception as e:
-            print(f"ERROR: Failed to audit {p.get('url')}: {e}")
-            import traceback
-            traceback.print_exc()
-        
-    print(f"Audit complete. Updated {audited_count} pages.")
-    return audited_count
+            if rpc_missing(e):
+                print(f"DEBUG: merge_discovered_pages RPC not installed ({e}), merging in chunks")
+                _page_merge_rpc['available'] = False
+            else:
+                # Batches already merged are merged again harmlessly (lookups by URL, JSONB merge)
+                print(f"DEBUG: merge_discovered_pages RPC failed ({e}), merging this sync in chunks")
+    if merged is None:
+        merged = _merge_pages_chunked(project_id, pages)
+    print(f"Inserted {merged[0]} new pages, updated {merged[1]} existing pages")
+    
+    # Update project page_count field (head-only count, no rows transferred)
+    total_pages = supabase.table('pages').select('id', count='exact', head=True).eq('project_id', project_id).execute()
+    supabase.table('projects').update({
+        'page_count': total_pages.count
+    }).eq('id', project_id).execute()
+    print(f"Updated project page_count to {total_pages.count}")
+    return total_pages.count
+
+def build_setup_dag(project, do_profile, do_audit, max_pages):
+    """
+    Project setup as two independent branches:
+      profile -> strategy -> save_profile   (Gemini research)
+      discover -> sync_pages                (sitemap crawl + page upsert)
+    """
+    project_id = project['id']
+    domain = project['domain']
+    dag = SetupDAG()
+    if do_profile:
+        dag.add('profile', lambda r: research_business_profile(project, domain))
+        dag.add('strategy', lambda r: generate_strategy_plan(project, r['profile']), deps=['profile'])
+        dag.add('save_profile', lambda r: save_business_profile(project_id, r['profile'], r['strategy']),
+                deps=['profile', 'strategy'])
+    if do_audit:
+        print(f"Starting sitemap crawl (Audit enabled, Max Pages: {max_pages})...")
+        dag.add('discover', lambda r: crawl_sitemap(domain, project_id, max_pages=max_pages) or [])
+        dag.add('sync_pages', lambda r: sync_discovered_pages(project_id, r['discover']), deps=['discover'])
+    else:
+        print("Audit disabled. Skipping crawl.")
+    return dag
+
+def _setup_response(results, status, do_audit):
+    payload = {
+        "message": "Project setup complete",
+        "profile": results.get('save_profile', {}),
+        "strategy_plan": results.get('strategy', ""),
+        "pages_found": len(results.get('discover') or []),
+        "audit_run": do_audit,
+        "steps": status
+    }
+    failed = [name for name, s in status.items() if s == 'failed']
+    if failed:
+        payload["message"] = f"Project setup finished with failed steps: {', '.join(failed)}"
+        payload["failed_steps"] = failed
+    return payload
 
 @app.route('/api/run-project-setup', methods=['POST'])
 def run_project_setup():
+    """
+    Profile research and sitemap discovery run concurrently (see build_setup_dag).
+    Send "stream": true (or Accept: text/event-stream) to get per-step progress as
+    Server-Sent Events; the final 'complete' event carries the usual JSON response.
+    """
     if not supabase: return jsonify({"error": "Supabase not configured"}), 500
     
     try:
@@ -1505,6 +1574,7 @@ def run_project_setup():
         do_tech_audit = data.get('do_tech_audit', False) # New Flag
         do_profile = data.get('do_profile', False) # Default to False to separate actions
         max_pages = data.get('max_pages', 200)
+        stream = wants_stream(data)
 
         if not project_id: return jsonify({"error": "project_id required"}), 400
         
@@ -1516,172 +1586,88 @@ def run_project_setup():
         
         print(f"Starting Setup for {domain} (Audit: {do_audit}, Tech Audit: {do_tech_audit}, Profile: {do_profile}, Max Pages: {max_pages})...")
         
-        profile_data = {}
-        strategy_plan = ""
-        profile_insert = {} # Initialize to empty dict
-        
         # 0. Technical Audit (Deep Dive) - NEW
         if do_tech_audit:
-             count = perform_tech_audit(project_id, limit=max_pages)
-             return jsonify({"message": f"Technical audit completed for {count} pages."})
-
-        # 1. Research Business (The Brain)
-        if do_profile:
-            print("Starting Gemini research...")
-            try:
-                tools = [{'google_search': {}}]
-                model = genai.GenerativeModel('gemini-2.0-flash-exp', tools=tools)
-            except:
-                print("Warning: Google Search tool failed. Using standard model.")
-                model = genai.GenerativeModel('gemini-2.0-flash-exp')
-            
-            prompt = f"""
-            You are an expert business analyst. Research the website {domain} and create a comprehensive Business Profile.
-            
-            Context:
-            - Language: {project.get('language')}
-            - Location: {project.get('location')}
-            - Focus: {project.get('focus')}
-            
-            I need you to find:
-            1. Business Summary: What do they do? (1 paragraph)
-            2. Ideal Customer Profile (ICP): Who are they selling to? Be specific.
-            3. Brand Voice: How do they sound?
-            4. Primary Products: List their main products/services.
-            5. Competitors: List 3-5 potential competitors.
-            6. Unique Selling Points (USPs): What makes them different?
-            
-            Return JSON:
-            {{
-                "business_summary": "...",
-                "ideal_customer_profile": "...",
-                "brand_voice": "...",
-                "primary_products": ["..."],
-                "competitors": ["..."],
-                "unique_selling_points": ["..."]
-            }}
-            """
-            
-            response = model.generate_content(prompt)
-            
-            # Parse JSON
-            import json
-            text = response.text.strip()
-            if text.startswith('```json'): text = text[7:]
-            if text.startswith('```'): text = text[3:]
-            if text.endswith('```'): text = text[:-3]
-            
-            profile_data = json.loads(text.strip())
-            
-            # 2. Generate Content Strategy Plan
-            print("Generating Strategy Plan...")
-            strategy_prompt = f"""
-            Based on this business profile:
-            {json.dumps(profile_data)}
-            
-            **CONTEXT**:
-            - Target Audience Location: {project.get('location')}
-            - Target Language: {project.get('language')}
-            
-            Create a high-level Content Strategy Plan following the "Bottom-Up" approach:
-            1. Bottom Funnel (BoFu): What product/service pages need optimization?
-            2. Middle Funnel (MoFu): What comparison/best-of topics link to BoFu?
-            3. Top Funnel (ToFu): What informational topics link to MoFu?
-            
-            Return a short markdown summary of the strategy.
-            """
-            strategy_res = model.generate_content(strategy_prompt)
-            strategy_plan = strategy_res.text
-            
-            # Save Business Profile
-            # WORKAROUND: Append Strategy Plan to Business Summary for persistence
-            combined_summary = profile_data.get("business_summary", "")
-            if strategy_plan:
-                combined_summary += "\n\n===STRATEGY_PLAN===\n\n" + strategy_plan
-
-            profile_insert = {
-                "project_id": project_id,
-                "business_summary": combined_summary,
-                "ideal_customer_profile": profile_data.get("ideal_customer_profile"),
-                "brand_voice": profile_data.get("brand_voice"),
-                "primary_products": profile_data.get("primary_products"),
-                "competitors": profile_data.get("competitors"),
-                "unique_selling_points": profile_data.get("unique_selling_points")
-            }
-            
-            # Check if exists, update or insert
-            existing = supabase.table('business_profiles').select('id').eq('project_id', project_id).execute()
-            if existing.data:
-                supabase.table('business_profiles').update(profile_insert).eq('id', existing.data[0]['id']).execute()
-            else:
-                supabase.table('business_profiles').insert(profile_insert).execute()
+             stats = perform_tech_audit(project_id, limit=max_pages)
+             return jsonify({
+                 "message": f"Technical audit completed for {stats['persisted']} pages ({stats['pages_per_sec']} pages/sec).",
+                 "stats": stats
+             })
 
-        # 3. Crawl Sitemap (The Map)
-        pages_to_insert = []
+        # 1. Research Business (The Brain) || 2. Crawl Sitemap (The Map)
+        dag = build_setup_dag(project, do_profile, do_audit, max_pages)
         
-        if do_audit:
-            print(f"Starting sitemap crawl (Audit enabled, Max Pages: {max_pages})...")
-            pages_to_insert = crawl_sitemap(domain, project_id, max_pages=max_pages)
-            
-            if pages_to_insert:
-                print(f"Found {len(pages_to_insert)} pages. syncing with DB...")
-                
-                # 1. Get existing URLs to avoid duplicates
-                existing_res = supabase.table('pages').select('url, id, tech_audit_data').eq('project_id', project_id).execute()
-                existing_map = {row['url']: row for row in existing_res.data}
-                
-                new_pages = []
-                
-                for p in pages_to_insert:
-                    url = p['url']
-                    if url in existing_map:
-                        # Update existing page if title is missing or we have a better one
-                        existing_row = existing_map[url]
-                        existing_data = existing_row.get('tech_audit_data') or {}
-                        new_data = p.get('tech_audit_data') or {}
-                        
-                        # If existing has no title, or we want to refresh it
-                        if not existing_data.get('title') or new_data.get('title') != 'Untitled Product':
-                            # Merge data
-                            updated_data = existing_data.copy()
-                            updated_data.update(new_data)
-                            
-                            # Only update if changed
-                            if updated_data != existing_data:
-                                print(f"Updating title for {url}")
-                                supabase.table('pages').update({'tech_audit_data': updated_data}).eq('id', existing_row['id']).execute()
-                    else:
-                        new_pages.append(p)
-                
-                # 2. Insert only new pages
-                if new_pages:
-                    print(f"Inserting {len(new_pages)} new pages...")
-                    batch_size = 100
-                    for i in range(0, len(new_pages), batch_size):
-                        batch = new_pages[i:i+batch_size]
-                        supabase.table('pages').insert(batch).execute()
-                    
-                #3. Update project page_count field
-                total_pages = supabase.table('pages').select('*', count='exact').eq('project_id', project_id).execute()
-                supabase.table('projects').update({
-                    'page_count': total_pages.count
-                }).eq('id', project_id).execute()
-                print(f"Updated project page_count to {total_pages.count}")
-        else:
-            print("Audit disabled. Skipping crawl.")
-                
-        return jsonify({
-            "message": "Project setup complete",
-            "profile": profile_insert,
-            "strategy_plan": strategy_plan,
-            "pages_found": len(pages_to_insert),
-            "audit_run": do_audit
-        })
+        if stream:
+            return sse_response(dag.events(finish=lambda results, status: {"result": _setup_response(results, status, do_audit)}))
+        
+        results, status = dag.run(on_event=lambda e: print(f"DEBUG: Setup {e.get('step', e['event'])}: {e.get('status', '')}"))
+        payload = _setup_response(results, status, do_audit)
+        if payload.get('failed_steps') and len(payload['failed_steps']) == len(status):
+            return jsonify(dict(payload, error=payload['message'])), 500
+        return jsonify(payload)
 
     except Exception as e:
         print(f"Error in run_project_setup: {e}")
         return jsonify({"error": str(e)}), 500
 
+def funnel_prompt(profile, page, current_stage, target_stage):
+    """Gemini prompt for 5 content ideas one funnel stage above `page` (JSON list out)."""
+    return f"""
+    You are a strategic SEO expert for this business:
+    Summary: {profile.get('business_summary')}
+    ICP: {profile.get('ideal_customer_profile')}
+    
+    We are building a Content Funnel.
+    Current Page ({current_stage}): {page.get('title')} ({page.get('url')})
+    
+    Task: Generate 5 high-impact "{target_stage}" content ideas that will drive traffic to this Current Page.
+    
+    Definitions:
+    - If Target is MoFu (Middle of Funnel): Generate "Comparison", "Best X for Y", or "Alternative to Z" articles. These help users evaluate options.
+    - If Target is ToFu (Top of Funnel): Generate "How-to", "What is", or "Guide" articles. These help users understand the problem.
+    
+    Output JSON format:
+    [
+        {{
+            "topic_title": "Title of the article",
+            "primary_keyword": "Main SEO keyword",
+            "rationale": "Why this drives traffic to the parent page"
+        }}
+    ]
+    """
+
+def funnel_rows(ideas, keyword_data, project_id, page_id, target_stage):
+    """(content_briefs rows, placeholder Topic pages rows) for generated funnel ideas."""
+    briefs_to_insert = []
+    for idea in ideas:
+        kw = idea.get('primary_keyword')
+        data = keyword_data.get(kw, {})
+        
+        briefs_to_insert.append({
+            "project_id": project_id,
+            "topic_title": idea.get('topic_title'),
+            "primary_keyword": kw,
+            "rationale": idea.get('rationale'),
+            "parent_page_id": page_id, 
+            "status": "Proposed",
+            "funnel_stage": target_stage,
+            "meta_data": data # Store volume/kd here
+        })
+    
+    pages_to_insert = []
+    for brief in briefs_to_insert:
+        pages_to_insert.append({
+            "project_id": project_id,
+            "url": f"pending-slug-{uuid.uuid4()}", # Placeholder URL
+            "page_type": "Topic",
+            "funnel_stage": target_stage,
+            "source_page_id": page_id,
+            "tech_audit_data": {"title": brief['topic_title']},
+            "content_description": brief['rationale'],
+            "keywords": brief['primary_keyword']
+        })
+    return briefs_to_insert, pages_to_insert
+
 @app.route('/api/generate-funnel', methods=['POST'])
 def generate_funnel():
     if not supabase:
@@ -1708,35 +1694,18 @@ def generate_funnel():
         print(f"Generating {target_stage} strategy for {page.get('url')}...")
         
         # 2. Prompt Gemini
-        prompt = f"""
-        You are a strategic SEO expert for this business:
-        Summary: {profile.get('business_summary')}
-        ICP: {profile.get('ideal_customer_profile')}
-        
-        We are building a Content Funnel.
-        Current Page ({current_stage}): {page.get('title')} ({page.get('url')})
-        
-        Task: Generate 5 high-impact "{target_stage}" content ideas that will drive traffic to this Current Page.
-        
-        Definitions:
-        - If Target is MoFu (Middle of Funnel): Generate "Comparison", "Best X for Y", or "Alternative to Z" articles. These help users evaluate options.
-        - If Target is ToFu (Top of Funnel): Generate "How-to", "What is", or "Guide" articles. These help users understand the problem.
-        
-        Output JSON format:
-        [
-            {{
-                "topic_title": "Title of the article",
-                "primary_keyword": "Main SEO keyword",
-                "rationale": "Why this drives traffic to the parent page"
-            }}
-        ]
-        """
+        prompt = funnel_prompt(profile, page, current_stage, target_stage)
         
         model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        response = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
+        generation_config = {"response_mime_type": "application/json"}
+        response_text = cached_generate(
+            'gemini-2.0-flash-exp', prompt,
+            lambda: scheduled_call('gemini', model.generate_content, prompt, generation_config=generation_config),
+            config=generation_config
+        )
         
         # 3. Parse and Save
-        ideas = json.loads(response.text)
+        ideas = json.loads(response_text)
         
         # 4. Enrich with DataForSEO (Optional)
         try:
@@ -1746,39 +1715,12 @@ def generate_funnel():
             print(f"DataForSEO Error: {e}")
             keyword_data = {}
 
-        briefs_to_insert = []
-        for idea in ideas:
-            kw = idea.get('primary_keyword')
-            data = keyword_data.get(kw, {})
-            
-            briefs_to_insert.append({
-                "project_id": project_id,
-                "topic_title": idea.get('topic_title'),
-                "primary_keyword": kw,
-                "rationale": idea.get('rationale'),
-                "parent_page_id": page_id, 
-                "status": "Proposed",
-                "funnel_stage": target_stage,
-                "meta_data": data # Store volume/kd here
-            })
+        briefs_to_insert, pages_to_insert = funnel_rows(ideas, keyword_data, project_id, page_id, target_stage)
             
         if briefs_to_insert:
             supabase.table('content_briefs').insert(briefs_to_insert).execute()
             
             # SYNC TO PAGES TABLE (Fix for Dashboard Visibility)
-            pages_to_insert = []
-            for brief in briefs_to_insert:
-                pages_to_insert.append({
-                    "project_id": project_id,
-                    "url": f"pending-slug-{uuid.uuid4()}", # Placeholder URL
-                    "page_type": "Topic",
-                    "funnel_stage": target_stage,
-                    "source_page_id": page_id,
-                    "tech_audit_data": {"title": brief['topic_title']},
-                    "content_description": brief['rationale'],
-                    "keywords": brief['primary_keyword']
-                })
-            
             if pages_to_insert:
                 print(f"Syncing {len(pages_to_insert)} topics to pages table...")
                 supabase.table('pages').insert(pages_to_insert).execute()
@@ -1792,7 +1734,8 @@ def generate_funnel():
         print(f"Error in generate_funnel: {e}")
         return jsonify({"error": str(e)}), 500
 
-def fetch_keyword_data(keywords):
+def fetch_keyword_data(keywords, location_code=2840, language_code="en"):
+    """Search volumes for `keywords` ({keyword: {"volume": n}}), served from the keyword cache where possible."""
     if not keywords: 
         print("No keywords provided to fetch_keyword_data")
         return {}
@@ -1800,31 +1743,37 @@ def fetch_keyword_data(keywords):
     login = os.environ.get('DATAFORSEO_LOGIN')
     password = os.environ.get('DATAFORSEO_PASSWORD')
     
-    print(f"DataForSEO Login: {login}, Password: {'*' * len(password) if password else 'None'}")
-    
     if not login or not password:
         print("DataForSEO credentials missing")
         return {}
-        
-    url = "https://api.dataforseo.com/v3/dataforseo_labs/google/keyword_ideas/live"
     
-    # We can use 'keyword_ideas' or 'keywords_for_site' or just 'search_volume'
+    # Concurrent callers' misses are merged into one batched task (see keyword_cache.py)
+    return get_keyword_cache().lookup_volumes(keywords, location_code, language_code, _fetch_search_volume_batch)
+
+def _fetch_search_volume_batch(keywords, location_code, language_code):
+    """One historical_search_volume task. Returns {normalized keyword: {"volume": n}}, or None on failure."""
+    login = os.environ.get('DATAFORSEO_LOGIN')
+    password = os.environ.get('DATAFORSEO_PASSWORD')
+    
     # 'search_volume' is best for specific lists.
     url = "https://api.dataforseo.com/v3/dataforseo_labs/google/historical_search_volume/live"
     
     payload = [{
         "keywords": keywords,
-        "location_code": 2840, # US
-        "language_code": "en"
+        "location_code": location_code,
+        "language_code": language_code
     }]
     
     try:
         print(f"Fetching keyword data for {len(keywords)} keywords: {keywords[:3]}...")
-        response = requests.post(url, auth=(login, password), json=payload)
+        response = scheduled_call('dataforseo', requests.post, url, auth=(login, password), json=payload)
         res_data = response.json()
         
         print(f"DataForSEO Response Status: {response.status_code}")
-        print(f"DataForSEO Response: {res_data}")
+        
+        if res_data.get('status_code') != 20000:
+            print(f"DataForSEO Response: {res_data}")
+            return None
         
         result = {}
         if res_data.get('tasks') and len(res_data['tasks']) > 0:
@@ -1833,8 +1782,8 @@ def fetch_keyword_data(keywords):
                 for item in task_result:
                     kw = item.get('keyword')
                     vol = item.get('search_volume', 0)
-                    result[kw] = {"volume": vol}
-                    print(f"Keyword '{kw}': Volume = {vol}")
+                    result[normalize_keyword(kw)] = {"volume": vol}
+                print(f"Got volumes for {len(result)} of {len(keywords)} keywords")
             else:
                 print("No result in task")
         else:
@@ -1846,7 +1795,7 @@ def fetch_keyword_data(keywords):
         print(f"DataForSEO Request Failed: {e}")
         import traceback
         traceback.print_exc()
-        return {}
+        return None
 
 def validate_and_enrich_keywords(ai_keywords_str, topic_title, min_volume=100):
     """
@@ -1908,8 +1857,11 @@ def validate_and_enrich_keywords(ai_keywords_str, topic_title, min_volume=100):
                     "limit": 10
                 }]
                 
-                response = requests.post(url, auth=(login, password), json=payload)
-                res_data = response.json()
+                cache_key = f"{normalize_keyword(topic_title)}|min_volume={min_volume}|limit=10"
+                res_data = get_keyword_cache().cached_response(
+                    'keyword_ideas', cache_key, 2840, 'en',
+                    lambda: scheduled_call('dataforseo', requests.post, url, auth=(login, password), json=payload).json()
+                )
                 
                 if res_data.get('tasks') and res_data['tasks'][0].get('result'):
                     for item in res_data['tasks'][0]['result'][0].get('items', []):
@@ -1956,7 +1908,7 @@ def analyze_serp_for_keyword(keyword, location_code=2840):
         }]
         
         print(f"Analyzing SERP for '{keyword}'...")
-        response = requests.post(url, auth=(login, password), json=payload)
+        response = scheduled_call('dataforseo', requests.post, url, auth=(login, password), json=payload)
         data = response.json()
         
         competitors = []
@@ -2030,7 +1982,7 @@ def perform_gemini_research(topic, location="US", language="English"):
         }}
         """
         # NOTE: Cannot use response_mime_type="application/json" with Tools (Grounding)
-        response = client.models.generate_content(
+        response = scheduled_call('gemini', client.models.generate_content,
             model="gemini-2.5-flash",
             contents=prompt,
             config=types.GenerateContentConfig(
@@ -2195,7 +2147,7 @@ def research_with_perplexity(query, location="US", language="English"):
         log_debug(f"Calling Perplexity API with query: {query[:50]}...")
         print(f"Researching with Perplexity: {query[:100]}...")
         # Increased timeout to 120s for deep research
-        response = requests.post(url, headers=headers, json=payload, timeout=120)
+        response = scheduled_call('perplexity', requests.post, url, headers=headers, json=payload, timeout=120)
         log_debug(f"Perplexity response status: {response.status_code}")
         
         data = response.json()
@@ -2251,9 +2203,12 @@ def get_keyword_ideas(seed_keyword, location_code=2840, min_volume=100, limit=20
         
         print(f"Finding keyword ideas for '{seed_keyword}'...")
         log_debug(f"DataForSEO request: seed='{seed_keyword}', location={location_code}, min_vol={min_volume}")
-        response = requests.post(url, auth=(login, password), json=payload, timeout=30)
-        log_debug(f"DataForSEO status: {response.status_code}")
-        data = response.json()
+        def request_ideas():
+            response = scheduled_call('dataforseo', requests.post, url, auth=(login, password), json=payload, timeout=30)
+            log_debug(f"DataForSEO status: {response.status_code}")
+            return response.json()
+        
+        data = get_keyword_cache().cached_response('keyword_ideas', normalize_keyword(seed_keyword), location_code, 'en', request_ideas)
         
         keywords = []
         if data.get('tasks') and data['tasks'][0].get('result') and data['tasks'][0]['result'][0].get('items'):
@@ -2341,7 +2296,7 @@ def get_serp_competitors(keyword, location_code=2840, limit=5):
         }]
         
         log_debug(f"SERP API: Finding competitors for '{keyword}'")
-        response = requests.post(url, auth=(login, password), json=payload, timeout=30)
+        response = scheduled_call('dataforseo', requests.post, url, auth=(login, password), json=payload, timeout=30)
         log_debug(f"SERP API status: {response.status_code}")
         
         data = response.json()
@@ -2409,10 +2364,12 @@ def get_ranked_keywords_for_url(target_url, location_code=2840, limit=100):
         }]
         
         log_debug(f"Ranked Keywords API: Getting keywords for '{target_url[:50]}...'")
-        response = requests.post(url, auth=(login, password), json=payload, timeout=30)
-        log_debug(f"Ranked Keywords API status: {response.status_code}")
+        def request_ranked():
+            response = scheduled_call('dataforseo', requests.post, url, auth=(login, password), json=payload, timeout=30)
+            log_debug(f"Ranked Keywords API status: {response.status_code}")
+            return response.json()
         
-        data = response.json()
+        data = get_keyword_cache().cached_response('ranked_keywords', f"{target_url}|limit={limit}", location_code, 'en', request_ranked)
         
         keywords = []
         if data.get('tasks') and data['tasks'][0].get('result'):
@@ -2444,36 +2401,18 @@ def get_ranked_keywords_for_url(target_url, location_code=2840, limit=100):
                         
                     log_debug(f"Keeping {domain} (Rank {position})")
                     
-                    # Classify intent
-                    kw_lower = keyword.lower()
-                    intents = []
-                    
-                    # Try to get intent from API
-                    api_intent = item.get('keyword_data', {}).get('keyword_info', {}).get('search_intent')
-                    if api_intent:
-                        intent_str = api_intent
-                    else:
-                        # Fallback to rule-based
-                        intents = []
-                        if any(w in kw_lower for w in ['buy', 'price', 'shop', 'purchase', 'order', 'discount', 'sale', 'deal', 'cheap', 'cost']):
-                            intents.append('transactional')
-                        if any(w in kw_lower for w in ['best', 'top', 'review', 'vs', 'compare', 'alternative', 'guide', 'list', 'ranking']):
-                            intents.append('commercial')
-                        if any(w in kw_lower for w in ['what', 'how', 'benefits', 'made from', 'function', 'define', 'meaning', 'examples']):
-                            intents.append('informational')
-                        
-                        if not intents:
-                            intents.append('informational')
-                        
-                        intent_str = ', '.join(intents)
-                    
                     if keyword:
                         keywords.append({
                             'keyword': keyword,
-                            'intent': intent_str,
+                            # Intent from the API when it has one, else the shared rule-based classifier (below)
+                            'intent': item.get('keyword_data', {}).get('keyword_info', {}).get('search_intent'),
                             'position': position
                         })
         
+        unlabeled = [k for k in keywords if not k['intent']]
+        for k, intent in zip(unlabeled, classify_intents([k['keyword'] for k in unlabeled])):
+            k['intent'] = intent.label
+        
         log_debug(f"Ranked Keywords API returned {len(keywords)} keywords")
         return keywords
         
@@ -2487,7 +2426,6 @@ def get_ranked_keywords_for_url(target_url, location_code=2840, limit=100):
 
 
 
-import uuid # Added for filename generation
 
 @app.route('/api/upload', methods=['POST'])
 def upload_image():
@@ -2549,7 +2487,7 @@ def generate_image_endpoint():
         
         print(f"Generating image for prompt: {prompt}")
         
-        response = client.models.generate_content(
+        response = scheduled_call('gemini', client.models.generate_content,
             model="gemini-2.5-flash-image",
             contents=prompt,
             config=types.GenerateContentConfig(
@@ -2603,8 +2541,36 @@ def generate_image_endpoint():
 
 
 
+def article_v2_prompt(profile, parent_page, topic, keyword):
+    """Article prompt in the business's voice, with a required link to the parent (product) page."""
+    return f"""
+    You are a professional content writer for this business:
+    Summary: {profile.get('business_summary')}
+    ICP: {profile.get('ideal_customer_profile')}
+    Voice: {profile.get('brand_voice')}
+    
+    Task: Write a high-quality, SEO-optimized article.
+    Title: {topic}
+    Primary Keyword: {keyword}
+    
+    CRITICAL INSTRUCTION - INTERNAL LINKING:
+    You MUST include a natural, persuasive link to our product page within the content.
+    Product Page URL: {parent_page.get('url')}
+    Product Name: {parent_page.get('title', 'our product')}
+    
+    The link should not be "Click here". It should be contextual, e.g., "For the best solution, check out [Product Name]." or "Many experts recommend [Product Name] for this."
+    
+    Format: Markdown.
+    Structure:
+    - H1 Title
+    - Introduction (Hook the ICP)
+    - Body Paragraphs (H2s and H3s)
+    - Conclusion
+    """
+
 @app.route('/api/write-article-v2', methods=['POST'])
 def write_article_v2():
+    """Article with a link to the parent page; streams like /api/write-article when asked to."""
     if not supabase:
         return jsonify({"error": "Supabase not configured"}), 500
         
@@ -2630,34 +2596,15 @@ def write_article_v2():
         print(f"Writing article '{topic}' for project {project_id}...")
             
         # 2. Construct Prompt
-        prompt = f"""
-        You are a professional content writer for this business:
-        Summary: {profile.get('business_summary')}
-        ICP: {profile.get('ideal_customer_profile')}
-        Voice: {profile.get('brand_voice')}
-        
-        Task: Write a high-quality, SEO-optimized article.
-        Title: {topic}
-        Primary Keyword: {keyword}
-        
-        CRITICAL INSTRUCTION - INTERNAL LINKING:
-        You MUST include a natural, persuasive link to our product page within the content.
-        Product Page URL: {parent_page.get('url')}
-        Product Name: {parent_page.get('title', 'our product')}
-        
-        The link should not be "Click here". It should be contextual, e.g., "For the best solution, check out [Product Name]." or "Many experts recommend [Product Name] for this."
-        
-        Format: Markdown.
-        Structure:
-        - H1 Title
-        - Introduction (Hook the ICP)
-        - Body Paragraphs (H2s and H3s)
-        - Conclusion
-        """
+        prompt = article_v2_prompt(profile, parent_page, topic, keyword)
         
         # 3. Generate
         model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        response = model.generate_content(prompt)
+        if wants_stream(data):
+            chunks = scheduled_stream('gemini', model.generate_content, prompt, stream=True)
+            return sse_response(article_events(chunks, finish=lambda article: {"meta": {"linked_to": parent_page.get('url')}}))
+
+        response = scheduled_call('gemini', model.generate_content, prompt)
         
         content = response.text
         
@@ -2747,7 +2694,7 @@ def generate_image():
         # Use Gemini 2.5 Flash Image model as requested
         model = genai.GenerativeModel('gemini-2.5-flash-image')
         
-        response = model.generate_content(prompt)
+        response = scheduled_call('gemini', model.generate_content, prompt)
         
         # Check if we have a valid response
         if not response or not response.parts:
@@ -2788,19 +2735,39 @@ def generate_image():
         print(error_msg)
         return jsonify({"error": error_msg}), 500
 
-def scrape_page_content(url):
+def scrape_page_content(url, previous=None):
     """
     Scrapes a URL and returns structured content including body text, title, and meta data.
-    Uses BeautifulSoup and Gemini for intelligent extraction.
+    The local extractor (content_extractor.py) handles most pages; Gemini is only asked when
+    its confidence is below EXTRACTOR_MIN_CONFIDENCE.
+
+    `previous` is the page's stored tech_audit_data. When it holds an earlier extraction, the
+    fetch is conditional (ETag / Last-Modified) and the model is skipped if the page answers
+    304 or the cleaned HTML hashes the same; the result then has "unchanged": True.
     """
     try:
         import requests
-        from bs4 import BeautifulSoup
         
-        # Use fetch_with_curl for robustness against bot protection
-        content, latency = fetch_with_curl(url)
-        
-        # Fallback to requests if curl fails
+        previous = previous or {}
+        scrape_cache = previous.get('scrape_cache') or {}
+        reusable = bool(previous.get('body_content')) and bool(scrape_cache)
+        
+        conditional_headers = {}
+        if reusable:
+            if scrape_cache.get('etag'):
+                conditional_headers['If-None-Match'] = scrape_cache['etag']
+            if scrape_cache.get('last_modified'):
+                conditional_headers['If-Modified-Since'] = scrape_cache['last_modified']
+        
+        # Pooled fetcher with browser-like headers for robustness against bot protection
+        result = get_fetcher().fetch_with_fallback(url, headers=conditional_headers or None)
+        if result.status_code == 304 and reusable:
+            print(f"DEBUG: {url} not modified (304), reusing stored extraction")
+            return _reuse_extraction(previous, scrape_cache)
+        content = result.content if result.content and result.status_code < 400 else None
+        response_headers = {k.lower(): v for k, v in (result.headers or {}).items()}
+        
+        # Fallback to requests if the fetcher fails
         if not content:
             print(f"DEBUG: curl failed for {url}, falling back to requests...")
             try:
@@ -2810,7 +2777,7 @@ def scrape_page_content(url):
                 resp = requests.get(url, headers=headers, timeout=30)
                 if resp.status_code == 200:
                     content = resp.text
-                    latency = resp.elapsed.total_seconds()
+                    response_headers = {k.lower(): v for k, v in resp.headers.items()}
                     print(f"DEBUG: requests fallback successful for {url}")
             except Exception as req_err:
                 print(f"DEBUG: requests fallback failed: {req_err}")
@@ -2818,82 +2785,42 @@ def scrape_page_content(url):
         if not content:
             return None
 
-        soup = BeautifulSoup(content, 'html.parser')
-        
-        # 0. Extract Title (Before cleaning)
-        page_title = None
-        if soup.title:
-            page_title = soup.title.get_text(strip=True)
-            
-        # Fallback to og:title
-        if not page_title:
-            meta_title = soup.find('meta', attrs={'property': 'og:title'})
-            if meta_title:
-                page_title = meta_title.get('content')
-                
-        # Fallback to H1
-        if not page_title:
-            h1 = soup.find('h1')
-            if h1:
-                page_title = h1.get_text(strip=True)
-        
-        # 0. Extract JSON-LD (Structured Data)
-        json_ld_content = ""
-        try:
-            json_scripts = soup.find_all('script', type='application/ld+json')
-            for script in json_scripts:
-                if script.string:
-                    try:
-                        data = json.loads(script.string)
-                        if isinstance(data, list):
-                            for item in data:
-                                if item.get('@type') == 'Product':
-                                    json_ld_content += f"\nJSON-LD Product Data:\nName: {item.get('name')}\nDescription: {item.get('description')}\n"
-                        elif isinstance(data, dict):
-                            if data.get('@type') == 'Product':
-                                json_ld_content += f"\nJSON-LD Product Data:\nName: {data.get('name')}\nDescription: {data.get('description')}\n"
-                    except: pass
-        except: pass
-
-        # 0.5 Extract Meta Descriptions
-        meta_description = ""
-        try:
-            meta_desc = soup.find('meta', attrs={'name': 'description'}) or soup.find('meta', attrs={'property': 'og:description'})
-            if meta_desc:
-                meta_description = meta_desc.get('content', '')
-        except: pass
-
-        # 0.6 Explicitly Extract .short-description
-        short_desc_text = ""
-        try:
-            short_div = soup.find(class_='short-description')
-            if short_div:
-                short_desc_text = short_div.get_text(strip=True)
-        except: pass
-
-        # 1. Minimal Cleaning
-        for unwanted in soup(["script", "style", "svg", "noscript", "iframe", "object", "embed", "applet", "link", "meta"]):
-            unwanted.decompose()
+        # Title, meta, JSON-LD/microdata and a scored markdown body in one lxml parse
+        extracted = extract_content(content, url)
+        if extracted is None:
+            return None
+        page_title = extracted['title']
+        json_ld_content = extracted['json_ld']
+        meta_description = extracted['meta_description']
+        short_desc_text = extracted['short_description']
+        
+        # Visible text + everything the extraction prompt sees; same hash => same extraction
+        new_cache = {
+            "etag": response_headers.get('etag'),
+            "last_modified": response_headers.get('last-modified'),
+            "content_hash": extracted['fingerprint']
+        }
+        if reusable and scrape_cache.get('content_hash') == extracted['fingerprint']:
+            print(f"DEBUG: {url} content unchanged, skipping LLM extraction")
+            reused = _reuse_extraction(previous, new_cache)
+            reused.update({"title": page_title or reused['title'], "json_ld": json_ld_content})
+            return reused
+        
+        # Confident local extraction: no model call
+        if extracted['confidence'] >= EXTRACTOR_MIN_CONFIDENCE:
+            print(f"DEBUG: Local extraction for {url} ({extracted['page_type']}, confidence {extracted['confidence']})")
+            return {
+                "title": page_title,
+                "body_content": extracted['markdown'],
+                "meta_description": meta_description,
+                "json_ld": json_ld_content,
+                "scrape_cache": new_cache,
+                "extraction": {"method": "local", "confidence": extracted['confidence'], "page_type": extracted['page_type']},
+                "unchanged": False
+            }
         
-        for tag in soup.find_all(['nav', 'footer', 'aside']):
-            tag.decompose()
-            
-        noise_headings = ['related', 'you may also like', 'stories', 'intentional living', 'blog', 'latest news', 'articles']
-        for header in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-            text = header.get_text().lower()
-            if any(x in text for x in noise_headings):
-                parent = header.parent
-                for _ in range(3):
-                    if parent:
-                        if parent.name in ['section', 'div', 'aside']:
-                            parent.decompose()
-                            break
-                        parent = parent.parent
-
-        for tag in soup.find_all(True):
-            tag.attrs = {}
-            
-        cleaned_html = str(soup.body)[:150000] 
+        print(f"DEBUG: Local extraction confidence {extracted['confidence']} for {url}, falling back to Gemini")
+        cleaned_html = clean_html_for_llm(content)
         
         body_content = ""
         try:
@@ -2922,13 +2849,16 @@ def scrape_page_content(url):
             HTML Snippet: {cleaned_html}
             """
             
-            llm_response = extract_model.generate_content(extraction_prompt)
-            body_content = llm_response.text.strip()
+            # Re-scraping an unchanged page produces the same prompt, so this is served from the cache
+            body_content = cached_generate(
+                'gemini-2.0-flash-exp', extraction_prompt,
+                lambda: scheduled_call('gemini', extract_model.generate_content, extraction_prompt)
+            ).strip()
             body_content = body_content.replace('```markdown', '').replace('```', '').strip()
             
         except Exception as e:
             print(f"LLM Extraction failed: {e}")
-            body_content = soup.get_text(separator='\n\n', strip=True)
+            body_content = extracted['markdown']
         
         if not body_content:
              body_content = "Could not extract meaningful content"
@@ -2937,13 +2867,27 @@ def scrape_page_content(url):
             "title": page_title,
             "body_content": body_content,
             "meta_description": meta_description,
-            "json_ld": json_ld_content
+            "json_ld": json_ld_content,
+            "scrape_cache": new_cache,
+            "extraction": {"method": "gemini", "confidence": extracted['confidence'], "page_type": extracted['page_type']},
+            "unchanged": False
         }
 
     except Exception as e:
         print(f"Scraping error: {e}")
         return None
 
+def _reuse_extraction(previous, scrape_cache):
+    """scrape_page_content result built from a page's stored extraction."""
+    return {
+        "title": previous.get('title'),
+        "body_content": previous['body_content'],
+        "meta_description": previous.get('meta_description', ''),
+        "json_ld": "",
+        "scrape_cache": scrape_cache,
+        "unchanged": True
+    }
+
 @app.route('/api/crawl-project', methods=['POST'])
 def crawl_project_endpoint():
     if not supabase:
@@ -3001,7 +2945,7 @@ def generate_content_via_rest(prompt, api_key, model="gemini-2.5-pro", use_groun
         }]
         
     try:
-        response = requests.post(url, headers=headers, json=data, timeout=60)
+        response = scheduled_call('gemini', requests.post, url, headers=headers, json=data, timeout=60)
         response.raise_for_status()
         result = response.json()
         
@@ -3018,126 +2962,67 @@ def generate_content_via_rest(prompt, api_key, model="gemini-2.5-pro", use_groun
              print(f"DEBUG: Response content: {response.text}")
         raise e
 
-@app.route('/api/batch-update-pages', methods=['POST'])
-def batch_update_pages():
-    print(f"====== BATCH UPDATE PAGES CALLED ======", flush=True)
-    log_debug("Entered batch_update_pages route")
-    log_debug(f"Entered batch_update_pages route")
-    if not supabase: return jsonify({"error": "Supabase not configured"}), 500
-    
+def generate_content_for_page(page_id, api_key=None, on_event=None):
+    """
+    Rewrite one page's content (Product/Category) or write the article (Topic) with Gemini.
+    With `on_event`, Topic articles are streamed: 'chunk' and 'meta' events as the text arrives,
+    then 'complete' once the article is saved to pages.content.
+    """
+    api_key = api_key or os.environ.get("GEMINI_API_KEY")
+    log_debug(f"Generating content for page: {page_id}")
+    client_with_grounding = genai_new.Client(api_key=api_key)
+    tool = types.Tool(google_search=types.GoogleSearch())
+
+    # 1. Get Page Data (from the job's prefetched rows when run as a batch)
+    loader = current_loader(supabase)
+    page = loader.page(page_id)
+    if not page: return
+
+    # 2. Get existing content
+    existing_content = page.get('tech_audit_data', {}).get('body_content', '')
+    if not existing_content:
+        # If no body content, try to scrape it now
+        # If no body content, try to scrape it now using robust scraper
+        job_stage('scrape')
+        try:
+            scraped_data = scrape_page_content(page['url'])
+            if scraped_data and scraped_data.get('body_content'):
+                existing_content = scraped_data['body_content']
+                # Update DB with scraped content
+                current_tech = page.get('tech_audit_data', {})
+                current_tech['body_content'] = existing_content
+                current_tech['scrape_cache'] = scraped_data['scrape_cache']
+                supabase.table('pages').update({"tech_audit_data": current_tech}).eq('id', page_id).execute()
+                log_debug(f"Scraped missing content for {page['url']}")
+            else:
+                existing_content = "No content available"
+        except Exception as e:
+            print(f"Error scraping content for {page['url']}: {e}")
+            existing_content = "No content available"
+
+    # 3. Generate improved content
+    job_stage('generate')
+    page_title = page.get('tech_audit_data', {}).get('title', page.get('url', ''))
+    page_type = page.get('page_type', 'page')
+
+    # Fetch Project Settings for Localization
+    project_loc = 'US'
+    project_lang = 'English'
     try:
-        data = request.json
-        log_debug(f"Received batch update data: {data}")
-        page_ids = data.get('page_ids', [])
-        action = data.get('action')
-        
-        if not page_ids or not action:
-            return jsonify({"error": "page_ids and action required"}), 400
-            
-        if action == 'trigger_audit':
-            # In a real app, this would trigger a background job
-            supabase.table('pages').update({"audit_status": "Pending"}).in_('id', page_ids).execute()
-            
-        elif action == 'trigger_classification':
-            supabase.table('pages').update({"classification_status": "Pending"}).in_('id', page_ids).execute()
-            
-        elif action == 'approve_strategy':
-            supabase.table('pages').update({"approval_status": True}).in_('id', page_ids).execute()
-            
-        elif action == 'scrape_content':
-            # Scrape existing content for selected pages
-            for page_id in page_ids:
-                page_res = supabase.table('pages').select('*').eq('id', page_id).single().execute()
-                if not page_res.data: continue
-                page = page_res.data
-                
-                try:
-                    scraped_data = scrape_page_content(page['url'])
-                    
-                    if scraped_data:
-                        # Update tech_audit_data with body_content AND title
-                        current_tech_data = page.get('tech_audit_data', {})
-                        current_tech_data['body_content'] = scraped_data['body_content']
-                        
-                        if not current_tech_data.get('title') or current_tech_data.get('title') == 'Untitled':
-                             current_tech_data['title'] = scraped_data['title'] or get_title_from_url(page['url'])
-                        
-                        supabase.table('pages').update({
-                            "tech_audit_data": current_tech_data
-                        }).eq('id', page_id).execute()
-                        print(f"✓ Scraped content for {page['url']}")
-                    else:
-                        print(f"⚠ Failed to scrape {page['url']}")
-                        
-                except Exception as e:
-                    print(f"Error scraping page {page_id}: {e}")
-            
-            return jsonify({"message": "Content scraped successfully"})
-        elif action == 'generate_content':
-            # Async processing to avoid timeouts
-            import threading
-            
-            def process_content_generation(page_ids, api_key):
-                log_debug(f"Background thread started for pages: {page_ids}")
-                # Re-initialize client inside thread to be safe
-                client_with_grounding = genai_new.Client(api_key=api_key)
-                tool = types.Tool(google_search=types.GoogleSearch())
-                
-                # Legacy model for Topic pages (Removed - using new SDK below)
-                # model = genai.GenerativeModel('gemini-2.0-flash-exp')
-                
-                for page_id in page_ids:
-                    # 1. Get Page Data
-                    page_res = supabase.table('pages').select('*').eq('id', page_id).single().execute()
-                    if not page_res.data: continue
-                    page = page_res.data
-                    
-                    # 2. Get existing content
-                    existing_content = page.get('tech_audit_data', {}).get('body_content', '')
-                    if not existing_content:
-                        # If no body content, try to scrape it now
-                        # If no body content, try to scrape it now using robust scraper
-                        try:
-                            scraped_data = scrape_page_content(page['url'])
-                            if scraped_data and scraped_data.get('body_content'):
-                                existing_content = scraped_data['body_content']
-                                # Update DB with scraped content
-                                current_tech = page.get('tech_audit_data', {})
-                                current_tech['body_content'] = existing_content
-                                supabase.table('pages').update({"tech_audit_data": current_tech}).eq('id', page_id).execute()
-                                log_debug(f"Scraped missing content for {page['url']}")
-                            else:
-                                existing_content = "No content available"
-                        except Exception as e:
-                            print(f"Error scraping content for {page['url']}: {e}")
-                            existing_content = "No content available"
-                    
-                    # 3. Generate improved content
-                    page_title = page.get('tech_audit_data', {}).get('title', page.get('url', ''))
-                    page_type = page.get('page_type', 'page')
+        project_loc, project_lang = loader.project_settings(page['project_id'])
+        log_debug(f"Project settings: Loc={project_loc}, Lang={project_lang}")
+    except Exception as proj_err:
+        log_debug(f"Error fetching project settings: {proj_err}")
+        print(f"DEBUG: Project fetch failed: {proj_err}")
 
-                    # Fetch Project Settings for Localization
-                    project_loc = 'US'
-                    project_lang = 'English'
-                    try:
-                        log_debug(f"Fetching project settings for {page['project_id']}...")
-                        project_res = supabase.table('projects').select('location, language').eq('id', page['project_id']).single().execute()
-                        if project_res.data:
-                            project_loc = project_res.data.get('location', 'US')
-                            project_lang = project_res.data.get('language', 'English')
-                        log_debug(f"Project settings: Loc={project_loc}, Lang={project_lang}")
-                    except Exception as proj_err:
-                        log_debug(f"Error fetching project settings: {proj_err}")
-                        print(f"DEBUG: Project fetch failed: {proj_err}")
-                    
-                    try:
-                        log_debug(f"Checking page type for branching: '{page_type}'")
-                        # BRANCHING LOGIC: Product vs Category vs Topic
-                        if page_type and page_type.lower().strip() == 'product':
-                            log_debug("Entered Product generation block")
-                            # PRODUCT PROMPT (Sales & Conversion Focused - Conservative + Grounded)
-                            try:
-                                prompt = f"""You are an expert E-commerce Copywriter with access to live Google Search.
+    try:
+        log_debug(f"Checking page type for branching: '{page_type}'")
+        # BRANCHING LOGIC: Product vs Category vs Topic
+        if page_type and page_type.lower().strip() == 'product':
+            log_debug("Entered Product generation block")
+            # PRODUCT PROMPT (Sales & Conversion Focused - Conservative + Grounded)
+            try:
+                prompt = f"""You are an expert E-commerce Copywriter with access to live Google Search.
                             
     **TASK**: Polish and enhance the content for this **PRODUCT PAGE**. 
     **CRITICAL GOAL**: Improve clarity and persuasion WITHOUT changing the original length or structure significantly.
@@ -3179,29 +3064,29 @@ def batch_update_pages():
     -   Include a **Meta Description** at the top.
     -   Keep the original formatting (H1, H2, bullets) but polished.
     """
-                            except Exception as prompt_err:
-                                log_debug(f"Error constructing prompt: {prompt_err}")
-                                raise prompt_err
+            except Exception as prompt_err:
+                log_debug(f"Error constructing prompt: {prompt_err}")
+                raise prompt_err
 
-                            # Use REST API for Products to avoid SDK crash
-                            print(f"DEBUG: Generating content for Product: {page_title} using gemini-2.5-pro (REST)", flush=True)
-                            try:
-                                generated_text = generate_content_via_rest(
-                                    prompt=prompt,
-                                    api_key=api_key,
-                                    model="gemini-2.5-pro",
-                                    use_grounding=True
-                                )
-                                if not generated_text:
-                                    raise Exception("Empty response from Gemini REST API")
-                                print(f"DEBUG: Generation successful. Length: {len(generated_text)}", flush=True)
-                            except Exception as gen_err:
-                                print(f"DEBUG: Gemini generation failed: {gen_err}", flush=True)
-                                raise gen_err
-                            
-                        elif page_type.lower() == 'category':
-                            # CATEGORY PROMPT (Research-Backed SEO Enhancement - Grounded + Respect Length)
-                            prompt = f"""You are an expert E-commerce Copywriter & SEO Specialist.
+            # Use REST API for Products to avoid SDK crash
+            print(f"DEBUG: Generating content for Product: {page_title} using gemini-2.5-pro (REST)", flush=True)
+            try:
+                generated_text = generate_content_via_rest(
+                    prompt=prompt,
+                    api_key=api_key,
+                    model="gemini-2.5-pro",
+                    use_grounding=True
+                )
+                if not generated_text:
+                    raise Exception("Empty response from Gemini REST API")
+                print(f"DEBUG: Generation successful. Length: {len(generated_text)}", flush=True)
+            except Exception as gen_err:
+                print(f"DEBUG: Gemini generation failed: {gen_err}", flush=True)
+                raise gen_err
+
+        elif page_type.lower() == 'category':
+            # CATEGORY PROMPT (Research-Backed SEO Enhancement - Grounded + Respect Length)
+            prompt = f"""You are an expert E-commerce Copywriter & SEO Specialist.
 
     **TASK**: Enhance this **CATEGORY/COLLECTION PAGE** using real-time search data.
     **CRITICAL GOAL**: infuse the content with high-value SEO keywords and competitive insights while respecting the original length and structure.
@@ -3248,111 +3133,114 @@ def batch_update_pages():
     -   Return the full page content in Markdown.
     -   Include a **Meta Description** at the top.
     """
-                            # Use REST API for Categories too
-                            generated_text = generate_content_via_rest(
-                                prompt=prompt,
-                                api_key=api_key,
-                                model="gemini-2.5-pro",
-                                use_grounding=True
-                            )
-                            if not generated_text:
-                                raise Exception("Empty response from Gemini REST API")
-                            
-                        elif page_type == 'Topic':
-                            log_debug("Page type is Topic, skipping to Topic logic...")
-                            pass
-
-                        else:
-                            log_debug(f"WARNING: Unhandled page type: '{page_type}'")
-                            print(f"DEBUG: Unhandled page type: {page_type}", flush=True)
-
-                        # SHARED LOGIC FOR PRODUCT & CATEGORY (Clean & Save)
-                        if page_type.lower().strip() in ['product', 'category']:
-                            log_debug(f"Saving content for {page_type}...")
-                            # Clean markdown
-                            if generated_text.startswith('```markdown'): generated_text = generated_text[11:]
-                            if generated_text.startswith('```'): generated_text = generated_text[3:]
-                            if generated_text.endswith('```'): generated_text = generated_text[:-3]
-                            
-                            # Extract Meta Description
-                            meta_desc = None
-                            import re
-                            match = re.search(r'\*\*Meta Description\*\*:\s*(.*?)(?:\n|$)', generated_text)
-                            if match:
-                                meta_desc = match.group(1).strip()
-                            
-                            # Update tech_audit_data with new meta description
-                            current_tech_data = page.get('tech_audit_data') or {}
-                            if meta_desc:
-                                current_tech_data['meta_description'] = meta_desc
-                            
-                            # 4. Update DB
-                            supabase.table('pages').update({
-                                "content": generated_text.strip(),
-                                "product_action": "Idle", # Reset action
-                                "tech_audit_data": current_tech_data
-                            }).eq('id', page_id).execute()
-                            
-                            print(f"✓ Generated improved content for {page['url']}", flush=True)
-                            continue # Skip the rest of the loop for Product/Category
-
-                    except Exception as gen_error:
-                        print(f"✗ Error generating content for {page['url']}: {gen_error}", flush=True)
-
-                    # TOPIC LOGIC (MoFu/ToFu) - Now correctly placed outside the previous try/except
-                    if page_type == 'Topic':
-                        print(f"DEBUG: Generating content for Topic: {page_title}", flush=True)
-                        # TOPIC PROMPT (MoFu/ToFu - COMPLETE Google 2024/2025 Compliance)
-                        # Get research data for this topic
-                        research_data = page.get('research_data', {})
-                        keyword_cluster = research_data.get('keyword_cluster', [])
-                        primary_keyword = research_data.get('primary_keyword', page_title)
-                        perplexity_research = research_data.get('perplexity_research', '')
-                        citations = research_data.get('citations', [])
-                        funnel_stage = page.get('funnel_stage', '')
-                        source_page_id = page.get('source_page_id')
-                        
-                        # Get source/related pages for internal linking
-                        internal_links = []
-                        
-                        if source_page_id:
-                            try:
-                                # 1. Fetch Parent (MoFu or Product)
-                                parent_res = supabase.table('pages').select('id, url, tech_audit_data, source_page_id').eq('id', source_page_id).single().execute()
-                                if parent_res.data:
-                                    parent = parent_res.data
-                                    parent_title = parent.get('tech_audit_data', {}).get('title', parent.get('url'))
-                                    
-                                    # Link to Parent
-                                    if funnel_stage == 'MoFu':
-                                        internal_links.append(f"- {parent_title} (Main Product): {parent['url']}")
-                                    elif funnel_stage == 'ToFu':
-                                        internal_links.append(f"- {parent_title} (In-Depth Guide): {parent['url']}")
-                                        
-                                        # 2. Fetch Grandparent (Product) for ToFu
-                                        grandparent_id = parent.get('source_page_id')
-                                        if grandparent_id:
-                                            gp_res = supabase.table('pages').select('url, tech_audit_data').eq('id', grandparent_id).single().execute()
-                                            if gp_res.data:
-                                                gp_title = gp_res.data.get('tech_audit_data', {}).get('title', gp_res.data.get('url'))
-                                                internal_links.append(f"- {gp_title} (Main Product): {gp_res.data['url']}")
-        
-                            except Exception as e:
-                                print(f"Error fetching internal links: {e}")
-                        
-                        print(f"DEBUG: Internal Links for {page_title}: {internal_links}")
-                        links_str = '\n'.join(internal_links) if internal_links else "No internal links available"
-                                
-                        # Format keywords for prompt
-                        if keyword_cluster:
-                            kw_list = '\n'.join([f"- {kw['keyword']} ({kw['volume']}/mo, Score: {kw.get('score', 0)})" for kw in keyword_cluster[:15]])
-                        else:
-                            kw_list = f"- {primary_keyword}"
-                        
-                        # Format citations
-                        citations_str = '\n'.join([f"[{i+1}] {cite}" for i, cite in enumerate(citations[:10])]) if citations else "No citations available"
-                        
-                        prompt = f"""You are an expert SEO Content Writer following **Google's Complete Search Documentation** (2024/2025):
+            # Use REST API for Categories too
+            generated_text = generate_content_via_rest(
+                prompt=prompt,
+                api_key=api_key,
+                model="gemini-2.5-pro",
+                use_grounding=True
+            )
+            if not generated_text:
+                raise Exception("Empty response from Gemini REST API")
+
+        elif page_type == 'Topic':
+            log_debug("Page type is Topic, skipping to Topic logic...")
+            pass
+
+        else:
+            log_debug(f"WARNING: Unhandled page type: '{page_type}'")
+            print(f"DEBUG: Unhandled page type: {page_type}", flush=True)
+
+        # SHARED LOGIC FOR PRODUCT & CATEGORY (Clean & Save)
+        if page_type.lower().strip() in ['product', 'category']:
+            log_debug(f"Saving content for {page_type}...")
+            # Clean markdown
+            if generated_text.startswith('```markdown'): generated_text = generated_text[11:]
+            if generated_text.startswith('```'): generated_text = generated_text[3:]
+            if generated_text.endswith('```'): generated_text = generated_text[:-3]
+
+            # Extract Meta Description
+            meta_desc = None
+            import re
+            match = re.search(r'\*\*Meta Description\*\*:\s*(.*?)(?:\n|$)', generated_text)
+            if match:
+                meta_desc = match.group(1).strip()
+
+            # Update tech_audit_data with new meta description
+            current_tech_data = page.get('tech_audit_data') or {}
+            if meta_desc:
+                current_tech_data['meta_description'] = meta_desc
+
+            # 4. Update DB
+            job_stage('save')
+            supabase.table('pages').update({
+                "content": generated_text.strip(),
+                "product_action": "Idle", # Reset action
+                "tech_audit_data": current_tech_data
+            }).eq('id', page_id).execute()
+
+            print(f"✓ Generated improved content for {page['url']}", flush=True)
+            if on_event:
+                on_event({'event': 'complete', 'page_id': page_id, 'content': generated_text.strip(),
+                          'meta_description': meta_desc, 'saved': True})
+            return # Skip the rest of the loop for Product/Category
+
+    except Exception as gen_error:
+        print(f"✗ Error generating content for {page['url']}: {gen_error}", flush=True)
+        raise
+
+    # TOPIC LOGIC (MoFu/ToFu) - Now correctly placed outside the previous try/except
+    if page_type == 'Topic':
+        print(f"DEBUG: Generating content for Topic: {page_title}", flush=True)
+        # TOPIC PROMPT (MoFu/ToFu - COMPLETE Google 2024/2025 Compliance)
+        # Get research data for this topic
+        research_data = page.get('research_data', {})
+        keyword_cluster = research_data.get('keyword_cluster', [])
+        primary_keyword = research_data.get('primary_keyword', page_title)
+        perplexity_research = research_data.get('perplexity_research', '')
+        citations = research_data.get('citations', [])
+        funnel_stage = page.get('funnel_stage', '')
+        source_page_id = page.get('source_page_id')
+
+        # Get source/related pages for internal linking
+        internal_links = []
+
+        if source_page_id:
+            try:
+                # 1. Fetch Parent (MoFu or Product)
+                parent = loader.page(source_page_id)
+                if parent:
+                    parent_title = parent.get('tech_audit_data', {}).get('title', parent.get('url'))
+
+                    # Link to Parent
+                    if funnel_stage == 'MoFu':
+                        internal_links.append(f"- {parent_title} (Main Product): {parent['url']}")
+                    elif funnel_stage == 'ToFu':
+                        internal_links.append(f"- {parent_title} (In-Depth Guide): {parent['url']}")
+
+                        # 2. Fetch Grandparent (Product) for ToFu
+                        grandparent_id = parent.get('source_page_id')
+                        grandparent = loader.page(grandparent_id) if grandparent_id else None
+                        if grandparent:
+                            gp_title = grandparent.get('tech_audit_data', {}).get('title', grandparent.get('url'))
+                            internal_links.append(f"- {gp_title} (Main Product): {grandparent['url']}")
+
+            except Exception as e:
+                print(f"Error fetching internal links: {e}")
+
+        print(f"DEBUG: Internal Links for {page_title}: {internal_links}")
+        links_str = '\n'.join(internal_links) if internal_links else "No internal links available"
+
+        # Format keywords for prompt
+        if keyword_cluster:
+            kw_list = '\n'.join([f"- {kw['keyword']} ({kw['volume']}/mo, Score: {kw.get('score', 0)})" for kw in keyword_cluster[:15]])
+        else:
+            kw_list = f"- {primary_keyword}"
+
+        # Format citations
+        citations_str = '\n'.join([f"[{i+1}] {cite}" for i, cite in enumerate(citations[:10])]) if citations else "No citations available"
+
+        prompt = f"""You are an expert SEO Content Writer following **Google's Complete Search Documentation** (2024/2025):
         - Google Search Essentials
         - SEO Starter Guide  
         - Creating Helpful, Reliable, People-First Content
@@ -3431,17 +3319,17 @@ def batch_update_pages():
         - **USE THE DATA**: Incorporate specific stats, facts, and examples from the research.
         
         """
-                        # Only add Review Standards for comparison/review topics
-                        if any(x in page_title.lower() for x in ['best', 'vs', 'review', 'comparison', 'top']):
-                            prompt += """
+        # Only add Review Standards for comparison/review topics
+        if any(x in page_title.lower() for x in ['best', 'vs', 'review', 'comparison', 'top']):
+            prompt += """
         **7. High-Quality Review Standards** (MANDATORY for this topic):
         - Include specific Pros/Cons lists
         - Provide quantitative measurements/metrics where possible
         - Explain *how* things were tested or evaluated
         - Focus on unique features/drawbacks not found in manufacturer specs
         """
-                        
-                        prompt += f"""
+
+        prompt += f"""
         ---
         
         **INTERNAL LINKING STRATEGY** ({'MoFu → Product/Pillar' if funnel_stage == 'MoFu' else 'ToFu → MoFu + Product'}):
@@ -3535,148 +3423,203 @@ def batch_update_pages():
         
         **OUTPUT**: Full markdown article following structure above. Meta description at top. ALL internal links included.
         """
-                    
-                    # SHARED EXECUTION FOR TOPIC & GENERIC PAGES
-                    try:
-                        print(f"DEBUG: Calling Gemini 2.5 Pro (New SDK) for {page_title}...", flush=True)
-                        # Use New SDK for consistency and access to 2.5 Pro
-                        response = client_with_grounding.models.generate_content(
-                            model="gemini-2.5-pro",
-                            contents=prompt
-                        )
-                        generated_text = response.text
-                        
-                        # Clean markdown
-                        if generated_text.startswith('```markdown'): generated_text = generated_text[11:]
-                        if generated_text.startswith('```'): generated_text = generated_text[3:]
-                        if generated_text.endswith('```'): generated_text = generated_text[:-3]
-                        
-                        # Extract Meta Description
-                        meta_desc = None
-                        import re
-                        match = re.search(r'\*\*Meta Description\*\*:\s*(.*?)(?:\n|$)', generated_text)
-                        if match:
-                            meta_desc = match.group(1).strip()
-                        
-                        # Update tech_audit_data with new meta description
-                        current_tech_data = page.get('tech_audit_data') or {}
-                        if meta_desc:
-                            current_tech_data['meta_description'] = meta_desc
-                        
-                        # 4. Update DB
-                        supabase.table('pages').update({
-                            "content": generated_text.strip(),
-                            "product_action": "Idle", # Reset action
-                            "tech_audit_data": current_tech_data
-                        }).eq('id', page_id).execute()
-                        
-                        print(f"✓ Generated improved content for {page['url']}", flush=True)
-                    except Exception as gen_error:
-                        print(f"✗ Error generating content for {page['url']}: {gen_error}", flush=True)
 
-            # Set status to Processing immediately
-            try:
-                log_debug(f"Updating status to Processing for {page_ids}")
-                supabase.table('pages').update({"product_action": "Processing..."}).in_('id', page_ids).execute()
-            except Exception as e:
-                log_debug(f"Failed to update status to Processing: {e}")
+    # SHARED EXECUTION FOR TOPIC & GENERIC PAGES
+    try:
+        print(f"DEBUG: Calling Gemini 2.5 Pro (New SDK) for {page_title}...", flush=True)
+        # Use New SDK for consistency and access to 2.5 Pro
+        if on_event:
+            article = ArticleStream(on_event)
+            for chunk in scheduled_stream('gemini', client_with_grounding.models.generate_content_stream,
+                                          model="gemini-2.5-pro", contents=prompt):
+                article.feed(chunk_text(chunk))
+            generated_text = article.finish()
+        else:
+            response = scheduled_call('gemini', client_with_grounding.models.generate_content,
+                model="gemini-2.5-pro",
+                contents=prompt
+            )
+            generated_text = response.text
 
-            # Start background thread
-            log_debug("Starting background thread...")
-            thread = threading.Thread(target=process_content_generation, args=(page_ids, os.environ.get("GEMINI_API_KEY")))
-            thread.start()
-            
-            return jsonify({"message": "Content generation started in background. The status will update to 'Processing...' in the table."})
-        
-            return jsonify({"message": "Content generated successfully"})
+        # Clean markdown
+        if generated_text.startswith('```markdown'): generated_text = generated_text[11:]
+        if generated_text.startswith('```'): generated_text = generated_text[3:]
+        if generated_text.endswith('```'): generated_text = generated_text[:-3]
 
-        elif action == 'generate_mofu':
-            print(f"====== GENERATE MOFU ACTION ======", flush=True)
-            log_debug(f"GENERATE_MOFU: Starting for {len(page_ids)} pages")
-            print(f"DEBUG: Received generate_mofu action for page_ids: {page_ids}")
-        elif action == 'generate_mofu':
-            # Async processing for MoFu
-            import threading
-            
-            def process_mofu_generation(page_ids, api_key):
-                log_debug(f"Background MoFu thread started for pages: {page_ids}")
-                try:
-                    # Use new google-genai SDK with Grounding (ENABLED!)
-                    client = genai_new.Client(api_key=api_key)
-                    tool = types.Tool(google_search=types.GoogleSearch())
-                    
-                    for pid in page_ids:
-                        print(f"DEBUG: Processing page_id: {pid}")
-                        # Get Product Page Data
-                        res = supabase.table('pages').select('*').eq('id', pid).single().execute()
-                        if not res.data: 
-                            print(f"DEBUG: Page {pid} not found")
-                            continue
-                        product = res.data
-                        product_tech = product.get('tech_audit_data', {})
-                        
-                        print(f"Researching MoFu opportunities for {product.get('url')}...")
-                        
-                        # === NEW DATA-FIRST WORKFLOW ===
-                        
-                        # Step 0: Ensure Content Context (Fix for "Memoir vs Candles")
-                        body_content = product_tech.get('body_content', '')
-                        product_title = product_tech.get('title', 'Untitled')
-                        
-                        # FIX: If title is "Pending Scan" or generic, force scrape to get REAL title
-                        is_bad_title = not product_title or 'pending' in product_title.lower() or 'untitled' in product_title.lower() or 'scan' in product_title.lower()
-                        
-                        if not body_content or len(body_content) < 100 or is_bad_title:
-                            log_debug(f"Content/Title missing or bad ('{product_title}') for {product['url']}, scraping now...")
-                            scraped = scrape_page_content(product['url'])
-                            if scraped:
-                                body_content = scraped['body_content']
-                                # Use scraped title if current is bad
-                                if is_bad_title and scraped.get('title'):
-                                    product_title = scraped['title']
-                                    log_debug(f"Updated title from '{product_tech.get('title')}' to '{product_title}'")
-                                
-                                # Update DB so we don't scrape again
-                                current_tech = product.get('tech_audit_data', {})
-                                current_tech['body_content'] = body_content
-                                current_tech['title'] = product_title # Save real title
-                                
-                                supabase.table('pages').update({
-                                    "tech_audit_data": current_tech
-                                }).eq('id', pid).execute()
-                                product_tech = current_tech # Update local var
-                        
-                        log_debug(f"Using Product Title: {product_title}")
-
-                        # Fetch Source Product Page
-                        product_res = supabase.table('pages').select('*').eq('id', pid).single().execute()
-                        if not product_res.data:
-                            print(f"DEBUG: Product page not found for ID: {pid}", flush=True)
-                            continue
-                        product = product_res.data
-                        product_title = product.get('tech_audit_data', {}).get('title', '')
-                        print(f"DEBUG: Processing Product: {product_title}", flush=True)
-                        
-                        # Fetch Project Settings
-                        project_res = supabase.table('projects').select('location, language').eq('id', product['project_id']).single().execute()
-                        project_loc = project_res.data.get('location', 'US') if project_res.data else 'US'
-                        project_lang = project_res.data.get('language', 'English') if project_res.data else 'English'
-                        print(f"DEBUG: Project Settings: {project_loc}, {project_lang}", flush=True)
-
-                        # Step 1: Get Keywords
-                        keywords = []
-                        # (Skipping to where I can inject prints easily)
-                        # I'll just add prints around the Gemini call in the next block
-                        # Step 1: Generate MULTIPLE Broad Seed Keywords for DataForSEO
-                        # Strategy: Don't search for specific product - search for CATEGORY + common queries
-                        if not product_title:
-                            product_title = get_title_from_url(product['url'])
-
-                        print(f"DEBUG: Analyzing context for: {product_title} (Loc: {project_loc}, Lang: {project_lang})")
-                        
-                        try:
-                            # NEW STRATEGY: Generate multiple broad seeds
-                            context_prompt = f"""Analyze this product to generate 3-5 BROAD keyword seeds for DataForSEO research.
+        # Extract Meta Description
+        meta_desc = None
+        import re
+        match = re.search(r'\*\*Meta Description\*\*:\s*(.*?)(?:\n|$)', generated_text)
+        if match:
+            meta_desc = match.group(1).strip()
+
+        # Update tech_audit_data with new meta description
+        current_tech_data = page.get('tech_audit_data') or {}
+        if meta_desc:
+            current_tech_data['meta_description'] = meta_desc
+
+        # 4. Update DB
+        job_stage('save')
+        supabase.table('pages').update({
+            "content": generated_text.strip(),
+            "product_action": "Idle", # Reset action
+            "tech_audit_data": current_tech_data
+        }).eq('id', page_id).execute()
+
+        print(f"✓ Generated improved content for {page['url']}", flush=True)
+        if on_event:
+            on_event({'event': 'complete', 'page_id': page_id, 'content': generated_text.strip(),
+                      'meta_description': meta_desc, 'saved': True})
+    except Exception as gen_error:
+        print(f"✗ Error generating content for {page['url']}: {gen_error}", flush=True)
+        raise
+
+
+TOPIC_RESEARCH_WORKERS = int(os.environ.get("TOPIC_RESEARCH_WORKERS", 4))
+
+def _topic_title(page):
+    t_data = page.get('tech_audit_data') or {}
+    # Handle tech_audit_data being a string or dict
+    if isinstance(t_data, str):
+        try: t_data = json.loads(t_data)
+        except: t_data = {}
+    return t_data.get('title', '')
+
+def research_new_topics(inserted_pages, project_loc, project_lang):
+    """
+    Grounded keyword research for freshly inserted Topic pages, run concurrently (bounded by
+    TOPIC_RESEARCH_WORKERS; the Gemini scheduler still enforces the provider limits), then saved
+    with one bulk upsert. Returns the number of topics saved.
+    """
+    job_stage('topic_research')
+    pages = [p for p in inserted_pages if _topic_title(p)]
+    if not pages:
+        return 0
+    
+    # Worker threads inherit the caller's outbound priority and log context (job/page ids)
+    priority = current_priority()
+    def research(page):
+        title = _topic_title(page)
+        with outbound_priority(priority):
+            log_debug(f"Auto-Researching keywords for: {title} (Loc: {project_loc})")
+            try:
+                return page, perform_gemini_research(title, location=project_loc, language=project_lang)
+            except Exception as research_err:
+                log_debug(f"Auto-Research failed for {title}: {research_err}")
+                return page, None
+    
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(TOPIC_RESEARCH_WORKERS, len(pages))) as pool:
+        # Copy the context here, on the calling thread: inside the worker it would be the worker's own
+        futures = [pool.submit(contextvars.copy_context().run, research, p) for p in pages]
+        results = [f.result() for f in futures]
+    
+    rows = []
+    for page, gemini_result in results:
+        if not gemini_result:
+            continue
+        keywords = gemini_result.get('keywords', [])
+        formatted_keywords = '\n'.join([
+            f"{kw.get('keyword', '')} | {kw.get('intent', 'informational')} |"
+            for kw in keywords if kw.get('keyword')
+        ])
+        rows.append({
+            'id': page['id'],
+            'project_id': page['project_id'],
+            'url': page['url'],
+            'keywords': formatted_keywords,
+            # Create research data (partial)
+            'research_data': {
+                "stage": "keywords_only",
+                "mode": "hybrid",
+                "competitor_urls": [c['url'] for c in gemini_result.get('competitors', [])],
+                "ranked_keywords": keywords,
+                "formatted_keywords": formatted_keywords
+            }
+        })
+    
+    if rows:
+        supabase.table('pages').upsert(rows, on_conflict='id').execute()
+        log_debug(f"✓ Keywords saved for {len(rows)}/{len(pages)} topics")
+    return len(rows)
+
+def generate_mofu_for_page(pid, api_key=None):
+    """Research and insert MoFu topic pages for one product page."""
+    api_key = api_key or os.environ.get("GEMINI_API_KEY")
+    client = genai_new.Client(api_key=api_key)
+    tool = types.Tool(google_search=types.GoogleSearch())
+
+    print(f"DEBUG: Processing page_id: {pid}")
+    # Get Product Page Data (from the job's prefetched rows when run as a batch)
+    loader = current_loader(supabase)
+    product = loader.page(pid)
+    if not product:
+        print(f"DEBUG: Page {pid} not found")
+        return
+    if job_reached('topics_inserted'):
+        # A failed earlier attempt already inserted this page's topics; don't insert a second set
+        supabase.table('pages').update({"product_action": "MoFu Generated"}).eq('id', pid).execute()
+        return
+    product_tech = product.get('tech_audit_data') or {}
+
+    print(f"Researching MoFu opportunities for {product.get('url')}...")
+
+    # === NEW DATA-FIRST WORKFLOW ===
+
+    # Step 0: Ensure Content Context (Fix for "Memoir vs Candles")
+    body_content = product_tech.get('body_content', '')
+    product_title = product_tech.get('title', 'Untitled')
+
+    # FIX: If title is "Pending Scan" or generic, force scrape to get REAL title
+    is_bad_title = not product_title or 'pending' in product_title.lower() or 'untitled' in product_title.lower() or 'scan' in product_title.lower()
+
+    if not body_content or len(body_content) < 100 or is_bad_title:
+        job_stage('scrape')
+        log_debug(f"Content/Title missing or bad ('{product_title}') for {product['url']}, scraping now...")
+        # A bad title needs a real fetch, otherwise an unchanged page can reuse its extraction
+        scraped = scrape_page_content(product['url'], previous=None if is_bad_title else product_tech)
+        if scraped:
+            body_content = scraped['body_content']
+            # Use scraped title if current is bad
+            if is_bad_title and scraped.get('title'):
+                product_title = scraped['title']
+                log_debug(f"Updated title from '{product_tech.get('title')}' to '{product_title}'")
+
+            # Update DB so we don't scrape again
+            current_tech = product_tech
+            current_tech['body_content'] = body_content
+            current_tech['title'] = product_title # Save real title
+            current_tech['scrape_cache'] = scraped['scrape_cache']
+
+            supabase.table('pages').update({
+                "tech_audit_data": current_tech
+            }).eq('id', pid).execute()
+            product['tech_audit_data'] = product_tech = current_tech # Update local copy (no re-select)
+            loader.forget(pid)
+
+    log_debug(f"Using Product Title: {product_title}")
+    product_title = product_tech.get('title', '')
+    print(f"DEBUG: Processing Product: {product_title}", flush=True)
+
+    # Fetch Project Settings
+    project_loc, project_lang = loader.project_settings(product['project_id'])
+    print(f"DEBUG: Project Settings: {project_loc}, {project_lang}", flush=True)
+
+    # Step 1: Get Keywords
+    job_stage('keywords')
+    keywords = []
+    # (Skipping to where I can inject prints easily)
+    # I'll just add prints around the Gemini call in the next block
+    # Step 1: Generate MULTIPLE Broad Seed Keywords for DataForSEO
+    # Strategy: Don't search for specific product - search for CATEGORY + common queries
+    if not product_title:
+        product_title = get_title_from_url(product['url'])
+
+    print(f"DEBUG: Analyzing context for: {product_title} (Loc: {project_loc}, Lang: {project_lang})")
+
+    try:
+        # NEW STRATEGY: Generate multiple broad seeds
+        context_prompt = f"""Analyze this product to generate 3-5 BROAD keyword seeds for DataForSEO research.
 
         Product Title: "{product_title}"
         Page Content: {body_content[:2000]}
@@ -3693,83 +3636,92 @@ def batch_update_pages():
 
         OUTPUT: Return ONLY a comma-separated list of 3-5 broad keywords. No explanations.
         Example output: carrier oil benefits, oil for skin, facial oils, natural oils"""
-                            
-                            seed_res = client.models.generate_content(
-                                model="gemini-2.5-flash",
-                                contents=context_prompt,
-                                config=types.GenerateContentConfig(tools=[tool])
-                            )
-                            seeds_str = seed_res.text.strip().replace('"', '').replace("'", "")
-                            broad_seeds = [s.strip() for s in seeds_str.split(',') if s.strip()]
-                            
-                            # Fallback if AI fails
-                            if not broad_seeds:
-                                broad_seeds = [product_title]
-                            
-                            log_debug(f"Generated {len(broad_seeds)} broad seeds: {broad_seeds}")
-                            print(f"DEBUG: Broad seed keywords: {broad_seeds}")
-                            
-                        except Exception as e:
-                            print(f"⚠ Seed generation failed: {e}. Using product title.")
-                            broad_seeds = [product_title]
 
-                        
-                        # NEW: Use Gemini 2.0 Flash with Grounding as PRIMARY source (User Request)
-                        print(f"DEBUG: Using Gemini 2.0 Flash for keyword research (Primary)...")
-                        log_debug("Calling perform_gemini_research as PRIMARY source")
-                        
-                        gemini_result = perform_gemini_research(product_title, location=project_loc, language=project_lang)
-                        keywords = []
-                        
-                        if gemini_result and gemini_result.get('keywords'):
-                            print(f"✓ Gemini Research successful. Found {len(gemini_result['keywords'])} keywords.")
-                            for k in gemini_result['keywords']:
-                                keywords.append({
-                                    'keyword': k.get('keyword'),
-                                    'volume': 100, # Placeholder volume since Gemini doesn't provide it
-                                    'score': 100,
-                                    'cpc': 0,
-                                    'competition': 0,
-                                    'intent': k.get('intent', 'Commercial')
-                                })
-                        else:
-                            print(f"⚠ Gemini Research failed. Using fallback.")
-                            keywords = [{'keyword': product_title, 'volume': 0, 'score': 0, 'cpc': 0, 'competition': 0}]
+        seed_config = types.GenerateContentConfig(tools=[tool])
+        seed_text = cached_generate(
+            "gemini-2.5-flash", context_prompt,
+            lambda: scheduled_call('gemini', client.models.generate_content,
+                model="gemini-2.5-flash",
+                contents=context_prompt,
+                config=seed_config
+            ),
+            config=seed_config
+        )
+        seeds_str = seed_text.strip().replace('"', '').replace("'", "")
+        broad_seeds = [s.strip() for s in seeds_str.split(',') if s.strip()]
 
+        # Fallback if AI fails
+        if not broad_seeds:
+            broad_seeds = [product_title]
 
-                        
-                        # Step 2: Prepare Data for Topic Generation (No Deep Research yet)
-                        log_debug("Skipping deep research (will be done in 'Conduct Research' stage).")
-                        
-                        # Format keyword list for prompt
-                        keyword_list = '\n'.join([f"- {k['keyword']} ({k['volume']} searches/month)" for k in keywords[:50]])
-                        
-                        # Minimal research data for now
-                        research_data = {
-                            "keywords": keywords,
-                            "stage": "research_pending"
-                        }
+        log_debug(f"Generated {len(broad_seeds)} broad seeds: {broad_seeds}")
+        print(f"DEBUG: Broad seed keywords: {broad_seeds}")
+
+    except Exception as e:
+        print(f"⚠ Seed generation failed: {e}. Using product title.")
+        broad_seeds = [product_title]
+
+
+    # NEW: Use Gemini 2.0 Flash with Grounding as PRIMARY source (User Request)
+    print(f"DEBUG: Using Gemini 2.0 Flash for keyword research (Primary)...")
+    log_debug("Calling perform_gemini_research as PRIMARY source")
+
+    gemini_result = perform_gemini_research(product_title, location=project_loc, language=project_lang)
+    keywords = []
+
+    if gemini_result and gemini_result.get('keywords'):
+        print(f"✓ Gemini Research successful. Found {len(gemini_result['keywords'])} keywords.")
+        for k in gemini_result['keywords']:
+            keywords.append({
+                'keyword': k.get('keyword'),
+                'volume': 100, # Placeholder volume since Gemini doesn't provide it
+                'score': 100,
+                'cpc': 0,
+                'competition': 0,
+                'intent': k.get('intent', 'Commercial')
+            })
+    else:
+        print(f"⚠ Gemini Research failed. Using fallback.")
+        keywords = [{'keyword': product_title, 'volume': 0, 'score': 0, 'cpc': 0, 'competition': 0}]
 
 
-                        # Step 4: Generate Topics from REAL DATA
-                        import datetime
-                        current_year = datetime.datetime.now().year
-                        next_year = current_year + 1
-                        
-                        topic_prompt = f"""You are an SEO Content Strategist. Generate 6 MoFu (Middle-of-Funnel) article topics based on REAL keyword data.
+
+    # Step 2: Prepare Data for Topic Generation (No Deep Research yet)
+    log_debug("Skipping deep research (will be done in 'Conduct Research' stage).")
+
+    # Group keywords locally (TF-IDF cosine) so the prompt lists clusters instead of every keyword
+    keyword_lookup = keyword_index(keywords)
+    clusters = cluster_keywords(keywords[:50])
+    keyword_list = format_clusters_for_prompt(clusters)
+    log_debug(f"{len(keywords[:50])} MoFu keywords -> {len(clusters)} clusters (~{prompt_size(keyword_list)} prompt tokens)")
+
+    # Minimal research data for now
+    research_data = {
+        "keywords": keywords,
+        "stage": "research_pending"
+    }
+
+
+    # Step 4: Generate Topics from REAL DATA
+    job_stage('topics')
+    import datetime
+    current_year = datetime.datetime.now().year
+    next_year = current_year + 1
+
+    topic_prompt = f"""You are an SEO Content Strategist. Generate 6 MoFu (Middle-of-Funnel) article topics based on REAL keyword data.
 
         **Product**: {product_title}
         **Target Audience**: {project_loc} ({project_lang})
 
-        **VERIFIED HIGH-VOLUME KEYWORDS** (Scored by Opportunity):
+        **VERIFIED KEYWORD CLUSTERS** ([id] primary keyword (volume, size): other keywords):
         {keyword_list}
 
         **YOUR TASK**:
-        Create 6 MoFu topics. For EACH topic, assign ALL semantically relevant keywords from the list above (could be 3-15 keywords per topic - include as many as naturally fit the angle).
+        Create 6 MoFu topics. For EACH topic, pick the clusters above that fit its angle (one or more ids).
 
         **Requirements**:
         1. Each topic must target a primary keyword (highest opportunity score for that angle)
-        2. Include ALL secondary keywords that semantically match the topic angle
+        2. Include ALL clusters that semantically match the topic angle
         3. Topics should be Middle-of-Funnel (Comparison, Best Of, Guide, vs)
 
         **Topic Types**:
@@ -3785,176 +3737,541 @@ def batch_update_pages():
               "title": "[Exact title - include year {current_year} if relevant]",
               "slug": "url-friendly-slug",
               "description": "2-sentence description of content angle",
-              "keyword_cluster": [
-                {{"keyword": "[keyword1]", "volume": [INTEGER_FROM_INPUT], "is_primary": true}},
-                {{"keyword": "[keyword2]", "volume": [INTEGER_FROM_INPUT], "is_primary": false}},
-                ...
-              ],
+              "clusters": [1, 4],
+              "primary_keyword": "[keyword from the picked clusters]",
               "research_notes": "Why this topic (reference SERP competitor or research insight)"
             }}
           ]
         }}
 
         CRITICAL: 
-        1. Use EXACT integers for volume from the provided list. DO NOT write "Estimated".
-        2. Assign keywords based on semantic relevance. Don't artificially limit - if 12 keywords fit a topic, include all 12.
+        1. Use cluster ids exactly as listed.
+        2. Assign clusters based on semantic relevance. Don't artificially limit - if 3 clusters fit a topic, include all 3.
         """
 
 
+
+    try:
+        response = scheduled_call('gemini', client.models.generate_content,
+            model="gemini-2.5-flash",
+            contents=topic_prompt,
+            config=types.GenerateContentConfig(tools=[tool])
+        )
+        text = response.text.strip()
+        if text.startswith('```json'): text = text[7:]
+        if text.startswith('```'): text = text[3:]
+        if text.endswith('```'): text = text[:-3]
+        text = text.strip()
+
+        # Parse JSON with error handling
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as json_err:
+            log_debug(f"JSON parse error: {json_err}. Response: {text[:300]}")
+            print(f"✗ Gemini returned invalid JSON. Skipping MoFu for {product_title}")
+            return  # Skip to next product
+
+        topics = data.get('topics', [])
+        if not topics:
+            log_debug("No topics in AI response")
+            return
+
+        new_pages = []
+        for t in topics:
+            # Handle keyword cluster (multiple keywords per topic)
+            keyword_cluster = [{'keyword': k['keyword'], 'volume': k.get('volume', 0), 'is_primary': k['is_primary']}
+                               for k in expand_topic_keywords(t, clusters, keyword_lookup)]
+
+            if keyword_cluster:
+                # NEW FORMAT: "keyword | intent | secondary intent" (no volume)
+                intents = classify_intents([kw['keyword'] for kw in keyword_cluster])
+                keywords_str = '\n'.join([
+                    f"{kw['keyword']} | {intent.primary} | {', '.join(intent.secondary)}".rstrip()
+                    for kw, intent in zip(keyword_cluster, intents)
+                ])
+                # Get primary keyword for research reference (expand_topic_keywords puts it first)
+                primary_kw = keyword_cluster[0]
+            else:
+                keywords_str = ""
+                primary_kw = {}
+
+            # Combine general research with topic-specific notes
+            topic_research = research_data.copy()
+            topic_research['notes'] = t.get('research_notes', '')
+            topic_research['keyword_cluster'] = keyword_cluster
+            topic_research['primary_keyword'] = primary_kw.get('keyword', '')
+
+            new_pages.append({
+                "project_id": product['project_id'],
+                "source_page_id": pid,
+                "url": f"{product['url'].rstrip('/')}/{t['slug']}",
+                "page_type": "Topic",
+                "funnel_stage": "MoFu",
+                "product_action": "Idle",
+                "tech_audit_data": {
+                    "title": t['title'],
+                    "meta_description": t['description'],
+                    "meta_title": t['title']
+                },
+                "content_description": t['description'],
+                "keywords": keywords_str,  # Data-backed keywords with volume
+                "slug": t['slug'],
+                "research_data": topic_research  # Store all research including citations
+            })
+
+
+
+        if new_pages:
+            print(f"DEBUG: Attempting to insert {len(new_pages)} MoFu topics...", file=sys.stderr)
+            try:
+                insert_res = supabase.table('pages').insert(new_pages).execute()
+                job_checkpoint('topics_inserted')
+                print("DEBUG: ✓ MoFu topics inserted successfully.", file=sys.stderr)
+
+                # AUTO-KEYWORD RESEARCH (Gemini)
+                if insert_res.data:
+                    print(f"DEBUG: Starting Auto-Keyword Research for {len(insert_res.data)} topics...", file=sys.stderr)
+                    try:
+                        research_new_topics(insert_res.data, project_loc, project_lang)
+                    except Exception as research_err:
+                        log_debug(f"Auto-Research failed: {research_err}")
+            except Exception as insert_error:
+                print(f"DEBUG: Error inserting with research_data: {insert_error}", file=sys.stderr)
+                # Fallback: Try inserting without research_data (if column missing)
+                if 'research_data' in str(insert_error) or 'column' in str(insert_error):
+                    print("DEBUG: Retrying insert without research_data column...", file=sys.stderr)
+                    for p in new_pages:
+                        p.pop('research_data', None)
+                    supabase.table('pages').insert(new_pages).execute()
+                    job_checkpoint('topics_inserted')
+                    print("DEBUG: ✓ MoFu topics inserted (without research data).", file=sys.stderr)
+                else:
+                    raise insert_error
+        else:
+            print("DEBUG: No new pages to insert (topics list empty).", file=sys.stderr)
+
+        # Update Source Page Status
+        supabase.table('pages').update({"product_action": "MoFu Generated"}).eq('id', pid).execute()
+
+    except Exception as e:
+        print(f"DEBUG: Error generating MoFu topics: {e}", file=sys.stderr)
+        import traceback
+        traceback.print_exc()
+        raise
+
+
+def generate_tofu_for_page(pid, api_key=None):
+    """Research and insert ToFu topic pages for one MoFu topic page."""
+    api_key = api_key or os.environ.get("GEMINI_API_KEY")
+    client = genai_new.Client(api_key=api_key)
+    tool = types.Tool(google_search=types.GoogleSearch())
+
+    # Fetch Source MoFu Page (from the job's prefetched rows when run as a batch)
+    loader = current_loader(supabase)
+    mofu = loader.page(pid)
+    if not mofu: return
+    if job_reached('topics_inserted'):
+        # A failed earlier attempt already inserted this page's topics; don't insert a second set
+        supabase.table('pages').update({"product_action": "ToFu Generated"}).eq('id', pid).execute()
+        return
+    mofu_tech = mofu.get('tech_audit_data') or {}
+
+    print(f"Researching ToFu opportunities for MoFu topic: {mofu_tech.get('title')}...")
+
+    # === NEW DATA-FIRST WORKFLOW FOR TOFU ===
+
+    # Fetch Project Settings for Localization (Moved UP)
+    project_loc, project_lang = loader.project_settings(mofu['project_id'])
+
+    # Step 1: Get broad keyword ideas based on MoFu topic
+    job_stage('keywords')
+    mofu_title = mofu_tech.get('title', '')
+    print(f"Researching ToFu opportunities for: {mofu_title} (Loc: {project_loc})")
+
+    # Get keyword opportunities from DataForSEO
+    # For ToFu, we want broader terms, so we might strip "Best" or "Review" from the seed
+    seed_keyword = mofu_title.replace('Best ', '').replace('Review', '').replace(' vs ', ' ').strip()
+    # NEW: Use Gemini 2.0 Flash with Grounding as PRIMARY source (User Request)
+    print(f"DEBUG: Using Gemini 2.0 Flash for ToFu keyword research (Primary)...")
+
+    gemini_result = perform_gemini_research(seed_keyword, location=project_loc, language=project_lang)
+    keywords = []
+
+    if gemini_result and gemini_result.get('keywords'):
+        print(f"✓ Gemini Research successful. Found {len(gemini_result['keywords'])} keywords.")
+        for k in gemini_result['keywords']:
+            keywords.append({
+                'keyword': k.get('keyword'),
+                'volume': 100, # Placeholder
+                'score': 100,
+                'cpc': 0,
+                'competition': 0,
+                'intent': k.get('intent', 'Informational')
+            })
+    else:
+        print(f"⚠ Gemini Research failed. Using fallback.")
+        keywords = [{'keyword': seed_keyword, 'volume': 0, 'score': 0, 'cpc': 0, 'competition': 0}]
+
+    # Step 2: Analyze SERP for top 5 keywords (Optional - keeping for context if fast enough, or remove for speed)
+    # For now, we'll keep it lightweight or rely on Gemini Grounding in the prompt.
+    # Let's SKIP DataForSEO SERP to save time/cost, and rely on Gemini Grounding.
+    serp_summary = "Relied on Gemini Grounding for current SERP context."
+
+    # Step 3: Generate Topics (Lightweight - No Perplexity)
+    job_stage('topics')
+    import datetime
+    current_year = datetime.datetime.now().year
+
+    # Group keywords locally (TF-IDF cosine) so the prompt lists clusters instead of every keyword
+    keyword_lookup = keyword_index(keywords)
+    clusters = cluster_keywords(keywords[:100])
+    keyword_list = format_clusters_for_prompt(clusters)
+    print(f"DEBUG: {len(keywords[:100])} ToFu keywords -> {len(clusters)} clusters (~{prompt_size(keyword_list)} prompt tokens)")
+
+    topic_prompt = f"""
+                        You are an SEO Strategist. Generate 5 High-Value Top-of-Funnel (ToFu) topic ideas that lead to: {mofu_tech.get('title')}
                         
-                        try:
-                            response = client.models.generate_content(
-                                model="gemini-2.5-flash",
-                                contents=topic_prompt,
-                                config=types.GenerateContentConfig(tools=[tool])
-                            )
-                            text = response.text.strip()
-                            if text.startswith('```json'): text = text[7:]
-                            if text.startswith('```'): text = text[3:]
-                            if text.endswith('```'): text = text[:-3]
-                            text = text.strip()
-                            
-                            # Parse JSON with error handling
-                            try:
-                                data = json.loads(text)
-                            except json.JSONDecodeError as json_err:
-                                log_debug(f"JSON parse error: {json_err}. Response: {text[:300]}")
-                                print(f"✗ Gemini returned invalid JSON. Skipping MoFu for {product_title}")
-                                continue  # Skip to next product
-                            
-                            topics = data.get('topics', [])
-                            if not topics:
-                                log_debug("No topics in AI response")
-                                continue
-                            
-                            new_pages = []
-                            for t in topics:
-                                # Handle keyword cluster (multiple keywords per topic)
-                                keyword_cluster = t.get('keyword_cluster', [])
-                                
-                                if keyword_cluster:
-                                    # NEW FORMAT: "keyword | intent | secondary intent" (no volume)
-                                    # Classify intent based on keyword patterns
-                                    def classify_intent(kw_text):
-                                        kw_lower = kw_text.lower()
-                                        # Transactional indicators
-                                        if any(word in kw_lower for word in ['buy', 'price', 'shop', 'purchase', 'best', 'top', 'review', 'vs', 'alternative']):
-                                            return 'transactional'
-                                        # Commercial indicators
-                                        elif any(word in kw_lower for word in ['benefits', 'how to', 'uses', 'guide', 'comparison', 'difference']):
-                                            return 'commercial'
-                                        # Default: informational
-                                        else:
-                                            return 'informational'
-                                    
-                                    keywords_str = '\n'.join([
-                                        f"{kw['keyword']} | {classify_intent(kw['keyword'])} |"
-                                        for kw in keyword_cluster
-                                    ])
-                                    # Get primary keyword for research reference
-                                    primary_kw = next((kw for kw in keyword_cluster if kw.get('is_primary')), keyword_cluster[0] if keyword_cluster else {})
-                                else:
-                                    keywords_str = ""
-                                    primary_kw = {}
-                                
-                                # Combine general research with topic-specific notes
-                                topic_research = research_data.copy()
-                                topic_research['notes'] = t.get('research_notes', '')
-                                topic_research['keyword_cluster'] = keyword_cluster
-                                topic_research['primary_keyword'] = primary_kw.get('keyword', '')
-                                
-                                new_pages.append({
-                                    "project_id": product['project_id'],
-                                    "source_page_id": pid,
-                                    "url": f"{product['url'].rstrip('/')}/{t['slug']}",
-                                    "page_type": "Topic",
-                                    "funnel_stage": "MoFu",
-                                    "product_action": "Idle",
-                                    "tech_audit_data": {
-                                        "title": t['title'],
-                                        "meta_description": t['description'],
-                                        "meta_title": t['title']
-                                    },
-                                    "content_description": t['description'],
-                                    "keywords": keywords_str,  # Data-backed keywords with volume
-                                    "slug": t['slug'],
-                                    "research_data": topic_research  # Store all research including citations
-                                })
-                            
-                            
-                            
-                            if new_pages:
-                                print(f"DEBUG: Attempting to insert {len(new_pages)} MoFu topics...", file=sys.stderr)
-                                try:
-                                    insert_res = supabase.table('pages').insert(new_pages).execute()
-                                    print("DEBUG: ✓ MoFu topics inserted successfully.", file=sys.stderr)
-                                    
-                                    # AUTO-KEYWORD RESEARCH (Gemini)
-                                    if insert_res.data:
-                                        print(f"DEBUG: Starting Auto-Keyword Research for {len(insert_res.data)} topics...", file=sys.stderr)
-                                        for inserted_page in insert_res.data:
-                                            try:
-                                                p_id = inserted_page['id']
-                                                # Handle tech_audit_data being a string or dict
-                                                t_data = inserted_page.get('tech_audit_data', {})
-                                                if isinstance(t_data, str):
-                                                    try: t_data = json.loads(t_data)
-                                                    except: t_data = {}
-                                                    
-                                                p_title = t_data.get('title', '')
-                                                if not p_title: continue
-                                                
-                                                log_debug(f"Auto-Researching keywords for: {p_title} (Loc: {project_loc})")
-                                                gemini_result = perform_gemini_research(p_title, location=project_loc, language=project_lang)
-                                                
-                                                if gemini_result:
-                                                    keywords = gemini_result.get('keywords', [])
-                                                    formatted_keywords = '\n'.join([
-                                                        f"{kw.get('keyword', '')} | {kw.get('intent', 'informational')} |"
-                                                        for kw in keywords if kw.get('keyword')
-                                                    ])
-                                                    
-                                                    # Create research data (partial)
-                                                    research_data = {
-                                                        "stage": "keywords_only", 
-                                                        "mode": "hybrid",
-                                                        "competitor_urls": [c['url'] for c in gemini_result.get('competitors', [])],
-                                                        "ranked_keywords": keywords,
-                                                        "formatted_keywords": formatted_keywords
-                                                    }
-                                                    
-                                                    supabase.table('pages').update({
-                                                        "keywords": formatted_keywords,
-                                                        "research_data": research_data
-                                                    }).eq('id', p_id).execute()
-                                                    log_debug(f"✓ Keywords saved for {p_title}")
-                                            except Exception as research_err:
-                                                log_debug(f"Auto-Research failed for {p_title}: {research_err}")
-                                except Exception as insert_error:
-                                    print(f"DEBUG: Error inserting with research_data: {insert_error}", file=sys.stderr)
-                                    # Fallback: Try inserting without research_data (if column missing)
-                                    if 'research_data' in str(insert_error) or 'column' in str(insert_error):
-                                        print("DEBUG: Retrying insert without research_data column...", file=sys.stderr)
-                                        for p in new_pages:
-                                            p.pop('research_data', None)
-                                        supabase.table('pages').insert(new_pages).execute()
-                                        print("DEBUG: ✓ MoFu topics inserted (without research data).", file=sys.stderr)
-                                    else:
-                                        raise insert_error
-                            else:
-                                print("DEBUG: No new pages to insert (topics list empty).", file=sys.stderr)
-                            
-                            # Update Source Page Status
-                            supabase.table('pages').update({"product_action": "MoFu Generated"}).eq('id', pid).execute()
+                        **CONTEXT**:
+                        - Target Audience: People at the beginning of their journey (Problem Aware).
+                        - Location: {project_loc}
+                        - Language: {project_lang}
+                        - Goal: Educate them and naturally lead them to the solution (the MoFu topic).
                         
-                        except Exception as e:
-                            print(f"DEBUG: Error generating MoFu topics: {e}", file=sys.stderr)
-                            import traceback
-                            traceback.print_exc()
-                            
-                except Exception as e:
-                    log_debug(f"MoFu Thread Error: {e}")
+                        **HIGH-OPPORTUNITY KEYWORD CLUSTERS** ([id] primary keyword (volume, size): other keywords):
+                        {keyword_list}
+                        
+                        **INSTRUCTIONS**:
+                        1.  **Use Grounding**: Search Google to ensure these topics are currently relevant and not already saturated in **{project_loc}**.
+                        2.  **Focus**: "What is", "How to", "Guide to", "Benefits of", "Mistakes to Avoid".
+                        3.  **Variety**: specific angles, not just generic guides.
+                        
+                        **LOCALIZATION RULES (CRITICAL)**:
+                        1. **Currency**: You MUST use the local currency for **{project_loc}** (e.g., ₹ INR for India). Convert prices if needed.
+                        2. **Units**: Use the measurement system standard for **{project_loc}**.
+                        3. **Spelling**: Use the correct spelling dialect (e.g., "Colour" for UK/India).
+                        4. **Cultural Context**: Use examples relevant to **{project_loc}**.
+                        
+                        Current Date: {datetime.datetime.now().strftime("%B %Y")}
+                        
+                        Return a JSON object with a key "topics" containing a list of objects:
+                        - "title": Topic Title (Must include a primary keyword)
+                        - "slug": URL friendly slug
+                        - "description": Brief content description (intent)
+                        - "clusters": List of the cluster ids (integers from the list above) this topic covers
+                        - "primary_keyword": The main keyword targeted
+                        """
+
+    try:
+        response = scheduled_call('gemini', client.models.generate_content,
+            model="gemini-2.5-flash",
+            contents=topic_prompt,
+            config=types.GenerateContentConfig(tools=[tool])
+        )
+        text = response.text.strip()
+        if text.startswith('```json'): text = text[7:]
+        if text.startswith('```'): text = text[3:]
+        if text.endswith('```'): text = text[:-3]
+
+        data = json.loads(text)
+        topics = data.get('topics', [])
+
+        new_pages = []
+        for t in topics:
+            # Map the picked clusters (or echoed keyword strings) back to their data
+            cluster_data = expand_topic_keywords(t, clusters, keyword_lookup)
+            for k in cluster_data:
+                if not k.get('intent'):
+                    k['intent'] = classify_intent(k['keyword']).primary
+
+            # Standardized Format: "keyword | intent |" (Matches MoFu style)
+            keywords_str = '\n'.join([
+                f"{k['keyword']} | {k.get('intent', 'Informational')} |"
+                for k in cluster_data
+            ])
+
+            # Minimal research data (No Perplexity yet)
+            topic_research = {
+                "stage": "topic_generated",
+                "keyword_cluster": cluster_data,
+                "primary_keyword": t.get('primary_keyword')
+            }
+
+            new_pages.append({
+                "project_id": mofu['project_id'],
+                "source_page_id": pid,
+                "url": f"{mofu['url'].rsplit('/', 1)[0]}/{t['slug']}", 
+                "page_type": "Topic",
+                "funnel_stage": "ToFu",
+                "product_action": "Idle", # Ready for manual "Conduct Research"
+                "tech_audit_data": {
+                    "title": t['title'],
+                    "meta_description": t['description'],
+                    "meta_title": t['title']
+                },
+                "content_description": t['description'],
+                "keywords": keywords_str,
+                "slug": t['slug'],
+                "research_data": topic_research
+            })
+
+        if new_pages:
+            print(f"Attempting to insert {len(new_pages)} ToFu topics...")
+            insert_res = supabase.table('pages').insert(new_pages).execute()
+            job_checkpoint('topics_inserted')
+            print("✓ ToFu topics inserted successfully.")
+
+            # AUTO-KEYWORD RESEARCH (Gemini) - Architecture Parity with MoFu
+            if insert_res.data:
+                print(f"DEBUG: Starting Auto-Keyword Research for {len(insert_res.data)} ToFu topics...")
+                try:
+                    research_new_topics(insert_res.data, project_loc, project_lang)
+                except Exception as research_err:
+                    log_debug(f"Auto-Research failed: {research_err}")
+
+        # Update Source Page Status
+        supabase.table('pages').update({"product_action": "ToFu Generated"}).eq('id', pid).execute()
 
+    except Exception as e:
+        print(f"Error generating ToFu topics: {e}")
+        import traceback
+        traceback.print_exc()
+        raise
+
+
+def _job_page_ids(ctx):
+    return [item['item_id'] for item in (ctx.queue.get_job(ctx.job_id) or {}).get('items', [])]
+
+
+def _page_job(func):
+    """Adapt a per-page generator to the job queue's handler signature (exceptions trigger a retry)."""
+    def handler(page_id, payload, ctx):
+        # The first item of a job prefetches every page (plus projects and parents) for the rest
+        loader = job_loader(ctx.job_id, supabase, lambda: _job_page_ids(ctx))
+        if ctx.attempt > 1:
+            loader.forget(page_id)  # a failed attempt may have written to it
+        try:
+            # Background work yields provider capacity to interactive requests
+            with outbound_priority(BACKGROUND), log_context(page_id=page_id), use_loader(loader):
+                func(page_id)
+        finally:
+            loader.forget(page_id)  # done with it; a later reader (e.g. a child topic) sees the new row
+    return handler
+
+
+def _set_product_action(page_ids, status):
+    supabase.table('pages').update({"product_action": status}).in_('id', list(page_ids)).execute()
+
+
+# Each open job event stream holds a server thread, so streams are short (long-poll style: the
+# stream closes after JOB_EVENTS_STREAM_SEC and EventSource reconnects from its last id) and at most
+# JOB_EVENT_STREAMS_MAX are open per process; past that the client is told to retry (503).
+JOB_EVENTS_STREAM_SEC = int(os.environ.get("JOB_EVENTS_STREAM_SEC", 25))
+JOB_EVENT_STREAMS_MAX = int(os.environ.get("JOB_EVENT_STREAMS_MAX", 3))
+_job_event_streams = threading.BoundedSemaphore(JOB_EVENT_STREAMS_MAX)
+
+# batch_update_pages action -> (per-page handler, response message)
+BACKGROUND_PAGE_ACTIONS = {
+    'generate_content': (generate_content_for_page, "Content generation started in background. The status will update to 'Processing...' in the table."),
+    'generate_mofu': (generate_mofu_for_page, "MoFu generation started in background. The status will update to 'Processing...' in the table."),
+    'generate_tofu': (generate_tofu_for_page, "ToFu generation started in background. The status will update to 'Processing...' in the table."),
+}
+
+for _action, (_func, _message) in BACKGROUND_PAGE_ACTIONS.items():
+    register_job_type(
+        _action, _page_job(_func),
+        on_failure=lambda page_id, payload, error: _set_product_action([page_id], "Failed"),
+        on_cancel=lambda page_ids, payload: _set_product_action(page_ids, "Idle")
+    )
+
+
+@app.route('/api/outbound-stats', methods=['GET'])
+def outbound_stats():
+    """Per-provider call counts, 429s, queue wait vs call latency (this process only)."""
+    return jsonify(scheduler_stats())
+
+
+@app.route('/api/keyword-cache-stats', methods=['GET'])
+def keyword_cache_stats():
+    """DataForSEO cache hits/misses per endpoint (hits are paid lookups avoided)."""
+    return jsonify(get_keyword_cache().stats())
+
+
+@app.route('/api/llm-cache-stats', methods=['GET'])
+def llm_cache_stats():
+    """Gemini response cache hit rate and tokens/seconds saved (this process)."""
+    return jsonify(get_llm_cache().stats())
+
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    try:
+        limit = min(int(request.args.get('limit', 20)), 100)
+        return jsonify({"jobs": get_queue().list_jobs(limit=limit, status=request.args.get('status'))})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Job progress plus per-page status, attempts and last error."""
+    job = get_queue().get_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """
+    Job progress as Server-Sent Events: per-page item events (running, succeeded, retrying,
+    failed, cancelled, with errors and elapsed_ms), stage events with their durations, and a
+    final 'complete' event carrying the job. Browsers reconnect with Last-Event-ID and resume.
+    """
+    queue = get_queue()
+    if not queue.get_job(job_id, include_items=False):
+        return jsonify({"error": "Job not found"}), 404
+    try:
+        after = int(request.headers.get('Last-Event-ID') or request.args.get('after') or 0)
+    except ValueError:
+        after = 0
+
+    if not _job_event_streams.acquire(blocking=False):
+        return Response("retry: 5000\n\n", status=503, mimetype='text/event-stream',
+                        headers={'Retry-After': '5', 'Cache-Control': 'no-cache'})
+
+    def frames():
+        yield "retry: 2000\n\n"
+        for event in queue.stream_events(job_id, after, max_seconds=JOB_EVENTS_STREAM_SEC):
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield (f"id: {event['id']}\n" if 'id' in event else '') + sse_format(event)
+
+    response = Response(stream_with_context(frames()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(_job_event_streams.release)
+    return response
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = get_queue().cancel(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
+
+@app.route('/api/generate-content-stream', methods=['POST'])
+def generate_content_stream():
+    """
+    generate_content for one page as Server-Sent Events: Topic articles stream as 'chunk'
+    events, 'meta' once the Meta Description line is complete, and 'complete' after the article
+    is saved. Generation runs to the end (and is saved) even if the client disconnects.
+    """
+    if not supabase: return jsonify({"error": "Supabase not configured"}), 500
+    data = request.get_json() or {}
+    page_id = data.get('page_id')
+    if not page_id:
+        return jsonify({"error": "page_id required"}), 400
+
+    supabase.table('pages').update({"product_action": "Processing..."}).eq('id', page_id).execute()
+
+    def generate(on_event):
+        completed = []
+
+        def emit(event):
+            if event['event'] == 'complete':
+                completed.append(event)
+            on_event(event)
+
+        try:
+            generate_content_for_page(page_id, on_event=emit)
+        except Exception:
+            _set_product_action([page_id], "Failed")
+            raise
+        if not completed:
+            _set_product_action([page_id], "Failed")  # don't leave it "Processing..."
+            on_event({'event': 'error', 'error': "Page not found or its type has no content generator"})
+
+    return sse_response(run_with_events(generate, name='content-stream'))
+
+
+@app.route('/api/batch-update-pages', methods=['POST'])
+def batch_update_pages():
+    print(f"====== BATCH UPDATE PAGES CALLED ======", flush=True)
+    log_debug("Entered batch_update_pages route")
+    log_debug(f"Entered batch_update_pages route")
+    if not supabase: return jsonify({"error": "Supabase not configured"}), 500
+    
+    try:
+        data = request.json
+        log_debug(f"Received batch update data: {data}")
+        page_ids = data.get('page_ids', [])
+        action = data.get('action')
+        
+        if not page_ids or not action:
+            return jsonify({"error": "page_ids and action required"}), 400
+            
+        if action == 'trigger_audit':
+            # In a real app, this would trigger a background job
+            supabase.table('pages').update({"audit_status": "Pending"}).in_('id', page_ids).execute()
+            
+        elif action == 'trigger_classification':
+            supabase.table('pages').update({"classification_status": "Pending"}).in_('id', page_ids).execute()
+            
+        elif action == 'approve_strategy':
+            supabase.table('pages').update({"approval_status": True}).in_('id', page_ids).execute()
+            
+        elif action == 'scrape_content':
+            # Scrape existing content for selected pages (unchanged pages reuse their stored extraction)
+            scraped_count, skipped_count, failed_count = 0, 0, 0
+            loader = PageLoader(supabase, ancestors=0).prefetch(page_ids)
+            for page_id in page_ids:
+                page = loader.page(page_id)
+                if not page: continue
+                
+                try:
+                    current_tech_data = page.get('tech_audit_data') or {}
+                    scraped_data = scrape_page_content(page['url'], previous=current_tech_data)
+                    
+                    if scraped_data and scraped_data['unchanged']:
+                        skipped_count += 1
+                        if current_tech_data.get('scrape_cache') != scraped_data['scrape_cache']:
+                            current_tech_data['scrape_cache'] = scraped_data['scrape_cache']
+                            supabase.table('pages').update({
+                                "tech_audit_data": current_tech_data
+                            }).eq('id', page_id).execute()
+                        print(f"= Unchanged, kept stored content for {page['url']}")
+                    elif scraped_data:
+                        # Update tech_audit_data with body_content AND title
+                        current_tech_data['body_content'] = scraped_data['body_content']
+                        current_tech_data['scrape_cache'] = scraped_data['scrape_cache']
+                        
+                        if not current_tech_data.get('title') or current_tech_data.get('title') == 'Untitled':
+                             current_tech_data['title'] = scraped_data['title'] or get_title_from_url(page['url'])
+                        
+                        supabase.table('pages').update({
+                            "tech_audit_data": current_tech_data
+                        }).eq('id', page_id).execute()
+                        scraped_count += 1
+                        print(f"✓ Scraped content for {page['url']}")
+                    else:
+                        failed_count += 1
+                        print(f"⚠ Failed to scrape {page['url']}")
+                        
+                except Exception as e:
+                    failed_count += 1
+                    print(f"Error scraping page {page_id}: {e}")
+            
+            return jsonify({
+                "message": f"Content scraped successfully ({scraped_count} scraped, {skipped_count} unchanged, {failed_count} failed)",
+                "scraped": scraped_count,
+                "skipped_unchanged": skipped_count,
+                "failed": failed_count
+            })
+        elif action in BACKGROUND_PAGE_ACTIONS:
+            # Long-running generation runs on the job queue (see api/jobs.py), one item per page
             # Set status to Processing immediately
             try:
                 log_debug(f"Updating status to Processing for {page_ids}")
@@ -3962,13 +4279,11 @@ def batch_update_pages():
             except Exception as e:
                 log_debug(f"Failed to update status to Processing: {e}")
 
-            # Start background thread
-            log_debug("Starting background MoFu thread...")
-            thread = threading.Thread(target=process_mofu_generation, args=(page_ids, os.environ.get("GEMINI_API_KEY")))
-            thread.start()
-            
-            return jsonify({"message": "MoFu generation started in background. The status will update to 'Processing...' in the table."})
+            job_id = get_queue().enqueue(action, page_ids, {"action": action})
+            ensure_inline_worker()
+            log_debug(f"Queued {action} job {job_id} for {len(page_ids)} pages")
 
+            return jsonify({"message": BACKGROUND_PAGE_ACTIONS[action][1], "job_id": job_id})
 
         elif action == 'conduct_research':
             # SIMPLIFIED: Perplexity Research Brief ONLY
@@ -3976,15 +4291,15 @@ def batch_update_pages():
             print(f"====== CONDUCT_RESEARCH ACTION ======", flush=True)
             print(f"DEBUG: Received page_ids: {page_ids}", flush=True)
             log_debug(f"CONDUCT_RESEARCH: Starting for {len(page_ids)} pages")
+            loader = PageLoader(supabase, ancestors=0).prefetch(page_ids)
             
             for page_id in page_ids:
                 print(f"DEBUG: Processing page_id: {page_id}", flush=True)
                 try:
                     # Get the Topic page
-                    page_res = supabase.table('pages').select('*').eq('id', page_id).single().execute()
-                    if not page_res.data: continue
+                    page = loader.page(page_id)
+                    if not page: continue
                     
-                    page = page_res.data
                     topic_title = page.get('tech_audit_data', {}).get('title', '')
                     research_data = page.get('research_data') or {}
                     
@@ -3997,9 +4312,7 @@ def batch_update_pages():
                     competitor_urls = research_data.get('competitor_urls', [])
                     
                     # Fetch Project Settings for Localization (Moved OUTSIDE if block)
-                    project_res = supabase.table('projects').select('location, language').eq('id', page['project_id']).single().execute()
-                    project_loc = project_res.data.get('location', 'US') if project_res.data else 'US'
-                    project_lang = project_res.data.get('language', 'English') if project_res.data else 'English'
+                    project_loc, project_lang = loader.project_settings(page['project_id'])
                     
                     # Fallback: If no keywords (maybe old page), run Gemini now
                     if not keywords:
@@ -4054,239 +4367,14 @@ def batch_update_pages():
                     traceback.print_exc()
             
             return jsonify({"message": "Research complete"})
-
-
-        elif action == 'generate_tofu':
-            # Async processing for ToFu
-            import threading
-            
-            def process_tofu_generation(page_ids, api_key):
-                log_debug(f"Background ToFu thread started for pages: {page_ids}")
-                try:
-                    # Use new google-genai SDK with Grounding (ENABLED!)
-                    client = genai_new.Client(api_key=api_key)
-                    tool = types.Tool(google_search=types.GoogleSearch())
-                    
-                    for pid in page_ids:
-                        # Fetch Source MoFu Page
-                        mofu_res = supabase.table('pages').select('*').eq('id', pid).single().execute()
-                        if not mofu_res.data: continue
-                        mofu = mofu_res.data
-                        mofu_tech = mofu.get('tech_audit_data') or {}
-                        
-                        print(f"Researching ToFu opportunities for MoFu topic: {mofu_tech.get('title')}...")
-                        
-                        # === NEW DATA-FIRST WORKFLOW FOR TOFU ===
-                        
-                        # Fetch Project Settings for Localization (Moved UP)
-                        project_res = supabase.table('projects').select('location, language').eq('id', mofu['project_id']).single().execute()
-                        project_loc = project_res.data.get('location', 'US') if project_res.data else 'US'
-                        project_lang = project_res.data.get('language', 'English') if project_res.data else 'English'
-
-                        # Step 1: Get broad keyword ideas based on MoFu topic
-                        mofu_title = mofu_tech.get('title', '')
-                        print(f"Researching ToFu opportunities for: {mofu_title} (Loc: {project_loc})")
-                        
-                        # Get keyword opportunities from DataForSEO
-                        # For ToFu, we want broader terms, so we might strip "Best" or "Review" from the seed
-                        seed_keyword = mofu_title.replace('Best ', '').replace('Review', '').replace(' vs ', ' ').strip()
-                        # NEW: Use Gemini 2.0 Flash with Grounding as PRIMARY source (User Request)
-                        print(f"DEBUG: Using Gemini 2.0 Flash for ToFu keyword research (Primary)...")
-                        
-                        gemini_result = perform_gemini_research(seed_keyword, location=project_loc, language=project_lang)
-                        keywords = []
-                        
-                        if gemini_result and gemini_result.get('keywords'):
-                            print(f"✓ Gemini Research successful. Found {len(gemini_result['keywords'])} keywords.")
-                            for k in gemini_result['keywords']:
-                                keywords.append({
-                                    'keyword': k.get('keyword'),
-                                    'volume': 100, # Placeholder
-                                    'score': 100,
-                                    'cpc': 0,
-                                    'competition': 0,
-                                    'intent': k.get('intent', 'Informational')
-                                })
-                        else:
-                            print(f"⚠ Gemini Research failed. Using fallback.")
-                            keywords = [{'keyword': seed_keyword, 'volume': 0, 'score': 0, 'cpc': 0, 'competition': 0}]
-                        
-                        # Step 2: Analyze SERP for top 5 keywords (Optional - keeping for context if fast enough, or remove for speed)
-                        # For now, we'll keep it lightweight or rely on Gemini Grounding in the prompt.
-                        # Let's SKIP DataForSEO SERP to save time/cost, and rely on Gemini Grounding.
-                        serp_summary = "Relied on Gemini Grounding for current SERP context."
-                        
-                        # Step 3: Generate Topics (Lightweight - No Perplexity)
-                        import datetime
-                        current_year = datetime.datetime.now().year
-                        
-                        # Format keyword list for prompt
-                        keyword_list = '\n'.join([f"- {k['keyword']} ({k['volume']}/mo, Score: {k.get('score', 0)})" for k in keywords[:100]])
-
-                        topic_prompt = f"""
-                        You are an SEO Strategist. Generate 5 High-Value Top-of-Funnel (ToFu) topic ideas that lead to: {mofu_tech.get('title')}
-                        
-                        **CONTEXT**:
-                        - Target Audience: People at the beginning of their journey (Problem Aware).
-                        - Location: {project_loc}
-                        - Language: {project_lang}
-                        - Goal: Educate them and naturally lead them to the solution (the MoFu topic).
-                        
-                        **HIGH-OPPORTUNITY KEYWORDS**:
-                        {keyword_list}
-                        
-                        **INSTRUCTIONS**:
-                        1.  **Use Grounding**: Search Google to ensure these topics are currently relevant and not already saturated in **{project_loc}**.
-                        2.  **Focus**: "What is", "How to", "Guide to", "Benefits of", "Mistakes to Avoid".
-                        3.  **Variety**: specific angles, not just generic guides.
-                        
-                        **LOCALIZATION RULES (CRITICAL)**:
-                        1. **Currency**: You MUST use the local currency for **{project_loc}** (e.g., ₹ INR for India). Convert prices if needed.
-                        2. **Units**: Use the measurement system standard for **{project_loc}**.
-                        3. **Spelling**: Use the correct spelling dialect (e.g., "Colour" for UK/India).
-                        4. **Cultural Context**: Use examples relevant to **{project_loc}**.
-                        
-                        Current Date: {datetime.datetime.now().strftime("%B %Y")}
-                        
-                        Return a JSON object with a key "topics" containing a list of objects:
-                        - "title": Topic Title (Must include a primary keyword)
-                        - "slug": URL friendly slug
-                        - "description": Brief content description (intent)
-                        - "keyword_cluster": List of ALL semantically relevant keywords from the list (aim for 30+ per topic if relevant)
-                        - "primary_keyword": The main keyword targeted
-                        """
-                        
-                        try:
-                            response = client.models.generate_content(
-                                model="gemini-2.5-flash",
-                                contents=topic_prompt,
-                                config=types.GenerateContentConfig(tools=[tool])
-                            )
-                            text = response.text.strip()
-                            if text.startswith('```json'): text = text[7:]
-                            if text.startswith('```'): text = text[3:]
-                            if text.endswith('```'): text = text[:-3]
-                            
-                            data = json.loads(text)
-                            topics = data.get('topics', [])
-                            
-                            new_pages = []
-                            for t in topics:
-                                # Map selected keywords back to their data
-                                cluster_data = []
-                                for k_str in t.get('keyword_cluster', []):
-                                    match = next((k for k in keywords if k['keyword'].lower() == k_str.lower()), None)
-                                    if match: cluster_data.append(match)
-                                    else: cluster_data.append({'keyword': k_str, 'volume': 0, 'score': 0, 'intent': 'Informational'})
-                                
-                                # Standardized Format: "keyword | intent |" (Matches MoFu style)
-                                keywords_str = '\n'.join([
-                                    f"{k['keyword']} | {k.get('intent', 'Informational')} |"
-                                    for k in cluster_data
-                                ])
-                                
-                                # Minimal research data (No Perplexity yet)
-                                topic_research = {
-                                    "stage": "topic_generated",
-                                    "keyword_cluster": cluster_data,
-                                    "primary_keyword": t.get('primary_keyword')
-                                }
-
-                                new_pages.append({
-                                    "project_id": mofu['project_id'],
-                                    "source_page_id": pid,
-                                    "url": f"{mofu['url'].rsplit('/', 1)[0]}/{t['slug']}", 
-                                    "page_type": "Topic",
-                                    "funnel_stage": "ToFu",
-                                    "product_action": "Idle", # Ready for manual "Conduct Research"
-                                    "tech_audit_data": {
-                                        "title": t['title'],
-                                        "meta_description": t['description'],
-                                        "meta_title": t['title']
-                                    },
-                                    "content_description": t['description'],
-                                    "keywords": keywords_str,
-                                    "slug": t['slug'],
-                                    "research_data": topic_research
-                                })
-                            
-                            if new_pages:
-                                print(f"Attempting to insert {len(new_pages)} ToFu topics...")
-                                insert_res = supabase.table('pages').insert(new_pages).execute()
-                                print("✓ ToFu topics inserted successfully.")
-                                
-                                # AUTO-KEYWORD RESEARCH (Gemini) - Architecture Parity with MoFu
-                                if insert_res.data:
-                                    print(f"DEBUG: Starting Auto-Keyword Research for {len(insert_res.data)} ToFu topics...")
-                                    for inserted_page in insert_res.data:
-                                        try:
-                                            p_id = inserted_page['id']
-                                            t_data = inserted_page.get('tech_audit_data', {})
-                                            if isinstance(t_data, str):
-                                                try: t_data = json.loads(t_data)
-                                                except: t_data = {}
-                                                
-                                            p_title = t_data.get('title', '')
-                                            if not p_title: continue
-                                            
-                                            log_debug(f"Auto-Researching keywords for ToFu: {p_title}")
-                                            # Use project location/language for research
-                                            gemini_result = perform_gemini_research(p_title, location=project_loc, language=project_lang)
-                                            
-                                            if gemini_result:
-                                                keywords = gemini_result.get('keywords', [])
-                                                formatted_keywords = '\n'.join([
-                                                    f"{kw.get('keyword', '')} | {kw.get('intent', 'informational')} |"
-                                                    for kw in keywords if kw.get('keyword')
-                                                ])
-                                                
-                                                # Create research data (partial)
-                                                research_data = {
-                                                    "stage": "keywords_only", 
-                                                    "mode": "hybrid",
-                                                    "competitor_urls": [c['url'] for c in gemini_result.get('competitors', [])],
-                                                    "ranked_keywords": keywords,
-                                                    "formatted_keywords": formatted_keywords
-                                                }
-                                                
-                                                supabase.table('pages').update({
-                                                    "keywords": formatted_keywords,
-                                                    "research_data": research_data
-                                                }).eq('id', p_id).execute()
-                                                log_debug(f"✓ Keywords saved for {p_title}")
-                                        except Exception as research_err:
-                                            log_debug(f"Auto-Research failed for {p_title}: {research_err}")
-                            
-                            # Update Source Page Status
-                            supabase.table('pages').update({"product_action": "ToFu Generated"}).eq('id', pid).execute()
-                            
-                        except Exception as e:
-                            print(f"Error generating ToFu topics: {e}")
-                            import traceback
-                            traceback.print_exc()
-                
-                except Exception as e:
-                    log_debug(f"ToFu Thread Error: {e}")
-
-            # Set status to Processing immediately
-            try:
-                log_debug(f"Updating status to Processing for {page_ids}")
-                supabase.table('pages').update({"product_action": "Processing..."}).in_('id', page_ids).execute()
-            except Exception as e:
-                log_debug(f"Failed to update status to Processing: {e}")
-
-            # Start background thread
-            log_debug("Starting background ToFu thread...")
-            thread = threading.Thread(target=process_tofu_generation, args=(page_ids, os.environ.get("GEMINI_API_KEY")))
-            thread.start()
-            
-            return jsonify({"message": "ToFu generation started in background. The status will update to 'Processing...' in the table."})
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/get-page-details', methods=['GET'])
 def get_page_details():
+    """Full row for one page (heavy columns the list view leaves out)."""
     if not supabase: return jsonify({"error": "Supabase not configured"}), 500
     
     try:
@@ -4309,6 +4397,22 @@ def get_page_details():
 
 
 
+def image_prompt_request(topic, project_loc):
+    """Gemini prompt that asks for an image-generation prompt for a blog post."""
+    return f"""
+    You are an expert AI Art Director.
+    Create a detailed, high-quality image generation prompt for a blog post titled: "{topic}".
+    
+    **CONTEXT**:
+    - Target Audience Location: {project_loc} (Ensure cultural relevance, e.g., models, setting)
+    
+    Style: Photorealistic, Cinematic, High-End Editorial.
+    The style should be: "Modern, Minimalist, Tech-focused, 3D Render, High Resolution".
+    
+    Output: Just the prompt text.
+    Return ONLY the prompt text. No "Here is the prompt" or quotes.
+    """
+
 @app.route('/api/generate-image-prompt', methods=['POST'])
 def generate_image_prompt():
     if not supabase: return jsonify({"error": "Supabase not configured"}), 500
@@ -4325,22 +4429,10 @@ def generate_image_prompt():
             if project_res.data:
                 project_loc = project_res.data.get('location', 'US')
 
-        prompt = f"""
-        You are an expert AI Art Director.
-        Create a detailed, high-quality image generation prompt for a blog post titled: "{topic}".
-        
-        **CONTEXT**:
-        - Target Audience Location: {project_loc} (Ensure cultural relevance, e.g., models, setting)
-        
-        Style: Photorealistic, Cinematic, High-End Editorial.
-        The style should be: "Modern, Minimalist, Tech-focused, 3D Render, High Resolution".
-        
-        Output: Just the prompt text.
-        Return ONLY the prompt text. No "Here is the prompt" or quotes.
-        """
+        prompt = image_prompt_request(topic, project_loc)
         
         model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        response = model.generate_content(prompt)
+        response = scheduled_call('gemini', model.generate_content, prompt)
         
         return jsonify({"prompt": response.text.strip()})
     except Exception as e:
@@ -4473,7 +4565,7 @@ def update_photoshoot(photoshoot_id):
                 print(f"Generating image with prompt: {prompt_text} and image: {bool(input_image_url)}")
                 # Generate image using Gemini model
                 image_model = genai.GenerativeModel('gemini-2.5-flash-image')
-                response = image_model.generate_content(content_parts)
+                response = scheduled_call('gemini', image_model.generate_content, content_parts)
                 
                 print("Generation response received")
                 
@@ -4539,7 +4631,7 @@ def update_photoshoot(photoshoot_id):
                 print(f"Generating upscale...")
                 # Generate image using Gemini model
                 image_model = genai.GenerativeModel('gemini-2.5-flash-image')
-                response = image_model.generate_content(content_parts)
+                response = scheduled_call('gemini', image_model.generate_content, content_parts)
                 
                 print("Upscale response received")
                 
@@ -0,0 +1,28 @@
+"""
+Standalone worker for the batch_update_pages job queue.
+
+Run next to the web server (both must point at the same JOBS_DB_PATH):
+    JOB_WORKER_MODE=process python api/job_worker.py
+"""
+
+import os
+import signal
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import index  # noqa: F401  registers the job handlers
+from jobs import JobWorker
+
+
+def main():
+    worker = JobWorker()
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    try:
+        worker.run_forever()
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+if __name__ == "__main__":
+    main()
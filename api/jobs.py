@@ -0,0 +1,578 @@
+import contextvars
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from app_logging import log_context
+
+# Tunables (override via environment)
+JOBS_DB_PATH = os.environ.get("JOBS_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'jobs.db'))
+JOB_WORKER_CONCURRENCY = int(os.environ.get("JOB_WORKER_CONCURRENCY", 4))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+JOB_RETRY_BASE_SEC = float(os.environ.get("JOB_RETRY_BASE_SEC", 30))   # backoff: base * 2^(attempt-1) + jitter
+JOB_LEASE_SEC = float(os.environ.get("JOB_LEASE_SEC", 1800))           # running items older than this are requeued
+JOB_POLL_SEC = float(os.environ.get("JOB_POLL_SEC", 1.0))
+JOB_EVENT_POLL_SEC = float(os.environ.get("JOB_EVENT_POLL_SEC", 0.5))     # how often a stream checks for new events
+JOB_EVENT_TTL_SEC = float(os.environ.get("JOB_EVENT_TTL_SEC", 3 * 86400))  # events older than this are purged
+
+# Terminal states
+JOB_DONE_STATES = ('succeeded', 'failed', 'cancelled')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT,
+    total INTEGER NOT NULL DEFAULT 0,
+    succeeded INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    cancelled INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_run_at REAL NOT NULL,
+    lease_until REAL,
+    worker TEXT,
+    last_error TEXT,
+    started_at REAL,
+    finished_at REAL,
+    PRIMARY KEY (job_id, item_id)
+);
+CREATE INDEX IF NOT EXISTS idx_job_items_ready ON job_items (status, next_run_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    item_id TEXT,
+    event TEXT NOT NULL,
+    status TEXT,
+    stage TEXT,
+    data TEXT,
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_job_events_job ON job_events (job_id, seq);
+"""
+
+
+class JobCancelled(Exception):
+    """Raised by handlers (via JobContext.check_cancelled) to stop work on a cancelled job."""
+
+
+class JobHandler:
+    def __init__(self, func, max_attempts=None, on_failure=None, on_cancel=None):
+        self.func = func
+        self.max_attempts = max_attempts or JOB_MAX_ATTEMPTS
+        self.on_failure = on_failure  # on_failure(item_id, payload, error) after the last attempt
+        self.on_cancel = on_cancel    # on_cancel(item_ids, payload) for items that never ran
+
+
+_handlers = {}
+
+
+def register_job_type(job_type, func, max_attempts=None, on_failure=None, on_cancel=None):
+    """
+    Register a per-item handler: func(item_id, payload, ctx). Raising retries the item with
+    exponential backoff until max_attempts is reached.
+    """
+    _handlers[job_type] = JobHandler(func, max_attempts, on_failure, on_cancel)
+
+
+def job_handler(job_type, max_attempts=None, on_failure=None, on_cancel=None):
+    """Decorator form of register_job_type."""
+    def decorator(func):
+        register_job_type(job_type, func, max_attempts, on_failure, on_cancel)
+        return func
+    return decorator
+
+
+def registered_job_types():
+    return sorted(_handlers)
+
+
+class JobContext:
+    def __init__(self, queue, job_id, item_id, attempt):
+        self.queue = queue
+        self.job_id = job_id
+        self.item_id = item_id
+        self.attempt = attempt
+        self._stage = None
+        self._stage_started = None
+
+    def check_cancelled(self):
+        if self.queue.is_cancel_requested(self.job_id):
+            raise JobCancelled(self.job_id)
+
+    def stage(self, name):
+        """Mark the start of a named stage; the previous one is reported done with its duration."""
+        self.end_stage()
+        self._stage, self._stage_started = name, time.time()
+        self.queue.record_event(self.job_id, self.item_id, 'stage', 'running', stage=name)
+
+    def end_stage(self, status='done'):
+        if self._stage is None:
+            return
+        elapsed_ms = int((time.time() - self._stage_started) * 1000)
+        self.queue.record_event(self.job_id, self.item_id, 'stage', status, stage=self._stage,
+                                data={'elapsed_ms': elapsed_ms})
+        self._stage = None
+
+    def checkpoint(self, name):
+        """Record that this item committed `name` (e.g. rows inserted), so a retry can skip it."""
+        self.queue.record_event(self.job_id, self.item_id, 'checkpoint', 'done', stage=name)
+
+    def reached(self, name):
+        """True if an earlier attempt of this item recorded checkpoint `name`."""
+        return self.queue.has_checkpoint(self.job_id, self.item_id, name)
+
+
+_current_job = contextvars.ContextVar('current_job', default=None)
+
+
+def job_stage(name):
+    """Report a progress stage for the job item running in this context (no-op outside jobs)."""
+    ctx = _current_job.get()
+    if ctx is not None:
+        try:
+            ctx.stage(name)
+        except Exception as e:
+            print(f"DEBUG: Could not record stage {name}: {e}")
+
+
+def job_checkpoint(name):
+    """JobContext.checkpoint for the job item running in this context (no-op outside jobs)."""
+    ctx = _current_job.get()
+    if ctx is not None:
+        ctx.checkpoint(name)
+
+
+def job_reached(name):
+    """True if the job item running in this context already passed checkpoint `name`."""
+    ctx = _current_job.get()
+    return ctx is not None and ctx.attempt > 1 and ctx.reached(name)
+
+
+class JobQueue:
+    """
+    SQLite-backed queue. Each job fans out into one item per page; workers claim items
+    atomically, so any number of worker threads/processes can share the same file.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or JOBS_DB_PATH
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _connect(self):
+        return _Transaction(self._conn())
+
+    # --- Producers ---
+
+    def enqueue(self, job_type, item_ids, payload=None):
+        if job_type not in _handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        item_ids = list(dict.fromkeys(str(i) for i in item_ids))
+        with self._connect() as conn:
+            conn.execute("DELETE FROM job_events WHERE ts < ?", (now - JOB_EVENT_TTL_SEC,))
+            conn.execute(
+                "INSERT INTO jobs (id, type, status, payload, total, created_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, job_type, json.dumps(payload or {}), len(item_ids), now)
+            )
+            conn.executemany(
+                "INSERT INTO job_items (job_id, item_id, position, status, next_run_at) VALUES (?, ?, ?, 'queued', ?)",
+                [(job_id, item_id, pos, now) for pos, item_id in enumerate(item_ids)]
+            )
+        return job_id
+
+    def cancel(self, job_id):
+        """Stop a job: queued items are dropped now, running items see check_cancelled()."""
+        now = time.time()
+        with self._connect() as conn:
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if not job:
+                return None
+            if job['status'] in JOB_DONE_STATES:
+                return self.get_job(job_id)
+            dropped = [r['item_id'] for r in conn.execute(
+                "SELECT item_id FROM job_items WHERE job_id = ? AND status = 'queued'", (job_id,))]
+            conn.execute(
+                "UPDATE job_items SET status = 'cancelled', finished_at = ? WHERE job_id = ? AND status = 'queued'",
+                (now, job_id)
+            )
+            conn.execute(
+                "UPDATE jobs SET cancel_requested = 1, cancelled = cancelled + ? WHERE id = ?",
+                (len(dropped), job_id)
+            )
+            for item_id in dropped:
+                self._record(conn, job_id, item_id, 'item', 'cancelled')
+            self._finish_if_done(conn, job_id)
+
+        handler = _handlers.get(job['type'])
+        if dropped and handler and handler.on_cancel:
+            try:
+                handler.on_cancel(dropped, json.loads(job['payload'] or '{}'))
+            except Exception as e:
+                print(f"DEBUG: on_cancel hook failed for job {job_id}: {e}")
+        return self.get_job(job_id)
+
+    # --- Status ---
+
+    def is_cancel_requested(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return bool(row and row['cancel_requested'])
+
+    def get_job(self, job_id, include_items=True):
+        with self._connect() as conn:
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if not job:
+                return None
+            result = self._job_dict(job)
+            if include_items:
+                result['items'] = [dict(r) for r in conn.execute(
+                    "SELECT item_id, status, attempts, last_error, next_run_at, started_at, finished_at "
+                    "FROM job_items WHERE job_id = ? ORDER BY position", (job_id,))]
+            return result
+
+    def list_jobs(self, limit=20, status=None):
+        with self._connect() as conn:
+            if status:
+                rows = conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?", (status, limit))
+            else:
+                rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+            return [self._job_dict(r) for r in rows]
+
+    # --- Progress events ---
+
+    def _record(self, conn, job_id, item_id, event, status, stage=None, data=None):
+        conn.execute(
+            "INSERT INTO job_events (job_id, item_id, event, status, stage, data, ts) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, item_id, event, status, stage, json.dumps(data) if data else None, time.time())
+        )
+
+    def record_event(self, job_id, item_id, event, status, stage=None, data=None):
+        with self._connect() as conn:
+            self._record(conn, job_id, item_id, event, status, stage, data)
+
+    def has_checkpoint(self, job_id, item_id, name):
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT 1 FROM job_events WHERE job_id = ? AND item_id = ? AND event = 'checkpoint' AND stage = ? LIMIT 1",
+                (job_id, item_id, name)
+            ).fetchone() is not None
+
+    def events_since(self, job_id, after=0, limit=500):
+        """Events of a job with seq > after, oldest first, as flat dicts (their 'id' is the seq)."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?", (job_id, after, limit)
+            ).fetchall()
+        events = []
+        for row in rows:
+            event = {'id': row['seq'], 'event': row['event'], 'job_id': row['job_id'], 'item_id': row['item_id'],
+                     'status': row['status'], 'ts': row['ts']}
+            if row['stage']:
+                event['stage'] = row['stage']
+            event.update(json.loads(row['data'] or '{}'))
+            events.append(event)
+        return events
+
+    def stream_events(self, job_id, after=0, max_seconds=None, heartbeat_sec=15, poll_interval=None):
+        """
+        Generator of a job's events from seq `after` on, polling the table (workers may be other
+        processes). Ends with a 'complete' event carrying the job once it is finished, or after
+        `max_seconds` (the client reconnects with its last id). Yields None as a keep-alive.
+        """
+        poll_interval = poll_interval or JOB_EVENT_POLL_SEC
+        started = last_sent = time.time()
+        while True:
+            if max_seconds and time.time() - started >= max_seconds:
+                return  # checked every round, so a busy job cannot hold the stream open
+            events = self.events_since(job_id, after)
+            for event in events:
+                after = event['id']
+                yield event
+            if events:
+                last_sent = time.time()
+                continue
+            job = self.get_job(job_id, include_items=False)
+            if job is None:
+                return
+            if job['status'] in JOB_DONE_STATES:
+                if self.events_since(job_id, after, limit=1):
+                    continue  # recorded while we were checking
+                yield {'event': 'complete', 'job_id': job_id, 'status': job['status'], 'job': self.get_job(job_id)}
+                return
+            if time.time() - last_sent >= heartbeat_sec:
+                last_sent = time.time()
+                yield None
+            time.sleep(poll_interval)
+
+    def _job_dict(self, job):
+        result = dict(job)
+        result['payload'] = json.loads(result['payload'] or '{}')
+        finished = result['succeeded'] + result['failed'] + result['cancelled']
+        result['progress'] = round(finished / result['total'], 3) if result['total'] else 1.0
+        return result
+
+    # --- Workers ---
+
+    def claim(self, worker_id):
+        """Atomically take the next runnable item. Returns (job_row, item_row) or None."""
+        now = time.time()
+        self._expire_leases(now)
+        with self._connect() as conn:
+            item = conn.execute(
+                "SELECT i.* FROM job_items i JOIN jobs j ON j.id = i.job_id "
+                "WHERE i.status = 'queued' AND i.next_run_at <= ? AND j.cancel_requested = 0 "
+                "ORDER BY j.created_at, i.position LIMIT 1", (now,)
+            ).fetchone()
+            if not item:
+                return None
+            conn.execute(
+                "UPDATE job_items SET status = 'running', attempts = attempts + 1, worker = ?, lease_until = ?, "
+                "started_at = COALESCE(started_at, ?) WHERE job_id = ? AND item_id = ?",
+                (worker_id, now + JOB_LEASE_SEC, now, item['job_id'], item['item_id'])
+            )
+            conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = COALESCE(started_at, ?) WHERE id = ? AND status = 'queued'",
+                (now, item['job_id'])
+            )
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (item['job_id'],)).fetchone()
+            item = conn.execute("SELECT * FROM job_items WHERE job_id = ? AND item_id = ?",
+                                (item['job_id'], item['item_id'])).fetchone()
+            self._record(conn, item['job_id'], item['item_id'], 'item', 'running', data={'attempt': item['attempts']})
+            return dict(job), dict(item)
+
+    def _expire_leases(self, now):
+        """
+        Requeue items whose worker died or hung mid-run. An item that has used up its attempts
+        is failed instead, so one that keeps killing its worker does not come back forever.
+        """
+        with self._connect() as conn:
+            expired = conn.execute(
+                "SELECT i.job_id, i.item_id, i.attempts, j.type, j.payload FROM job_items i JOIN jobs j ON j.id = i.job_id "
+                "WHERE i.status = 'running' AND i.lease_until < ?", (now,)
+            ).fetchall()
+            failed = []
+            for row in expired:
+                handler = _handlers.get(row['type'])
+                max_attempts = handler.max_attempts if handler else JOB_MAX_ATTEMPTS
+                if row['attempts'] >= max_attempts:
+                    error = f"Lease expired after {row['attempts']} attempts (worker died or hung)"
+                    self._settle_in(conn, row['job_id'], row['item_id'], 'failed', error)
+                    failed.append((handler, row, error))
+                else:
+                    conn.execute(
+                        "UPDATE job_items SET status = 'queued', worker = NULL WHERE job_id = ? AND item_id = ?",
+                        (row['job_id'], row['item_id'])
+                    )
+        for handler, row, error in failed:
+            if handler and handler.on_failure:
+                try:
+                    handler.on_failure(row['item_id'], json.loads(row['payload'] or '{}'), error)
+                except Exception as e:
+                    print(f"DEBUG: on_failure hook failed for {row['item_id']}: {e}")
+
+    def complete(self, job_id, item_id, elapsed_ms=None):
+        self._settle(job_id, item_id, 'succeeded', None, elapsed_ms)
+
+    def fail(self, job_id, item_id, error, attempts, max_attempts, elapsed_ms=None):
+        """Schedule a retry with backoff, or mark the item failed. Returns True if it will retry."""
+        if attempts < max_attempts and not self.is_cancel_requested(job_id):
+            delay = JOB_RETRY_BASE_SEC * (2 ** (attempts - 1))
+            delay += random.uniform(0, delay * 0.25)
+            with self._connect() as conn:
+                conn.execute(
+                    "UPDATE job_items SET status = 'queued', next_run_at = ?, last_error = ?, worker = NULL "
+                    "WHERE job_id = ? AND item_id = ? AND status NOT IN (?, ?, ?)",
+                    (time.time() + delay, error, job_id, item_id) + JOB_DONE_STATES
+                )
+                self._record(conn, job_id, item_id, 'item', 'retrying', data={
+                    'attempt': attempts, 'error': error, 'retry_in_sec': round(delay, 1), 'elapsed_ms': elapsed_ms})
+            return True
+        self._settle(job_id, item_id, 'failed', error, elapsed_ms)
+        return False
+
+    def mark_cancelled(self, job_id, item_id):
+        self._settle(job_id, item_id, 'cancelled', None)
+
+    def _settle(self, job_id, item_id, status, error, elapsed_ms=None):
+        with self._connect() as conn:
+            self._settle_in(conn, job_id, item_id, status, error, elapsed_ms)
+
+    def _settle_in(self, conn, job_id, item_id, status, error, elapsed_ms=None):
+        now = time.time()
+        updated = conn.execute(
+            "UPDATE job_items SET status = ?, last_error = COALESCE(?, last_error), finished_at = ?, worker = NULL "
+            "WHERE job_id = ? AND item_id = ? AND status NOT IN (?, ?, ?)",
+            (status, error, now, job_id, item_id) + JOB_DONE_STATES
+        ).rowcount
+        if not updated:
+            return  # already settled (e.g. failed on lease expiry while a hung worker was still on it)
+        conn.execute(f"UPDATE jobs SET {status} = {status} + 1 WHERE id = ?", (job_id,))
+        job = conn.execute("SELECT total, succeeded, failed, cancelled FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        data = {'progress': dict(job)}
+        if error:
+            data['error'] = error
+        if elapsed_ms is not None:
+            data['elapsed_ms'] = elapsed_ms
+        self._record(conn, job_id, item_id, 'item', status, data=data)
+        self._finish_if_done(conn, job_id)
+
+    def _finish_if_done(self, conn, job_id):
+        job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if job['succeeded'] + job['failed'] + job['cancelled'] < job['total']:
+            return
+        if job['cancel_requested']:
+            status = 'cancelled'
+        elif job['failed'] and not job['succeeded']:
+            status = 'failed'
+        else:
+            status = 'succeeded'  # per-item failures are still visible in the counters
+        conn.execute("UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?", (status, time.time(), job_id))
+        self._record(conn, job_id, None, 'job', status, data={
+            'progress': {k: job[k] for k in ('total', 'succeeded', 'failed', 'cancelled')}})
+
+
+class _Transaction:
+    """`with` block = one IMMEDIATE transaction on a per-thread connection."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
+
+
+class JobWorker:
+    """Pulls items from the queue and runs their handlers on a bounded thread pool."""
+
+    def __init__(self, queue=None, concurrency=None, poll_interval=None, name=None):
+        self.queue = queue or get_queue()
+        self.concurrency = concurrency or JOB_WORKER_CONCURRENCY
+        self.poll_interval = poll_interval or JOB_POLL_SEC
+        self.name = name or f"{os.uname().nodename if hasattr(os, 'uname') else 'worker'}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._slots = threading.Semaphore(self.concurrency)
+
+    def stop(self):
+        self._stop.set()
+
+    def run_item(self, job, item):
+        # Everything the handler logs carries the job and item ids
+        with log_context(job_id=job['id'], item_id=item['item_id']):
+            self._run_item(job, item)
+
+    def _run_item(self, job, item):
+        handler = _handlers.get(job['type'])
+        job_id, item_id, attempt = job['id'], item['item_id'], item['attempts']
+        payload = json.loads(job['payload'] or '{}')
+        if handler is None:
+            self.queue.fail(job_id, item_id, f"No handler registered for {job['type']}", attempt, attempt)
+            return
+        ctx = JobContext(self.queue, job_id, item_id, attempt)
+        started = time.time()
+        token = _current_job.set(ctx)
+        try:
+            ctx.check_cancelled()
+            handler.func(item_id, payload, ctx)
+            ctx.end_stage()
+            self.queue.complete(job_id, item_id, int((time.time() - started) * 1000))
+        except JobCancelled:
+            ctx.end_stage('cancelled')
+            self.queue.mark_cancelled(job_id, item_id)
+            if handler.on_cancel:
+                try:
+                    handler.on_cancel([item_id], payload)
+                except Exception as e:
+                    print(f"DEBUG: on_cancel hook failed for {item_id}: {e}")
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+            ctx.end_stage('failed')
+            will_retry = self.queue.fail(job_id, item_id, error, attempt, handler.max_attempts,
+                                         int((time.time() - started) * 1000))
+            print(f"DEBUG: Job {job_id} item {item_id} attempt {attempt}/{handler.max_attempts} failed: {error}"
+                  f"{' (retrying)' if will_retry else ''}")
+            if not will_retry and handler.on_failure:
+                try:
+                    handler.on_failure(item_id, payload, error)
+                except Exception as hook_err:
+                    print(f"DEBUG: on_failure hook failed for {item_id}: {hook_err}")
+        finally:
+            _current_job.reset(token)
+
+    def run_forever(self):
+        print(f"DEBUG: Job worker {self.name} started (concurrency={self.concurrency}, types={registered_job_types()})")
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='job') as pool:
+            while not self._stop.is_set():
+                self._slots.acquire()
+                claimed = None
+                try:
+                    claimed = self.queue.claim(self.name)
+                except Exception as e:
+                    print(f"DEBUG: Job claim failed: {e}")
+                if not claimed:
+                    self._slots.release()
+                    self._stop.wait(self.poll_interval)
+                    continue
+                future = pool.submit(self.run_item, *claimed)
+                future.add_done_callback(lambda _: self._slots.release())
+
+
+_queue = None
+_queue_lock = threading.Lock()
+_inline_worker = None
+
+
+def get_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
+
+
+def ensure_inline_worker():
+    """
+    When no separate worker process is deployed (JOB_WORKER_MODE=thread, e.g. local dev),
+    run a worker on a daemon thread inside the web process.
+    """
+    global _inline_worker
+    if os.environ.get("JOB_WORKER_MODE", "thread") != "thread":
+        return
+    with _queue_lock:
+        if _inline_worker is None:
+            _inline_worker = JobWorker(queue=_queue)
+            threading.Thread(target=_inline_worker.run_forever, name='job-worker', daemon=True).start()
@@ -0,0 +1,268 @@
+import contextvars
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from outbound_scheduler import INTERACTIVE, current_priority, outbound_priority
+
+# Tunables (override via environment)
+KEYWORD_CACHE_PATH = os.environ.get("KEYWORD_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'keyword_cache.db'))
+KEYWORD_BATCH_WINDOW = float(os.environ.get("KEYWORD_BATCH_WINDOW", 0.25))  # seconds to collect concurrent lookups
+KEYWORD_BATCH_MAX = int(os.environ.get("KEYWORD_BATCH_MAX", 1000))          # DataForSEO's per-task keyword limit
+
+DAY = 86400
+# Per-endpoint TTLs: volumes move monthly, rankings much faster
+ENDPOINT_TTLS = {
+    'historical_search_volume': 30 * DAY,
+    'keyword_ideas': 7 * DAY,
+    'ranked_keywords': 3 * DAY,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS keyword_cache (
+    endpoint TEXT NOT NULL,
+    cache_key TEXT NOT NULL,
+    location_code INTEGER NOT NULL,
+    language TEXT NOT NULL,
+    value TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (endpoint, cache_key, location_code, language)
+);
+"""
+
+
+def endpoint_ttl(endpoint):
+    return float(os.environ.get(f"KEYWORD_CACHE_TTL_{endpoint.upper()}", ENDPOINT_TTLS.get(endpoint, DAY)))
+
+
+def normalize_keyword(keyword):
+    return re.sub(r'\s+', ' ', (keyword or '').strip().lower())
+
+
+class KeywordCache:
+    """
+    SQLite cache of DataForSEO results keyed by (endpoint, keyword, location_code, language).
+
+    `lookup_volumes` also coalesces concurrent search-volume lookups: keywords requested by
+    different threads within KEYWORD_BATCH_WINDOW go out as one task of up to KEYWORD_BATCH_MAX.
+    An interactive lookup that finds nothing pending is sent at once instead of waiting.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or KEYWORD_CACHE_PATH
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._pending = {}    # (location_code, language) -> {keyword: Future} not yet sent
+        self._inflight = {}   # (location_code, language, keyword) -> Future already sent
+        self._timers = {}
+        self._priorities = {}  # (location_code, language) -> most urgent outbound priority waiting
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    # --- Storage ---
+
+    def get_many(self, endpoint, keys, location_code, language):
+        """{key: value} for keys cached and still fresh."""
+        if not keys:
+            return {}
+        cutoff = time.time() - endpoint_ttl(endpoint)
+        found = {}
+        keys = list(keys)
+        conn = self._conn()
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = conn.execute(
+                f"SELECT cache_key, value FROM keyword_cache WHERE endpoint = ? AND location_code = ? AND language = ? "
+                f"AND fetched_at >= ? AND cache_key IN ({','.join('?' * len(chunk))})",
+                [endpoint, location_code, language, cutoff] + chunk
+            )
+            for key, value in rows:
+                found[key] = json.loads(value)
+        return found
+
+    def set_many(self, endpoint, values, location_code, language):
+        if not values:
+            return
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO keyword_cache (endpoint, cache_key, location_code, language, value, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(endpoint, key, location_code, language, json.dumps(value), now) for key, value in values.items()]
+            )
+
+    def purge_expired(self):
+        conn = self._conn()
+        removed = 0
+        with conn:
+            for endpoint in set(ENDPOINT_TTLS) | {r[0] for r in conn.execute("SELECT DISTINCT endpoint FROM keyword_cache")}:
+                cur = conn.execute("DELETE FROM keyword_cache WHERE endpoint = ? AND fetched_at < ?",
+                                   (endpoint, time.time() - endpoint_ttl(endpoint)))
+                removed += cur.rowcount
+        return removed
+
+    # --- Stats ---
+
+    def _count(self, endpoint, **increments):
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, {'hits': 0, 'misses': 0, 'api_calls': 0})
+            for name, value in increments.items():
+                stats[name] += value
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for endpoint, s in self._stats.items():
+                lookups = s['hits'] + s['misses']
+                result[endpoint] = dict(s, hit_rate=round(s['hits'] / lookups, 3) if lookups else 0.0,
+                                        ttl_sec=endpoint_ttl(endpoint))
+        try:
+            result['_entries'] = self._conn().execute("SELECT COUNT(*) FROM keyword_cache").fetchone()[0]
+        except sqlite3.Error:
+            pass
+        return result
+
+    # --- Whole-response cache (keyword ideas, ranked keywords) ---
+
+    def cached_response(self, endpoint, key, location_code, language, fetch):
+        """
+        Cached result of fetch() -> DataForSEO response JSON. Only successful responses
+        (status_code 20000) are stored.
+        """
+        cached = self.get_many(endpoint, [key], location_code, language)
+        if key in cached:
+            self._count(endpoint, hits=1)
+            return cached[key]
+        self._count(endpoint, misses=1, api_calls=1)
+        data = fetch()
+        if isinstance(data, dict) and data.get('status_code') == 20000:
+            self.set_many(endpoint, {key: data}, location_code, language)
+        return data
+
+    # --- Search volume with batch coalescing ---
+
+    def lookup_volumes(self, keywords, location_code, language, fetch_batch, endpoint='historical_search_volume'):
+        """
+        {keyword: value} for every requested keyword DataForSEO knows about.
+        fetch_batch(keywords, location_code, language) -> {normalized keyword: value} is only
+        called for cache misses; keywords missing from its answer are cached as None.
+        """
+        wanted = {}
+        for kw in keywords:
+            norm = normalize_keyword(kw)
+            if norm:
+                wanted.setdefault(norm, []).append(kw)
+        if not wanted:
+            return {}
+
+        cached = self.get_many(endpoint, wanted, location_code, language)
+        misses = [k for k in wanted if k not in cached]
+        self._count(endpoint, hits=len(wanted) - len(misses), misses=len(misses))
+
+        futures = self._enqueue(misses, location_code, language, fetch_batch, endpoint) if misses else {}
+        values = dict(cached)
+        for norm, future in futures.items():
+            try:
+                values[norm] = future.result()
+            except Exception as e:
+                print(f"DEBUG: Keyword batch lookup failed for '{norm}': {e}")
+
+        result = {}
+        for norm, originals in wanted.items():
+            if values.get(norm) is not None:
+                for kw in originals:
+                    result[kw] = values[norm]
+        return result
+
+    def _enqueue(self, keywords, location_code, language, fetch_batch, endpoint):
+        group = (location_code, language)
+        priority = current_priority()
+        futures = {}
+        flush_now = False
+        with self._lock:
+            pending = self._pending.setdefault(group, {})
+            idle = not pending
+            for kw in keywords:
+                future = self._inflight.get(group + (kw,)) or pending.get(kw)
+                if future is None:
+                    future = Future()
+                    pending[kw] = future
+                futures[kw] = future
+            self._priorities[group] = min(priority, self._priorities.get(group, priority))
+            if len(pending) >= KEYWORD_BATCH_MAX or (idle and priority == INTERACTIVE):
+                flush_now = True
+            elif group not in self._timers:
+                # The timer thread flushes in this caller's context so log fields carry over
+                context = contextvars.copy_context()
+                timer = threading.Timer(KEYWORD_BATCH_WINDOW, context.run,
+                                        args=(self._flush, group, fetch_batch, endpoint))
+                timer.daemon = True
+                self._timers[group] = timer
+                timer.start()
+        if flush_now:
+            self._flush(group, fetch_batch, endpoint)
+        return futures
+
+    def _flush(self, group, fetch_batch, endpoint):
+        with self._lock:
+            timer = self._timers.pop(group, None)
+            if timer is not None:
+                timer.cancel()
+            pending = self._pending.pop(group, {})
+            priority = self._priorities.pop(group, INTERACTIVE)
+            for kw, future in pending.items():
+                self._inflight[group + (kw,)] = future
+        if not pending:
+            return
+
+        location_code, language = group
+        keywords = list(pending)
+        try:
+            for i in range(0, len(keywords), KEYWORD_BATCH_MAX):
+                chunk = keywords[i:i + KEYWORD_BATCH_MAX]
+                self._count(endpoint, api_calls=1)
+                with outbound_priority(priority):
+                    fetched = fetch_batch(chunk, location_code, language)
+                if fetched is None:
+                    # Request failed: answer the waiters but cache nothing
+                    for kw in chunk:
+                        pending[kw].set_result(None)
+                    continue
+                values = {kw: fetched.get(kw) for kw in chunk}
+                self.set_many(endpoint, values, location_code, language)
+                for kw in chunk:
+                    pending[kw].set_result(values[kw])
+        except Exception as e:
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            with self._lock:
+                for kw in keywords:
+                    self._inflight.pop(group + (kw,), None)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_keyword_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = KeywordCache()
+        return _cache
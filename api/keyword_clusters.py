@@ -0,0 +1,206 @@
+import math
+import os
+import re
+
+import numpy as np
+
+from keyword_cache import normalize_keyword
+
+# Tunables (override via environment)
+CLUSTER_SIMILARITY = float(os.environ.get("CLUSTER_SIMILARITY", 0.35))  # min cosine to join a cluster
+CLUSTER_SERP_WEIGHT = float(os.environ.get("CLUSTER_SERP_WEIGHT", 0.4))  # share of SERP overlap when known
+
+# Modifiers that say how someone searches, not what about; they should not pull keywords together
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'at', 'best', 'by', 'can', 'do', 'does', 'for', 'from', 'how', 'i', 'in', 'is',
+    'it', 'me', 'my', 'near', 'of', 'on', 'or', 'the', 'to', 'top', 'vs', 'versus', 'what', 'when', 'which',
+    'why', 'with', 'your',
+}
+
+
+def tokenize(keyword):
+    tokens = []
+    for token in re.findall(r'[a-z0-9]+', (keyword or '').lower()):
+        if token in STOPWORDS or re.fullmatch(r'(19|20)\d\d', token):
+            continue
+        if len(token) > 4 and token.endswith('es') and not token.endswith('ses'):
+            token = token[:-2]
+        elif len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def keyword_index(keywords):
+    """{normalized keyword: keyword dict} for O(1) lookups of model output against our data."""
+    index = {}
+    for k in keywords:
+        norm = normalize_keyword(k.get('keyword'))
+        if norm and norm not in index:
+            index[norm] = k
+    return index
+
+
+def _rank(k):
+    # Higher opportunity first, then volume, then the shorter (head) term
+    return (-(k.get('score') or 0), -(k.get('volume') or 0), len(k.get('keyword') or ''))
+
+
+class TfidfVectors:
+    """Sparse rows (token ids, L2-normalized TF-IDF weights) over a shared vocabulary."""
+
+    def __init__(self, texts):
+        docs = [tokenize(t) for t in texts]
+        self.vocab = {}
+        for doc in docs:
+            for token in doc:
+                self.vocab.setdefault(token, len(self.vocab))
+        df = np.zeros(len(self.vocab), dtype=np.float32)
+        rows = []
+        for doc in docs:
+            ids, counts = np.unique(np.fromiter((self.vocab[t] for t in doc), dtype=np.int64, count=len(doc)),
+                                    return_counts=True)
+            df[ids] += 1
+            rows.append((ids, counts.astype(np.float32)))
+        n = len(docs)
+        self.df = df
+        self.idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+        self.rows = []
+        for ids, counts in rows:
+            weights = counts * self.idf[ids]
+            norm = float(np.linalg.norm(weights))
+            self.rows.append((ids, weights / norm if norm else weights))
+
+    def dense(self):
+        matrix = np.zeros((len(self.rows), len(self.vocab)), dtype=np.float32)
+        for i, (ids, weights) in enumerate(self.rows):
+            matrix[i, ids] = weights
+        return matrix
+
+
+def cosine_matrix(keywords):
+    """Pairwise cosine similarity of the keywords' TF-IDF vectors (n x n; for small lists)."""
+    matrix = TfidfVectors(keywords).dense()
+    return matrix @ matrix.T
+
+
+def _serp_overlap(a, b):
+    if not a or not b:
+        return None
+    return len(a & b) / len(a | b)
+
+
+def cluster_keywords(keywords, threshold=None, serp_urls=None):
+    """
+    Group keyword dicts ({'keyword', 'volume', 'score', ...}) into topical clusters.
+
+    Keywords are visited best-first; each joins the cluster whose centroid it is most similar
+    to (cosine over TF-IDF, blended with SERP URL overlap against the cluster's primary when
+    `serp_urls` {keyword: set(urls)} is given) if that clears `threshold`, else starts a new
+    cluster. Centroids live in one NumPy matrix, so each step is a single sparse-row product.
+
+    Returns [{'id', 'primary', 'keywords'}] with ids from 1, largest clusters first.
+    """
+    threshold = CLUSTER_SIMILARITY if threshold is None else threshold
+    index = keyword_index(keywords)
+    ordered = sorted(index.values(), key=_rank)
+    if not ordered:
+        return []
+
+    vectors = TfidfVectors([k['keyword'] for k in ordered])
+    serp = {normalize_keyword(kw): set(urls) for kw, urls in (serp_urls or {}).items()}
+    # A token used by a single keyword never meets another keyword, so it only counts towards
+    # norms: centroid columns are kept for shared tokens only, which keeps the matrix small.
+    shared = np.flatnonzero(vectors.df > 1)
+    column = np.full(len(vectors.vocab), -1, dtype=np.int64)
+    column[shared] = np.arange(len(shared))
+    centroids = np.zeros((min(len(ordered), 64), max(len(shared), 1)), dtype=np.float32)
+    sq_norms = np.zeros(len(centroids), dtype=np.float32)   # full squared norms, rare tokens included
+    members = []
+
+    for position, k in enumerate(ordered):
+        ids, weights = vectors.rows[position]
+        cols = column[ids]
+        keep = cols >= 0
+        ids, shared_weights = cols[keep], weights[keep]
+        best, best_sim = None, threshold
+        if members and len(ids):
+            sims = centroids[:len(members), ids] @ shared_weights
+            norms = np.sqrt(sq_norms[:len(members)])
+            sims = np.divide(sims, norms, out=np.zeros_like(sims), where=norms > 0)
+            if serp:
+                mine = serp.get(normalize_keyword(k['keyword']))
+                for c, cluster in enumerate(members):
+                    overlap = _serp_overlap(mine, serp.get(normalize_keyword(cluster[0]['keyword'])))
+                    if overlap is not None:
+                        sims[c] = (1 - CLUSTER_SERP_WEIGHT) * sims[c] + CLUSTER_SERP_WEIGHT * overlap
+            c = int(np.argmax(sims))
+            if sims[c] >= best_sim:
+                best, best_sim = c, sims[c]
+
+        if best is None:
+            if len(members) == len(centroids):
+                centroids = np.vstack([centroids, np.zeros_like(centroids)])
+                sq_norms = np.concatenate([sq_norms, np.zeros_like(sq_norms)])
+            best = len(members)
+            members.append([])
+        members[best].append(k)
+        sq_norms[best] += 2 * float(centroids[best, ids] @ shared_weights) + float(weights @ weights)
+        centroids[best, ids] += shared_weights
+
+    clusters = sorted(members, key=lambda m: (-len(m), _rank(m[0])))
+    return [{'id': i, 'primary': m[0], 'keywords': m} for i, m in enumerate(clusters, 1)]
+
+
+def format_clusters_for_prompt(clusters, max_clusters=40, max_keywords=12):
+    """Compact prompt block: one line per cluster with its primary keyword and a few members."""
+    lines = []
+    for cluster in clusters[:max_clusters]:
+        primary = cluster['primary']
+        others = [k['keyword'] for k in cluster['keywords'][1:max_keywords]]
+        more = len(cluster['keywords']) - 1 - len(others)
+        line = f"[{cluster['id']}] {primary['keyword']} ({primary.get('volume', 0)}/mo, {len(cluster['keywords'])} keywords)"
+        if others:
+            line += ": " + ', '.join(others) + (f" +{more} more" if more > 0 else '')
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def expand_topic_keywords(topic, clusters, index):
+    """
+    Keyword dicts for a topic the model returned. Uses the cluster ids it picked ("clusters")
+    when present, else maps its "keyword_cluster" strings/objects back through `index`.
+    The primary keyword comes first and is flagged is_primary.
+    """
+    by_id = {c['id']: c for c in clusters}
+    picked = []
+    for cid in topic.get('clusters') or []:
+        try:
+            cluster = by_id.get(int(cid))
+        except (TypeError, ValueError):
+            cluster = None
+        if cluster:
+            picked.extend(cluster['keywords'])
+    if not picked:
+        for entry in topic.get('keyword_cluster') or []:
+            text = entry.get('keyword') if isinstance(entry, dict) else entry
+            match = index.get(normalize_keyword(text))
+            picked.append(match if match is not None else {'keyword': text, 'volume': 0, 'score': 0})
+
+    seen, result = set(), []
+    for k in picked:
+        norm = normalize_keyword(k.get('keyword'))
+        if norm and norm not in seen:
+            seen.add(norm)
+            result.append(dict(k, is_primary=False))
+    primary = normalize_keyword(topic.get('primary_keyword'))
+    first = next((i for i, k in enumerate(result) if normalize_keyword(k['keyword']) == primary), 0) if result else None
+    if first is not None:
+        result.insert(0, result.pop(first))
+        result[0]['is_primary'] = True
+    return result
+
+
+def prompt_size(text):
+    """Rough token count (4 chars/token) for logging how much a prompt shrank."""
+    return int(math.ceil(len(text) / 4))
@@ -0,0 +1,116 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+# Tunables (override via environment)
+INTENT_CACHE_SIZE = int(os.environ.get("INTENT_CACHE_SIZE", 50000))
+
+DEFAULT_INTENT = 'informational'
+
+# Intent vocabulary, in priority order: when several intents match, the first listed is the
+# primary one. Terms match on word boundaries (plural -s/-es allowed), so "top" does not fire
+# on "laptop" nor "order" on "border".
+INTENT_TERMS = OrderedDict([
+    ('transactional', ['buy', 'price', 'shop', 'purchase', 'order', 'discount', 'coupon', 'deal', 'sale',
+                       'cheap', 'cost', 'for sale', 'near me']),
+    ('commercial', ['best', 'top', 'review', 'vs', 'versus', 'alternative', 'compare', 'comparison',
+                    'ranking', 'list']),
+    ('informational', ['what', 'what is', 'how', 'how to', 'why', 'benefit', 'guide', 'tutorial', 'tip',
+                       'made from', 'function', 'define', 'definition', 'meaning', 'example', 'use',
+                       'difference', 'ingredient']),
+])
+
+
+class KeywordIntent:
+    """Primary intent plus any secondary intents (in INTENT_TERMS priority order)."""
+
+    __slots__ = ('primary', 'secondary')
+
+    def __init__(self, primary, secondary=()):
+        self.primary = primary
+        self.secondary = tuple(secondary)
+
+    @property
+    def label(self):
+        """"primary, secondary, ..." - the format the ranked-keywords lists use."""
+        return ', '.join((self.primary,) + self.secondary)
+
+    def __eq__(self, other):
+        return isinstance(other, KeywordIntent) and (self.primary, self.secondary) == (other.primary, other.secondary)
+
+    def __repr__(self):
+        return f"KeywordIntent({self.primary!r}, {self.secondary!r})"
+
+
+def _compile(terms):
+    groups = []
+    for intent, words in terms.items():
+        alternatives = sorted((re.escape(w).replace(r'\ ', r'\s+') for w in words), key=len, reverse=True)
+        groups.append(f"(?P<{intent}>{'|'.join(alternatives)})")
+    return re.compile(rf"\b(?:{'|'.join(groups)})(?:e?s)?\b")
+
+
+class IntentClassifier:
+    """
+    One precompiled pattern for the whole vocabulary and an LRU memo keyed by the normalized
+    keyword, so large clusters (where the same phrases repeat across topics) are labeled once.
+    """
+
+    def __init__(self, terms=None, cache_size=None):
+        self.order = list((terms or INTENT_TERMS).keys())
+        self._pattern = _compile(terms or INTENT_TERMS)
+        self._cache = OrderedDict()
+        self._cache_size = cache_size or INTENT_CACHE_SIZE
+        self._lock = threading.Lock()
+
+    def _classify(self, normalized):
+        found = {match.lastgroup for match in self._pattern.finditer(normalized)}
+        intents = [intent for intent in self.order if intent in found] or [DEFAULT_INTENT]
+        return KeywordIntent(intents[0], intents[1:])
+
+    def classify(self, keyword):
+        normalized = re.sub(r'\s+', ' ', (keyword or '').strip().lower())
+        with self._lock:
+            cached = self._cache.get(normalized)
+            if cached is not None:
+                self._cache.move_to_end(normalized)
+                return cached
+        result = self._classify(normalized)
+        with self._lock:
+            self._cache[normalized] = result
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def classify_many(self, keywords):
+        """[KeywordIntent] aligned with `keywords`."""
+        seen = {}
+        out = []
+        for keyword in keywords:
+            result = seen.get(keyword)
+            if result is None:
+                result = seen[keyword] = self.classify(keyword)
+            out.append(result)
+        return out
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_intent_classifier():
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            _classifier = IntentClassifier()
+        return _classifier
+
+
+def classify_intents(keywords):
+    """[KeywordIntent] for a list of keywords, using the shared memoized classifier."""
+    return get_intent_classifier().classify_many(keywords)
+
+
+def classify_intent(keyword):
+    return get_intent_classifier().classify(keyword)
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Tunables (override via environment)
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'llm_cache.db'))
+LLM_CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", 30 * 86400))
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "1") not in ("0", "false", "False")
+# Writes between SUM(size) rechecks; other processes write to the same file
+LLM_CACHE_RESYNC_WRITES = int(os.environ.get("LLM_CACHE_RESYNC_WRITES", 256))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    latency REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache (last_access);
+"""
+
+
+def normalize_prompt(prompt):
+    """Prompts are mostly indented f-strings; indentation and blank-line noise should not change the key."""
+    if not isinstance(prompt, str):
+        prompt = json.dumps(prompt, sort_keys=True, default=str)
+    lines = [re.sub(r'[ \t]+', ' ', line).strip() for line in prompt.strip().splitlines()]
+    return '\n'.join(line for line in lines if line)
+
+
+def config_hash(config):
+    if config is None:
+        return ''
+    if hasattr(config, 'model_dump'):  # google-genai pydantic config objects
+        config = config.model_dump(exclude_none=True)
+    return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+def cache_key(model, prompt, config=None):
+    raw = f"{model}\x00{normalize_prompt(prompt)}\x00{config_hash(config)}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _usage(response):
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return 0, 0
+    return (getattr(usage, 'prompt_token_count', 0) or 0,
+            getattr(usage, 'candidates_token_count', 0) or 0)
+
+
+class LLMCache:
+    """Disk-backed (SQLite) LRU cache of model responses, bounded by LLM_CACHE_MAX_BYTES."""
+
+    def __init__(self, path=None, max_bytes=None, ttl=None):
+        self.path = path or LLM_CACHE_PATH
+        self.max_bytes = max_bytes or LLM_CACHE_MAX_BYTES
+        self.ttl = LLM_CACHE_TTL if ttl is None else ttl
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'bypassed': 0, 'evictions': 0,
+                       'tokens_saved': 0, 'seconds_saved': 0.0}
+        self._size = None   # running total of stored bytes, read from SUM(size) on first write
+        self._writes = 0
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def record(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                self._stats[name] += value
+
+    def get(self, key):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT response, prompt_tokens, output_tokens, latency, created_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if not row:
+            return None
+        response, prompt_tokens, output_tokens, latency, created_at = row
+        if self.ttl and time.time() - created_at > self.ttl:
+            with conn:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            return None
+        with conn:
+            conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+        self.record(hits=1, tokens_saved=prompt_tokens + output_tokens, seconds_saved=latency)
+        return response
+
+    def put(self, key, model, response, prompt_tokens=0, output_tokens=0, latency=0.0):
+        size = len(response.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            replaced = conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, response, size, prompt_tokens, output_tokens, latency, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, prompt_tokens, output_tokens, latency, now, now)
+            )
+        with self._lock:
+            self._writes += 1
+            if self._size is not None:
+                self._size += size - (replaced[0] if replaced else 0)
+            total, resync = self._size, self._writes % LLM_CACHE_RESYNC_WRITES == 0
+        if total is None or resync or total > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        """Drop least-recently-used entries until the cache fits in max_bytes; resets the running total."""
+        conn = self._conn()
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            with self._lock:
+                self._size = total
+            return
+        excess = total - self.max_bytes
+        doomed, freed = [], 0
+        for key, size in conn.execute("SELECT key, size FROM llm_cache ORDER BY last_access"):
+            doomed.append(key)
+            freed += size
+            if freed >= excess:
+                break
+        with conn:
+            conn.executemany("DELETE FROM llm_cache WHERE key = ?", [(k,) for k in doomed])
+        with self._lock:
+            self._size = total - freed
+        self.record(evictions=len(doomed))
+
+    def stats(self):
+        with self._lock:
+            result = dict(self._stats)
+        lookups = result['hits'] + result['misses']
+        result['hit_rate'] = round(result['hits'] / lookups, 3) if lookups else 0.0
+        result['seconds_saved'] = round(result['seconds_saved'], 1)
+        entries, size = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        result.update({'entries': entries, 'bytes': size, 'max_bytes': self.max_bytes})
+        return result
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+        return _cache
+
+
+def _lookup(model, prompt, config, cache):
+    """(store, key, cached text) for a generate call; store is None when the cache is bypassed."""
+    if not (cache and LLM_CACHE_ENABLED):
+        if LLM_CACHE_ENABLED:
+            get_llm_cache().record(bypassed=1)
+        return None, None, None
+    store = get_llm_cache()
+    key = cache_key(model, prompt, config)
+    try:
+        text = store.get(key)
+    except sqlite3.Error as e:
+        print(f"DEBUG: LLM cache read failed: {e}")
+        text = None
+    if text is None:
+        store.record(misses=1)
+    return store, key, text
+
+
+def _store(store, key, model, response, started):
+    """Cache a fresh response (non-empty text only) and return its text."""
+    text = response.text
+    if store is not None and text and text.strip():
+        prompt_tokens, output_tokens = _usage(response)
+        try:
+            store.put(key, model, text, prompt_tokens, output_tokens, time.time() - started)
+        except sqlite3.Error as e:
+            print(f"DEBUG: LLM cache write failed: {e}")
+    return text
+
+
+def cached_generate(model, prompt, generate, config=None, cache=True):
+    """
+    Response text for `prompt`, from the cache when the same (model, normalized prompt, config)
+    was answered before. `generate()` makes the real call and returns the SDK response.
+    """
+    store, key, text = _lookup(model, prompt, config, cache)
+    if text is not None:
+        return text
+    started = time.time()
+    return _store(store, key, model, generate(), started)
+
+
+async def acached_generate(model, prompt, generate, config=None, cache=True):
+    """cached_generate for async callers: `generate()` is a coroutine returning the response."""
+    store, key, text = _lookup(model, prompt, config, cache)
+    if text is not None:
+        return text
+    started = time.time()
+    return _store(store, key, model, await generate(), started)
@@ -0,0 +1,380 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from rate_limit import TokenBucket
+
+# Priority classes: lower runs first when a provider is saturated
+INTERACTIVE = 0
+BACKGROUND = 1
+
+OUTBOUND_MAX_RETRIES = int(os.environ.get("OUTBOUND_MAX_RETRIES", 3))
+OUTBOUND_RETRY_BASE_SEC = float(os.environ.get("OUTBOUND_RETRY_BASE_SEC", 2))
+OUTBOUND_MAX_RETRY_AFTER = float(os.environ.get("OUTBOUND_MAX_RETRY_AFTER", 120))
+OUTBOUND_SAMPLE_SIZE = 500  # recent calls kept per provider for percentiles
+
+
+def _env_limits(prefix, rate, burst, max_in_flight):
+    return {
+        'rate': float(os.environ.get(f"{prefix}_RPS", rate)),
+        'burst': float(os.environ.get(f"{prefix}_BURST", burst)),
+        'max_in_flight': int(os.environ.get(f"{prefix}_MAX_IN_FLIGHT", max_in_flight))
+    }
+
+
+# Defaults sit a little under each provider's published per-minute quota. Limits are per process.
+PROVIDER_LIMITS = {
+    'gemini': _env_limits("GEMINI", 1.5, 5, 8),
+    'perplexity': _env_limits("PERPLEXITY", 0.8, 2, 4),
+    'dataforseo': _env_limits("DATAFORSEO", 5, 10, 20),
+}
+
+_priority = contextvars.ContextVar('outbound_priority', default=INTERACTIVE)
+
+
+def current_priority():
+    return _priority.get()
+
+
+@contextmanager
+def outbound_priority(priority):
+    """Run outbound calls made in this context (e.g. a background job) at `priority`."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def _retry_after_seconds(value):
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def throttle_delay(result=None, error=None):
+    """
+    Seconds to back off if `result`/`error` is a rate-limit signal, else None.
+    Understands requests responses (429/503 + Retry-After) and Gemini SDK errors.
+    """
+    if result is not None:
+        status = getattr(result, 'status_code', None)
+        if status in (429, 503):
+            headers = getattr(result, 'headers', None) or {}
+            delay = _retry_after_seconds(headers.get('Retry-After'))
+            return delay if delay is not None else 0.0
+        return None
+    if error is not None:
+        code = getattr(error, 'code', None)
+        text = str(error)
+        if code == 429 or 'RESOURCE_EXHAUSTED' in text:
+            # Gemini puts the hint in the message ("retry in 12.3s" / "retryDelay": "12s")
+            match = re.search(r'retry(?:Delay"?:\s*"?| in )(\d+(?:\.\d+)?)s', text)
+            return float(match.group(1)) if match else 0.0
+    return None
+
+
+class ProviderScheduler:
+    """
+    Admission control for one provider: a token bucket for request rate, a cap on calls
+    in flight, and a priority queue so interactive requests are admitted before background ones.
+    """
+
+    def __init__(self, name, rate, burst, max_in_flight):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._waiters = []            # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._async_waiters = set()   # (loop, asyncio.Event) of coroutines parked in aacquire
+
+        self.calls = 0
+        self.errors = 0
+        self.throttled = 0
+        self.retries = 0
+        self._waits = deque(maxlen=OUTBOUND_SAMPLE_SIZE)
+        self._latencies = deque(maxlen=OUTBOUND_SAMPLE_SIZE)
+        self.wait_total = 0.0
+        self.latency_total = 0.0
+
+    def _try_admit(self, ticket):
+        """(admitted, seconds to wait) for a queued ticket; caller holds self._cond."""
+        if self._waiters[0] == ticket and self.in_flight < self.max_in_flight:
+            acquired, wait = self.bucket.try_acquire()
+            if acquired:
+                heapq.heappop(self._waiters)
+                self.in_flight += 1
+                self._wake()
+                return True, 0.0
+            return False, min(wait, 1.0)
+        return False, 1.0
+
+    def _withdraw(self, ticket):
+        self._waiters.remove(ticket)
+        heapq.heapify(self._waiters)
+        self._wake()
+
+    def _wake(self):
+        """Wake blocked acquire() threads and aacquire() coroutines; caller holds self._cond."""
+        self._cond.notify_all()
+        for loop, event in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # loop already closed
+
+    def acquire(self, priority=INTERACTIVE):
+        """Block until this caller is first in line, under the in-flight cap and has a token."""
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    admitted, wait = self._try_admit(ticket)
+                    if admitted:
+                        return
+                    self._cond.wait(timeout=wait)
+            except BaseException:
+                self._withdraw(ticket)
+                raise
+
+    async def aacquire(self, priority=INTERACTIVE):
+        """
+        acquire() for coroutines: sleeps on the event loop until the bucket refills or a slot
+        frees up, so a cancelled caller simply leaves the queue and no thread is parked per waiter.
+        """
+        ticket = (priority, next(self._seq))
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+        try:
+            while True:
+                event = asyncio.Event()
+                with self._cond:
+                    admitted, wait = self._try_admit(ticket)
+                    if admitted:
+                        return
+                    self._async_waiters.add((loop, event))
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    with self._cond:
+                        self._async_waiters.discard((loop, event))
+        except BaseException:
+            with self._cond:
+                self._withdraw(ticket)
+            raise
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._wake()
+
+    def penalize(self, seconds):
+        self.bucket.penalize(seconds)
+
+    def record(self, wait, latency, error=False, throttled=False, retried=False):
+        with self._cond:
+            self.calls += 1
+            self.errors += int(error)
+            self.throttled += int(throttled)
+            self.retries += int(retried)
+            self.wait_total += wait
+            self.latency_total += latency
+            self._waits.append(wait)
+            self._latencies.append(latency)
+
+    def stats(self):
+        with self._cond:
+            waits, latencies = sorted(self._waits), sorted(self._latencies)
+            return {
+                'calls': self.calls,
+                'errors': self.errors,
+                'throttled': self.throttled,
+                'retries': self.retries,
+                'in_flight': self.in_flight,
+                'queued': len(self._waiters),
+                'limits': {'rate': self.bucket.rate, 'burst': self.bucket.capacity, 'max_in_flight': self.max_in_flight},
+                'queue_wait_ms': _summary(waits, self.wait_total, self.calls),
+                'latency_ms': _summary(latencies, self.latency_total, self.calls)
+            }
+
+
+def _summary(ordered, total, count):
+    if not ordered:
+        return {'avg': 0, 'p50': 0, 'p95': 0, 'max': 0}
+    return {
+        'avg': round(total / count * 1000, 1),
+        'p50': round(ordered[len(ordered) // 2] * 1000, 1),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+        'max': round(ordered[-1] * 1000, 1)
+    }
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(provider):
+    with _schedulers_lock:
+        scheduler = _schedulers.get(provider)
+        if scheduler is None:
+            limits = PROVIDER_LIMITS.get(provider) or _env_limits(provider.upper(), 2, 2, 4)
+            scheduler = ProviderScheduler(provider, **limits)
+            _schedulers[provider] = scheduler
+        return scheduler
+
+
+def _retry_after_attempt(provider, scheduler, attempt, waited, latency, delay, error):
+    """
+    Record one attempt and decide whether to retry it. `delay` is throttle_delay()'s answer;
+    on a retry the bucket is drained for the backoff and True is returned.
+    """
+    retry = delay is not None and attempt < OUTBOUND_MAX_RETRIES
+    scheduler.record(waited, latency, error=error is not None, throttled=delay is not None, retried=retry)
+    if not retry:
+        return False
+    if not delay:
+        delay = OUTBOUND_RETRY_BASE_SEC * (2 ** attempt) + random.uniform(0, 1)
+    delay = min(delay, OUTBOUND_MAX_RETRY_AFTER)
+    print(f"DEBUG: {provider} rate limited, retrying in {delay:.1f}s (attempt {attempt + 1}/{OUTBOUND_MAX_RETRIES})")
+    scheduler.penalize(delay)
+    return True
+
+
+def scheduled_call(provider, fn, *args, priority=None, **kwargs):
+    """
+    Run fn(*args, **kwargs) under `provider`'s limits. Rate-limit answers (HTTP 429/503 or a
+    Gemini RESOURCE_EXHAUSTED error) drain the bucket for Retry-After and are retried; after
+    OUTBOUND_MAX_RETRIES the last response is returned / the last error raised.
+    """
+    scheduler = get_scheduler(provider)
+    priority = current_priority() if priority is None else priority
+    attempt = 0
+    while True:
+        queued_at = time.monotonic()
+        scheduler.acquire(priority)
+        started = time.monotonic()
+        result, error = None, None
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            error = e
+        finally:
+            scheduler.release()
+        delay = throttle_delay(result=result, error=error)
+        if not _retry_after_attempt(provider, scheduler, attempt, started - queued_at,
+                                    time.monotonic() - started, delay, error):
+            if error is not None:
+                raise error
+            return result
+        attempt += 1
+
+
+def scheduled_stream(provider, fn, *args, priority=None, **kwargs):
+    """
+    scheduled_call for streaming APIs: fn(*args, **kwargs) returns an iterator of chunks, which
+    are yielded as they arrive. The call keeps its in-flight slot until the stream ends or the
+    reader closes it; a rate-limit error before the first chunk is retried like scheduled_call.
+    """
+    scheduler = get_scheduler(provider)
+    priority = current_priority() if priority is None else priority
+    attempt = 0
+    while True:
+        queued_at = time.monotonic()
+        scheduler.acquire(priority)
+        started = time.monotonic()
+        error, received, retry = None, False, False
+        try:
+            for chunk in fn(*args, **kwargs):
+                received = True
+                yield chunk
+        except Exception as e:
+            error = e
+        finally:
+            scheduler.release()
+            delay = None if received else throttle_delay(error=error)
+            retry = _retry_after_attempt(provider, scheduler, attempt, started - queued_at,
+                                         time.monotonic() - started, delay, error)
+        if not retry:
+            if error is not None:
+                raise error
+            return
+        attempt += 1
+
+
+async def ascheduled_call(provider, fn, *args, priority=None, **kwargs):
+    """
+    scheduled_call for coroutines (the ASGI routes): admission and the call both wait on the
+    event loop, sharing the provider's queue and limits with the sync callers.
+    """
+    scheduler = get_scheduler(provider)
+    priority = current_priority() if priority is None else priority
+    attempt = 0
+    while True:
+        queued_at = time.monotonic()
+        await scheduler.aacquire(priority)
+        started = time.monotonic()
+        result, error = None, None
+        try:
+            result = await fn(*args, **kwargs)
+        except Exception as e:
+            error = e
+        finally:
+            scheduler.release()
+        delay = throttle_delay(result=result, error=error)
+        if not _retry_after_attempt(provider, scheduler, attempt, started - queued_at,
+                                    time.monotonic() - started, delay, error):
+            if error is not None:
+                raise error
+            return result
+        attempt += 1
+
+
+async def ascheduled_stream(provider, fn, *args, priority=None, **kwargs):
+    """scheduled_stream for async iterators: fn(*args, **kwargs) returns an async iterator of chunks."""
+    scheduler = get_scheduler(provider)
+    priority = current_priority() if priority is None else priority
+    attempt = 0
+    while True:
+        queued_at = time.monotonic()
+        await scheduler.aacquire(priority)
+        started = time.monotonic()
+        error, received, retry = None, False, False
+        try:
+            async for chunk in fn(*args, **kwargs):
+                received = True
+                yield chunk
+        except Exception as e:
+            error = e
+        finally:
+            scheduler.release()
+            delay = None if received else throttle_delay(error=error)
+            retry = _retry_after_attempt(provider, scheduler, attempt, started - queued_at,
+                                         time.monotonic() - started, delay, error)
+        if not retry:
+            if error is not None:
+                raise error
+            return
+        attempt += 1
+
+
+def scheduler_stats():
+    with _schedulers_lock:
+        schedulers = dict(_schedulers)
+    return {name: s.stats() for name, s in schedulers.items()}
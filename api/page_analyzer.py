@@ -0,0 +1,272 @@
+from urllib.parse import urlparse
+
+from lxml import etree
+
+# Text inside these elements is not visible copy and is left out of the word count
+NON_CONTENT_TAGS = {'script', 'style', 'noscript', 'template'}
+# <title> elements inside inline SVG are icon labels, not the page title
+SVG_TAGS = {'svg', 'symbol', 'defs', 'g'}
+
+
+class _PageFactsTarget:
+    """
+    lxml parser target that collects every on-page fact in one pass over the parse events.
+    No tree is built, so memory and time scale only with the size of the document.
+    """
+
+    def __init__(self, page_host):
+        self.page_host = page_host
+        self.skip_depth = 0      # > 0 while inside script/style/...
+        self.svg_depth = 0
+        self.text_run = []       # pieces of the current text node (lxml may split one node into several calls)
+        self.capture = None      # 'title' / 'h1' while collecting their text
+        self.capture_parts = []
+        self.capture_depth = 0
+
+        self.title = None
+        self.h1 = None
+        self.h1_count = 0
+        self.meta_description = None
+        self.canonical = None
+        self.og_title = None
+        self.og_description = None
+        self.has_json_ld = False
+        self.has_microdata = False
+        self.image_count = 0
+        self.missing_alt_count = 0
+        self.internal_links_count = 0
+        self.external_links_count = 0
+        self.word_count = 0
+
+    def _flush_text(self):
+        if self.text_run:
+            text = ''.join(self.text_run)
+            self.text_run = []
+            if not self.skip_depth:
+                self.word_count += len(text.split())
+            if self.capture:
+                self.capture_parts.append(text)
+
+    def start(self, tag, attrib):
+        self._flush_text()
+        if not isinstance(tag, str):
+            return
+        tag = tag.lower()
+
+        if tag in NON_CONTENT_TAGS:
+            self.skip_depth += 1
+        if tag in SVG_TAGS:
+            self.svg_depth += 1
+        if 'itemscope' in attrib:
+            self.has_microdata = True
+
+        if tag == 'h1':
+            self.h1_count += 1
+        if self.capture:
+            self.capture_depth += 1
+        elif tag == 'title' and self.title is None and not self.svg_depth:
+            self.capture, self.capture_parts, self.capture_depth = 'title', [], 0
+        elif tag == 'h1' and self.h1 is None:
+            self.capture, self.capture_parts, self.capture_depth = 'h1', [], 0
+
+        if tag == 'meta':
+            name = (attrib.get('name') or '').lower()
+            prop = (attrib.get('property') or '').lower()
+            content = (attrib.get('content') or '').strip()
+            if name == 'description' and self.meta_description is None:
+                self.meta_description = content
+            elif prop == 'og:title' and self.og_title is None:
+                self.og_title = content
+            elif prop == 'og:description' and self.og_description is None:
+                self.og_description = content
+        elif tag == 'link':
+            rel = (attrib.get('rel') or '').lower().split()
+            if 'canonical' in rel and self.canonical is None:
+                self.canonical = (attrib.get('href') or '').strip()
+        elif tag == 'script':
+            if (attrib.get('type') or '').strip().lower() == 'application/ld+json':
+                self.has_json_ld = True
+        elif tag == 'img':
+            self.image_count += 1
+            if not (attrib.get('alt') or '').strip():
+                self.missing_alt_count += 1
+        elif tag == 'a':
+            href = (attrib.get('href') or '').strip()
+            if href and not href.startswith(('#', 'javascript:', 'mailto:', 'tel:')):
+                host = urlparse(href).netloc.lower()
+                if not host or host == self.page_host:
+                    self.internal_links_count += 1
+                else:
+                    self.external_links_count += 1
+
+    def end(self, tag):
+        self._flush_text()
+        if not isinstance(tag, str):
+            return
+        tag = tag.lower()
+        if tag in NON_CONTENT_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+        if tag in SVG_TAGS and self.svg_depth:
+            self.svg_depth -= 1
+
+        if self.capture:
+            if self.capture_depth:
+                self.capture_depth -= 1
+            else:
+                text = ' '.join(' '.join(self.capture_parts).split())
+                if self.capture == 'title':
+                    self.title = text
+                else:
+                    self.h1 = text
+                self.capture = None
+
+    def data(self, data):
+        self.text_run.append(data)
+
+    def comment(self, text):
+        self._flush_text()
+
+    def close(self):
+        self._flush_text()
+        return self
+
+
+def extract_page_facts(html, url):
+    """Single pass over the HTML. Returns the raw on-page facts (no scoring)."""
+    page_host = urlparse(url).netloc.lower()
+    target = _PageFactsTarget(page_host)
+    parser = etree.HTMLParser(target=target, recover=True, no_network=True)
+    parser.feed(html)
+    parser.close()
+
+    path = urlparse(url).path
+    return {
+        'title': target.title or '',
+        'meta_description': target.meta_description or '',
+        'h1': target.h1 or '',
+        'h1_count': target.h1_count,
+        'canonical': target.canonical or '',
+        'og_title': target.og_title or '',
+        'og_description': target.og_description or '',
+        'has_schema': target.has_json_ld or target.has_microdata,
+        'image_count': target.image_count,
+        'missing_alt_count': target.missing_alt_count,
+        'internal_links_count': target.internal_links_count,
+        'external_links_count': target.external_links_count,
+        'word_count': target.word_count,
+        # Click Depth (Proxy: URL path segments). Root is 0.
+        'click_depth': len([x for x in path.split('/') if x])
+    }
+
+
+def score_page(facts):
+    """On-page score and the list of failed checks."""
+    score = 100
+    checks = []
+
+    # Title Analysis
+    title = facts.get('title')
+    if not title:
+        score -= 20
+        checks.append("Missing Title")
+    elif len(title) < 10:
+        score -= 10
+        checks.append("Title too short")
+    elif len(title) > 60:
+        score -= 10
+        checks.append("Title too long")
+
+    # Meta Description Analysis
+    desc = facts.get('meta_description')
+    if not desc:
+        score -= 20
+        checks.append("Missing Meta Desc")
+    elif len(desc) < 50:
+        score -= 5
+        checks.append("Desc too short")
+    elif len(desc) > 160:
+        score -= 5
+        checks.append("Desc too long")
+
+    # H1 Analysis
+    if not facts.get('h1'):
+        score -= 20
+        checks.append("Missing H1")
+
+    # OG Checks
+    if not facts.get('og_title'):
+        checks.append("Missing OG Title")
+    if not facts.get('og_description'):
+        checks.append("Missing OG Desc")
+
+    # Image Alt Analysis
+    if facts.get('missing_alt_count'):
+        score -= 10
+        checks.append(f"{facts['missing_alt_count']} Images missing Alt")
+
+    return max(0, score), checks
+
+
+def analyze_page(url, content, fetch_meta):
+    """
+    Full tech_audit_data for a fetched page. Used by both start_audit and the tech audit
+    pipeline so the two always agree. `fetch_meta` is tech_audit.fetch_meta_from_result().
+    """
+    status = fetch_meta.get('status_code') or 0
+    if content and not status:
+        status = 200 # curl strategy without a reported status
+    redirects = fetch_meta.get('redirect_history') or []
+
+    data = {
+        'status_code': status,
+        'load_time_ms': fetch_meta.get('load_time_ms', 0),
+        'ttfb_ms': fetch_meta.get('ttfb_ms', 0),
+        'redirect_history': redirects,
+        'title': '',
+        'meta_description': '',
+        'h1': '',
+        'canonical': '',
+        'og_title': '',
+        'og_description': '',
+        'word_count': 0,
+        'missing_alt_count': 0,
+        'internal_links_count': 0,
+        'has_schema': False,
+        'missing_h1': False,
+        'onpage_score': 0,
+        'checks': [],
+        'error': None
+    }
+
+    # --- Technical Issues Checks ---
+    data['is_redirect'] = bool(redirects) or 300 <= status < 400
+    data['redirect_chain'] = len(redirects) > 1
+    data['is_4xx_code'] = 400 <= status < 500
+    data['is_5xx_code'] = 500 <= status < 600
+    data['is_broken'] = status >= 400 or status == 0
+    data['high_loading_time'] = data['load_time_ms'] > 2000
+    data['is_orphan_page'] = False # Placeholder: Requires full link graph
+
+    if not content or status >= 400:
+        data['error'] = fetch_meta.get('error') or f"HTTP {status}"
+        return data
+
+    try:
+        data.update(extract_page_facts(content, url))
+    except Exception as e:
+        print(f"Error parsing {url}: {e}")
+        data['error'] = str(e)
+        return data
+
+    data['title_length'] = len(data['title'])
+    data['description_length'] = len(data['meta_description'])
+    data['missing_h1'] = not data['h1']
+
+    # Canonical Mismatch (ignore trailing slashes)
+    if data['canonical']:
+        data['canonical_mismatch'] = url.rstrip('/') != data['canonical'].rstrip('/')
+    else:
+        data['canonical_mismatch'] = False
+
+    data['onpage_score'], data['checks'] = score_page(data)
+    return data
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import re
+import threading
+
+# Only pages with one of these types are (re)classified
+UNCLASSIFIED_TYPES = (None, 'Unclassified', 'Other', '')
+
+# Default rules, highest priority first (same order as the old if/elif chain in auto_classify).
+# Each rule is {"type": ..., "og_type": [...]} (substring of og:type) or
+# {"type": ..., "contains": [...]} / {"type": ..., "regex": "..."} (matched against the lowercased URL).
+DEFAULT_RULES = [
+    # 1. Technical data (most accurate)
+    {'type': 'Product', 'og_type': ['product']},
+    {'type': 'Service', 'og_type': ['service']},
+    {'type': 'Category', 'og_type': ['article', 'blog']},
+    # 2. URL heuristics
+    {'type': 'Product', 'contains': ['/product/', '/products/', '/item/', '/p/', '/shop/']},
+    {'type': 'Service', 'contains': ['/service/', '/services/', '/solution/', '/solutions/', '/consulting/', '/offering/']},
+    {'type': 'Category', 'contains': ['/category/', '/categories/', '/c/', '/collection/', '/collections/',
+                                      '/blog/', '/blogs/', '/article/', '/news/']},
+    # Generic content markers
+    {'type': 'Category', 'contains': ['culture', 'trend', 'artistry', 'how-to', 'backstage', 'collections',
+                                      'editorial', 'guide']},
+    # Common beauty/fashion categories
+    {'type': 'Category', 'contains': ['/lips', '/face', '/eyes', '/brushes', '/skincare', '/bestsellers',
+                                      '/new', '/sets', '/gifts']},
+    # Words that imply a collection/list
+    {'type': 'Category', 'contains': ['shades', 'colours', 'looks', 'inspiration']},
+    # Generic "products" list pattern
+    {'type': 'Category', 'regex': r'trending-products|-products$'},
+]
+
+
+def _compile(rules, key):
+    """[(type, literals, regex)] for the rules of one kind, in priority order."""
+    compiled = []
+    for rule in rules:
+        literals = tuple(s.lower() for s in (rule.get(key) or []) if s)
+        regex = re.compile(rule['regex']) if key == 'contains' and rule.get('regex') else None
+        if literals or regex:
+            compiled.append((rule['type'], literals, regex))
+    return compiled
+
+
+def _first_match(tiers, text):
+    if not text:
+        return None
+    for page_type, literals, regex in tiers:
+        for literal in literals:
+            if literal in text:
+                return page_type
+        if regex is not None and regex.search(text):
+            return page_type
+    return None
+
+
+class PageClassifier:
+    """
+    Compiled rule set: og:type rules first, then URL rules; the first (highest-priority)
+    matching rule wins. classify_pages() works on a whole project at once.
+    """
+
+    def __init__(self, rules=None):
+        self.rules = list(rules or DEFAULT_RULES)
+        self._og = _compile([r for r in self.rules if r.get('og_type')], 'og_type')
+        self._url = _compile([r for r in self.rules if r.get('contains') or r.get('regex')], 'contains')
+
+    def classify(self, url, og_type=None):
+        """Page type for a URL (and optional og:type), or None when no rule matches."""
+        return _first_match(self._og, (og_type or '').lower()) or _first_match(self._url, (url or '').lower())
+
+    def classify_pages(self, pages):
+        """
+        {page_type: [page ids]} for unclassified pages that matched a rule. Pages are dicts
+        with id, url, page_type and og_type (or tech_audit_data.og_type).
+        """
+        candidates = [p for p in pages if p.get('page_type') in UNCLASSIFIED_TYPES]
+
+        def og_of(page):
+            og_type = page.get('og_type')
+            if og_type is None:
+                og_type = (page.get('tech_audit_data') or {}).get('og_type')
+            return (og_type or '').lower()
+
+        og_tiers, url_tiers = self._og, self._url
+        groups = {}
+        for page in candidates:
+            new_type = _first_match(og_tiers, og_of(page)) or _first_match(url_tiers, (page.get('url') or '').lower())
+            if new_type:
+                groups.setdefault(new_type, []).append(page['id'])
+        return groups
+
+
+def project_rules(config):
+    """
+    Rule list for a project's classifier_rules setting: either a list of rules (tried before
+    the defaults) or {"rules": [...], "replace_defaults": true}.
+    """
+    if not config:
+        return DEFAULT_RULES
+    if isinstance(config, str):
+        config = json.loads(config)
+    if isinstance(config, list):
+        return list(config) + DEFAULT_RULES
+    rules = list(config.get('rules') or [])
+    return rules if config.get('replace_defaults') else rules + DEFAULT_RULES
+
+
+_classifiers = {}
+_classifiers_lock = threading.Lock()
+
+
+def get_classifier(config=None):
+    """Compiled classifier for a project's rule config, built once per distinct config."""
+    rules = project_rules(config)
+    key = hashlib.sha256(json.dumps(rules, sort_keys=True).encode('utf-8')).hexdigest()
+    with _classifiers_lock:
+        classifier = _classifiers.get(key)
+        if classifier is None:
+            classifier = PageClassifier(rules)
+            _classifiers[key] = classifier
+        return classifier
@@ -0,0 +1,146 @@
+import contextvars
+import copy
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Tunables (override via environment)
+PAGE_LOADER_CHUNK = int(os.environ.get("PAGE_LOADER_CHUNK", 100))    # ids per in_() query (URL length)
+PAGE_LOADER_JOBS = int(os.environ.get("PAGE_LOADER_JOBS", 8))        # jobs whose rows stay memoized
+
+_current = contextvars.ContextVar('page_loader', default=None)
+
+
+class PageLoader:
+    """
+    Batch loader for pages and their projects. prefetch() reads the requested pages with one
+    in_() query per chunk, then their projects and parent/grandparent pages (source_page_id)
+    with one query per level; page()/project() then answer from memory. Anything not
+    prefetched is loaded on first use and memoized too (misses included).
+
+    Rows are handed out as deep copies, so callers can edit them freely; call forget() after
+    writing a row that a later reader in the same loader should see fresh.
+    """
+
+    def __init__(self, client, ancestors=2):
+        self.client = client
+        self.ancestors = ancestors
+        self._pages = {}
+        self._projects = {}
+        self._lock = threading.Lock()
+        self._prefetched = False
+        self.queries = 0
+
+    def _select(self, table, ids):
+        rows = []
+        ids = list(ids)
+        for start in range(0, len(ids), PAGE_LOADER_CHUNK):
+            chunk = ids[start:start + PAGE_LOADER_CHUNK]
+            res = self.client.table(table).select('*').in_('id', chunk).execute()
+            self.queries += 1
+            rows.extend(res.data or [])
+        return rows
+
+    def _load_pages(self, ids):
+        missing = [i for i in dict.fromkeys(str(i) for i in ids if i) if i not in self._pages]
+        if not missing:
+            return []
+        rows = self._select('pages', missing)
+        for page_id in missing:
+            self._pages[page_id] = None
+        for row in rows:
+            self._pages[str(row['id'])] = row
+        return rows
+
+    def _load_projects(self, ids):
+        missing = [i for i in dict.fromkeys(str(i) for i in ids if i) if i not in self._projects]
+        if not missing:
+            return
+        rows = self._select('projects', missing)
+        for project_id in missing:
+            self._projects[project_id] = None
+        for row in rows:
+            self._projects[str(row['id'])] = row
+
+    def prefetch(self, page_ids):
+        """Load pages, their projects and `ancestors` levels of source pages. Returns self."""
+        with self._lock:
+            rows = self._load_pages(page_ids)
+            level = rows
+            for _ in range(self.ancestors):
+                level = self._load_pages(p.get('source_page_id') for p in level)
+                rows.extend(level)
+            self._load_projects(p.get('project_id') for p in rows)
+            self._prefetched = True
+        return self
+
+    def prefetch_once(self, page_ids):
+        """prefetch() on first use only; `page_ids` may be a callable so it is not built again."""
+        with self._lock:
+            if self._prefetched:
+                return self
+        return self.prefetch(page_ids() if callable(page_ids) else page_ids)
+
+    def page(self, page_id):
+        """Full page row, or None if it does not exist."""
+        key = str(page_id)
+        with self._lock:
+            if key not in self._pages:
+                self._load_pages([key])
+            return copy.deepcopy(self._pages[key])
+
+    def project(self, project_id):
+        """Full project row, or None if it does not exist."""
+        if not project_id:
+            return None
+        key = str(project_id)
+        with self._lock:
+            if key not in self._projects:
+                self._load_projects([key])
+            return copy.deepcopy(self._projects[key])
+
+    def project_settings(self, project_id):
+        """(location, language) of a project, defaulting to US/English."""
+        project = self.project(project_id) or {}
+        return project.get('location') or 'US', project.get('language') or 'English'
+
+    def forget(self, page_id):
+        with self._lock:
+            self._pages.pop(str(page_id), None)
+
+
+@contextmanager
+def use_loader(loader):
+    """Make `loader` the current one for code running inside the block (this thread/context)."""
+    token = _current.set(loader)
+    try:
+        yield loader
+    finally:
+        _current.reset(token)
+
+
+def current_loader(client):
+    """The bound loader, else a fresh one for a single lookup."""
+    return _current.get() or PageLoader(client)
+
+
+_job_loaders = OrderedDict()
+_job_loaders_lock = threading.Lock()
+
+
+def job_loader(job_id, client, page_ids):
+    """
+    One loader per job, shared by its workers: the first item prefetches the whole job
+    (`page_ids` is a callable returning the job's item ids). The most recent
+    PAGE_LOADER_JOBS jobs are kept.
+    """
+    with _job_loaders_lock:
+        loader = _job_loaders.get(job_id)
+        if loader is None:
+            loader = _job_loaders[job_id] = PageLoader(client)
+            while len(_job_loaders) > PAGE_LOADER_JOBS:
+                _job_loaders.popitem(last=False)
+        else:
+            _job_loaders.move_to_end(job_id)
+    return loader.prefetch_once(page_ids)
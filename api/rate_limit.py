@@ -0,0 +1,78 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    """Thread-safe token bucket. `rate` tokens are added per second up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available. Returns (acquired, seconds_until_available)."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True, 0.0
+            if self.rate <= 0:
+                return False, float('inf')
+            return False, (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1, timeout=None, stop_event=None):
+        """Block until tokens are available. Returns False on timeout or when stop_event is set."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            acquired, wait = self.try_acquire(tokens)
+            if acquired:
+                return True
+            if stop_event is not None and stop_event.is_set():
+                return False
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            # Short sleeps so a stop_event is noticed quickly
+            time.sleep(min(wait, 0.25))
+
+    def penalize(self, seconds):
+        """Drain the bucket so nothing is granted for `seconds` (e.g. after a 429 Retry-After)."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+
+class HostRateLimiter:
+    """One TokenBucket per host, created lazily."""
+
+    def __init__(self, rate=2.0, burst=4):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket_for(self, url_or_host):
+        host = urlparse(url_or_host).netloc if '://' in url_or_host else url_or_host
+        host = host.lower()
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[host] = bucket
+            return bucket
+
+    def acquire(self, url_or_host, timeout=None, stop_event=None):
+        return self.bucket_for(url_or_host).acquire(timeout=timeout, stop_event=stop_event)
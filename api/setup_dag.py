@@ -0,0 +1,143 @@
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Tunables (override via environment)
+SETUP_DAG_WORKERS = int(os.environ.get("SETUP_DAG_WORKERS", 4))
+
+PENDING, RUNNING, DONE, FAILED, SKIPPED = 'pending', 'running', 'done', 'failed', 'skipped'
+
+
+class StepFailed(Exception):
+    """Raised by SetupDAG.run when a step failed and `raise_on_error` is set."""
+
+    def __init__(self, step, error):
+        super().__init__(f"{step}: {error}")
+        self.step = step
+        self.error = error
+
+
+class SetupDAG:
+    """
+    A handful of named steps with dependencies, run on a thread pool so independent
+    branches overlap. Each step is called as func(results) where `results` holds the
+    return values of the steps finished so far. A failed step skips everything downstream
+    of it; other branches keep running.
+
+    Progress is reported as event dicts ({'event': 'step', 'step', 'status', ...} and a final
+    {'event': 'complete', ...}) to `on_event`, or consumed as a generator via `events()`.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or SETUP_DAG_WORKERS
+        self._steps = {}   # name -> (func, deps), in insertion order
+
+    def add(self, name, func, deps=()):
+        missing = [d for d in deps if d not in self._steps]
+        if missing:
+            raise ValueError(f"Step '{name}' depends on unknown steps: {missing}")
+        self._steps[name] = (func, tuple(deps))
+        return self
+
+    def run(self, on_event=None, raise_on_error=False):
+        """Run every step; returns (results, status) dicts keyed by step name."""
+        emit = on_event or (lambda event: None)
+        status = {name: PENDING for name in self._steps}
+        results, errors, timings = {}, {}, {}
+        started = time.monotonic()
+
+        def ready(name):
+            return status[name] == PENDING and all(status[d] == DONE for d in self._steps[name][1])
+
+        def blocked(name):
+            return status[name] == PENDING and any(status[d] in (FAILED, SKIPPED) for d in self._steps[name][1])
+
+        def timed(name, func):
+            t0 = time.monotonic()
+            try:
+                return func(results)
+            finally:
+                timings[name] = time.monotonic() - t0
+
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='setup-dag') as pool:
+            while True:
+                changed = True
+                while changed:
+                    changed = False
+                    for name in self._steps:
+                        if blocked(name):
+                            status[name] = SKIPPED
+                            emit({'event': 'step', 'step': name, 'status': SKIPPED})
+                            changed = True
+                for name, (func, _) in self._steps.items():
+                    if ready(name):
+                        status[name] = RUNNING
+                        emit({'event': 'step', 'step': name, 'status': RUNNING})
+                        running[pool.submit(timed, name, func)] = name
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    elapsed_ms = round(timings.get(name, 0) * 1000)
+                    try:
+                        results[name] = future.result()
+                        status[name] = DONE
+                        emit({'event': 'step', 'step': name, 'status': DONE, 'elapsed_ms': elapsed_ms})
+                    except Exception as e:
+                        print(f"DEBUG: Setup step '{name}' failed: {e}")
+                        errors[name] = e
+                        status[name] = FAILED
+                        emit({'event': 'step', 'step': name, 'status': FAILED,
+                              'elapsed_ms': elapsed_ms, 'error': str(e)})
+
+        emit({'event': 'complete', 'status': status,
+              'elapsed_ms': round((time.monotonic() - started) * 1000),
+              'step_ms': {name: round(t * 1000) for name, t in timings.items()}})
+        if raise_on_error and errors:
+            name = next(iter(errors))
+            raise StepFailed(name, errors[name])
+        return results, status
+
+    def events(self, finish=None):
+        """
+        Run in a background thread and yield events as they happen. `finish(results, status)`
+        may return extra fields for the final 'complete' event (e.g. the response payload).
+        """
+        events = queue.Queue()
+        outcome = {}
+
+        def on_event(event):
+            if event['event'] == 'complete':
+                outcome['complete'] = event   # held back until `finish` has run
+            else:
+                events.put(event)
+
+        def runner():
+            try:
+                results, status = self.run(on_event=on_event)
+                complete = outcome['complete']
+                if finish:
+                    complete.update(finish(results, status) or {})
+                events.put(complete)
+            except Exception as e:
+                events.put({'event': 'error', 'error': str(e)})
+            finally:
+                events.put(None)
+
+        threading.Thread(target=runner, name='setup-dag-runner', daemon=True).start()
+        while True:
+            event = events.get()
+            if event is None:
+                return
+            yield event
+
+
+def sse_format(event):
+    """One Server-Sent Events frame for an event dict (its 'event' key names the SSE event)."""
+    return f"event: {event.get('event', 'message')}\ndata: {json.dumps(event, default=str)}\n\n"
@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from bs4 import BeautifulSoup
+
+from rate_limit import HostRateLimiter
+
+# Tunables (override via environment)
+SITEMAP_CRAWL_WORKERS = int(os.environ.get("SITEMAP_CRAWL_WORKERS", 8))
+SITEMAP_HOST_RATE = float(os.environ.get("SITEMAP_HOST_RATE", 4))   # requests/sec per host
+SITEMAP_HOST_BURST = int(os.environ.get("SITEMAP_HOST_BURST", 4))
+
+
+def parse_sitemap_soup(content, max_urls=None):
+    """Parse a sitemap document with BeautifulSoup. Returns (child_sitemap_urls, page_urls)."""
+    try:
+        soup = BeautifulSoup(content, 'xml')
+    except Exception:
+        soup = BeautifulSoup(content, 'html.parser')
+
+    children = []
+    for sitemap_tag in soup.find_all('sitemap'):
+        loc = sitemap_tag.find('loc')
+        if loc and loc.text.strip():
+            children.append(loc.text.strip())
+
+    urls = []
+    if not children:
+        for tag in soup.find_all('url'):
+            if max_urls is not None and len(urls) >= max_urls:
+                break
+            loc = tag.find('loc')
+            if loc and loc.text.strip():
+                urls.append(loc.text.strip())
+
+    return children, urls
+
+
+class SitemapCrawler:
+    """
+    Crawls sitemap indexes with a bounded worker pool.
+
+    Child sitemaps are fetched concurrently, each host is rate limited with a token
+    bucket, URLs are de-duplicated across child sitemaps and the crawl stops as soon
+    as `max_pages` unique URLs have been collected.
+
+    `fetch(url)` must return the document (str/bytes or a readable stream) or None.
+    `parse(content, max_urls)` must return (child_sitemap_urls, page_urls).
+    """
+
+    def __init__(self, fetch, parse=parse_sitemap_soup, max_workers=None,
+                 host_rate=None, host_burst=None):
+        self.fetch = fetch
+        self.parse = parse
+        self.max_workers = max_workers or SITEMAP_CRAWL_WORKERS
+        self.limiter = HostRateLimiter(
+            rate=host_rate if host_rate is not None else SITEMAP_HOST_RATE,
+            burst=host_burst if host_burst is not None else SITEMAP_HOST_BURST
+        )
+        self.stats = {}
+
+    def _process(self, sitemap_url, remaining, stop_event):
+        if stop_event.is_set():
+            return [], []
+        if not self.limiter.acquire(sitemap_url, stop_event=stop_event):
+            return [], []
+
+        print(f"DEBUG: Fetching sitemap: {sitemap_url}")
+        content = self.fetch(sitemap_url)
+        if not content:
+            print(f"DEBUG: Failed to fetch {sitemap_url}")
+            return [], []
+        try:
+            return self.parse(content, remaining)
+        finally:
+            # Streaming fetchers hand back open responses; release them as soon as parsing stops
+            close = getattr(content, 'close', None)
+            if close:
+                close()
+
+    def crawl(self, sitemap_urls, project_id, max_pages=200):
+        """Crawl the given sitemap/index URLs. Returns page rows ready for the `pages` table."""
+        start = time.time()
+        pages = []
+        seen_urls = set()
+        seen_sitemaps = set()
+        stop_event = threading.Event()
+        fetched = 0
+        empty_children = 0
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = {}
+        try:
+            def submit(url):
+                if url in seen_sitemaps:
+                    return
+                seen_sitemaps.add(url)
+                future = executor.submit(self._process, url, max_pages - len(pages), stop_event)
+                pending[future] = url
+
+            for url in sitemap_urls:
+                submit(url)
+
+            while pending and not stop_event.is_set():
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if stop_event.is_set():
+                        break
+                    sitemap_url = pending.pop(future)
+                    fetched += 1
+                    try:
+                        children, urls = future.result()
+                    except Exception as e:
+                        print(f"DEBUG: Error fetching sitemap {sitemap_url}: {e}")
+                        continue
+
+                    if children:
+                        print(f"DEBUG: {sitemap_url} is an index with {len(children)} child sitemaps")
+                        for child_url in children:
+                            submit(child_url)
+                        continue
+
+                    if not urls:
+                        empty_children += 1
+                        print(f"DEBUG: Warning - Sitemap {sitemap_url} returned 0 pages. Possible block?")
+
+                    for url in urls:
+                        if url in seen_urls:
+                            continue
+                        seen_urls.add(url)
+                        pages.append({
+                            'project_id': project_id,
+                            'url': url,
+                            'status': 'DISCOVERED',
+                            # Skip title scraping for speed. User can run "Perform Audit" to get details.
+                            'tech_audit_data': {'title': 'Pending Scan'}
+                        })
+                        if len(pages) >= max_pages:
+                            stop_event.set()
+                            break
+        finally:
+            # Drop queued work once the limit is reached; in-flight fetches finish on their own
+            stop_event.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        self.stats = {
+            'sitemaps_fetched': fetched,
+            'sitemaps_discovered': len(seen_sitemaps),
+            'empty_sitemaps': empty_children,
+            'pages': len(pages),
+            'elapsed_sec': round(time.time() - start, 3)
+        }
+        print(f"DEBUG: Sitemap crawl finished: {self.stats}")
+        return pages
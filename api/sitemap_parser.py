@@ -0,0 +1,162 @@
+import gzip
+import io
+import re
+
+from lxml import etree
+
+GZIP_MAGIC = b'\x1f\x8b'
+# '&' that does not start a character/entity reference (raw query strings in hand-built sitemaps)
+BARE_AMPERSAND = re.compile(rb'&(?!#[0-9]+;|#x[0-9a-fA-F]+;|[A-Za-z][\w.-]*;)')
+ENTITY_MAX_LEN = 32
+
+
+class _PrefixedStream(io.RawIOBase):
+    """Re-attaches bytes that were peeked off the front of a non-seekable stream."""
+
+    def __init__(self, prefix, stream):
+        self._prefix = prefix
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._prefix:
+            n = min(len(buffer), len(self._prefix))
+            buffer[:n] = self._prefix[:n]
+            self._prefix = self._prefix[n:]
+            return n
+        data = self._stream.read(len(buffer))
+        if not data:
+            return 0
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            super().close()
+
+
+def open_sitemap_stream(stream):
+    """
+    Wrap a binary stream, transparently gunzipping `.xml.gz` payloads (detected by magic bytes).
+    Closing the returned stream also closes the original one.
+    """
+    if isinstance(stream, str):
+        stream = stream.encode('utf-8')
+    if isinstance(stream, (bytes, bytearray)):
+        stream = io.BytesIO(stream)
+
+    head = stream.read(2)
+    wrapped = _PrefixedStream(head, stream)
+    buffered = io.BufferedReader(wrapped)
+    if head == GZIP_MAGIC:
+        return _GzipStream(buffered)
+    return buffered
+
+
+class _GzipStream(gzip.GzipFile):
+    def __init__(self, fileobj):
+        super().__init__(fileobj=fileobj, mode='rb')
+        self._source = fileobj
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._source.close()
+
+
+class _AmpersandEscaper(io.RawIOBase):
+    """
+    Escapes bare '&' as the document is read. lxml's recover mode would otherwise cut the
+    <loc> text at the '&' and drop every entity after it (so later '&amp;' URLs break too).
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._carry = b''   # tail that may be the start of an entity split across reads
+        self._out = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._out:
+            data = self._stream.read(len(buffer))
+            if not data:
+                if not self._carry:
+                    return 0
+                data, self._carry = self._carry, b''
+            else:
+                data = self._carry + data
+                cut = data.rfind(b'&', max(0, len(data) - ENTITY_MAX_LEN))
+                if cut != -1 and b';' not in data[cut:]:
+                    data, self._carry = data[:cut], data[cut:]
+                else:
+                    self._carry = b''
+            self._out = BARE_AMPERSAND.sub(b'&amp;', data)
+        n = min(len(buffer), len(self._out))
+        buffer[:n] = self._out[:n]
+        self._out = self._out[n:]
+        return n
+
+
+def iter_sitemap_entries(stream):
+    """
+    Incrementally yield ('sitemap' | 'url', loc) tuples from a sitemap or sitemap index.
+
+    Elements are freed as soon as they are read, so memory stays flat regardless of
+    sitemap size. Reading stops as soon as the caller stops iterating.
+    """
+    source = open_sitemap_stream(stream)
+    context = etree.iterparse(_AmpersandEscaper(source), events=('end',), tag=('{*}url', '{*}sitemap'),
+                              recover=True, resolve_entities=False, no_network=True)
+    try:
+        for _, elem in _until_unparseable(context):
+            kind = etree.QName(elem).localname
+            loc = None
+            for child in elem:
+                if isinstance(child.tag, str) and etree.QName(child).localname == 'loc':
+                    loc = (child.text or '').strip()
+                    break
+
+            # Free the element and any already-processed siblings
+            elem.clear()
+            parent = elem.getparent()
+            if parent is not None:
+                while elem.getprevious() is not None:
+                    del parent[0]
+
+            if loc:
+                yield kind, loc
+    finally:
+        del context
+        source.close()
+
+
+def _until_unparseable(context):
+    """iterparse events, ending quietly where even recover mode gives up (e.g. an empty body)."""
+    try:
+        yield from context
+    except etree.XMLSyntaxError as e:
+        print(f"DEBUG: Sitemap parsing stopped: {e}")
+
+
+def parse_sitemap_stream(stream, max_urls=None):
+    """
+    Streaming counterpart of parse_sitemap_soup. Returns (child_sitemap_urls, page_urls)
+    and stops reading the stream once `max_urls` page URLs have been collected.
+    """
+    children = []
+    urls = []
+    for kind, loc in iter_sitemap_entries(stream):
+        if kind == 'sitemap':
+            children.append(loc)
+        elif not children:
+            urls.append(loc)
+            if max_urls is not None and len(urls) >= max_urls:
+                break
+    return children, urls
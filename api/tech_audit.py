@@ -0,0 +1,25 @@
+from urllib.parse import urlparse
+
+
+def get_title_from_url(url):
+    try:
+        path = urlparse(url).path
+        # Get last non-empty segment
+        segments = [s for s in path.split('/') if s]
+        if not segments: return "Home"
+        slug = segments[-1]
+        # Convert slug to title (e.g., "my-page-title" -> "My Page Title")
+        return slug.replace('-', ' ').replace('_', ' ').title()
+    except:
+        return "Untitled Page"
+
+
+def fetch_meta_from_result(result):
+    """Picklable summary of a FetchResult (everything the parse stage needs besides the HTML)."""
+    return {
+        'status_code': result.status_code,
+        'load_time_ms': int(result.total * 1000),
+        'ttfb_ms': int(result.ttfb * 1000),
+        'redirect_history': [{'status_code': s, 'url': u} for s, u in result.history],
+        'error': result.error
+    }
@@ -1,3 +1,11 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api'))
+
+from keyword_intent import classify_intent  # shared vocabulary with the MoFu/ToFu generators
+
+
 def get_serp_competitors(keyword, location_code=2840, limit=5):
     """
     Gets top ranking URLs for a keyword using DataForSEO SERP API.
@@ -123,27 +131,4 @@ def classify_keyword_intent(keyword, kw_info=None):
     Classifies keyword intent as: informational, commercial, transactional
     Returns string with primary and optional secondary intents
     """
-    kw_lower = keyword.lower()
-    intents = []
-    
-    # Transactional indicators
-    if any(word in kw_lower for word in ['buy', 'price', 'shop', 'purchase', 'order', 'discount', 'coupon', 'deal']):
-        intents.append('transactional')
-    
-    # Commercial indicators
-    if any(word in kw_lower for word in ['best', 'top', 'review', 'vs', 'versus', 'alternative', 'compare', 'comparison']):
-        intents.append('commercial')
-    
-    # Informational indicators
-    if any(word in kw_lower for word in ['what is', 'how to', 'benefits', 'guide', 'tutorial', 'tips', 'made from', 'function of']):
-        intents.append('informational')
-    
-    # Default to informational if no clear signals
-    if not intents:
-        intents.append('informational')
-    
-    # Format: "primary | secondary" or just "primary |"
-    if len(intents) == 1:
-        return f"{intents[0]}"
-    else:
-        return f"{intents[0]}, {', '.join(intents[1:])}"
+    return classify_intent(keyword).label
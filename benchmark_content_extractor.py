@@ -0,0 +1,225 @@
+"""
+Benchmark: local content extractor vs the BeautifulSoup-cleaning + Gemini extraction in
+scrape_page_content.
+
+Point --corpus at a directory of saved product/category pages (*.html). Without a corpus a
+synthetic shop (product + category pages with known copy) is generated so the script runs
+offline. With --gemini (and GEMINI_API_KEY set) each page is also sent through the real
+extraction prompt and the two outputs are compared.
+
+Reports per page: latency of each path, prompt tokens the Gemini path would spend (estimated
+at 4 chars/token unless --gemini returns real usage), how many pages clear the confidence
+threshold, and agreement (word-set overlap) with the reference text.
+
+Usage:
+    python benchmark_content_extractor.py [--corpus ./saved_pages] [--pages 100] [--gemini]
+"""
+
+import argparse
+import glob
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+# Add api directory to path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api'))
+
+from content_extractor import EXTRACTOR_MIN_CONFIDENCE, clean_html_for_llm, extract_content
+
+PROMPT_OVERHEAD_CHARS = 1400  # fixed instructions in the extraction prompt
+
+
+def legacy_clean(html):
+    """The BeautifulSoup cleaning scrape_page_content ran before every Gemini call."""
+    soup = BeautifulSoup(html, 'html.parser')
+    for unwanted in soup(["script", "style", "svg", "noscript", "iframe", "object", "embed", "applet", "link", "meta"]):
+        unwanted.decompose()
+    for tag in soup.find_all(['nav', 'footer', 'aside']):
+        tag.decompose()
+    noise_headings = ['related', 'you may also like', 'stories', 'intentional living', 'blog', 'latest news', 'articles']
+    for header in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
+        text = header.get_text().lower()
+        if any(x in text for x in noise_headings):
+            parent = header.parent
+            for _ in range(3):
+                if parent:
+                    if parent.name in ['section', 'div', 'aside']:
+                        parent.decompose()
+                        break
+                    parent = parent.parent
+    for tag in soup.find_all(True):
+        tag.attrs = {}
+    return str(soup.body)[:150000]
+
+
+def words(text):
+    return set(re.findall(r'[a-z0-9]{3,}', (text or '').lower()))
+
+
+def agreement(candidate, reference):
+    """(recall, precision) of candidate's word set against the reference's."""
+    cand, ref = words(candidate), words(reference)
+    if not ref or not cand:
+        return 0.0, 0.0
+    common = len(cand & ref)
+    return common / len(ref), common / len(cand)
+
+
+# --- Synthetic shop ---
+
+WORDS = ("hydrating serum vitamin skin barrier gentle formula fragrance free dermatologist tested "
+         "daily use morning evening apply drops face neck absorbs quickly lightweight texture "
+         "sensitive oily dry combination niacinamide hyaluronic acid glow radiance").split()
+
+
+def _sentence(rng, n=14):
+    return ' '.join(rng.choice(WORDS) for _ in range(n)).capitalize() + '.'
+
+
+def _chrome(rng, inner, title, jsonld):
+    nav = ''.join(f'<li><a href="/collections/c{i}">Category {i}</a></li>' for i in range(40))
+    rail = ''.join(f'<div class="card"><a href="/products/r{i}">Recommended {i}</a><span>£{i}.00</span></div>' for i in range(12))
+    return (
+        f'<!DOCTYPE html><html><head><title>{title}</title><meta name="description" content="{title} — shop now">'
+        f'<script type="application/ld+json">{jsonld}</script><style>.x{{color:red}}</style>'
+        f'<script>window.__STATE__={{"nonce":"{rng.random()}"}}</script></head><body>'
+        f'<div class="announcement-bar">Free shipping over £50</div>'
+        f'<header class="site-header"><nav><ul>{nav}</ul></nav><form class="search"><input name="q"></form></header>'
+        f'<main id="MainContent">{inner}</main>'
+        f'<section class="related-products"><h2>You may also like</h2>{rail}</section>'
+        f'<div class="newsletter-signup"><p>Sign up for 10% off your first order, exclusive offers and news.</p></div>'
+        f'<footer><p>© Example Beauty Ltd. All rights reserved, registered in England.</p></footer></body></html>'
+    )
+
+
+def synthetic_product(i, rng):
+    name = f"Glow Serum No. {i}"
+    paragraphs = [_sentence(rng, rng.randint(12, 30)) for _ in range(rng.randint(3, 8))]
+    benefits = [_sentence(rng, 6) for _ in range(5)]
+    reference = '\n'.join([name, *paragraphs, *benefits])
+    inner = (
+        f'<div class="product"><div class="product__media"><img src="/i/{i}.jpg" alt="{name}"></div>'
+        f'<div class="product__info"><h1 class="product__title">{name}</h1><div class="price">£{i}.00</div>'
+        f'<form class="product-form"><button>Add to cart</button></form>'
+        f'<div class="product__description rte">' + ''.join(f'<p>{p}</p>' for p in paragraphs) +
+        '<h3>Key benefits</h3><ul>' + ''.join(f'<li>{b}</li>' for b in benefits) + '</ul></div></div></div>'
+    )
+    jsonld = ('{"@context":"https://schema.org","@type":"Product","name":"%s","description":"%s",'
+              '"offers":{"@type":"Offer","price":"%d.00","priceCurrency":"GBP"}}' % (name, paragraphs[0], i))
+    return f"https://shop.example.com/products/glow-serum-{i}", _chrome(rng, inner, name, jsonld), reference
+
+
+def synthetic_category(i, rng):
+    title = f"Serums Collection {i}"
+    intro = _sentence(rng, 30)
+    products = [f"Product {i}-{n}" for n in range(rng.randint(8, 24))]
+    reference = '\n'.join([title, intro, *products])
+    cards = ''.join(f'<li class="grid__item"><div class="card"><a href="/products/p{n}">{p}</a><span class="price">£{n}.00</span></div></li>'
+                    for n, p in enumerate(products))
+    inner = (f'<div class="collection-hero"><h1>{title}</h1><div class="collection-hero__description rte"><p>{intro}</p></div></div>'
+             f'<ul class="product-grid">{cards}</ul>')
+    items = ','.join('{"@type":"ListItem","position":%d,"item":{"@type":"Product","name":"%s","url":"/products/p%d"}}' % (n + 1, p, n)
+                     for n, p in enumerate(products))
+    jsonld = '{"@context":"https://schema.org","@type":"ItemList","itemListElement":[%s]}' % items
+    return f"https://shop.example.com/collections/serums-{i}", _chrome(rng, inner, title, jsonld), reference
+
+
+def load_corpus(path, count):
+    if path:
+        corpus = []
+        for f in sorted(glob.glob(os.path.join(path, '**', '*.htm*'), recursive=True))[:count]:
+            with open(f, 'rb') as fh:
+                corpus.append((f"https://example.com/{os.path.basename(f)}", fh.read().decode('utf-8', errors='replace'), None))
+        return corpus
+    rng = random.Random(7)
+    return [synthetic_product(i, rng) if i % 2 == 0 else synthetic_category(i, rng) for i in range(count)]
+
+
+def gemini_extract(cleaned_html, meta):
+    import google.generativeai as genai
+    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+    model = genai.GenerativeModel('gemini-2.0-flash-exp')
+    prompt = ("You are a strict Content Extraction Robot. Extract the visible page content as Markdown. "
+              "No hallucinations; ignore navigation, footers and related products.\n"
+              f"Meta Description: {meta}\nHTML Snippet: {cleaned_html}")
+    t0 = time.perf_counter()
+    response = model.generate_content(prompt)
+    usage = getattr(response, 'usage_metadata', None)
+    return response.text, time.perf_counter() - t0, getattr(usage, 'prompt_token_count', None)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--corpus', help='Directory of saved product/category pages (default: synthetic shop)')
+    parser.add_argument('--pages', type=int, default=100)
+    parser.add_argument('--gemini', action='store_true', help='Also run the real Gemini extraction (needs GEMINI_API_KEY)')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus, args.pages)
+    if not corpus:
+        print(f"No *.html files found in {args.corpus}")
+        return
+    print(f"Corpus: {len(corpus)} pages ({'saved' if args.corpus else 'synthetic'}), "
+          f"confidence threshold {EXTRACTOR_MIN_CONFIDENCE}")
+    print("=" * 72)
+
+    local_ms, legacy_ms, lxml_clean_ms, gemini_ms = [], [], [], []
+    prompt_tokens, confident, avoided_tokens, recalls, precisions = [], 0, 0, [], []
+    by_type = {}
+    for url, html, reference in corpus:
+        t0 = time.perf_counter()
+        result = extract_content(html, url)
+        local_ms.append((time.perf_counter() - t0) * 1000)
+
+        t0 = time.perf_counter()
+        cleaned = legacy_clean(html)
+        legacy_ms.append((time.perf_counter() - t0) * 1000)
+
+        t0 = time.perf_counter()
+        clean_html_for_llm(html)
+        lxml_clean_ms.append((time.perf_counter() - t0) * 1000)
+
+        tokens = (len(cleaned) + len(result['json_ld']) + len(result['meta_description']) + PROMPT_OVERHEAD_CHARS) // 4
+        if args.gemini:
+            gemini_text, latency, real_tokens = gemini_extract(cleaned, result['meta_description'])
+            gemini_ms.append(latency * 1000)
+            tokens = real_tokens or tokens
+            reference = reference or gemini_text
+        prompt_tokens.append(tokens)
+
+        ok = result['confidence'] >= EXTRACTOR_MIN_CONFIDENCE
+        confident += ok
+        avoided_tokens += tokens if ok else 0
+        by_type.setdefault(result['page_type'], []).append(result['confidence'])
+        if reference:
+            recall, precision = agreement(result['markdown'], reference)
+            recalls.append(recall)
+            precisions.append(precision)
+
+    def line(name, values):
+        print(f"{name:34s} mean={statistics.mean(values):8.2f}ms  median={statistics.median(values):8.2f}ms  max={max(values):8.2f}ms")
+
+    line("local extractor (lxml)", local_ms)
+    line("legacy cleaning (BeautifulSoup)", legacy_ms)
+    line("LLM-input cleaning (lxml)", lxml_clean_ms)
+    if gemini_ms:
+        line("Gemini extraction call", gemini_ms)
+    print(f"Gemini prompt tokens per page: mean={statistics.mean(prompt_tokens):.0f} "
+          f"(total {sum(prompt_tokens):,}{'' if args.gemini else ', estimated'})")
+    print(f"Pages above confidence threshold: {confident}/{len(corpus)} -> {avoided_tokens:,} prompt tokens avoided")
+    for page_type, values in sorted(by_type.items()):
+        print(f"  {page_type:10s} pages={len(values):4d}  mean confidence={statistics.mean(values):.2f}")
+    if recalls:
+        print(f"Agreement with {'Gemini output' if args.gemini and args.corpus else 'known page copy'}: "
+              f"recall={statistics.mean(recalls):.2f}  precision={statistics.mean(precisions):.2f}")
+    else:
+        print("Agreement: no reference text for saved pages (run with --gemini to compare against Gemini)")
+
+
+if __name__ == "__main__":
+    main()
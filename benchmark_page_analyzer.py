@@ -0,0 +1,194 @@
+"""
+Benchmark: single-pass lxml page analyzer vs the two BeautifulSoup implementations it replaced
+(the inline parse in start_audit and the one in scrape_page_details).
+
+Point --corpus at a directory of saved pages (*.html / *.htm, e.g. from "Save Page As" or
+`curl -o`). Without a corpus a synthetic one is generated so the script always runs offline.
+
+Usage:
+    python benchmark_page_analyzer.py [--corpus ./saved_pages] [--pages 200] [--repeat 3]
+"""
+
+import argparse
+import glob
+import os
+import random
+import statistics
+import sys
+import time
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup
+
+# Add api directory to path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api'))
+
+from page_analyzer import analyze_page
+
+
+def legacy_start_audit(html, url):
+    """The parse half of the old start_audit (one find/find_all walk per check)."""
+    soup = BeautifulSoup(html, 'html.parser')
+    data = {}
+    data['title'] = soup.title.string.strip() if soup.title and soup.title.string else None
+    meta_desc = soup.find('meta', attrs={'name': 'description'})
+    data['meta_description'] = meta_desc.get('content', '').strip() if meta_desc else None
+    h1 = soup.find('h1')
+    data['h1'] = h1.get_text().strip() if h1 else None
+    og_title = soup.find('meta', attrs={'property': 'og:title'})
+    data['og_title'] = og_title.get('content', '').strip() if og_title else None
+    og_desc = soup.find('meta', attrs={'property': 'og:description'})
+    data['og_description'] = og_desc.get('content', '').strip() if og_desc else None
+    text = soup.get_text(separator=' ')
+    data['word_count'] = len([w for w in text.split() if len(w) > 2])
+    data['internal_links_count'] = len(soup.find_all('a', href=True))
+    canonical = soup.find('link', attrs={'rel': 'canonical'})
+    data['canonical'] = canonical.get('href', '').strip() if canonical else None
+    data['missing_alt_count'] = len([img for img in soup.find_all('img') if not img.get('alt')])
+    data['has_schema'] = soup.find('script', type='application/ld+json') is not None or \
+        soup.find(attrs={'itemscope': True}) is not None
+    return data
+
+
+def legacy_scrape_page_details(html, url):
+    """The parse half of the old scrape_page_details."""
+    soup = BeautifulSoup(html, 'html.parser')
+    data = {'missing_alt_count': 0}
+    page_title = None
+    head_title = soup.select_one('head > title')
+    if head_title and head_title.string:
+        page_title = head_title
+    if not page_title:
+        for t in soup.find_all('title'):
+            parents = [p.name for p in t.parents]
+            if not any(x in ['svg', 'symbol', 'defs', 'g'] for x in parents):
+                page_title = t
+                break
+    data['title'] = page_title.get_text(strip=True) if page_title else ''
+    meta_desc = soup.find('meta', attrs={'name': 'description'})
+    data['meta_description'] = meta_desc.get('content', '').strip() if meta_desc else ''
+    h1 = soup.find('h1')
+    data['h1'] = h1.get_text(strip=True) if h1 else ''
+    canonical = soup.find('link', attrs={'rel': 'canonical'})
+    data['canonical'] = canonical.get('href', '').strip() if canonical else ''
+    data['word_count'] = len(soup.get_text(separator=' ').split())
+    og_title = soup.find('meta', property='og:title')
+    data['og_title'] = og_title.get('content', '').strip() if og_title else ''
+    og_desc = soup.find('meta', property='og:description')
+    data['og_description'] = og_desc.get('content', '').strip() if og_desc else ''
+    data['has_schema'] = soup.find('script', type='application/ld+json') is not None
+    for img in soup.find_all('img'):
+        if not img.get('alt'):
+            data['missing_alt_count'] += 1
+    return data
+
+
+def analyzer(html, url):
+    return analyze_page(url, html, {'status_code': 200})
+
+
+WORDS = ("running shoes trail lightweight waterproof cushioning grip outsole mesh upper "
+         "comfort size guide returns shipping review rating colour fit heel drop").split()
+
+
+def synthetic_page(i, rng):
+    paragraphs = rng.randint(20, 200)
+    products = rng.randint(10, 60)
+    parts = [
+        '<!DOCTYPE html><html lang="en"><head><meta charset="utf-8">',
+        f'<title>Product {i} | Example Store</title>',
+        f'<meta name="description" content="Buy product {i} online with free shipping and easy returns.">',
+        f'<link rel="canonical" href="https://shop.example.com/products/p{i}">',
+        f'<meta property="og:title" content="Product {i}">',
+        '<script type="application/ld+json">{"@type": "Product"}</script>',
+        '<style>body{font-family:sans-serif}.card{padding:8px}</style>',
+        '</head><body>',
+        '<svg style="display:none"><symbol id="icon-cart"><title>Cart</title><path d="M0 0h24v24H0z"/></symbol></svg>',
+        '<header><nav>' + ''.join(f'<a href="/c/{n}">Category {n}</a>' for n in range(30)) + '</nav></header>',
+        f'<main><h1>Product {i}</h1>'
+    ]
+    for p in range(paragraphs):
+        parts.append('<p>' + ' '.join(rng.choice(WORDS) for _ in range(rng.randint(15, 60))) + '</p>')
+    parts.append('<div class="grid">')
+    for p in range(products):
+        alt = '' if p % 4 == 0 else f' alt="Product {p}"'
+        parts.append(f'<div class="card" itemscope><a href="https://shop.example.com/p/{p}">'
+                     f'<img src="/img/{p}.jpg"{alt}></a><span>&pound;{p}.99</span></div>')
+    parts.append('</div></main><footer><a href="https://twitter.com/example">Twitter</a></footer>')
+    parts.append('<script>window.dataLayer=window.dataLayer||[];</script></body></html>')
+    return '\n'.join(parts)
+
+
+def load_corpus(path, count):
+    if path:
+        files = sorted(glob.glob(os.path.join(path, '**', '*.htm*'), recursive=True))[:count]
+        corpus = []
+        for f in files:
+            with open(f, 'rb') as fh:
+                raw = fh.read()
+            corpus.append((f"https://example.com/{os.path.basename(f)}", raw.decode('utf-8', errors='replace')))
+        return corpus
+    rng = random.Random(42)
+    return [(f"https://shop.example.com/products/p{i}", synthetic_page(i, rng)) for i in range(count)]
+
+
+def time_per_page(fn, corpus, repeat):
+    timings = []
+    for url, html in corpus:
+        best = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn(html, url)
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        timings.append(best * 1000)
+    return timings
+
+
+def summarize(name, timings):
+    ordered = sorted(timings)
+    p95 = ordered[int(len(ordered) * 0.95) - 1] if len(ordered) > 1 else ordered[0]
+    print(f"{name:28s} mean={statistics.mean(timings):7.2f}ms  median={statistics.median(timings):7.2f}ms  p95={p95:7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--corpus', help='Directory of saved HTML pages (default: synthetic corpus)')
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per page; the fastest is kept')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus, args.pages)
+    if not corpus:
+        print(f"No *.html files found in {args.corpus}")
+        return
+    total_kb = sum(len(html) for _, html in corpus) / 1024
+    print(f"Corpus: {len(corpus)} pages, {total_kb / len(corpus):.1f}KB avg "
+          f"({'saved' if args.corpus else 'synthetic'})")
+    print("=" * 60)
+
+    legacy_audit = time_per_page(legacy_start_audit, corpus, args.repeat)
+    legacy_scrape = time_per_page(legacy_scrape_page_details, corpus, args.repeat)
+    new = time_per_page(analyzer, corpus, args.repeat)
+
+    summarize("start_audit (BeautifulSoup)", legacy_audit)
+    summarize("scrape_page_details (BS)", legacy_scrape)
+    summarize("page_analyzer (lxml)", new)
+    print(f"Speedup vs start_audit: {statistics.mean(legacy_audit) / statistics.mean(new):.1f}x, "
+          f"vs scrape_page_details: {statistics.mean(legacy_scrape) / statistics.mean(new):.1f}x")
+
+    # Sanity check: the fields both implementations report should agree
+    mismatches = 0
+    for url, html in corpus:
+        old = legacy_scrape_page_details(html, url)
+        cur = analyzer(html, url)
+        for key in ('title', 'meta_description', 'h1', 'canonical', 'missing_alt_count'):
+            if (old.get(key) or '') != (cur.get(key) or ''):
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"  differs: {urlparse(url).path} {key}: {old.get(key)!r} vs {cur.get(key)!r}")
+    print(f"Field mismatches vs scrape_page_details: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
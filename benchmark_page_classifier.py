@@ -0,0 +1,118 @@
+"""
+Benchmark: compiled page classifier (api/page_classifier.py) vs the old per-URL if/elif chain
+in auto_classify, on synthetic URLs.
+
+Checks that both assign the same type to every page, then reports classification throughput
+and the Supabase round trips needed to classify the whole project: the old endpoint handled 50
+pages per request with one update per matched page; the new one pages through the project
+1000 rows at a time and writes one update per type (500 ids each).
+
+Usage:
+    python benchmark_page_classifier.py [--pages 20000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add api directory to path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api'))
+
+from page_classifier import PageClassifier
+
+
+def legacy_classify(url, og_type):
+    """The rule chain auto_classify ran for every page before the compiled classifier."""
+    url = url.lower()
+    og_type = (og_type or '').lower()
+    new_type = None
+    if 'product' in og_type:
+        new_type = 'Product'
+    elif 'service' in og_type:
+        new_type = 'Service'
+    elif 'article' in og_type or 'blog' in og_type:
+        new_type = 'Category'
+    if not new_type:
+        if any(x in url for x in ['/product/', '/products/', '/item/', '/p/', '/shop/']):
+            new_type = 'Product'
+        elif any(x in url for x in ['/service/', '/services/', '/solution/', '/solutions/', '/consulting/', '/offering/']):
+            new_type = 'Service'
+        elif any(x in url for x in ['/category/', '/categories/', '/c/', '/collection/', '/collections/', '/blog/', '/blogs/', '/article/', '/news/']):
+            new_type = 'Category'
+        elif 'culture' in url or 'trend' in url or 'artistry' in url or 'how-to' in url or 'backstage' in url or 'collections' in url or 'editorial' in url or 'guide' in url:
+            new_type = 'Category'
+        elif any(f"/{x}" in url for x in ['lips', 'face', 'eyes', 'brushes', 'skincare', 'bestsellers', 'new', 'sets', 'gifts']):
+            new_type = 'Category'
+        elif 'shades' in url or 'colours' in url or 'looks' in url or 'inspiration' in url:
+            new_type = 'Category'
+        elif 'trending-products' in url or url.endswith('-products'):
+            new_type = 'Category'
+    return new_type
+
+
+SECTIONS = ['products', 'product', 'p', 'shop', 'item', 'collections', 'c', 'blog', 'news', 'services',
+            'solutions', 'pages', 'about', 'lips', 'face', 'eyes', 'skincare', 'gifts', 'new-in', 'en-gb',
+            'help', 'stores', 'account', 'sets', 'inspiration', 'looks']
+SLUG_WORDS = ['matte', 'lipstick', 'serum', 'glow', 'trend', 'guide', 'shades', 'how-to', 'culture', 'foundation',
+              'brush', 'kit', 'mini', 'holiday', 'best', 'sellers', 'trending', 'products', 'vegan', 'spf']
+OG_TYPES = [None, None, None, 'website', 'product', 'article', 'og:product', 'product.group', 'blog']
+
+
+def synthetic_pages(count, seed=11):
+    rng = random.Random(seed)
+    pages = []
+    for i in range(count):
+        depth = rng.randint(0, 3)
+        path = '/'.join(rng.choice(SECTIONS) for _ in range(depth))
+        slug = '-'.join(rng.choice(SLUG_WORDS) for _ in range(rng.randint(1, 4)))
+        url = f"https://www.example-beauty.com/{path + '/' if path else ''}{slug}"
+        if rng.random() < 0.1:
+            url = url.upper()
+        pages.append({'id': i, 'url': url, 'page_type': rng.choice([None, None, None, 'Unclassified', 'Other']),
+                      'og_type': rng.choice(OG_TYPES)})
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=20000)
+    args = parser.parse_args()
+
+    pages = synthetic_pages(args.pages)
+    print(f"Synthetic pages: {len(pages)}")
+    print("=" * 60)
+
+    t0 = time.perf_counter()
+    legacy = {p['id']: legacy_classify(p['url'], p['og_type']) for p in pages}
+    legacy_sec = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    classifier = PageClassifier()
+    compile_sec = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    groups = classifier.classify_pages(pages)
+    compiled_sec = time.perf_counter() - t0
+
+    compiled = {pid: page_type for page_type, ids in groups.items() for pid in ids}
+    mismatches = [p for p in pages if legacy[p['id']] != compiled.get(p['id'])]
+    matched = sum(1 for t in legacy.values() if t)
+
+    print(f"{'legacy if/elif chain':28s} {legacy_sec * 1000:8.1f}ms  {len(pages) / legacy_sec:10,.0f} pages/sec")
+    print(f"{'compiled classifier':28s} {compiled_sec * 1000:8.1f}ms  {len(pages) / compiled_sec:10,.0f} pages/sec"
+          f"  (compile {compile_sec * 1000:.1f}ms)")
+    print(f"Speedup: {legacy_sec / compiled_sec:.1f}x")
+    print(f"Matched pages: {matched}  by type: { {t: len(ids) for t, ids in sorted(groups.items())} }")
+    old_requests = (len(pages) + 49) // 50
+    new_calls = (len(pages) + 999) // 1000 + sum((len(ids) + 499) // 500 for ids in groups.values())
+    print(f"Round trips for the whole project: old {old_requests} requests x (1 select) + {matched} updates "
+          f"= {old_requests + matched}; new 1 request, {new_calls} calls")
+    print(f"Disagreements with legacy chain: {len(mismatches)}")
+    for p in mismatches[:10]:
+        print(f"  {p['url']} og={p['og_type']}: legacy={legacy[p['id']]} compiled={compiled.get(p['id'])}")
+
+
+if __name__ == "__main__":
+    main()
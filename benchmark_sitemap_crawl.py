@@ -0,0 +1,163 @@
+"""
+Benchmark: concurrent SitemapCrawler vs the old serial sitemap recursion.
+
+Spins up a local fixture server serving a sitemap index with 50 child sitemaps
+and crawls it both ways. No network or Supabase access is needed.
+
+Usage:
+    python benchmark_sitemap_crawl.py [--children 50] [--urls-per-child 200] [--latency-ms 40] [--max-pages 5000]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+# Add api directory to path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api'))
+
+from sitemap_crawler import SitemapCrawler, parse_sitemap_soup
+from sitemap_parser import parse_sitemap_stream
+
+LEGACY_SLEEP_SEC = 2  # Fixed sleep the old fetch_sitemap_urls paid before every child sitemap
+
+
+def make_handler(children, urls_per_child, latency_ms, overlap):
+    class FixtureHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(latency_ms / 1000.0)
+            host = f"http://{self.headers['Host']}"
+            if self.path == '/sitemap_index.xml':
+                body = ['<?xml version="1.0" encoding="UTF-8"?>',
+                        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+                for i in range(children):
+                    body.append(f"<sitemap><loc>{host}/sitemap-{i}.xml</loc></sitemap>")
+                body.append('</sitemapindex>')
+            elif self.path.startswith('/sitemap-'):
+                idx = int(self.path[len('/sitemap-'):-len('.xml')])
+                body = ['<?xml version="1.0" encoding="UTF-8"?>',
+                        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+                for j in range(urls_per_child):
+                    # A slice of every child repeats URLs from the previous child (dedup check)
+                    owner = idx - 1 if (idx > 0 and j < overlap) else idx
+                    body.append(f"<url><loc>https://shop.example.com/c{owner}/p{j}</loc></url>")
+                body.append('</urlset>')
+            else:
+                self.send_response(404)
+                self.end_headers()
+                return
+
+            payload = '\n'.join(body).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/xml')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return FixtureHandler
+
+
+def fetch(url):
+    resp = requests.get(url, timeout=30)
+    return resp.text if resp.status_code == 200 else None
+
+
+def fetch_stream(url):
+    resp = requests.get(url, timeout=30, stream=True)
+    if resp.status_code != 200:
+        resp.close()
+        return None
+    return resp.raw
+
+
+def legacy_crawl(sitemap_url, project_id, max_urls, sleep_sec, visits):
+    """Depth-first, one child at a time - mirrors the previous fetch_sitemap_urls."""
+    visits.append(sitemap_url)
+    pages = []
+    content = fetch(sitemap_url)
+    if not content:
+        return pages
+    children, urls = parse_sitemap_soup(content)
+    if children:
+        for child_url in children:
+            if len(pages) >= max_urls:
+                break
+            time.sleep(sleep_sec)
+            pages.extend(legacy_crawl(child_url, project_id, max_urls - len(pages), sleep_sec, visits))
+    else:
+        for url in urls[:max_urls]:
+            pages.append({'project_id': project_id, 'url': url, 'status': 'DISCOVERED',
+                          'tech_audit_data': {'title': 'Pending Scan'}})
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--children', type=int, default=50)
+    parser.add_argument('--urls-per-child', type=int, default=200)
+    parser.add_argument('--overlap', type=int, default=20, help='URLs each child repeats from the previous one')
+    parser.add_argument('--latency-ms', type=int, default=40, help='Artificial server latency per request')
+    parser.add_argument('--max-pages', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--legacy-sleep', type=float, default=0.0,
+                        help=f'Sleep between children for the serial baseline (the old code used {LEGACY_SLEEP_SEC}s)')
+    args = parser.parse_args()
+
+    handler = make_handler(args.children, args.urls_per_child, args.latency_ms, args.overlap)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    index_url = f"http://127.0.0.1:{server.server_address[1]}/sitemap_index.xml"
+
+    print(f"Fixture: {args.children} child sitemaps x {args.urls_per_child} URLs, "
+          f"{args.latency_ms}ms latency, max_pages={args.max_pages}")
+    print("=" * 60)
+
+    # Silence the engine's per-sitemap DEBUG prints while timing
+    devnull = open(os.devnull, 'w')
+    real_stdout = sys.stdout
+
+    sys.stdout = devnull
+    visits = []
+    t0 = time.time()
+    legacy_pages = legacy_crawl(index_url, 'bench', args.max_pages, args.legacy_sleep, visits)
+    legacy_elapsed = time.time() - t0
+
+    crawler = SitemapCrawler(fetch=fetch, max_workers=args.workers, host_rate=1000, host_burst=args.workers)
+    t0 = time.time()
+    new_pages = crawler.crawl([index_url], 'bench', max_pages=args.max_pages)
+    new_elapsed = time.time() - t0
+
+    stream_crawler = SitemapCrawler(fetch=fetch_stream, parse=parse_sitemap_stream,
+                                    max_workers=args.workers, host_rate=1000, host_burst=args.workers)
+    t0 = time.time()
+    stream_pages = stream_crawler.crawl([index_url], 'bench', max_pages=args.max_pages)
+    stream_elapsed = time.time() - t0
+    sys.stdout = real_stdout
+
+    legacy_unique = len({p['url'] for p in legacy_pages})
+    # Every child sitemap after the index cost a fixed sleep in the old code
+    projected_sleep = max(0, len(visits) - 1) * max(0.0, LEGACY_SLEEP_SEC - args.legacy_sleep)
+
+    print(f"Serial (legacy):     {legacy_elapsed:7.2f}s  rows={len(legacy_pages)} unique={legacy_unique}")
+    print(f"  + fixed sleeps the old code added: ~{projected_sleep}s")
+    print(f"Concurrent (engine): {new_elapsed:7.2f}s  rows={len(new_pages)} unique={len({p['url'] for p in new_pages})}")
+    print(f"Concurrent + stream: {stream_elapsed:7.2f}s  rows={len(stream_pages)} unique={len({p['url'] for p in stream_pages})}")
+    print(f"Engine stats: {crawler.stats}")
+    if new_elapsed > 0:
+        print(f"Speedup (excluding legacy sleeps): {legacy_elapsed / new_elapsed:.1f}x")
+        print(f"Speedup (including legacy sleeps): {(legacy_elapsed + projected_sleep) / new_elapsed:.1f}x")
+    if stream_elapsed > 0:
+        print(f"Streaming parser vs BeautifulSoup engine: {new_elapsed / stream_elapsed:.1f}x")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import os
+from supabase import create_client, Client
+from dotenv import load_dotenv
+
+load_dotenv()
+
+url: str = os.environ.get("SUPABASE_URL")
+key: str = os.environ.get("SUPABASE_KEY")
+
+# Per-project rules for /api/auto-classify (see api/page_classifier.py). Either a list of rules
+# tried before the defaults, or {"rules": [...], "replace_defaults": true}. Example:
+#   [{"type": "Product", "contains": ["/dp/"]}, {"type": "Category", "regex": "/range/[a-z-]+$"}]
+SQL = """
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS classifier_rules JSONB;
+"""
+
+print("Migration script for per-project classifier rules")
+print("Please execute the following SQL in your Supabase SQL Editor:")
+print(SQL)
+
+if url and key:
+    supabase: Client = create_client(url, key)
+    try:
+        supabase.table('projects').select('classifier_rules').limit(1).execute()
+        print("projects.classifier_rules exists.")
+    except Exception as e:
+        print(f"projects.classifier_rules is missing: {e}")
@@ -0,0 +1,39 @@
+import os
+from supabase import create_client, Client
+from dotenv import load_dotenv
+
+load_dotenv()
+
+url: str = os.environ.get("SUPABASE_URL")
+key: str = os.environ.get("SUPABASE_KEY")
+
+# Grouped page counts for /api/get-projects (replaces two count queries per project).
+# Until this function exists the API falls back to per-project head counts.
+SQL = """
+CREATE OR REPLACE FUNCTION get_project_page_counts(project_ids UUID[] DEFAULT NULL)
+RETURNS TABLE (project_id UUID, page_count BIGINT, classified_count BIGINT)
+LANGUAGE sql STABLE
+AS $$
+    SELECT
+        p.project_id,
+        COUNT(*) AS page_count,
+        COUNT(*) FILTER (WHERE p.page_type IS NOT NULL AND p.page_type <> 'Unclassified') AS classified_count
+    FROM pages p
+    WHERE project_ids IS NULL OR p.project_id = ANY(project_ids)
+    GROUP BY p.project_id;
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_pages_project_id_page_type ON pages (project_id, page_type);
+"""
+
+print("Migration script for grouped project page counts")
+print("Please execute the following SQL in your Supabase SQL Editor:")
+print(SQL)
+
+if url and key:
+    supabase: Client = create_client(url, key)
+    try:
+        res = supabase.rpc('get_project_page_counts', {}).execute()
+        print(f"get_project_page_counts is installed ({len(res.data or [])} projects with pages).")
+    except Exception as e:
+        print(f"get_project_page_counts is not installed yet: {e}")
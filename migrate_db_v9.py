@@ -0,0 +1,64 @@
+import os
+from supabase import create_client, Client
+from dotenv import load_dotenv
+
+load_dotenv()
+
+url: str = os.environ.get("SUPABASE_URL")
+key: str = os.environ.get("SUPABASE_KEY")
+
+# Bulk merge of crawled pages for /api/run-project-setup (one call per 1000 URLs instead of
+# an update per existing row). Until merge_discovered_pages exists the API merges client-side
+# in chunks.
+#
+# The unique index needs (project_id, url) to be unique already. Find duplicates first with:
+#   SELECT project_id, url, COUNT(*) FROM pages GROUP BY 1, 2 HAVING COUNT(*) > 1;
+SQL = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_pages_project_id_url ON pages (project_id, url);
+
+-- Crawl data is merged over what is stored, except that a placeholder title from the
+-- crawler never replaces a real one (existing keys win in that case).
+CREATE OR REPLACE FUNCTION merge_tech_audit_data(existing JSONB, incoming JSONB)
+RETURNS JSONB
+LANGUAGE sql IMMUTABLE
+AS $$
+    SELECT CASE
+        WHEN existing IS NULL THEN incoming
+        WHEN COALESCE(existing->>'title', '') NOT IN ('', 'Pending Scan', 'Untitled Product')
+             AND incoming->>'title' IN ('Pending Scan', 'Untitled Product')
+            THEN incoming || existing
+        ELSE existing || COALESCE(incoming, '{}'::jsonb)
+    END;
+$$;
+
+CREATE OR REPLACE FUNCTION merge_discovered_pages(p_project_id UUID, p_pages JSONB)
+RETURNS TABLE (inserted BIGINT, updated BIGINT)
+LANGUAGE sql
+AS $$
+    WITH incoming AS (
+        SELECT DISTINCT ON (url) url, status, tech_audit_data
+        FROM jsonb_to_recordset(p_pages) AS x(url TEXT, status TEXT, tech_audit_data JSONB)
+        WHERE url IS NOT NULL
+    ), written AS (
+        INSERT INTO pages (project_id, url, status, tech_audit_data)
+        SELECT p_project_id, url, status, tech_audit_data FROM incoming
+        ON CONFLICT (project_id, url) DO UPDATE
+            SET tech_audit_data = merge_tech_audit_data(pages.tech_audit_data, EXCLUDED.tech_audit_data)
+            WHERE pages.tech_audit_data IS DISTINCT FROM merge_tech_audit_data(pages.tech_audit_data, EXCLUDED.tech_audit_data)
+        RETURNING (xmax = 0) AS is_insert
+    )
+    SELECT COUNT(*) FILTER (WHERE is_insert), COUNT(*) FILTER (WHERE NOT is_insert) FROM written;
+$$;
+"""
+
+print("Migration script for bulk page merge")
+print("Please execute the following SQL in your Supabase SQL Editor:")
+print(SQL)
+
+if url and key:
+    supabase: Client = create_client(url, key)
+    try:
+        res = supabase.rpc('merge_discovered_pages', {'p_project_id': None, 'p_pages': []}).execute()
+        print(f"merge_discovered_pages is installed: {res.data}")
+    except Exception as e:
+        print(f"merge_discovered_pages is not installed yet: {e}")
@@ -0,0 +1,30 @@
+from content_extractor import clean_html_for_llm, extract_content
+
+COPY = ("Our hand-poured soy candles burn clean for fifty hours and are scented with essential oils. " * 12).strip()
+
+# ASP.NET WebForms: the whole page body lives inside one <form>
+FORM_WRAPPED = f"""
+<html><head><title>Lavender Candle</title></head>
+<body><form id="aspnetForm" method="post" action="./candle.aspx">
+  <input type="hidden" name="__VIEWSTATE" value="abc">
+  <div id="content">
+    <h1>Lavender Candle</h1>
+    <div class="product-description"><p>{COPY}</p></div>
+    <button type="submit">Add to cart</button>
+  </div>
+</form></body></html>
+"""
+
+
+def test_form_wrapped_page_keeps_its_content():
+    result = extract_content(FORM_WRAPPED, url='https://shop.test/candle.aspx')
+    assert 'hand-poured soy candles' in result['markdown']
+    assert result['confidence'] >= 0.6
+    assert 'Add to cart' not in result['markdown']
+
+
+def test_form_wrapped_page_reaches_llm_cleaner():
+    cleaned = clean_html_for_llm(FORM_WRAPPED)
+    assert 'hand-poured soy candles' in cleaned
+    assert '__VIEWSTATE' not in cleaned
+    assert 'Add to cart' not in cleaned
@@ -0,0 +1,113 @@
+import duplicate_index
+from duplicate_index import DuplicateIndex, build_project_index, estimate_similarity, minhash_signature, normalize_text
+
+DESCRIPTION = ("Our lightweight trail running shoes have a grippy outsole, a breathable mesh upper and "
+               "a cushioned midsole so you can run longer on rocky paths without sore feet at the end of the day")
+
+
+class FakeQuery:
+    def __init__(self, rows):
+        self.rows = rows
+        self.start, self.end = 0, None
+
+    def select(self, *args):
+        return self
+
+    def eq(self, *args):
+        return self
+
+    def order(self, *args):
+        return self
+
+    def range(self, start, end):
+        self.start, self.end = start, end
+        return self
+
+    def execute(self):
+        return type('Result', (), {'data': self.rows[self.start:self.end + 1]})()
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def table(self, name):
+        query = FakeQuery(self.rows)
+        self.queries.append(query)
+        return query
+
+
+def test_normalize_text_ignores_case_width_and_separators():
+    assert normalize_text('  Ｒｕｎｎｉｎｇ   SHOES | ') == 'running shoes'
+    assert normalize_text(None) == ''
+
+
+def test_exact_duplicates_are_grouped_and_flagged():
+    index = DuplicateIndex('p1')
+    index.update(1, 'Running Shoes', 'Shoes for running')
+    index.update(2, 'running  shoes -', 'Something else')
+    index.update(3, 'Hiking Boots', None)
+
+    assert index.duplicate_groups('title') == [[1, 2]]
+    assert index.duplicate_groups('meta_description') == []
+    assert index.flags_for(1) == {'duplicate_title': True, 'duplicate_desc': False}
+    assert index.flags_for(3) == {'duplicate_title': False, 'duplicate_desc': False}
+
+
+def test_update_moves_a_page_out_of_its_old_bucket():
+    index = DuplicateIndex('p1')
+    index.update(1, 'Running Shoes')
+    index.update(2, 'Running Shoes')
+    index.update(2, 'Hiking Boots')
+
+    assert index.duplicate_groups('title') == []
+    assert index.flag_all() == {1: {'duplicate_title': False, 'duplicate_desc': False},
+                                2: {'duplicate_title': False, 'duplicate_desc': False}}
+
+
+def test_minhash_estimates_similarity():
+    signature = minhash_signature(DESCRIPTION)
+    assert estimate_similarity(signature, minhash_signature(DESCRIPTION.upper())) == 1.0
+    assert estimate_similarity(signature, minhash_signature('Cast iron frying pan, pre-seasoned')) < 0.2
+
+
+def test_near_duplicates_share_an_lsh_band():
+    index = DuplicateIndex('p1')
+    index.update(1, meta_description=DESCRIPTION)
+    index.update(2, meta_description=DESCRIPTION.replace('end of the day', 'end of the week'))
+    index.update(3, meta_description=DESCRIPTION)
+    index.update(4, meta_description='Cast iron frying pan, pre-seasoned and ready for the oven or the campfire')
+
+    assert index.near_duplicate_groups('meta_description') == [[1, 2, 3]]
+    # Exact matching only sees the identical pair
+    assert index.duplicate_groups('meta_description') == [[1, 3]]
+
+
+def test_near_duplicates_respect_the_threshold():
+    index = DuplicateIndex('p1')
+    index.update(1, meta_description=DESCRIPTION)
+    index.update(2, meta_description=DESCRIPTION.replace('end of the day', 'end of the week'))
+
+    assert index.near_duplicate_groups('meta_description', threshold=1.0) == []
+
+
+def test_build_project_index_pages_past_the_row_cap():
+    supabase = FakeSupabase([{'id': i, 'title': 'Same title' if i < 2 else f'Page {i}', 'meta_description': None}
+                             for i in range(5)])
+    index = build_project_index(supabase, 'p1', page_size=2)
+
+    assert len(index) == 5
+    assert len(supabase.queries) == 3
+    assert index.duplicate_groups('title') == [[0, 1]]
+
+
+def test_get_project_index_is_cached_until_refresh(monkeypatch):
+    monkeypatch.setattr(duplicate_index, '_indexes', {})
+    supabase = FakeSupabase([{'id': 1, 'title': 'A', 'meta_description': None}])
+    first = duplicate_index.get_project_index(supabase, 'p1')
+    duplicate_index.record_page('p1', 2, 'A', None)
+
+    assert duplicate_index.get_project_index(supabase, 'p1') is first
+    assert first.duplicate_groups('title') == [[1, 2]]
+    assert duplicate_index.get_project_index(supabase, 'p1', refresh=True) is not first
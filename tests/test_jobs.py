@@ -0,0 +1,164 @@
+import time
+
+import pytest
+
+import jobs
+from jobs import JobQueue, register_job_type
+
+register_job_type('busy', lambda item_id, payload, ctx: None)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / 'jobs.db'))
+
+
+def test_stream_ends_after_max_seconds_while_events_keep_coming(queue):
+    job_id = queue.enqueue('busy', ['a'])
+    queue.record_event(job_id, 'a', 'stage', 'running', stage='tick')
+    started = time.time()
+    for event in queue.stream_events(job_id, max_seconds=0.3, poll_interval=0.01):
+        assert time.time() - started < 2, "stream outlived max_seconds"
+        queue.record_event(job_id, 'a', 'stage', 'running', stage='tick')  # the job never goes quiet
+    assert time.time() - started < 2
+
+
+class Recorder:
+    def __init__(self):
+        self.failures, self.cancels = [], []
+
+    def on_failure(self, item_id, payload, error):
+        self.failures.append((item_id, error))
+
+    def on_cancel(self, item_ids, payload):
+        self.cancels.extend(item_ids)
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_RETRY_BASE_SEC', 0)
+
+
+def drain(queue, limit=20):
+    """Claim and run items until the queue has nothing runnable."""
+    worker = jobs.JobWorker(queue=queue)
+    for _ in range(limit):
+        claimed = queue.claim('test')
+        if not claimed:
+            return
+        worker.run_item(*claimed)
+
+
+def items(queue, job_id):
+    return {i['item_id']: i for i in queue.get_job(job_id)['items']}
+
+
+def test_items_are_claimed_in_order_once(queue):
+    job_id = queue.enqueue('busy', ['b', 'a', 'b'])
+    assert [queue.claim('w')[1]['item_id'] for _ in range(2)] == ['b', 'a']
+    assert queue.claim('w') is None
+
+
+def test_failing_item_retries_then_fails_after_max_attempts(queue, no_backoff):
+    calls, hooks = [], Recorder()
+
+    def handler(item_id, payload, ctx):
+        calls.append(ctx.attempt)
+        raise RuntimeError('boom')
+
+    register_job_type('flaky', handler, max_attempts=3, on_failure=hooks.on_failure)
+    job_id = queue.enqueue('flaky', ['a'])
+    drain(queue)
+
+    assert calls == [1, 2, 3]
+    assert items(queue, job_id)['a']['status'] == 'failed'
+    assert queue.get_job(job_id)['status'] == 'failed'
+    assert hooks.failures == [('a', 'RuntimeError: boom')]
+
+
+def test_retry_that_succeeds_counts_once(queue, no_backoff):
+    def handler(item_id, payload, ctx):
+        if ctx.attempt == 1:
+            raise RuntimeError('transient')
+
+    register_job_type('retry_ok', handler)
+    job_id = queue.enqueue('retry_ok', ['a', 'b'])
+    drain(queue)
+
+    job = queue.get_job(job_id)
+    assert (job['status'], job['succeeded'], job['failed']) == ('succeeded', 2, 0)
+    assert {i['attempts'] for i in job['items']} == {2}
+
+
+def test_expired_lease_is_requeued_until_attempts_run_out(queue):
+    hooks = Recorder()
+    register_job_type('hangs', lambda *args: None, max_attempts=2, on_failure=hooks.on_failure)
+    job_id = queue.enqueue('hangs', ['a'])
+
+    for attempt in (1, 2):
+        job, item = queue.claim('dead-worker')
+        assert item['attempts'] == attempt
+        queue._conn().execute("UPDATE job_items SET lease_until = 0")   # the worker died mid-run
+
+    assert queue.claim('w') is None
+    assert items(queue, job_id)['a']['status'] == 'failed'
+    assert queue.get_job(job_id)['status'] == 'failed'
+    assert len(hooks.failures) == 1
+
+    # The hung worker finishing late must not change the settled counters
+    queue.complete(job_id, 'a')
+    job = queue.get_job(job_id)
+    assert (job['succeeded'], job['failed']) == (0, 1)
+
+
+def test_checkpoint_lets_a_retry_skip_committed_work(queue, no_backoff):
+    inserts = []
+
+    def handler(item_id, payload, ctx):
+        if jobs.job_reached('inserted'):
+            return
+        inserts.append(item_id)
+        jobs.job_checkpoint('inserted')
+        if ctx.attempt == 1:
+            raise RuntimeError('later step failed')
+
+    register_job_type('insert_once', handler)
+    job_id = queue.enqueue('insert_once', ['a'])
+    drain(queue)
+
+    assert inserts == ['a']
+    assert queue.get_job(job_id)['status'] == 'succeeded'
+
+
+def test_checkpoints_are_per_item_and_ignored_on_first_attempt(queue):
+    seen = []
+
+    def handler(item_id, payload, ctx):
+        seen.append((item_id, jobs.job_reached('inserted')))
+        jobs.job_checkpoint('inserted')
+
+    register_job_type('fresh', handler)
+    queue.enqueue('fresh', ['a', 'b'])
+    drain(queue)
+    assert seen == [('a', False), ('b', False)]
+    assert jobs.job_reached('inserted') is False   # outside any job
+
+
+def test_cancel_drops_queued_items_and_stops_running_ones(queue):
+    hooks = Recorder()
+
+    def handler(item_id, payload, ctx):
+        ctx.check_cancelled()
+
+    register_job_type('cancellable', handler, on_cancel=hooks.on_cancel)
+    job_id = queue.enqueue('cancellable', ['a', 'b', 'c'])
+    running = queue.claim('w')               # 'a' is in flight when the cancel arrives
+    queue.cancel(job_id)
+    assert hooks.cancels == ['b', 'c']
+    assert queue.claim('w') is None
+
+    jobs.JobWorker(queue=queue).run_item(*running)
+    job = queue.get_job(job_id)
+    assert job['status'] == 'cancelled'
+    assert {i['status'] for i in job['items']} == {'cancelled'}
+    assert hooks.cancels == ['b', 'c', 'a']
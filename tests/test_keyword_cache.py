@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+
+import keyword_cache
+from app_logging import current_context, log_context
+from keyword_cache import KeywordCache
+from outbound_scheduler import BACKGROUND, INTERACTIVE, current_priority, outbound_priority
+
+
+class FetchRecorder:
+    """fetch_batch stand-in: answers `volume` for every keyword except those in `unknown`."""
+
+    def __init__(self, unknown=()):
+        self.unknown = set(unknown)
+        self.calls = []
+
+    def __call__(self, keywords, location_code, language):
+        self.calls.append({'keywords': sorted(keywords), 'priority': current_priority(),
+                           'context': current_context()})
+        return {kw: {'volume': len(kw)} for kw in keywords if kw not in self.unknown}
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(keyword_cache, 'KEYWORD_BATCH_WINDOW', 0.1)
+    return KeywordCache(str(tmp_path / 'keywords.db'))
+
+
+def lookup_in_background(cache, keywords, fetch, results):
+    with outbound_priority(BACKGROUND):
+        results.append(cache.lookup_volumes(keywords, 2840, 'en', fetch))
+
+
+def test_concurrent_background_lookups_share_one_batch(cache):
+    fetch = FetchRecorder()
+    results = []
+    threads = [threading.Thread(target=lookup_in_background, args=(cache, kws, fetch, results))
+               for kws in (['Red Shoes', 'blue shoes'], ['blue  shoes', 'green shoes'])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(2)
+
+    assert [call['keywords'] for call in fetch.calls] == [['blue shoes', 'green shoes', 'red shoes']]
+    assert {kw: v['volume'] for r in results for kw, v in r.items()} == {
+        'Red Shoes': 9, 'blue shoes': 10, 'blue  shoes': 10, 'green shoes': 11}
+
+
+def test_cached_volumes_skip_the_fetch(cache):
+    fetch = FetchRecorder(unknown={'nobody searches this'})
+    first = cache.lookup_volumes(['shoes', 'nobody searches this'], 2840, 'en', fetch)
+    second = cache.lookup_volumes(['SHOES', 'nobody searches this'], 2840, 'en', fetch)
+
+    assert first == {'shoes': {'volume': 5}}
+    assert second == {'SHOES': {'volume': 5}}
+    assert len(fetch.calls) == 1  # unknown keywords are cached as None too
+    stats = cache.stats()['historical_search_volume']
+    assert (stats['hits'], stats['misses'], stats['api_calls']) == (2, 2, 1)
+
+
+def test_failed_fetch_is_not_cached(cache):
+    calls = []
+
+    def failing(keywords, location_code, language):
+        calls.append(keywords)
+        return None
+
+    assert cache.lookup_volumes(['shoes'], 2840, 'en', failing) == {}
+    assert cache.lookup_volumes(['shoes'], 2840, 'en', failing) == {}
+    assert len(calls) == 2
+
+
+def test_interactive_lookup_skips_the_batch_window(cache, monkeypatch):
+    monkeypatch.setattr(keyword_cache, 'KEYWORD_BATCH_WINDOW', 5)
+    fetch = FetchRecorder()
+    started = time.monotonic()
+    assert cache.lookup_volumes(['shoes'], 2840, 'en', fetch) == {'shoes': {'volume': 5}}
+    assert time.monotonic() - started < 1
+    assert fetch.calls[0]['priority'] == INTERACTIVE
+
+
+def test_timer_flush_keeps_caller_priority_and_log_context(cache):
+    fetch = FetchRecorder()
+    with log_context(job_id='job-1'), outbound_priority(BACKGROUND):
+        cache.lookup_volumes(['shoes'], 2840, 'en', fetch)
+
+    assert fetch.calls == [{'keywords': ['shoes'], 'priority': BACKGROUND, 'context': {'job_id': 'job-1'}}]
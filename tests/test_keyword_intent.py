@@ -0,0 +1,48 @@
+from collections import OrderedDict
+
+import pytest
+
+from keyword_intent import IntentClassifier, KeywordIntent, classify_intent, classify_intents
+
+
+@pytest.mark.parametrize('keyword, primary, secondary', [
+    ('buy running shoes', 'transactional', ()),
+    ('best running shoes', 'commercial', ()),
+    ('how to tie running shoes', 'informational', ()),
+    ('running shoes', 'informational', ()),                      # no term: default intent
+    ('best price running shoes', 'transactional', ('commercial',)),
+    ('how to choose the best running shoes', 'commercial', ('informational',)),
+    ('running shoe deals near  me', 'transactional', ()),       # plural and multi-word terms
+    ('Cheap   SHOES for sale', 'transactional', ()),
+])
+def test_intent_priority_order(keyword, primary, secondary):
+    assert classify_intent(keyword) == KeywordIntent(primary, secondary)
+
+
+@pytest.mark.parametrize('keyword', ['laptop bag', 'border collie', 'shopify themes'])
+def test_terms_match_whole_words_only(keyword):
+    assert classify_intent(keyword).primary == 'informational'
+
+
+def test_label_lists_primary_then_secondary():
+    assert classify_intent('best price running shoes').label == 'transactional, commercial'
+    assert classify_intent('running shoes').label == 'informational'
+
+
+def test_classify_many_keeps_input_order():
+    keywords = ['buy shoes', 'shoes review', 'buy shoes']
+    assert [r.primary for r in classify_intents(keywords)] == ['transactional', 'commercial', 'transactional']
+
+
+def test_memo_is_bounded_lru():
+    classifier = IntentClassifier(cache_size=2)
+    first = classifier.classify('buy shoes')
+    classifier.classify('shoes review')
+    assert classifier.classify('BUY  shoes') is first   # normalized hit, now most recent
+    classifier.classify('what is a shoe')
+    assert list(classifier._cache) == ['buy shoes', 'what is a shoe']
+
+
+def test_custom_vocabulary_order():
+    terms = OrderedDict([('local', ['near me']), ('transactional', ['buy'])])
+    assert IntentClassifier(terms).classify('buy shoes near me') == KeywordIntent('local', ('transactional',))
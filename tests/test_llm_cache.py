@@ -0,0 +1,49 @@
+import llm_cache
+from llm_cache import LLMCache, cache_key
+
+
+def keys(cache):
+    return [row[0] for row in cache._conn().execute("SELECT key FROM llm_cache ORDER BY last_access")]
+
+
+def test_cache_key_ignores_prompt_indentation():
+    assert cache_key('m', "  Hello\n\n    world  ") == cache_key('m', "Hello\nworld")
+    assert cache_key('m', "Hello") != cache_key('m', "Hello", config={'temperature': 0})
+
+
+def test_put_evicts_least_recently_used(tmp_path):
+    cache = LLMCache(str(tmp_path / 'llm.db'), max_bytes=100)
+    cache.put('a', 'm', 'x' * 40)
+    cache.put('b', 'm', 'x' * 40)
+    assert cache.get('a') == 'x' * 40   # 'a' is now the most recent
+    cache.put('c', 'm', 'x' * 40)
+
+    assert keys(cache) == ['a', 'c']
+    assert cache.stats()['evictions'] == 1
+    assert cache._size == 80
+
+
+def test_replacing_a_key_does_not_double_count(tmp_path, monkeypatch):
+    sums = []
+    cache = LLMCache(str(tmp_path / 'llm.db'), max_bytes=100)
+    real_evict = cache._evict
+    monkeypatch.setattr(cache, '_evict', lambda: sums.append(1) or real_evict())
+    for _ in range(5):
+        cache.put('a', 'm', 'x' * 60)
+
+    assert keys(cache) == ['a']
+    assert cache._size == 60
+    assert len(sums) == 1   # only the first write reads SUM(size)
+
+
+def test_running_total_is_resynced_periodically(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, 'LLM_CACHE_RESYNC_WRITES', 2)
+    path = str(tmp_path / 'llm.db')
+    cache, other_process = LLMCache(path, max_bytes=100), LLMCache(path, max_bytes=100)
+    cache.put('a', 'm', 'x' * 40)
+    other_process.put('b', 'm', 'x' * 40)
+    other_process.put('c', 'm', 'x' * 40)   # the other process evicts 'a'
+    cache.put('d', 'm', 'x' * 40)
+
+    assert keys(cache) == ['c', 'd']
+    assert cache._size == 80
@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import outbound_scheduler
+from outbound_scheduler import (BACKGROUND, INTERACTIVE, ProviderScheduler, current_priority,
+                                outbound_priority, scheduled_call)
+from rate_limit import TokenBucket
+
+
+class Response:
+    def __init__(self, status_code, retry_after=None):
+        self.status_code = status_code
+        self.headers = {'Retry-After': retry_after} if retry_after is not None else {}
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    """A fast 'test' provider with one call in flight at a time and no retry backoff."""
+    scheduler = ProviderScheduler('test', rate=1000, burst=10, max_in_flight=1)
+    monkeypatch.setitem(outbound_scheduler._schedulers, 'test', scheduler)
+    monkeypatch.setattr(outbound_scheduler, 'OUTBOUND_RETRY_BASE_SEC', 0)
+    monkeypatch.setattr(outbound_scheduler.random, 'uniform', lambda a, b: 0)
+    return scheduler
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_token_bucket_burst_then_refill_wait():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.try_acquire() == (True, 0.0)
+    assert bucket.try_acquire() == (True, 0.0)
+    acquired, wait = bucket.try_acquire()
+    assert not acquired
+    assert 0 < wait <= 0.1
+
+
+def test_token_bucket_penalize_blocks_for_the_penalty():
+    bucket = TokenBucket(rate=10, capacity=5)
+    bucket.penalize(2)
+    acquired, wait = bucket.try_acquire()
+    assert not acquired
+    assert 2.0 < wait <= 2.1
+
+
+def test_interactive_admitted_before_earlier_background(scheduler):
+    scheduler.acquire()
+    order = []
+
+    def worker(priority, label):
+        scheduler.acquire(priority)
+        order.append(label)
+        scheduler.release()
+
+    background = threading.Thread(target=worker, args=(BACKGROUND, 'background'))
+    background.start()
+    wait_until(lambda: scheduler.stats()['queued'] == 1)
+    interactive = threading.Thread(target=worker, args=(INTERACTIVE, 'interactive'))
+    interactive.start()
+    wait_until(lambda: scheduler.stats()['queued'] == 2)
+
+    scheduler.release()
+    background.join(2)
+    interactive.join(2)
+    assert order == ['interactive', 'background']
+
+
+def test_scheduled_call_retries_rate_limited_responses(scheduler):
+    responses = [Response(429, '0'), Response(503), Response(200)]
+    result = scheduled_call('test', responses.pop, 0)
+    assert result.status_code == 200
+    stats = scheduler.stats()
+    assert (stats['calls'], stats['throttled'], stats['retries']) == (3, 2, 2)
+
+
+def test_scheduled_call_returns_last_response_after_max_retries(scheduler, monkeypatch):
+    monkeypatch.setattr(outbound_scheduler, 'OUTBOUND_MAX_RETRIES', 2)
+    calls = []
+
+    def always_throttled():
+        calls.append(1)
+        return Response(429)
+
+    assert scheduled_call('test', always_throttled).status_code == 429
+    assert len(calls) == 3
+    assert scheduler.stats()['retries'] == 2
+
+
+def test_scheduled_call_raises_non_throttle_errors_without_retry(scheduler):
+    def boom():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        scheduled_call('test', boom)
+    stats = scheduler.stats()
+    assert (stats['calls'], stats['errors'], stats['retries'], stats['in_flight']) == (1, 1, 0, 0)
+
+
+def test_aacquire_wakes_on_release(scheduler):
+    async def run():
+        scheduler.acquire()
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.05, scheduler.release)
+        started = time.monotonic()
+        await scheduler.aacquire()
+        scheduler.release()
+        return time.monotonic() - started
+
+    # Woken by release() rather than the 1s fallback timeout
+    assert asyncio.run(run()) < 0.5
+
+
+def test_cancelled_aacquire_leaves_the_queue(scheduler):
+    async def run():
+        scheduler.acquire()
+        task = asyncio.ensure_future(scheduler.aacquire())
+        await asyncio.sleep(0.05)
+        assert scheduler.stats()['queued'] == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        scheduler.release()
+
+    asyncio.run(run())
+    stats = scheduler.stats()
+    assert (stats['queued'], stats['in_flight']) == (0, 0)
+
+
+def test_outbound_priority_is_per_task():
+    seen = {}
+
+    async def background():
+        with outbound_priority(BACKGROUND):
+            await asyncio.sleep(0.01)
+            seen['background'] = current_priority()
+
+    async def interactive():
+        await asyncio.sleep(0.005)
+        seen['interactive'] = current_priority()
+
+    async def run():
+        await asyncio.gather(background(), interactive())
+
+    asyncio.run(run())
+    assert seen == {'background': BACKGROUND, 'interactive': INTERACTIVE}
+    assert current_priority() == INTERACTIVE
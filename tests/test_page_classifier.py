@@ -0,0 +1,66 @@
+import pytest
+
+from page_classifier import DEFAULT_RULES, PageClassifier, get_classifier, project_rules
+
+
+@pytest.fixture
+def classifier():
+    return PageClassifier()
+
+
+@pytest.mark.parametrize('url, og_type, expected', [
+    ('https://shop.example/products/red-lipstick', None, 'Product'),
+    ('https://example.com/services/seo-audit', None, 'Service'),
+    ('https://example.com/blog/spring-looks', None, 'Category'),
+    ('https://example.com/lips', None, 'Category'),
+    ('https://example.com/trending-products', None, 'Category'),
+    ('https://example.com/about-us', None, None),
+    # og:type is checked before any URL rule
+    ('https://example.com/blog/new-serum', 'product', 'Product'),
+    ('https://example.com/products/gift-guide', 'article', 'Category'),
+])
+def test_default_rule_order(classifier, url, og_type, expected):
+    assert classifier.classify(url, og_type) == expected
+
+
+def test_url_rules_match_case_insensitively(classifier):
+    assert classifier.classify('https://Example.com/PRODUCTS/X') == 'Product'
+
+
+def test_earlier_url_rule_wins(classifier):
+    # '/products/' (Product) comes before the generic 'guide' marker (Category)
+    assert classifier.classify('https://example.com/products/buying-guide') == 'Product'
+
+
+def test_classify_pages_only_touches_unclassified_pages(classifier):
+    pages = [
+        {'id': 1, 'url': 'https://example.com/products/a', 'page_type': None},
+        {'id': 2, 'url': 'https://example.com/products/b', 'page_type': 'Service'},
+        {'id': 3, 'url': 'https://example.com/about', 'page_type': 'Unclassified',
+         'tech_audit_data': {'og_type': 'product.item'}},
+        {'id': 4, 'url': 'https://example.com/contact', 'page_type': 'Other'},
+        {'id': 5, 'url': 'https://example.com/blog/x', 'page_type': ''},
+    ]
+    assert classifier.classify_pages(pages) == {'Product': [1, 3], 'Category': [5]}
+
+
+def test_project_rules_run_before_the_defaults():
+    config = [{'type': 'Landing', 'contains': ['/lp/']}, {'type': 'Landing', 'regex': r'/products/promo-'}]
+    classifier = PageClassifier(project_rules(config))
+    assert classifier.classify('https://example.com/lp/summer') == 'Landing'
+    assert classifier.classify('https://example.com/products/promo-1') == 'Landing'
+    assert classifier.classify('https://example.com/products/serum') == 'Product'
+
+
+def test_project_rules_can_replace_the_defaults():
+    config = '{"rules": [{"type": "Landing", "contains": ["/lp/"]}], "replace_defaults": true}'
+    classifier = PageClassifier(project_rules(config))
+    assert classifier.classify('https://example.com/lp/summer') == 'Landing'
+    assert classifier.classify('https://example.com/products/serum') is None
+
+
+def test_get_classifier_is_built_once_per_config():
+    assert project_rules(None) is DEFAULT_RULES
+    config = [{'type': 'Landing', 'contains': ['/lp/']}]
+    assert get_classifier(config) is get_classifier([dict(config[0])])
+    assert get_classifier(config) is not get_classifier(None)
@@ -0,0 +1,59 @@
+import gzip
+import io
+
+import pytest
+
+from sitemap_parser import parse_sitemap_stream
+
+URLSET = '<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{}</urlset>'
+
+
+def sitemap(*locs):
+    return URLSET.format(''.join(f'<url><loc>{loc}</loc></url>' for loc in locs)).encode('utf-8')
+
+
+class TrickleStream(io.RawIOBase):
+    """Hands out a few bytes per read, so entities get split across reads."""
+
+    def __init__(self, data, size=5):
+        self._data = data
+        self._size = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = min(len(buffer), self._size, len(self._data))
+        buffer[:n] = self._data[:n]
+        self._data = self._data[n:]
+        return n
+
+
+def test_raw_ampersands_keep_the_whole_loc():
+    body = sitemap('https://a.com/p?x=1&y=2', 'https://a.com/q?a=1&amp;b=2', 'https://a.com/r?c=&#38;&#x26;d')
+    assert parse_sitemap_stream(body) == ([], ['https://a.com/p?x=1&y=2', 'https://a.com/q?a=1&b=2',
+                                               'https://a.com/r?c=&&d'])
+
+
+@pytest.mark.parametrize('size', [1, 3, 7])
+def test_entities_split_across_reads(size):
+    locs = [f'https://a.com/p{i}?x=1&amp;y={i}&z=3' for i in range(20)]
+    children, urls = parse_sitemap_stream(TrickleStream(sitemap(*locs), size))
+    assert children == []
+    assert urls == [loc.replace('&amp;', '&') for loc in locs]
+
+
+def test_gzipped_sitemap_index():
+    body = URLSET.replace('urlset', 'sitemapindex').format(
+        '<sitemap><loc>https://a.com/s1.xml?v=1&lang=en</loc></sitemap>').encode('utf-8')
+    assert parse_sitemap_stream(gzip.compress(body)) == (['https://a.com/s1.xml?v=1&lang=en'], [])
+
+
+@pytest.mark.parametrize('body', [b'', b'  \n', gzip.compress(b'')])
+def test_empty_body_has_no_urls(body):
+    assert parse_sitemap_stream(body) == ([], [])
+
+
+def test_max_urls_stops_early():
+    assert parse_sitemap_stream(sitemap('https://a.com/1', 'https://a.com/2', 'https://a.com/3'),
+                                max_urls=2) == ([], ['https://a.com/1', 'https://a.com/2'])